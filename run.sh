@@ -174,6 +174,15 @@ function run-mock {
     wait $OPENAI_MOCK_PID
 }
 
+# run the API on the local filesystem storage backend, with no S3 or moto server, e.g. to benchmark the API alone
+function run-local {
+    export STORAGE_BACKEND="local"
+    export LOCAL_STORAGE_DIRECTORY="${LOCAL_STORAGE_DIRECTORY:-$THIS_DIR/.local-storage}"
+    export S3_BUCKET_NAME="some-bucket"
+    export LOGURU_LEVEL=INFO
+    uvicorn files_api.main:create_app --reload
+}
+
 function set-local-aws-env-vars {
     export AWS_PROFILE=cloud-course
     export AWS_REGION=us-west-2
@@ -0,0 +1,64 @@
+# pylint: disable=invalid-name,missing-module-docstring
+
+import os
+from collections import Counter
+from typing import (
+    Callable,
+    Dict,
+)
+
+import boto3
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+from files_api.main import create_app
+from files_api.settings import Settings
+
+BENCHMARK_BUCKET_NAME = "benchmark-bucket"
+BENCHMARK_FILE_PATH = "benchmark/file.txt"
+BENCHMARK_FILE_CONTENT = b"benchmark content"
+
+
+def main() -> None:
+    """Print the S3 API calls made by each route."""
+    # never talk to real AWS from a benchmark
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BENCHMARK_BUCKET_NAME)
+        app = create_app(settings=Settings(s3_bucket_name=BENCHMARK_BUCKET_NAME))
+
+        s3_calls: Counter = Counter()
+
+        def count_call(model, **kwargs):
+            s3_calls[model.name] += 1
+
+        app.state.s3_client.meta.events.register("before-call.s3", count_call)
+
+        file_url = f"/v1/files/{BENCHMARK_FILE_PATH}"
+        upload = {"file": (BENCHMARK_FILE_PATH, BENCHMARK_FILE_CONTENT, "text/plain")}
+        with TestClient(app) as client:
+            routes: Dict[str, Callable] = {
+                "PUT (create)": lambda: client.put(file_url, files=upload),
+                "PUT (update)": lambda: client.put(file_url, files=upload),
+                "HEAD": lambda: client.head(file_url),
+                "HEAD (missing)": lambda: client.head("/v1/files/missing.txt"),
+                "GET": lambda: client.get(file_url),
+                "GET (missing)": lambda: client.get("/v1/files/missing.txt"),
+                "LIST": lambda: client.get("/v1/files"),
+                "DELETE": lambda: client.delete(file_url),
+                "DELETE (missing)": lambda: client.delete(file_url),
+            }
+
+            print(f"{'route':<18} {'status':>6} {'S3 calls':>8}  operations")
+            for route_name, send_request in routes.items():
+                s3_calls.clear()
+                response = send_request()
+                operations = ", ".join(f"{name} x{count}" for name, count in sorted(s3_calls.items()))
+                print(f"{route_name:<18} {response.status_code:>6} {sum(s3_calls.values()):>8}  {operations}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# pylint: disable=invalid-name,missing-module-docstring
+
+import argparse
+import os
+import statistics
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+)
+
+import boto3
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+from files_api.main import create_app
+from files_api.settings import Settings
+
+BENCHMARK_BUCKET_NAME = "benchmark-bucket"
+BENCHMARK_FILE_PATH = "benchmark/file.txt"
+BENCHMARK_FILE_CONTENT = b"benchmark content" * 64
+
+
+class Args(NamedTuple):
+    """CLI arguments for the script."""
+
+    iterations: int
+
+
+def main() -> None:
+    """Compare per-request latency of every route with and without the shared S3 client."""
+    args = parse_args()
+
+    # never talk to real AWS from a benchmark
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BENCHMARK_BUCKET_NAME)
+
+        per_call_latencies = run_benchmark(iterations=args.iterations, share_client=False)
+        shared_latencies = run_benchmark(iterations=args.iterations, share_client=True)
+
+    print(f"{'route':<10} {'client':<10} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for route_name in per_call_latencies:
+        for label, latencies in (("per-call", per_call_latencies), ("shared", shared_latencies)):
+            samples = latencies[route_name]
+            print(
+                f"{route_name:<10} {label:<10} {statistics.mean(samples):>10.2f} "
+                f"{percentile(samples, 50):>10.2f} {percentile(samples, 95):>10.2f}"
+            )
+
+
+def parse_args() -> Args:
+    """
+    Parse command-line arguments.
+
+    :return: Parsed command-line arguments as a NamedTuple.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark route latency with and without a shared S3 client")
+    parser.add_argument("--iterations", type=int, default=50, help="Number of requests to time per route")
+    args = parser.parse_args()
+    return Args(iterations=args.iterations)
+
+
+def run_benchmark(iterations: int, share_client: bool) -> Dict[str, List[float]]:
+    """
+    Time each route against a moto-mocked bucket.
+
+    :param iterations: Number of requests to time per route.
+    :param share_client: Whether routes use the pooled client created by `create_app`. When False, the
+        shared client is removed so every s3 helper falls back to building its own client.
+
+    :return: Latencies in milliseconds keyed by route name.
+    """
+    app = create_app(settings=Settings(s3_bucket_name=BENCHMARK_BUCKET_NAME))
+    if not share_client:
+        app.state.s3_client = None
+
+    file_url = f"/v1/files/{BENCHMARK_FILE_PATH}"
+    upload = {"file": (BENCHMARK_FILE_PATH, BENCHMARK_FILE_CONTENT, "text/plain")}
+    latencies: Dict[str, List[float]] = {}
+    with TestClient(app) as client:
+        routes: Dict[str, Callable] = {
+            "PUT": lambda: client.put(file_url, files=upload),
+            "HEAD": lambda: client.head(file_url),
+            "GET": lambda: client.get(file_url),
+            "LIST": lambda: client.get("/v1/files"),
+            "DELETE": lambda: client.delete(file_url),
+        }
+        for _ in range(iterations):
+            for route_name, send_request in routes.items():
+                start_time = time.perf_counter()
+                send_request()
+                latencies.setdefault(route_name, []).append((time.perf_counter() - start_time) * 1000)
+
+    return latencies
+
+
+def percentile(samples: List[float], pct: int) -> float:
+    """Return the `pct`-th percentile of `samples`."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+if __name__ == "__main__":
+    main()
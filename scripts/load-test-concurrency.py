@@ -0,0 +1,112 @@
+# pylint: disable=invalid-name,missing-module-docstring
+
+import argparse
+import asyncio
+import os
+import time
+from typing import (
+    List,
+    NamedTuple,
+)
+
+import boto3
+import httpx
+from moto import mock_aws
+
+from files_api.main import create_app
+from files_api.settings import Settings
+
+LOAD_TEST_BUCKET_NAME = "load-test-bucket"
+LOAD_TEST_FILE_PATH = "load-test/file.txt"
+
+
+class Args(NamedTuple):
+    """CLI arguments for the script."""
+
+    requests: int
+    concurrency: int
+    s3_latency_ms: float
+    executor_workers: List[int]
+
+
+def main() -> None:
+    """Measure the throughput of one worker process under concurrent load for several S3 executor sizes."""
+    args = parse_args()
+
+    # never talk to real AWS from a load test
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    print(f"{args.requests} GET requests, {args.concurrency} concurrent, {args.s3_latency_ms} ms per S3 call")
+    print(f"{'executor workers':>16} {'seconds':>10} {'requests/s':>12}")
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket=LOAD_TEST_BUCKET_NAME)
+        s3_client.put_object(Bucket=LOAD_TEST_BUCKET_NAME, Key=LOAD_TEST_FILE_PATH, Body=b"load test")
+
+        for executor_workers in args.executor_workers:
+            elapsed_seconds = asyncio.run(run_load_test(args=args, executor_workers=executor_workers))
+            print(f"{executor_workers:>16} {elapsed_seconds:>10.2f} {args.requests / elapsed_seconds:>12.1f}")
+
+
+def parse_args() -> Args:
+    """
+    Parse command-line arguments.
+
+    :return: Parsed command-line arguments as a NamedTuple.
+    """
+    parser = argparse.ArgumentParser(description="Load test a single Files API worker with a slow S3 endpoint")
+    parser.add_argument("--requests", type=int, default=200, help="Total number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=50, help="Number of requests in flight at once")
+    parser.add_argument("--s3-latency-ms", type=float, default=50, help="Latency added to every S3 call")
+    parser.add_argument(
+        "--executor-workers",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32],
+        help="S3 executor sizes to compare; 1 behaves like calling boto3 directly on the event loop",
+    )
+    args = parser.parse_args()
+    return Args(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        s3_latency_ms=args.s3_latency_ms,
+        executor_workers=args.executor_workers,
+    )
+
+
+async def run_load_test(args: Args, executor_workers: int) -> float:
+    """
+    Download a file `args.requests` times with at most `args.concurrency` requests in flight.
+
+    :return: Elapsed wall-clock seconds.
+    """
+    settings = Settings(
+        s3_bucket_name=LOAD_TEST_BUCKET_NAME,
+        s3_executor_max_workers=executor_workers,
+        s3_max_pool_connections=max(executor_workers, 10),
+    )
+    app = create_app(settings=settings)
+
+    def add_s3_latency(**kwargs):
+        time.sleep(args.s3_latency_ms / 1000)
+
+    app.state.s3_client.meta.events.register("before-call.s3", add_s3_latency)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+
+        async def send_request() -> None:
+            async with semaphore:
+                response = await client.get(f"/v1/files/{LOAD_TEST_FILE_PATH}")
+                response.raise_for_status()
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*[send_request() for _ in range(args.requests)])
+        return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    main()
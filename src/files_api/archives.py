@@ -0,0 +1,544 @@
+"""Read and write tar and zip archives as a stream, without seeking or spooling the archive."""
+
+import asyncio
+import io
+import struct
+import tarfile
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import (
+    IO,
+    AsyncIterator,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Protocol,
+    Union,
+)
+
+ArchiveFormat = Literal["zip", "tar"]
+ARCHIVE_MEDIA_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+
+ZIP_LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+ZIP_DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# the local file headers are followed by the central directory, which repeats what was already streamed
+ZIP_END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+# signature, version, flags, method, mtime, mdate, crc32, compressed size, size, name length, extra length
+ZIP_LOCAL_FILE_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP_FLAG_UTF8 = 0x800
+ZIP_METHOD_STORED = 0
+ZIP_METHOD_DEFLATED = 8
+ZIP64_EXTRA_FIELD_ID = 0x0001
+ZIP64_SIZE_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+ZIP_CENTRAL_DIRECTORY_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sQHHIIQQQQ")
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct("<4sIQI")
+ZIP_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sHHHHIIH")
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+ZIP_MADE_BY_UNIX = 3 << 8
+ZIP_FILE_ATTRIBUTES = 0o100644 << 16
+
+
+class BinaryReader(Protocol):
+    """What archives are read from, and what their entries are read with: the `read` of a binary file."""
+
+    def read(self, size: int = -1, /) -> bytes:
+        """Read up to `size` bytes, or all of them if `size` is negative. Empty only at the end."""
+
+
+class ArchiveError(Exception):
+    """The archive is malformed, or uses a feature that cannot be read as a stream."""
+
+
+@dataclass(frozen=True)
+class ArchiveEntry:
+    """A regular file in an archive. `reader` is only valid until the next entry is requested."""
+
+    name: str
+    size: Optional[int]
+    reader: BinaryReader
+
+
+class AsyncStreamReader(io.RawIOBase):
+    """
+    A blocking file object over an async iterator of chunks, e.g. `Request.stream()`.
+
+    Meant for sync parsers running in a worker thread: each read waits for the event loop to
+    produce the next chunk. It must never be read from the event loop's own thread.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        """Tell `io` that the stream can be read."""
+        return True
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        """Fill `buffer` with what is left of the current chunk, waiting for the next one if none is."""
+        while not self._buffer and not self._eof:
+            try:
+                self._buffer = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            except StopAsyncIteration:
+                self._eof = True
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    async def _next_chunk(self) -> bytes:
+        return await anext(self._chunks)
+
+
+def iter_tar_entries(stream: IO[bytes]) -> Iterator[ArchiveEntry]:
+    """
+    Iterate over the regular files of a tar archive, optionally gzip, bzip2 or xz compressed.
+
+    :param stream: The archive, read sequentially.
+
+    :raises ArchiveError: If the archive is malformed.
+    """
+    try:
+        with tarfile.open(fileobj=stream, mode="r|*") as archive:
+            for member in archive:
+                reader = archive.extractfile(member) if member.isfile() else None
+                if reader is not None:
+                    yield ArchiveEntry(name=member.name, size=member.size, reader=reader)
+    except tarfile.TarError as err:
+        raise ArchiveError(str(err)) from err
+
+
+def iter_zip_entries(stream: BinaryReader) -> Iterator[ArchiveEntry]:
+    """
+    Iterate over the regular files of a zip archive from its local file headers.
+
+    `zipfile` needs to seek to the central directory at the end of the archive, so this reads the
+    local file headers in order instead. Stored and deflated entries are supported, except stored
+    entries whose size is only given after their data, which cannot be delimited in a stream.
+
+    :param stream: The archive, read sequentially.
+
+    :raises ArchiveError: If the archive is malformed, encrypted or uses an unsupported feature.
+    """
+    source = _PushbackStream(stream)
+    while True:
+        signature = source.read(4)
+        if not signature or signature in ZIP_END_SIGNATURES:
+            return
+        if signature != ZIP_LOCAL_FILE_HEADER_SIGNATURE:
+            raise ArchiveError("Not a zip archive, or a corrupted one")
+
+        header = _read_zip_local_file_header(source, signature)
+        reader = _open_zip_entry(source, header)
+        if not header.name.endswith("/"):
+            yield ArchiveEntry(
+                name=header.name, size=None if header.has_data_descriptor else header.size, reader=reader
+            )
+        # skip whatever the consumer did not read
+        while reader.read(64 * 1024):
+            pass
+        if header.has_data_descriptor:
+            _skip_zip_data_descriptor(source, header.is_zip64)
+
+
+@dataclass(frozen=True)
+class _ZipLocalFileHeader:
+    """What the local file header of a zip entry says about it, with zip64 sizes applied."""
+
+    name: str
+    flags: int
+    method: int
+    compressed_size: int
+    size: int
+    is_zip64: bool
+
+    @property
+    def has_data_descriptor(self) -> bool:
+        """Whether the CRC and sizes of the entry follow its data, rather than being in the header."""
+        return bool(self.flags & ZIP_FLAG_DATA_DESCRIPTOR)
+
+
+def _read_zip_local_file_header(source: BinaryReader, signature: bytes) -> _ZipLocalFileHeader:
+    """Read the rest of a local file header, whose `signature` was already read, and its name and extra field."""
+    header = ZIP_LOCAL_FILE_HEADER.unpack(signature + _read_exactly(source, ZIP_LOCAL_FILE_HEADER.size - 4))
+    _, _, flags, method, _, _, _, compressed_size, size, name_length, extra_length = header
+    raw_name = _read_exactly(source, name_length)
+    name = raw_name.decode("utf-8" if flags & ZIP_FLAG_UTF8 else "cp437")
+    is_zip64 = False
+    for field_id, field_data in _iter_zip_extra_fields(_read_exactly(source, extra_length)):
+        if field_id == ZIP64_EXTRA_FIELD_ID:
+            # its presence also means the data descriptor, if any, has 8-byte sizes
+            is_zip64 = True
+            if ZIP64_SIZE_MARKER in (size, compressed_size) and len(field_data) >= 16:
+                size, compressed_size = struct.unpack("<QQ", field_data[:16])
+    return _ZipLocalFileHeader(name, flags, method, compressed_size, size, is_zip64)
+
+
+def _open_zip_entry(source: "_PushbackStream", header: _ZipLocalFileHeader) -> BinaryReader:
+    """Read the data of the entry a local file header starts, which ends where the reader returns b""."""
+    if header.flags & ZIP_FLAG_ENCRYPTED:
+        raise ArchiveError(f"Encrypted zip entries are not supported: {header.name}")
+    if header.method == ZIP_METHOD_DEFLATED:
+        return _InflatingReader(source, header.name, size=None if header.has_data_descriptor else header.size)
+    if header.method == ZIP_METHOD_STORED and not header.has_data_descriptor:
+        return _LimitedReader(source, header.compressed_size)
+    raise ArchiveError(f"Unsupported zip entry, compression method {header.method}: {header.name}")
+
+
+def _read_exactly(stream: BinaryReader, size: int) -> bytes:
+    """Read `size` bytes, raising if the stream ends first."""
+    data = stream.read(size)
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ArchiveError("Truncated archive")
+        data += chunk
+    return data
+
+
+def _iter_zip_extra_fields(extra: bytes) -> Iterator[tuple]:
+    """Split the extra field of a zip header into (id, data) pairs."""
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, field_length = struct.unpack("<HH", extra[offset : offset + 4])
+        yield field_id, extra[offset + 4 : offset + 4 + field_length]
+        offset += 4 + field_length
+
+
+def _skip_zip_data_descriptor(source: "_PushbackStream", is_zip64: bool) -> None:
+    """Skip the CRC and sizes that follow the data of an entry, with or without their optional signature."""
+    sizes_length = 16 if is_zip64 else 8
+    first = _read_exactly(source, 4)
+    if first == ZIP_DATA_DESCRIPTOR_SIGNATURE:
+        _read_exactly(source, 4 + sizes_length)
+    else:
+        # no signature: `first` was the CRC
+        _read_exactly(source, sizes_length)
+
+
+class _PushbackStream(io.RawIOBase):
+    """A stream that bytes read too far can be pushed back onto."""
+
+    def __init__(self, stream: BinaryReader):
+        super().__init__()
+        self._stream = stream
+        self._pushed_back = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:  # type: ignore[override]
+        if self._pushed_back:
+            data = self._pushed_back if size < 0 else self._pushed_back[:size]
+            self._pushed_back = self._pushed_back[len(data) :]
+            return data
+        return self._stream.read(size)
+
+    def push_back(self, data: bytes) -> None:
+        self._pushed_back = data + self._pushed_back
+
+
+class _LimitedReader(io.RawIOBase):
+    """Read the next `size` bytes of a stream."""
+
+    def __init__(self, source: _PushbackStream, size: int):
+        super().__init__()
+        self._source = source
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:  # type: ignore[override]
+        size = self._remaining if size < 0 else min(size, self._remaining)
+        if size == 0:
+            return b""
+        data = _read_exactly(self._source, size)
+        self._remaining -= len(data)
+        return data
+
+
+class _InflatingReader(io.RawIOBase):
+    """
+    Decompress a raw deflate stream, which marks its own end, and push back the bytes that follow it.
+
+    Each read inflates no more than it returns, and an entry inflating past its declared size is rejected, so
+    a small entry cannot expand into memory, e.g. a zip bomb buffered as a small file.
+    """
+
+    def __init__(self, source: _PushbackStream, name: str, size: Optional[int] = None, chunk_size: int = 64 * 1024):
+        super().__init__()
+        self._source = source
+        self._name = name
+        self._size = size
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._output = b""
+        self._inflated = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:  # type: ignore[override]
+        while (size < 0 or len(self._output) < size) and not self._decompressor.eof:
+            self._inflate(self._chunk_size if size < 0 else size - len(self._output))
+        data = self._output if size < 0 else self._output[:size]
+        self._output = self._output[len(data) :]
+        return data
+
+    def _inflate(self, max_length: int) -> None:
+        """Inflate up to `max_length` more bytes, reading the source only once the input so far is used up."""
+        compressed = self._decompressor.unconsumed_tail or self._source.read(self._chunk_size)
+        # with no input left, zlib may still hold output it had no room for
+        output = self._decompressor.decompress(compressed, max_length)
+        if not compressed and not output:
+            raise ArchiveError("Truncated archive")
+        self._inflated += len(output)
+        if self._size is not None and self._inflated > self._size:
+            raise ArchiveError(f"Zip entry larger than its declared size: {self._name}")
+        self._output += output
+        if self._decompressor.eof:
+            self._source.push_back(self._decompressor.unused_data)
+
+
+@dataclass
+class _ZipCentralDirectoryEntry:
+    """What the central directory records about an entry once it is written."""
+
+    name: bytes
+    dos_time: int
+    dos_date: int
+    crc: int
+    compressed_size: int
+    size: int
+    offset: int
+    is_zip64: bool
+
+
+class ZipStreamWriter:
+    """
+    Write a zip archive front to back, for streaming it as it is produced.
+
+    Entries are deflated and their CRC and sizes follow their data in a data descriptor, so nothing has to
+    be known, or buffered, before an entry's bytes go out. Zip64 records are added when sizes, offsets or
+    the number of entries outgrow the classic format. Each method returns the bytes to send next.
+    """
+
+    def __init__(self, compression_level: int = 1):
+        """
+        Start an empty archive.
+
+        :param compression_level: zlib compression level. 0 still writes deflate blocks, just uncompressed ones.
+        """
+        self._compression_level = compression_level
+        self._offset = 0
+        self._entries: List[_ZipCentralDirectoryEntry] = []
+        self._entry: Optional[_ZipCentralDirectoryEntry] = None
+        self._compressor: Optional["zlib._Compress"] = None
+
+    def start_entry(self, name: str, size: int, last_modified: datetime) -> bytes:
+        """Begin an entry of `size` bytes, which is only used to decide whether it needs zip64 sizes."""
+        encoded_name = name.encode()
+        # deflate can grow incompressible data slightly, so keep a margin like `zipfile` does
+        is_zip64 = size * 1.05 > ZIP64_SIZE_MARKER
+        dos_time, dos_date = _to_dos_time(last_modified)
+        self._entry = _ZipCentralDirectoryEntry(
+            name=encoded_name,
+            dos_time=dos_time,
+            dos_date=dos_date,
+            crc=0,
+            compressed_size=0,
+            size=0,
+            offset=self._offset,
+            is_zip64=is_zip64,
+        )
+        self._compressor = zlib.compressobj(self._compression_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        # sizes are zero here: with a data descriptor, they are written after the data
+        extra = struct.pack("<HHQQ", ZIP64_EXTRA_FIELD_ID, 16, 0, 0) if is_zip64 else b""
+        header = ZIP_LOCAL_FILE_HEADER.pack(
+            ZIP_LOCAL_FILE_HEADER_SIGNATURE,
+            ZIP64_VERSION if is_zip64 else ZIP_VERSION,
+            ZIP_FLAG_DATA_DESCRIPTOR | ZIP_FLAG_UTF8,
+            ZIP_METHOD_DEFLATED,
+            dos_time,
+            dos_date,
+            0,
+            0,
+            0,
+            len(encoded_name),
+            len(extra),
+        )
+        return self._emit(header + encoded_name + extra)
+
+    def write(self, data: bytes) -> bytes:
+        """Add bytes to the current entry, returning the compressed bytes ready so far."""
+        assert self._entry is not None and self._compressor is not None
+        self._entry.crc = zlib.crc32(data, self._entry.crc)
+        self._entry.size += len(data)
+        return self._emit_entry_data(self._compressor.compress(data))
+
+    def finish_entry(self) -> bytes:
+        """End the current entry with the rest of its compressed data and its data descriptor."""
+        assert self._entry is not None and self._compressor is not None
+        entry = self._entry
+        data = self._emit_entry_data(self._compressor.flush())
+        if not entry.is_zip64 and max(entry.size, entry.compressed_size) >= ZIP64_SIZE_MARKER:
+            raise ArchiveError(f"Entry grew past the size announced for it: {entry.name.decode()}")
+        sizes_format = "<QQ" if entry.is_zip64 else "<II"
+        descriptor = (
+            ZIP_DATA_DESCRIPTOR_SIGNATURE
+            + struct.pack("<I", entry.crc)
+            + struct.pack(sizes_format, entry.compressed_size, entry.size)
+        )
+        self._entries.append(entry)
+        self._entry = self._compressor = None
+        return data + self._emit(descriptor)
+
+    def finish(self) -> bytes:
+        """Write the central directory, which ends the archive."""
+        central_directory_offset = self._offset
+        central_directory = b"".join(self._central_directory_header(entry) for entry in self._entries)
+        central_directory_size = len(central_directory)
+        self._emit(central_directory)
+
+        trailer = b""
+        num_entries = len(self._entries)
+        if (
+            num_entries >= ZIP64_COUNT_MARKER
+            or central_directory_offset >= ZIP64_SIZE_MARKER
+            or central_directory_size >= ZIP64_SIZE_MARKER
+        ):
+            zip64_end_offset = self._offset
+            trailer += ZIP64_END_OF_CENTRAL_DIRECTORY.pack(
+                b"PK\x06\x06",
+                ZIP64_END_OF_CENTRAL_DIRECTORY.size - 12,
+                ZIP_MADE_BY_UNIX | ZIP64_VERSION,
+                ZIP64_VERSION,
+                0,
+                0,
+                num_entries,
+                num_entries,
+                central_directory_size,
+                central_directory_offset,
+            )
+            trailer += ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.pack(b"PK\x06\x07", 0, zip64_end_offset, 1)
+        trailer += ZIP_END_OF_CENTRAL_DIRECTORY.pack(
+            b"PK\x05\x06",
+            0,
+            0,
+            min(num_entries, ZIP64_COUNT_MARKER),
+            min(num_entries, ZIP64_COUNT_MARKER),
+            min(central_directory_size, ZIP64_SIZE_MARKER),
+            min(central_directory_offset, ZIP64_SIZE_MARKER),
+            0,
+        )
+        return central_directory + self._emit(trailer)
+
+    def _central_directory_header(self, entry: _ZipCentralDirectoryEntry) -> bytes:
+        """Describe a written entry in the central directory."""
+        is_zip64 = entry.is_zip64 or entry.offset >= ZIP64_SIZE_MARKER
+        extra = b""
+        compressed_size, size, offset = entry.compressed_size, entry.size, entry.offset
+        if is_zip64:
+            extra = struct.pack("<HHQQQ", ZIP64_EXTRA_FIELD_ID, 24, size, compressed_size, offset)
+            compressed_size = size = offset = ZIP64_SIZE_MARKER
+        header = ZIP_CENTRAL_DIRECTORY_HEADER.pack(
+            b"PK\x01\x02",
+            ZIP_MADE_BY_UNIX | (ZIP64_VERSION if is_zip64 else ZIP_VERSION),
+            ZIP64_VERSION if is_zip64 else ZIP_VERSION,
+            ZIP_FLAG_DATA_DESCRIPTOR | ZIP_FLAG_UTF8,
+            ZIP_METHOD_DEFLATED,
+            entry.dos_time,
+            entry.dos_date,
+            entry.crc,
+            compressed_size,
+            size,
+            len(entry.name),
+            len(extra),
+            0,
+            0,
+            0,
+            ZIP_FILE_ATTRIBUTES,
+            offset,
+        )
+        return header + entry.name + extra
+
+    def _emit_entry_data(self, data: bytes) -> bytes:
+        assert self._entry is not None
+        self._entry.compressed_size += len(data)
+        return self._emit(data)
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+
+class TarStreamWriter:
+    """
+    Write a POSIX (pax) tar archive front to back, for streaming it as it is produced.
+
+    Tar headers carry the size of their entry, so the size passed to `start_entry` must be exact.
+    Each method returns the bytes to send next.
+    """
+
+    def __init__(self) -> None:
+        self._size = 0
+        self._remaining = 0
+
+    def start_entry(self, name: str, size: int, last_modified: datetime) -> bytes:
+        """Begin an entry of exactly `size` bytes."""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(last_modified.timestamp())
+        info.mode = 0o644
+        self._size = self._remaining = size
+        return info.tobuf(format=tarfile.PAX_FORMAT)
+
+    def write(self, data: bytes) -> bytes:
+        """Add bytes to the current entry."""
+        self._remaining -= len(data)
+        if self._remaining < 0:
+            raise ArchiveError("Entry is larger than the size announced for it")
+        return data
+
+    def finish_entry(self) -> bytes:
+        """End the current entry, padding it to a whole block."""
+        if self._remaining:
+            raise ArchiveError("Entry is smaller than the size announced for it")
+        return b"\0" * (-self._size % tarfile.BLOCKSIZE)
+
+    def finish(self) -> bytes:
+        """Write the two empty blocks that end the archive."""
+        return b"\0" * (2 * tarfile.BLOCKSIZE)
+
+
+def make_archive_writer(
+    archive_format: ArchiveFormat, zip_compression_level: int = 1
+) -> Union[ZipStreamWriter, TarStreamWriter]:
+    """
+    Create a streaming writer for an archive format.
+
+    :param archive_format: "zip" or "tar".
+    :param zip_compression_level: zlib compression level of zip entries.
+    """
+    if archive_format == "zip":
+        return ZipStreamWriter(compression_level=zip_compression_level)
+    return TarStreamWriter()
+
+
+def _to_dos_time(timestamp: datetime) -> tuple:
+    """Convert a time to the (time, date) pair of zip headers, which cannot go before 1980."""
+    timestamp = max(timestamp.replace(tzinfo=None), datetime(1980, 1, 1))
+    dos_time = timestamp.hour << 11 | timestamp.minute << 5 | timestamp.second // 2
+    dos_date = (timestamp.year - 1980) << 9 | timestamp.month << 5 | timestamp.day
+    return dos_time, dos_date
@@ -1,7 +1,20 @@
+from typing import Optional
+
 from mangum import Mangum
 
 from files_api.main import create_app
+from files_api.settings import Settings
+
+
+def create_handler(settings: Optional[Settings] = None) -> Mangum:
+    """
+    Wrap the app in Mangum, which buffers every response body before returning it from the invocation.
+
+    Downloads are sized to fit: small files are returned inline, larger ones are streamed if the
+    deployment supports response streaming, and the rest are redirected to presigned S3 URLs.
+    """
+    settings = settings or Settings()
+    return Mangum(create_app(settings=settings.model_copy(update={"lambda_response_limits_enabled": True})))
 
-APP = create_app()
 
-handler = Mangum(APP)
\ No newline at end of file
+handler = create_handler()
@@ -0,0 +1,132 @@
+"""Delete many files at once with batched DeleteObjects calls, streaming per-key results back."""
+
+import asyncio
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Set,
+)
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from files_api.s3.delete_objects import delete_s3_objects
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import KeyIndex
+from files_api.s3.read_objects import iter_s3_object_key_pages
+from files_api.schemas import (
+    BulkDeleteBatchResult,
+    BulkDeleteError,
+    BulkDeleteRequest,
+    BulkDeleteSummary,
+)
+from files_api.settings import Settings
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def stream_bulk_delete(request: Request, body: BulkDeleteRequest) -> StreamingResponse:
+    """
+    Delete the requested files, streaming one JSON line per completed batch and a summary line last.
+
+    Keys under a directory are enumerated while earlier batches are being deleted, so the first results
+    arrive before the listing is complete, which doubles as progress reporting for large directories.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param body: The files to delete.
+
+    :return: A `application/x-ndjson` response of `BulkDeleteBatchResult` lines, then a `BulkDeleteSummary`.
+    """
+    return StreamingResponse(content=_iter_result_lines(request, body), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def _iter_result_lines(request: Request, body: BulkDeleteRequest) -> AsyncIterator[str]:
+    """Yield the NDJSON lines of a bulk delete response."""
+    settings: Settings = request.app.state.settings
+
+    deleted_count = error_count = 0
+    async for result in _iter_batch_results(request, _iter_key_batches(request, body)):
+        deleted_count += len(result.deleted)
+        error_count += len(result.errors)
+        yield result.model_dump_json() + "\n"
+
+    logger.info(
+        "bulk deleted {deleted_count} files in {bucket}, {error_count} errors",
+        deleted_count=deleted_count,
+        bucket=settings.s3_bucket_name,
+        error_count=error_count,
+    )
+    yield BulkDeleteSummary(deleted_count=deleted_count, error_count=error_count).model_dump_json() + "\n"
+
+
+async def _iter_key_batches(request: Request, body: BulkDeleteRequest) -> AsyncIterator[List[str]]:
+    """Yield the keys to delete in batches of at most `s3_bulk_delete_batch_size`."""
+    settings: Settings = request.app.state.settings
+    batch_size = settings.s3_bulk_delete_batch_size
+
+    if body.file_paths is not None:
+        for start in range(0, len(body.file_paths), batch_size):
+            yield body.file_paths[start : start + batch_size]
+        return
+
+    s3_executor: S3Executor = request.app.state.s3_executor
+    pages: Iterator[List[str]] = iter_s3_object_key_pages(
+        bucket_name=settings.s3_bucket_name,
+        prefix=body.directory or "",
+        page_size=batch_size,
+        s3_client=request.app.state.s3_client,
+    )
+    while True:
+        # each page is listed on the S3 thread pool, while earlier batches are being deleted
+        keys: Optional[List[str]] = await s3_executor.run(next, pages, None)
+        if keys is None:
+            return
+        yield keys
+
+
+async def _iter_batch_results(
+    request: Request, key_batches: AsyncIterator[List[str]]
+) -> AsyncIterator[BulkDeleteBatchResult]:
+    """Delete each batch with one DeleteObjects call, with up to `s3_bulk_delete_max_concurrency` in flight."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+
+    async def delete_batch(keys: List[str]) -> BulkDeleteBatchResult:
+        deleted_keys, errors = await s3_executor.run(
+            delete_s3_objects,
+            bucket_name=settings.s3_bucket_name,
+            object_keys=keys,
+            s3_client=request.app.state.s3_client,
+            metadata_cache=request.app.state.metadata_cache,
+        )
+        if key_index is not None:
+            await s3_executor.run(key_index.remove_many, deleted_keys)
+        return BulkDeleteBatchResult(
+            deleted=deleted_keys,
+            errors=[
+                BulkDeleteError(file_path=error["Key"], code=error["Code"], message=error["Message"])
+                for error in errors
+            ],
+        )
+
+    in_flight: Set[asyncio.Task] = set()
+    try:
+        async for keys in key_batches:
+            if len(in_flight) >= settings.s3_bulk_delete_max_concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            in_flight.add(asyncio.create_task(delete_batch(keys)))
+
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # the client went away or a batch failed: stop the batches that have not completed yet
+        for task in in_flight:
+            task.cancel()
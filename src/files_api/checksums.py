@@ -0,0 +1,70 @@
+"""Check file contents end to end: checksums sent to S3 with uploads, and SHA-256 digests checked on download."""
+
+import asyncio
+import base64
+import hashlib
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Mapping,
+    Optional,
+)
+
+from loguru import logger
+
+# user metadata of objects uploaded in one piece: the hex SHA-256 digest of their stored bytes
+SHA256_METADATA_KEY = "sha256"
+
+
+class ChecksumMismatchError(Exception):
+    """The bytes read from S3 do not have the digest they were uploaded with."""
+
+
+def sha256_checksum(digest: bytes) -> str:
+    """Encode a SHA-256 digest the way S3's `ChecksumSHA256` parameters expect it: in base64."""
+    return base64.b64encode(digest).decode()
+
+
+def crc32_checksum(crc: int) -> str:
+    """Encode a CRC32, e.g. from `zlib.crc32`, the way S3's `ChecksumCRC32` parameters expect it: in base64."""
+    return base64.b64encode(crc.to_bytes(4, "big")).decode()
+
+
+def get_content_sha256(obj: Mapping[str, Any]) -> Optional[str]:
+    """
+    Get the digest of an object's stored bytes.
+
+    :param obj: Response of `head_object` or `get_object` for the object.
+
+    :return: The hex SHA-256 digest, or None for objects uploaded in parts or from outside the API.
+    """
+    return obj.get("Metadata", {}).get(SHA256_METADATA_KEY)
+
+
+async def iter_verified(chunks: AsyncIterator[bytes], sha256: str, object_key: str) -> AsyncGenerator[bytes, None]:
+    """
+    Pass the chunks of a whole object through while hashing them, and check the digest once they all went by.
+
+    Each chunk is hashed in place, without copying it.
+
+    :param chunks: Chunks of the object's stored bytes, in order.
+    :param sha256: Hex SHA-256 digest the object was uploaded with.
+    :param object_key: Key of the object, for the error message.
+
+    :raises ChecksumMismatchError: After the last chunk, if the digests differ. The response being sent is then
+        cut short, so the client sees an incomplete body instead of silently keeping corrupted bytes.
+    """
+    digest = hashlib.sha256()
+    try:
+        async for chunk in chunks:
+            # hashlib releases the GIL on large buffers
+            await asyncio.to_thread(digest.update, chunk)
+            yield chunk
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    if digest.hexdigest() != sha256:
+        logger.error("checksum mismatch downloading {object_key}", object_key=object_key)
+        raise ChecksumMismatchError(f"{object_key} does not have the SHA-256 digest it was uploaded with")
@@ -0,0 +1,164 @@
+"""Command line tools for operating on the files bucket, outside the API."""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import (
+    Optional,
+    Sequence,
+)
+
+from loguru import logger
+
+from files_api.s3.blobs import collect_orphaned_blobs
+from files_api.s3.enumerate_objects import iter_s3_objects_sharded
+from files_api.s3.executor import S3Executor
+from files_api.s3.sharding import rebalance_shards
+from files_api.s3.storage_backend import (
+    create_shard_map,
+    create_storage_backend,
+    create_unsharded_storage_backend,
+)
+from files_api.schemas import FileMetadata
+from files_api.settings import Settings
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Run the `files-api` command.
+
+    :param argv: Command line arguments, without the program name. Defaults to `sys.argv[1:]`.
+
+    :return: Exit status.
+    """
+    parser = argparse.ArgumentParser(prog="files-api", description=__doc__)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    enumerate_parser = subcommands.add_parser(
+        "enumerate",
+        help="Print every file under a prefix as JSON lines, listing shards of the bucket concurrently.",
+    )
+    enumerate_parser.add_argument(
+        "--bucket", default=os.environ.get("S3_BUCKET_NAME"), help="Bucket to list. Defaults to $S3_BUCKET_NAME."
+    )
+    enumerate_parser.add_argument("--prefix", default="", help="Only list the files under this prefix.")
+    enumerate_parser.add_argument("--shards", type=int, default=16, help="Number of shards to split the keys into.")
+    enumerate_parser.add_argument("--concurrency", type=int, default=8, help="Maximum listing calls in flight.")
+    enumerate_parser.add_argument(
+        "--unordered", action="store_true", help="Print files as they are listed, instead of in key order."
+    )
+    enumerate_parser.add_argument("--keys-only", action="store_true", help="Print one file path per line.")
+    enumerate_parser.set_defaults(run=_enumerate)
+
+    gc_parser = subcommands.add_parser("gc", help="Delete the content-addressed blobs no file points to anymore.")
+    gc_parser.add_argument(
+        "--bucket", default=os.environ.get("S3_BUCKET_NAME"), help="Bucket of the files. Defaults to $S3_BUCKET_NAME."
+    )
+    gc_parser.add_argument(
+        "--blob-bucket",
+        default=os.environ.get("S3_BLOB_BUCKET_NAME"),
+        help="Bucket of the blobs. Defaults to $S3_BLOB_BUCKET_NAME.",
+    )
+    gc_parser.add_argument(
+        "--grace-seconds", type=int, default=None, help="Keep unreferenced blobs younger than this. Defaults to a day."
+    )
+    gc_parser.add_argument("--concurrency", type=int, default=8, help="Maximum metadata reads in flight.")
+    gc_parser.set_defaults(run=_collect_garbage)
+
+    rebalance_parser = subcommands.add_parser(
+        "rebalance",
+        help="Move every file to the shard of $S3_SHARDS it belongs on, e.g. after adding shards, printing each move.",
+    )
+    rebalance_parser.add_argument(
+        "--bucket", default=os.environ.get("S3_BUCKET_NAME"), help="Bucket of the files. Defaults to $S3_BUCKET_NAME."
+    )
+    rebalance_parser.add_argument("--concurrency", type=int, default=8, help="Maximum files moved at once.")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="Print the moves without making them.")
+    rebalance_parser.set_defaults(run=_rebalance)
+
+    args = parser.parse_args(argv)
+    if not args.bucket:
+        parser.error("--bucket is required unless $S3_BUCKET_NAME is set")
+    if args.command == "gc" and not args.blob_bucket:
+        parser.error("--blob-bucket is required unless $S3_BLOB_BUCKET_NAME is set")
+    if args.command == "rebalance" and not os.environ.get("S3_SHARDS"):
+        parser.error("rebalance needs the shards in $S3_SHARDS")
+    return asyncio.run(args.run(args))
+
+
+async def _enumerate(args: argparse.Namespace) -> int:
+    """Print the files under a prefix, one line each."""
+    settings = Settings(s3_bucket_name=args.bucket, s3_executor_max_workers=args.concurrency)
+    s3_executor = S3Executor(max_workers=settings.s3_executor_max_workers)
+    try:
+        async for page in iter_s3_objects_sharded(
+            s3_executor,
+            bucket_name=settings.s3_bucket_name,
+            prefix=args.prefix,
+            num_shards=args.shards,
+            max_concurrency=args.concurrency,
+            ordered=not args.unordered,
+            s3_client=create_storage_backend(settings),
+        ):
+            if args.keys_only:
+                lines = [obj["Key"] for obj in page]
+            else:
+                lines = [
+                    FileMetadata(
+                        file_path=obj["Key"], last_modified=obj["LastModified"], size_bytes=obj["Size"]
+                    ).model_dump_json()
+                    for obj in page
+                ]
+            sys.stdout.write("\n".join(lines) + "\n")
+    except BrokenPipeError:
+        # e.g. piped into `head`
+        logger.debug("stdout was closed, stopping")
+    finally:
+        s3_executor.shutdown()
+    return 0
+
+
+async def _collect_garbage(args: argparse.Namespace) -> int:
+    """Delete the orphaned blobs, printing each deleted key."""
+    settings = Settings(s3_bucket_name=args.bucket, s3_blob_bucket_name=args.blob_bucket)
+    grace_seconds = args.grace_seconds if args.grace_seconds is not None else settings.s3_blob_gc_grace_seconds
+    s3_executor = S3Executor(max_workers=args.concurrency)
+    try:
+        deleted = await collect_orphaned_blobs(
+            s3_executor,
+            bucket_name=settings.s3_bucket_name,
+            blob_bucket_name=args.blob_bucket,
+            gc_grace_seconds=grace_seconds,
+            max_concurrency=args.concurrency,
+            s3_client=create_storage_backend(settings),
+        )
+    finally:
+        s3_executor.shutdown()
+    if deleted:
+        sys.stdout.write("\n".join(deleted) + "\n")
+    return 0
+
+
+async def _rebalance(args: argparse.Namespace) -> int:
+    """Move the files on the wrong shard, printing each move as "key source -> destination"."""
+    settings = Settings(s3_bucket_name=args.bucket)
+    s3_executor = S3Executor(max_workers=args.concurrency)
+    try:
+        moves = await rebalance_shards(
+            s3_executor,
+            shard_map=create_shard_map(settings),
+            max_concurrency=args.concurrency,
+            part_size_bytes=settings.s3_copy_part_size_bytes,
+            dry_run=args.dry_run,
+            s3_client=create_unsharded_storage_backend(settings),
+        )
+    finally:
+        s3_executor.shutdown()
+    if moves:
+        sys.stdout.write("\n".join(f"{move.key} {move.source} -> {move.destination}" for move in moves) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Fetch object metadata and the start of object bodies once per burst of concurrent requests for the same key."""
+
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    Optional,
+)
+
+from fastapi import Request
+
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.read_objects import (
+    fetch_s3_object_metadata,
+    fetch_s3_object_start,
+)
+from files_api.s3.single_flight import SingleFlight
+
+try:
+    from mypy_boto3_s3.type_defs import HeadObjectOutputTypeDef
+except ImportError:
+    ...
+
+
+@dataclass(frozen=True)
+class FetchedObjectStart:
+    """The first bytes of an object, with the `get_object` response they came in, minus its `Body`."""
+
+    obj: Dict[str, Any]
+    content: bytes
+
+
+async def fetch_file_metadata(
+    request: Request, bucket_name: str, object_key: str
+) -> Optional["HeadObjectOutputTypeDef"]:
+    """
+    Fetch the metadata of an object from the metadata cache, or with a `head_object` call.
+
+    With request coalescing enabled, concurrent lookups of a key missing from the cache share one call.
+
+    :param request: The incoming request, used to reach the app's S3 client, executor and caches.
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object.
+
+    :return: Metadata of the object, or None if the object does not exist.
+    """
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    single_flight: Optional[SingleFlight] = request.app.state.metadata_single_flight
+    if single_flight is None:
+        return await s3_executor.run(
+            fetch_s3_object_metadata,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            s3_client=request.app.state.s3_client,
+            metadata_cache=metadata_cache,
+        )
+
+    cached = metadata_cache.get(bucket_name, object_key)
+    if cached is not None:
+        return cached.metadata
+    generation = metadata_cache.generation
+
+    async def fetch() -> Optional["HeadObjectOutputTypeDef"]:
+        obj = await s3_executor.run(
+            fetch_s3_object_metadata,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            s3_client=request.app.state.s3_client,
+        )
+        metadata_cache.put(bucket_name, object_key, obj, generation=generation)
+        return obj
+
+    return await single_flight.run(("head", bucket_name, object_key, generation), fetch)
+
+
+async def fetch_object_start(
+    request: Request, bucket_name: str, object_key: str, max_bytes: int
+) -> FetchedObjectStart:
+    """
+    Download at most the first `max_bytes` bytes of an object into memory, once for all concurrent requests.
+
+    Requires request coalescing to be enabled. The result is shared, so callers must not modify it.
+
+    :param request: The incoming request, used to reach the app's S3 client, executor and caches.
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object.
+    :param max_bytes: Maximum number of bytes to download. Objects up to this size arrive whole.
+
+    :return: The response of the ranged `get_object` call and the bytes it returned.
+
+    :raises botocore.exceptions.ClientError: With code "NoSuchKey" if the object does not exist.
+    """
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    single_flight: SingleFlight = request.app.state.download_single_flight
+
+    def fetch() -> FetchedObjectStart:
+        obj: Dict[str, Any] = dict(
+            fetch_s3_object_start(
+                bucket_name=bucket_name, object_key=object_key, max_bytes=max_bytes, s3_client=s3_client
+            )
+        )
+        body = obj.pop("Body")
+        try:
+            return FetchedObjectStart(obj=obj, content=body.read())
+        finally:
+            body.close()
+
+    # writes bump the generation, so a download started before one is never shared with requests made after it
+    key = ("get", bucket_name, object_key, metadata_cache.generation)
+    return await single_flight.run(key, lambda: s3_executor.run(fetch))
@@ -0,0 +1,110 @@
+"""Compress files at rest, and decompress them for clients that do not accept their stored encoding."""
+
+import asyncio
+import gzip
+import zlib
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Literal,
+    Mapping,
+    Optional,
+)
+
+from files_api.settings import Settings
+
+try:
+    # installed with the "compression" extra
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ContentEncoding = Literal["gzip", "zstd"]
+# user metadata of compressed objects, since S3 only knows their stored size
+UNCOMPRESSED_SIZE_METADATA_KEY = "uncompressed-size"
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def compress(data: bytes, encoding: ContentEncoding, level: Optional[int] = None) -> bytes:
+    """
+    Compress bytes with a content coding.
+
+    :param data: The bytes to compress.
+    :param encoding: "gzip" or "zstd".
+    :param level: Compression level. Defaults to gzip's 6 or zstd's 3.
+
+    :return: The compressed bytes, decodable by HTTP clients that accept the coding.
+    """
+    level = level if level is not None else DEFAULT_COMPRESSION_LEVELS[encoding]
+    if encoding == "gzip":
+        # a fixed mtime keeps the output, and so the ETag, the same for the same content
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return _zstandard().ZstdCompressor(level=level).compress(data)
+
+
+def make_decompressor(encoding: str) -> Any:
+    """
+    Create an incremental decompressor for a content coding.
+
+    :return: An object with `decompress(chunk) -> bytes` and `flush() -> bytes` methods.
+
+    :raises ValueError: If the coding is not supported.
+    """
+    if encoding == "gzip":
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        return _zstandard().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+async def iter_decompressed(chunks: AsyncIterator[bytes], encoding: str) -> AsyncGenerator[bytes, None]:
+    """Decompress a stream of compressed chunks as it is read, off the event loop."""
+    decompressor = make_decompressor(encoding)
+    try:
+        async for chunk in chunks:
+            data = await asyncio.to_thread(decompressor.decompress, chunk)
+            if data:
+                yield data
+        data = decompressor.flush()
+        if data:
+            yield data
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def content_encoding_for_upload(settings: Settings, content_type: Optional[str]) -> Optional[ContentEncoding]:
+    """
+    Pick the encoding to store an upload with.
+
+    :return: `s3_compression_encoding` if the content type is compressible, else None.
+    """
+    if settings.s3_compression_encoding is None or not content_type:
+        return None
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if any(media_type.startswith(prefix) for prefix in settings.s3_compressible_content_types):
+        return settings.s3_compression_encoding
+    return None
+
+
+def get_uncompressed_size(obj: Mapping[str, Any]) -> Optional[int]:
+    """
+    Get the size of an object once decompressed.
+
+    :param obj: Response of `head_object` or `get_object` for the object.
+
+    :return: The size, which is the stored size for objects stored uncompressed, or None if it is unknown.
+    """
+    if not obj.get("ContentEncoding"):
+        return obj["ContentLength"]
+    value = obj.get("Metadata", {}).get(UNCOMPRESSED_SIZE_METADATA_KEY)
+    return int(value) if value and value.isdigit() else None
+
+
+def _zstandard() -> Any:
+    """Return the zstandard module, or explain how to install it."""
+    if zstandard is None:
+        raise RuntimeError("zstd needs the zstandard package: pip install cloud-course-project[compression]")
+    return zstandard
@@ -0,0 +1,213 @@
+"""Upload files as pointers to deduplicated, content-addressed blobs, and find the blob a file's content is in."""
+
+import asyncio
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Optional,
+)
+
+from fastapi import Request
+from loguru import logger
+
+from files_api.coalescing import fetch_file_metadata
+from files_api.compression import (
+    content_encoding_for_upload,
+    get_uncompressed_size,
+)
+from files_api.s3.blobs import (
+    blob_key_for_digest,
+    claim_blob,
+    get_pointer_digest,
+    write_pointer,
+)
+from files_api.s3.executor import S3Executor
+from files_api.s3.write_objects import (
+    upload_s3_object,
+    upload_s3_object_from_stream,
+)
+from files_api.settings import Settings
+
+
+@dataclass(frozen=True)
+class FileLocation:
+    """Where the content of a file is stored, and the MIME type it is served with."""
+
+    bucket_name: str
+    object_key: str
+    # the pointer's own type for files stored as pointers, since files sharing a blob may differ in type;
+    # None to serve the stored object's
+    content_type: Optional[str] = None
+
+
+async def upload_file_as_blob(
+    request: Request,
+    file_path: str,
+    read: Callable[[int], Awaitable[bytes]],
+    content_type: Optional[str] = None,
+) -> None:
+    """
+    Upload a file's content to the blob bucket, unless a blob already holds it, and point the file at it.
+
+    The content is hashed as it is read. Files up to `s3_multipart_threshold_bytes` are hashed in memory, larger
+    ones while they are spooled to a local temporary file. Either way the digest is known before anything is
+    sent, so a known content is never uploaded again, and a new one is uploaded straight to its blob key.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param file_path: Path of the file.
+    :param read: Async function returning up to `n` bytes of the file, or b"" at the end.
+    :param content_type: The MIME type of the file.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    head = bytearray()
+    while len(head) <= settings.s3_multipart_threshold_bytes:
+        chunk = await read(settings.s3_multipart_threshold_bytes + 1 - len(head))
+        if not chunk:
+            await store_content_as_blob(request, file_path, bytes(head), content_type)
+            return
+        head += chunk
+
+    with tempfile.TemporaryFile() as spool:
+        sha256 = hashlib.sha256()
+        size = 0
+        chunk = bytes(head)
+        while chunk:
+            # hashlib releases the GIL on large buffers, and writes would block the event loop
+            await asyncio.gather(asyncio.to_thread(sha256.update, chunk), asyncio.to_thread(spool.write, chunk))
+            size += len(chunk)
+            chunk = await read(settings.s3_multipart_part_size_bytes)
+        digest = sha256.hexdigest()
+        if await link_file_to_blob(request, file_path, digest, content_type) is not None:
+            return
+
+        async def read_spool(max_size: int) -> bytes:
+            return await asyncio.to_thread(spool.read, max_size)
+
+        spool.seek(0)
+        await upload_s3_object_from_stream(
+            s3_executor,
+            read=read_spool,
+            bucket_name=settings.s3_blob_bucket_name,
+            object_key=blob_key_for_digest(digest),
+            content_type=content_type,
+            multipart_threshold_bytes=settings.s3_multipart_threshold_bytes,
+            part_size_bytes=settings.s3_multipart_part_size_bytes,
+            max_concurrency=settings.s3_multipart_max_concurrency,
+            s3_client=s3_client,
+        )
+    await s3_executor.run(
+        write_pointer,
+        settings.s3_bucket_name,
+        file_path,
+        sha256=digest,
+        size=size,
+        content_type=content_type,
+        s3_client=s3_client,
+        metadata_cache=request.app.state.metadata_cache,
+    )
+
+
+async def store_content_as_blob(
+    request: Request, file_path: str, content: bytes, content_type: Optional[str] = None
+) -> None:
+    """
+    Store content held in memory as a blob, unless a blob already holds it, and point the file at it.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param file_path: Path of the file.
+    :param content: The content of the file.
+    :param content_type: The MIME type of the file.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    digest = (await asyncio.to_thread(hashlib.sha256, content)).hexdigest()
+    if await link_file_to_blob(request, file_path, digest, content_type) is not None:
+        return
+    await s3_executor.run(
+        upload_s3_object,
+        bucket_name=settings.s3_blob_bucket_name,
+        object_key=blob_key_for_digest(digest),
+        file_content=content,
+        content_type=content_type,
+        s3_client=s3_client,
+        content_encoding=content_encoding_for_upload(settings, content_type),
+        compression_level=settings.s3_compression_level,
+    )
+    await s3_executor.run(
+        write_pointer,
+        settings.s3_bucket_name,
+        file_path,
+        sha256=digest,
+        size=len(content),
+        content_type=content_type,
+        s3_client=s3_client,
+        metadata_cache=request.app.state.metadata_cache,
+    )
+
+
+async def link_file_to_blob(
+    request: Request, file_path: str, sha256: str, content_type: Optional[str] = None
+) -> Optional[int]:
+    """
+    Point a file at the blob of a content the client only gave the digest of, if that blob exists.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param file_path: Path of the file.
+    :param sha256: Hex SHA-256 digest of the content.
+    :param content_type: The MIME type of the file.
+
+    :return: The size of the content if the file now points to it, or None if no blob holds it.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    blob = await s3_executor.run(
+        claim_blob, settings.s3_blob_bucket_name, sha256, settings.s3_blob_gc_grace_seconds, s3_client=s3_client
+    )
+    if blob is None:
+        return None
+    logger.debug("{file_path} has the content of blob {sha256}", file_path=file_path, sha256=sha256)
+    size = get_uncompressed_size(blob)
+    size = blob["ContentLength"] if size is None else size
+    await s3_executor.run(
+        write_pointer,
+        settings.s3_bucket_name,
+        file_path,
+        sha256=sha256,
+        size=size,
+        content_type=content_type,
+        s3_client=s3_client,
+        metadata_cache=request.app.state.metadata_cache,
+    )
+    return size
+
+
+async def resolve_file_location(request: Request, file_path: str) -> Optional[FileLocation]:
+    """
+    Find the bucket and key holding a file's content: its blob if the file is a pointer, else the file itself.
+
+    Without a blob bucket configured, this is the file's own location and costs no S3 call. With one, it costs
+    at most a `head_object` of the file, none for recently seen files.
+
+    :return: The location, or None if the file does not exist.
+    """
+    settings: Settings = request.app.state.settings
+    if settings.s3_blob_bucket_name is None:
+        return FileLocation(settings.s3_bucket_name, file_path)
+
+    obj = await fetch_file_metadata(request, settings.s3_bucket_name, file_path)
+    if obj is None:
+        return None
+    digest = get_pointer_digest(obj)
+    if digest is None:
+        return FileLocation(settings.s3_bucket_name, file_path)
+    return FileLocation(settings.s3_blob_bucket_name, blob_key_for_digest(digest), content_type=obj["ContentType"])
@@ -0,0 +1,199 @@
+"""Copy and move files within the bucket with server-side copies, streaming per-page results back."""
+
+import asyncio
+from typing import (
+    Any,
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import botocore.exceptions as boto_exceptions
+from fastapi import (
+    HTTPException,
+    Request,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from files_api.bulk_delete import NDJSON_MEDIA_TYPE
+from files_api.s3.copy_objects import (
+    copy_s3_object,
+    copy_s3_object_in_parts,
+)
+from files_api.s3.delete_objects import delete_s3_objects
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import KeyIndex
+from files_api.s3.read_objects import (
+    fetch_s3_object_metadata,
+    iter_s3_object_pages,
+)
+from files_api.schemas import (
+    CopiedFile,
+    CopyBatchResult,
+    CopyError,
+    CopyFilesRequest,
+    CopySummary,
+)
+from files_api.settings import Settings
+
+
+async def stream_copy(request: Request, body: CopyFilesRequest, move: bool = False) -> StreamingResponse:
+    """
+    Copy, or move, one file or every file under a prefix, streaming one JSON line per listing page.
+
+    S3 copies the bytes itself: objects up to `s3_copy_multipart_threshold_bytes` with one CopyObject call,
+    larger ones with concurrent UploadPartCopy calls. Up to `s3_copy_max_concurrency` files of a page are
+    copied at once. A move then deletes the originals of the page that were copied, with one DeleteObjects call.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param body: What to copy, and where to.
+    :param move: Delete the originals once they are copied.
+
+    :return: A `application/x-ndjson` response of `CopyBatchResult` lines, then a `CopySummary`.
+
+    :raises HTTPException: 404 if there is nothing to copy.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    pages: Iterator[List[Any]]
+    if body.recursive:
+        pages = iter_s3_object_pages(bucket_name=settings.s3_bucket_name, prefix=body.source, s3_client=s3_client)
+    else:
+        # the metadata cache is bypassed: a stale size could pick the wrong kind of copy
+        obj = await s3_executor.run(
+            fetch_s3_object_metadata, bucket_name=settings.s3_bucket_name, object_key=body.source, s3_client=s3_client
+        )
+        obj_page = [{"Key": body.source, "Size": obj["ContentLength"], "ETag": obj["ETag"]}] if obj else []
+        pages = iter([obj_page] if obj_page else [])
+
+    # read the first page before answering, so a missing source is a 404
+    first_page: Optional[List[Any]] = await s3_executor.run(next, pages, None)
+    if first_page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {body.source}")
+
+    return StreamingResponse(
+        content=_iter_result_lines(request, body, first_page, pages, move), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+async def _iter_result_lines(
+    request: Request, body: CopyFilesRequest, first_page: List[Any], pages: Iterator[List[Any]], move: bool
+) -> AsyncIterator[str]:
+    """Yield the NDJSON lines of a copy or move response, listing the next page while copying the current one."""
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    copied_count = deleted_count = error_count = 0
+    page: Optional[List[Any]] = first_page
+    next_page: Optional[asyncio.Future] = None
+    try:
+        while page is not None:
+            next_page = asyncio.ensure_future(s3_executor.run(next, pages, None))
+            result = await _copy_page(request, body, page, move)
+            copied_count += len(result.copied)
+            deleted_count += len(result.deleted)
+            error_count += len(result.errors)
+            yield result.model_dump_json() + "\n"
+            page = await next_page
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+    logger.info(
+        "{operation} {copied_count} files from {source} to {destination}, {error_count} errors",
+        operation="moved" if move else "copied",
+        copied_count=copied_count,
+        source=body.source,
+        destination=body.destination,
+        error_count=error_count,
+    )
+    yield CopySummary(
+        copied_count=copied_count, deleted_count=deleted_count, error_count=error_count
+    ).model_dump_json() + "\n"
+
+
+async def _copy_page(request: Request, body: CopyFilesRequest, page: List[Any], move: bool) -> CopyBatchResult:
+    """Copy the objects of a listing page concurrently, then for a move, delete the originals that were copied."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+    slots = asyncio.Semaphore(settings.s3_copy_max_concurrency)
+
+    async def copy(obj: Any) -> Tuple[CopiedFile, Optional[CopyError]]:
+        copied_file = CopiedFile(source=obj["Key"], destination=body.destination + obj["Key"][len(body.source) :])
+        async with slots:
+            try:
+                await _copy_object(request, obj, copied_file.destination)
+            except boto_exceptions.ClientError as err:
+                logger.warning("failed to copy {key}: {error}", key=obj["Key"], error=err)
+                error = err.response["Error"]
+                return copied_file, CopyError(file_path=obj["Key"], code=error["Code"], message=error["Message"])
+        return copied_file, None
+
+    outcomes = await asyncio.gather(*(copy(obj) for obj in page))
+    copied = [copied_file for copied_file, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+
+    deleted: List[str] = []
+    if move and copied:
+        deleted, delete_errors = await s3_executor.run(
+            delete_s3_objects,
+            bucket_name=settings.s3_bucket_name,
+            object_keys=[copied_file.source for copied_file in copied],
+            s3_client=request.app.state.s3_client,
+            metadata_cache=request.app.state.metadata_cache,
+        )
+        if key_index is not None:
+            await s3_executor.run(key_index.remove_many, deleted)
+        errors += [
+            CopyError(file_path=error["Key"], code=error["Code"], message=error["Message"]) for error in delete_errors
+        ]
+    return CopyBatchResult(copied=copied, deleted=deleted, errors=errors)
+
+
+async def _copy_object(request: Request, obj: Any, destination_key: str) -> None:
+    """Copy one listed object, pinned to its listed ETag, and record the copy in the key index."""
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache = request.app.state.metadata_cache
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+
+    if obj["Size"] <= settings.s3_copy_multipart_threshold_bytes:
+        last_modified = await s3_executor.run(
+            copy_s3_object,
+            bucket_name=settings.s3_bucket_name,
+            source_key=obj["Key"],
+            destination_key=destination_key,
+            if_match=obj["ETag"],
+            s3_client=s3_client,
+            metadata_cache=metadata_cache,
+        )
+        if key_index is not None:
+            await s3_executor.run(key_index.upsert, destination_key, size=obj["Size"], last_modified=last_modified)
+        return
+
+    # multipart uploads start without metadata, so the content type is read from the source
+    source_metadata = await s3_executor.run(
+        fetch_s3_object_metadata, bucket_name=settings.s3_bucket_name, object_key=obj["Key"], s3_client=s3_client
+    )
+    await copy_s3_object_in_parts(
+        s3_executor,
+        bucket_name=settings.s3_bucket_name,
+        source_key=obj["Key"],
+        destination_key=destination_key,
+        size=obj["Size"],
+        etag=obj["ETag"],
+        content_type=source_metadata["ContentType"] if source_metadata else None,
+        part_size_bytes=settings.s3_copy_part_size_bytes,
+        max_concurrency=settings.s3_copy_max_concurrency,
+        s3_client=s3_client,
+        metadata_cache=metadata_cache,
+    )
+    if key_index is not None:
+        await s3_executor.run(key_index.refresh_key, destination_key, s3_client=s3_client)
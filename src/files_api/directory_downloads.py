@@ -0,0 +1,229 @@
+"""Stream every file under a directory as a zip or tar archive built on the fly."""
+
+import asyncio
+from collections import deque
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Deque,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import botocore.exceptions as boto_exceptions
+from fastapi import (
+    HTTPException,
+    Request,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from files_api.archives import (
+    ARCHIVE_MEDIA_TYPES,
+    ArchiveFormat,
+    TarStreamWriter,
+    ZipStreamWriter,
+    make_archive_writer,
+)
+from files_api.compression import (
+    get_uncompressed_size,
+    make_decompressor,
+)
+from files_api.s3.blobs import (
+    blob_key_for_digest,
+    get_pointer_digest,
+)
+from files_api.s3.executor import S3Executor
+from files_api.s3.read_objects import (
+    fetch_s3_object,
+    is_not_found_error,
+    iter_s3_object_key_pages,
+)
+from files_api.settings import Settings
+
+# an object whose GET has started: its key, the `get_object` response and the first chunk of its body
+_OpenedMember = Tuple[str, Any, bytes]
+
+
+async def stream_directory_archive(
+    request: Request, directory: str, archive_format: ArchiveFormat = "zip"
+) -> StreamingResponse:
+    """
+    Stream the files whose path starts with `directory` as one archive.
+
+    The next listing page is fetched while the current one is archived, and up to `s3_archive_prefetch_window`
+    files ahead of the one being sent have their GET started and their first chunk read, so small files cost
+    no round trip of their own. Only those first chunks are buffered, never a whole file or the archive.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client and executor.
+    :param directory: Prefix of the files to archive. Paths in the archive are relative to its last "/".
+    :param archive_format: "zip" or "tar".
+
+    :return: A streaming response of the archive.
+
+    :raises HTTPException: 404 if no file starts with `directory`.
+    """
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    pages = iter_s3_object_key_pages(
+        bucket_name=settings.s3_bucket_name,
+        prefix=directory,
+        s3_client=request.app.state.s3_client,
+    )
+    # list the first page before answering, so an empty directory is a 404 rather than an empty archive
+    first_page: Optional[List[str]] = await s3_executor.run(next, pages, None)
+    if first_page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No files in directory: {directory}")
+
+    archive_name = directory.rstrip("/").rsplit("/", 1)[-1] or "files"
+    return StreamingResponse(
+        content=_iter_archive(request, directory, first_page, pages, archive_format),
+        media_type=ARCHIVE_MEDIA_TYPES[archive_format],
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}.{archive_format}"'},
+    )
+
+
+async def _iter_archive(
+    request: Request,
+    directory: str,
+    first_page: List[str],
+    pages: Iterator[List[str]],
+    archive_format: ArchiveFormat,
+) -> AsyncIterator[bytes]:
+    """Yield the bytes of the archive, fetching files ahead within the prefetch window."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    writer = make_archive_writer(archive_format, zip_compression_level=settings.s3_archive_zip_compression_level)
+    # members are named relative to the directory's last "/": "docs/" and "docs/re" both archive "docs/readme.md"
+    # as "readme.md"
+    base = directory[: directory.rfind("/") + 1]
+
+    keys = _iter_keys(s3_executor, first_page, pages)
+    window: Deque[asyncio.Future] = deque()
+
+    async def fill_window() -> None:
+        while len(window) < settings.s3_archive_prefetch_window:
+            key = await anext(keys, None)
+            if key is None:
+                return
+            if not key.endswith("/"):
+                # keys ending in "/" are folder placeholders, not files
+                window.append(asyncio.ensure_future(_open_member(request, key)))
+
+    num_members = 0
+    try:
+        await fill_window()
+        while window:
+            member = await window.popleft()
+            await fill_window()
+            if member is None:
+                continue
+            async for data in _iter_member(request, writer, member, name=member[0][len(base) :]):
+                yield data
+            num_members += 1
+        yield writer.finish()
+    finally:
+        # the client went away or a GET failed: release the connections of the files fetched ahead
+        for pending in window:
+            pending.cancel()
+            if pending.done() and not pending.cancelled() and pending.exception() is None and pending.result():
+                pending.result()[1]["Body"].close()
+        await keys.aclose()
+    logger.info("archived {num_members} files under {directory}", num_members=num_members, directory=directory)
+
+
+async def _iter_keys(
+    s3_executor: S3Executor, first_page: List[str], pages: Iterator[List[str]]
+) -> AsyncGenerator[str, None]:
+    """Yield the listed keys, fetching the next listing page while the current one is consumed."""
+    page: Optional[List[str]] = first_page
+    next_page: Optional[asyncio.Future] = None
+    try:
+        while page is not None:
+            next_page = asyncio.ensure_future(s3_executor.run(next, pages, None))
+            for key in page:
+                yield key
+            page = await next_page
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+
+async def _open_member(request: Request, key: str) -> Optional[_OpenedMember]:
+    """Start the GET of a file and read its first chunk, or return None if it was deleted since it was listed."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    try:
+        obj_response = await s3_executor.run(
+            fetch_s3_object,
+            bucket_name=settings.s3_bucket_name,
+            object_key=key,
+            s3_client=request.app.state.s3_client,
+        )
+        digest = get_pointer_digest(obj_response) if settings.s3_blob_bucket_name is not None else None
+        if digest is not None:
+            # the file is a pointer: archive the content of its blob instead
+            obj_response["Body"].close()
+            obj_response = await s3_executor.run(
+                fetch_s3_object,
+                bucket_name=settings.s3_blob_bucket_name,
+                object_key=blob_key_for_digest(digest),
+                s3_client=request.app.state.s3_client,
+            )
+    except boto_exceptions.ClientError as err:
+        if is_not_found_error(err):
+            logger.debug("skipping a file deleted since it was listed: {key}", key=key)
+            return None
+        raise
+    if get_uncompressed_size(obj_response) is None:
+        # archive entries need their size up front, which a compressed file without the recorded size lacks
+        logger.warning("skipping a compressed file of unknown size: {key}", key=key)
+        obj_response["Body"].close()
+        return None
+    try:
+        first_chunk = await s3_executor.run(obj_response["Body"].read, settings.s3_stream_chunk_size_bytes)
+    except BaseException:
+        obj_response["Body"].close()
+        raise
+    return key, obj_response, first_chunk
+
+
+async def _iter_member(
+    request: Request, writer: Union[ZipStreamWriter, TarStreamWriter], member: _OpenedMember, name: str
+) -> AsyncIterator[bytes]:
+    """Yield the archived bytes of one file, reading the rest of its body as it is sent and decompressing it."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    _, obj_response, first_chunk = member
+
+    size = get_uncompressed_size(obj_response)
+    yield writer.start_entry(name, size=size, last_modified=obj_response["LastModified"])
+    content_encoding = obj_response.get("ContentEncoding")
+    decompressor = make_decompressor(content_encoding) if content_encoding else None
+    chunks = s3_executor.iter_chunks(obj_response["Body"], chunk_size=settings.s3_stream_chunk_size_bytes)
+    try:
+        chunk = first_chunk
+        while chunk:
+            # deflate releases the GIL, so compressing off the event loop keeps other requests responsive
+            data = await asyncio.to_thread(_write_member_chunk, writer, decompressor, chunk)
+            if data:
+                yield data
+            chunk = await anext(chunks, b"")
+    finally:
+        await chunks.aclose()
+        obj_response["Body"].close()
+    yield writer.finish_entry()
+
+
+def _write_member_chunk(
+    writer: Union[ZipStreamWriter, TarStreamWriter], decompressor: Optional[Any], chunk: bytes
+) -> bytes:
+    """Archive a chunk of a file's stored body, decompressing it first if the file is stored compressed."""
+    # without a length limit, decompressors return all the output of each chunk at once
+    return writer.write(decompressor.decompress(chunk) if decompressor is not None else chunk)
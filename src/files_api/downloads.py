@@ -0,0 +1,625 @@
+"""Build the responses that stream files from S3 to clients."""
+
+import asyncio
+import secrets
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+)
+
+import botocore.exceptions as boto_exceptions
+from fastapi import (
+    HTTPException,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import (
+    FileResponse,
+    StreamingResponse,
+)
+from loguru import logger
+from starlette.background import BackgroundTask
+
+from files_api.checksums import (
+    get_content_sha256,
+    iter_verified,
+)
+from files_api.coalescing import (
+    FetchedObjectStart,
+    fetch_file_metadata,
+    fetch_object_start,
+)
+from files_api.compression import (
+    get_uncompressed_size,
+    iter_decompressed,
+)
+from files_api.content_addressing import resolve_file_location
+from files_api.http_headers import (
+    RangeNotSatisfiableError,
+    RangeSpec,
+    accepts_content_encoding,
+    format_http_date,
+    format_multipart_byteranges_end,
+    format_multipart_byteranges_part_header,
+    format_range_spec,
+    format_repr_digest,
+    is_not_modified,
+    parse_entity_tags,
+    parse_http_date,
+    parse_range_header,
+    resolve_byte_ranges,
+)
+from files_api.lambda_responses import exceeds_lambda_response_limit
+from files_api.presigned import (
+    download_redirect_response,
+    should_redirect_download,
+)
+from files_api.s3.disk_cache import ObjectDiskCache
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.read_objects import (
+    fetch_s3_object,
+    fetch_s3_object_metadata,
+    fetch_s3_object_start,
+    get_object_size,
+    is_not_found_error,
+    is_not_modified_error,
+    iter_s3_object_parts,
+)
+from files_api.settings import Settings
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+
+@dataclass(frozen=True)
+class Preconditions:
+    """The `If-None-Match` and `If-Modified-Since` headers of a GET request."""
+
+    if_none_match: Optional[str] = None
+    if_modified_since: Optional[str] = None
+
+    def is_not_modified(self, obj: Mapping[str, Any]) -> bool:
+        """Check the preconditions against the `head_object` or `get_object` response of a file."""
+        return is_not_modified(
+            etag=obj["ETag"],
+            last_modified=obj["LastModified"],
+            if_none_match=self.if_none_match,
+            if_modified_since=self.if_modified_since,
+        )
+
+    def to_s3_conditions(self) -> Dict[str, Any]:
+        """Translate the preconditions into `fetch_s3_object` arguments, so S3 answers 304 without sending a body."""
+        if self.if_none_match:
+            entity_tags = parse_entity_tags(self.if_none_match)
+            # S3 compares a single ETag; lists and "*" are checked here once the object's metadata arrives
+            if len(entity_tags) == 1 and entity_tags[0] != "*":
+                return {"if_none_match": entity_tags[0]}
+            return {}
+        modified_since = parse_http_date(self.if_modified_since)
+        return {"if_modified_since": modified_since} if modified_since else {}
+
+
+async def stream_file(  # pylint: disable=too-many-arguments
+    request: Request,
+    file_path: str,
+    range_header: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None,
+    accept_encoding: Optional[str] = None,
+) -> Response:
+    """
+    Stream a file, or the byte ranges of it requested by a `Range` header.
+
+    Files stored compressed are sent as stored, with a `Content-Encoding` header, to clients whose
+    `Accept-Encoding` allows it, and decompressed on the fly for the others. Decompressed files are always
+    sent whole, since ranges of them cannot be fetched from S3. Files stored as pointers are served from
+    their blob. Small whole files are served from the local disk cache, if enabled, once their ETag is checked.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client and executor.
+    :param file_path: Path of the file in the bucket.
+    :param range_header: Value of the request's `Range` header, if any. Invalid headers are ignored.
+    :param if_none_match: Value of the request's `If-None-Match` header, if any.
+    :param if_modified_since: Value of the request's `If-Modified-Since` header, if any.
+    :param accept_encoding: Value of the request's `Accept-Encoding` header, if any.
+
+    :return: A 200 response with the whole file, a 206 response with the requested ranges,
+        a 304 response without a body if the client's copy is current, or a 307 redirect to a presigned
+        URL for whole files above `s3_presigned_download_redirect_threshold_bytes` and, in Lambda, for any
+        response too large for Lambda to return. Files sent decompressed are redirected by their
+        decompressed size.
+
+    :raises HTTPException: 404 if the file does not exist, 416 if no requested range overlaps the file.
+    """
+    preconditions = Preconditions(if_none_match=if_none_match, if_modified_since=if_modified_since)
+    location = await resolve_file_location(request, file_path)
+    if location is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
+    bucket_name, object_key, content_type = location.bucket_name, location.object_key, location.content_type
+
+    # recently seen keys answer 404s and 304s without asking S3
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    cached = metadata_cache.get(bucket_name, object_key)
+    if cached is not None:
+        if cached.metadata is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
+        if preconditions.is_not_modified(cached.metadata):
+            return not_modified_response(file_validator_headers(cached.metadata))
+
+    range_specs = parse_range_header(range_header)
+    if range_specs is None:
+        if cached is not None and should_redirect_download(request, _sent_size(cached.metadata, accept_encoding)):
+            return download_redirect_response(request, object_key, bucket_name=bucket_name, content_type=content_type)
+        disk_cache: Optional[ObjectDiskCache] = request.app.state.disk_cache
+        if disk_cache is not None:
+            response = await _serve_from_disk_cache(
+                request, disk_cache, bucket_name, object_key, preconditions, accept_encoding, content_type
+            )
+            if response is not None:
+                return response
+        return await _stream_whole_file(
+            request, file_path, bucket_name, object_key, preconditions, accept_encoding, content_type
+        )
+    if len(range_specs) == 1:
+        return await _stream_single_range(
+            request, file_path, bucket_name, object_key, range_specs[0], preconditions, accept_encoding, content_type
+        )
+    return await _stream_multiple_ranges(
+        request, file_path, bucket_name, object_key, range_specs, preconditions, accept_encoding, content_type
+    )
+
+
+def file_validator_headers(obj: Mapping[str, Any]) -> Dict[str, str]:
+    """
+    Build the `ETag` and `Last-Modified` headers of a file.
+
+    :param obj: Response of `head_object` or `get_object` for the file.
+
+    :return: The headers, ready to be set on a response.
+    """
+    return {"ETag": obj["ETag"], "Last-Modified": format_http_date(obj["LastModified"])}
+
+
+def sends_stored_encoding(obj: Mapping[str, Any], accept_encoding: Optional[str]) -> bool:
+    """Check whether a file can be sent as stored: it is not compressed, or the client accepts its encoding."""
+    content_encoding = obj.get("ContentEncoding")
+    return not content_encoding or accepts_content_encoding(accept_encoding, content_encoding)
+
+
+def representation_headers(
+    obj: Mapping[str, Any], accept_encoding: Optional[str], stored_size: Optional[int] = None
+) -> Dict[str, str]:
+    """
+    Build the headers describing the body of a whole file: its length, encoding and validators.
+
+    :param obj: Response of `head_object` or `get_object` for the file.
+    :param accept_encoding: Value of the request's `Accept-Encoding` header, if any.
+    :param stored_size: Size of the file as stored, if `obj` is the response to a partial GET.
+
+    :return: The headers, ready to be set on a response. A file sent as stored gets a `Repr-Digest` if its
+        digest was recorded. A decompressed file gets a weak ETag, since its bytes differ from the stored ones,
+        and no `Content-Length` if its uncompressed size was not recorded.
+    """
+    stored_size = obj["ContentLength"] if stored_size is None else stored_size
+    headers = {"Content-Length": str(stored_size), "Accept-Ranges": "bytes", **file_validator_headers(obj)}
+    sha256 = get_content_sha256(obj)
+    if sha256 is not None:
+        headers["Repr-Digest"] = format_repr_digest(sha256)
+    content_encoding = obj.get("ContentEncoding")
+    if not content_encoding:
+        return headers
+    # caches must not serve the encoded body to clients that cannot decode it, or the reverse
+    headers["Vary"] = "Accept-Encoding"
+    if accepts_content_encoding(accept_encoding, content_encoding):
+        headers["Content-Encoding"] = content_encoding
+        return headers
+    del headers["Content-Length"]
+    uncompressed_size = get_uncompressed_size(obj)
+    if uncompressed_size is not None:
+        headers["Content-Length"] = str(uncompressed_size)
+    headers["Accept-Ranges"] = "none"
+    headers["ETag"] = "W/" + obj["ETag"]
+    headers.pop("Repr-Digest", None)
+    return headers
+
+
+def not_modified_response(validator_headers: Mapping[str, str]) -> Response:
+    """Build the 304 response telling a client its copy of a file is current."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(validator_headers))
+
+
+def _sent_size(obj: Mapping[str, Any], accept_encoding: Optional[str]) -> int:
+    """Get the size of a whole file as sent to the client: as stored, or decompressed if it cannot decode it."""
+    if sends_stored_encoding(obj, accept_encoding):
+        return obj["ContentLength"]
+    uncompressed_size = get_uncompressed_size(obj)
+    # files stored compressed are at least as large decompressed
+    return obj["ContentLength"] if uncompressed_size is None else uncompressed_size
+
+
+async def _stream_whole_file(
+    request: Request,
+    file_path: str,
+    bucket_name: str,
+    object_key: str,
+    preconditions: Preconditions,
+    accept_encoding: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> Response:
+    """
+    Stream a whole file, switching to parallel ranged GETs for large files and decompressing it if needed.
+
+    With request coalescing enabled, concurrent requests share the download of the file's first
+    `s3_single_flight_max_object_bytes`, which is the whole file for small ones. Small files are copied to the
+    disk cache, if enabled, as they are sent. Files whose digest was recorded at upload are verified as they
+    stream, before they are cached or decompressed. A `content_type` is sent instead of the stored object's.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client: "S3Client" = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    disk_cache: Optional[ObjectDiskCache] = request.app.state.disk_cache
+
+    generation = metadata_cache.generation
+    disk_cache_generation = disk_cache.generation if disk_cache is not None else None
+    fetched: Optional[FetchedObjectStart] = None
+    try:
+        if request.app.state.download_single_flight is not None:
+            max_bytes = settings.s3_single_flight_max_object_bytes
+            if settings.s3_parallel_download_concurrency > 1:
+                max_bytes = min(max_bytes, settings.s3_parallel_download_threshold_bytes)
+            # the shared download cannot be conditional, so the preconditions are checked on its response
+            fetched = await fetch_object_start(request, bucket_name, object_key, max_bytes=max_bytes)
+            obj_response = fetched.obj
+        elif settings.s3_parallel_download_concurrency > 1:
+            # objects up to the threshold still arrive whole in this one request, larger ones reveal their size
+            obj_response = await s3_executor.run(
+                fetch_s3_object_start,
+                bucket_name=bucket_name,
+                object_key=object_key,
+                max_bytes=settings.s3_parallel_download_threshold_bytes,
+                s3_client=s3_client,
+                **preconditions.to_s3_conditions(),
+            )
+        else:
+            obj_response = await s3_executor.run(
+                fetch_s3_object,
+                bucket_name=bucket_name,
+                object_key=object_key,
+                s3_client=s3_client,
+                **preconditions.to_s3_conditions(),
+            )
+    except boto_exceptions.ClientError as err:
+        if is_not_found_error(err):
+            metadata_cache.put(bucket_name, object_key, None, generation=generation)
+        return _handle_s3_error(err, file_path)
+
+    object_size = get_object_size(obj_response)
+    metadata = {
+        "ContentLength": object_size,
+        "ContentType": obj_response["ContentType"],
+        "ETag": obj_response["ETag"],
+        "LastModified": obj_response["LastModified"],
+        "ContentEncoding": obj_response.get("ContentEncoding"),
+        "Metadata": obj_response.get("Metadata", {}),
+    }
+    metadata_cache.put(bucket_name, object_key, metadata, generation=generation)
+    if preconditions.is_not_modified(obj_response):
+        if fetched is None:
+            obj_response["Body"].close()
+        return not_modified_response(file_validator_headers(obj_response))
+    send_stored = sends_stored_encoding(obj_response, accept_encoding)
+    # S3 sends the stored bytes, so clients that cannot decode them are only redirected by the size of the
+    # decompressed file, which the API would otherwise have to send them
+    if should_redirect_download(request, _sent_size(metadata, accept_encoding)):
+        # only the response headers were received, so closing the body wastes no transfer
+        if fetched is None:
+            obj_response["Body"].close()
+        return download_redirect_response(request, object_key, bucket_name=bucket_name, content_type=content_type)
+
+    if fetched is not None:
+        body = _iter_after_fetched_start(request, bucket_name, object_key, fetched, object_size)
+    else:
+        # read the body on the S3 thread pool so a slow download never blocks the event loop
+        body = s3_executor.iter_chunks(obj_response["Body"], chunk_size=settings.s3_stream_chunk_size_bytes)
+    if fetched is None and object_size > obj_response["ContentLength"]:
+        logger.debug("downloading {object_size} bytes with parallel ranged GETs", object_size=object_size)
+        body = iter_s3_object_parts(
+            s3_executor,
+            head_chunks=body,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            etag=obj_response["ETag"],
+            start=obj_response["ContentLength"],
+            total_size=object_size,
+            part_size=settings.s3_parallel_download_part_size_bytes,
+            max_concurrency=settings.s3_parallel_download_concurrency,
+            s3_client=s3_client,
+        )
+    sha256 = get_content_sha256(obj_response)
+    if sha256 is not None:
+        body = iter_verified(body, sha256, object_key)
+    if disk_cache is not None and object_size <= disk_cache.max_object_bytes:
+        body = _copy_to_disk_cache(body, disk_cache, bucket_name, object_key, metadata, disk_cache_generation)
+    if not send_stored:
+        body = iter_decompressed(body, obj_response["ContentEncoding"])
+
+    return StreamingResponse(
+        content=body,
+        media_type=content_type or obj_response["ContentType"],
+        headers=representation_headers(obj_response, accept_encoding, stored_size=object_size),
+    )
+
+
+async def _iter_after_fetched_start(
+    request: Request, bucket_name: str, object_key: str, fetched: FetchedObjectStart, object_size: int
+) -> AsyncGenerator[bytes, None]:
+    """Send the shared first bytes of a file, then download the rest of it for this request alone."""
+    settings: Settings = request.app.state.settings
+    s3_client: "S3Client" = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    start = len(fetched.content)
+    if start >= object_size:
+        yield fetched.content
+        return
+    if settings.s3_parallel_download_concurrency > 1 and object_size > settings.s3_parallel_download_threshold_bytes:
+        rest = iter_s3_object_parts(
+            s3_executor,
+            head_chunks=_iter_content(fetched.content),
+            bucket_name=bucket_name,
+            object_key=object_key,
+            etag=fetched.obj["ETag"],
+            start=start,
+            total_size=object_size,
+            part_size=settings.s3_parallel_download_part_size_bytes,
+            max_concurrency=settings.s3_parallel_download_concurrency,
+            s3_client=s3_client,
+        )
+    else:
+        yield fetched.content
+        # conditional on the ETag, so an overwrite fails the download instead of mixing two versions of the file
+        obj_response = await s3_executor.run(
+            fetch_s3_object,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            s3_client=s3_client,
+            byte_range=f"bytes={start}-",
+            if_match=fetched.obj["ETag"],
+        )
+        rest = s3_executor.iter_chunks(obj_response["Body"], chunk_size=settings.s3_stream_chunk_size_bytes)
+    try:
+        async for chunk in rest:
+            yield chunk
+    finally:
+        await rest.aclose()
+
+
+async def _iter_content(content: bytes) -> AsyncIterator[bytes]:
+    """Yield bytes already in memory as a single chunk."""
+    yield content
+
+
+async def _serve_from_disk_cache(  # pylint: disable=too-many-arguments
+    request: Request,
+    disk_cache: ObjectDiskCache,
+    bucket_name: str,
+    object_key: str,
+    preconditions: Preconditions,
+    accept_encoding: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> Optional[Response]:
+    """Send a whole file from the disk cache if its ETag is still current, or return None to download it."""
+    entry = disk_cache.acquire(bucket_name, object_key)
+    if entry is None:
+        return None
+    sent = False
+    try:
+        if not sends_stored_encoding(entry.metadata, accept_encoding) or should_redirect_download(request, entry.size):
+            return None
+        # at most a HEAD, none while the metadata cache holds the key, instead of downloading the body again
+        current = await fetch_file_metadata(request, bucket_name, object_key)
+        if current is None or current["ETag"] != entry.metadata["ETag"]:
+            return None
+        if preconditions.is_not_modified(current):
+            return not_modified_response(file_validator_headers(current))
+        sent = True
+        # servers supporting the ASGI `pathsend` extension send the file without copying it through Python
+        return FileResponse(
+            entry.path,
+            media_type=content_type or entry.metadata["ContentType"],
+            headers=representation_headers(entry.metadata, accept_encoding),
+            background=BackgroundTask(disk_cache.release, entry),
+        )
+    finally:
+        if not sent:
+            disk_cache.release(entry)
+
+
+async def _copy_to_disk_cache(  # pylint: disable=too-many-arguments
+    chunks: AsyncGenerator[bytes, None],
+    disk_cache: ObjectDiskCache,
+    bucket_name: str,
+    object_key: str,
+    metadata: Dict[str, Any],
+    generation: Optional[int],
+) -> AsyncGenerator[bytes, None]:
+    """Pass a file's stored body through, and cache it on disk once it was read whole."""
+    buffer = bytearray()
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            yield chunk
+    finally:
+        await chunks.aclose()
+    if len(buffer) == metadata["ContentLength"]:
+        await asyncio.to_thread(
+            disk_cache.put, bucket_name, object_key, bytes(buffer), metadata, generation=generation
+        )
+
+
+async def _stream_single_range(
+    request: Request,
+    file_path: str,
+    bucket_name: str,
+    object_key: str,
+    range_spec: RangeSpec,
+    preconditions: Preconditions,
+    accept_encoding: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> Response:
+    """Stream one byte range of a file, passing the range straight through to S3."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    try:
+        obj_response = await s3_executor.run(
+            fetch_s3_object,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            s3_client=request.app.state.s3_client,
+            byte_range=format_range_spec(range_spec),
+            **preconditions.to_s3_conditions(),
+        )
+    except boto_exceptions.ClientError as err:
+        return _handle_s3_error(err, file_path)
+    if preconditions.is_not_modified(obj_response):
+        obj_response["Body"].close()
+        return not_modified_response(file_validator_headers(obj_response))
+    if not sends_stored_encoding(obj_response, accept_encoding):
+        # the range is of the compressed bytes, which this client cannot decode: send the whole file decompressed
+        obj_response["Body"].close()
+        return await _stream_whole_file(
+            request, file_path, bucket_name, object_key, preconditions, accept_encoding, content_type
+        )
+    if exceeds_lambda_response_limit(settings, obj_response["ContentLength"]):
+        # the redirected GET keeps its `Range` header, which S3 serves itself
+        obj_response["Body"].close()
+        return download_redirect_response(request, object_key, bucket_name=bucket_name, content_type=content_type)
+
+    body = s3_executor.iter_chunks(obj_response["Body"], chunk_size=settings.s3_stream_chunk_size_bytes)
+    return StreamingResponse(
+        content=body,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=content_type or obj_response["ContentType"],
+        headers={
+            "Content-Range": obj_response["ContentRange"],
+            **representation_headers(obj_response, accept_encoding),
+        },
+    )
+
+
+async def _stream_multiple_ranges(
+    request: Request,
+    file_path: str,
+    bucket_name: str,
+    object_key: str,
+    range_specs: List[RangeSpec],
+    preconditions: Preconditions,
+    accept_encoding: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> Response:
+    """Stream several byte ranges of a file as a `multipart/byteranges` body, one ranged GET per range."""
+    settings: Settings = request.app.state.settings
+    s3_client: "S3Client" = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    # S3 serves a single range per request, so the size is needed up front to resolve suffix ranges.
+    # the metadata cache is bypassed: a stale size or ETag would fail the ranged GETs halfway through the body
+    obj_metadata = await s3_executor.run(
+        fetch_s3_object_metadata, bucket_name=bucket_name, object_key=object_key, s3_client=s3_client
+    )
+    if obj_metadata is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
+    if preconditions.is_not_modified(obj_metadata):
+        return not_modified_response(file_validator_headers(obj_metadata))
+    if obj_metadata.get("ContentEncoding"):
+        # a `Content-Encoding` would apply to the whole multipart body rather than to each part: send the file
+        return await _stream_whole_file(
+            request, file_path, bucket_name, object_key, preconditions, accept_encoding, content_type
+        )
+
+    file_size = obj_metadata["ContentLength"]
+    try:
+        byte_ranges = resolve_byte_ranges(range_specs, file_size=file_size)
+    except RangeNotSatisfiableError as err:
+        raise _range_not_satisfiable(file_size) from err
+    if len(byte_ranges) == 1:
+        return await _stream_single_range(
+            request,
+            file_path,
+            bucket_name,
+            object_key,
+            (byte_ranges[0].first_byte, byte_ranges[0].last_byte),
+            preconditions,
+            accept_encoding,
+            content_type,
+        )
+
+    content_type = content_type or obj_metadata["ContentType"]
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        format_multipart_byteranges_part_header(boundary, content_type, byte_range, file_size)
+        for byte_range in byte_ranges
+    ]
+    end = format_multipart_byteranges_end(boundary)
+    content_length = sum(len(header) for header in part_headers) + sum(r.length for r in byte_ranges) + len(end)
+    if exceeds_lambda_response_limit(settings, content_length):
+        return download_redirect_response(request, object_key, bucket_name=bucket_name, content_type=content_type)
+
+    async def iter_parts() -> AsyncIterator[bytes]:
+        for part_header, byte_range in zip(part_headers, byte_ranges):
+            yield part_header
+            part = await s3_executor.run(
+                fetch_s3_object,
+                bucket_name=bucket_name,
+                object_key=object_key,
+                s3_client=s3_client,
+                byte_range=byte_range.to_s3_range(),
+                if_match=obj_metadata["ETag"],
+            )
+            async for chunk in s3_executor.iter_chunks(part["Body"], chunk_size=settings.s3_stream_chunk_size_bytes):
+                yield chunk
+        yield end
+
+    return StreamingResponse(
+        content=iter_parts(),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers={
+            "Content-Length": str(content_length),
+            "Accept-Ranges": "bytes",
+            **file_validator_headers(obj_metadata),
+        },
+    )
+
+
+def _handle_s3_error(err: boto_exceptions.ClientError, file_path: str) -> Response:
+    """Turn S3's 304 into a response, translate errors the client can act on into HTTP errors, re-raise the rest."""
+    if is_not_modified_error(err):
+        s3_headers = err.response["ResponseMetadata"]["HTTPHeaders"]
+        return not_modified_response({"ETag": s3_headers["etag"], "Last-Modified": s3_headers["last-modified"]})
+    if is_not_found_error(err):
+        logger.debug("file does not exist: {file_path}", file_path=file_path)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}") from err
+    if err.response["Error"]["Code"] == "InvalidRange":
+        raise _range_not_satisfiable(int(err.response["Error"]["ActualObjectSize"])) from err
+    raise err
+
+
+def _range_not_satisfiable(file_size: int) -> HTTPException:
+    """Build the 416 error returned when no requested range overlaps the file."""
+    return HTTPException(
+        status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{file_size}"},
+    )
@@ -13,6 +13,7 @@ from loguru import logger
 from pydantic import ValidationError
 
 from files_api.monitoring.logger import log_response_info
+from files_api.s3.resilience import S3UnavailableError
 
 
 async def handle_broad_exceptions(request: Request, call_next):
@@ -30,6 +31,18 @@ async def handle_broad_exceptions(request: Request, call_next):
         return response
 
 
+async def handle_s3_unavailable(request: Request, exc: S3UnavailableError):
+    """Tell clients to come back later while S3 throttles or fails, rather than reporting an internal error."""
+    logger.warning("S3 is unavailable: {message}", message=str(exc))
+    response = JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Storage is temporarily unavailable, retry later"},
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+    log_response_info(response)
+    return response
+
+
 async def handle_pydantic_validation_errors(request: Request, exc: ValidationError):
     """Catch pydantic validation errors and return details to the client."""
     errors = exc.errors()
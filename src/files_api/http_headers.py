@@ -0,0 +1,226 @@
+"""Parse and format HTTP headers used when serving files."""
+
+import base64
+import re
+from dataclasses import dataclass
+from datetime import (
+    datetime,
+    timezone,
+)
+from email.utils import (
+    format_datetime,
+    parsedate_to_datetime,
+)
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+# e.g. "bytes=0-499", "bytes=500-", "bytes=-500" or "bytes=0-0, -1"
+RANGE_HEADER_PATTERN = re.compile(r"^\s*bytes\s*=\s*(.+)$", re.IGNORECASE)
+RANGE_SPEC_PATTERN = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+# e.g. "abc123", W/"abc123" or *
+ENTITY_TAG_PATTERN = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+class RangeNotSatisfiableError(Exception):
+    """None of the requested byte ranges overlap the file."""
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    """An inclusive range of byte offsets within a file."""
+
+    first_byte: int
+    last_byte: int
+
+    @property
+    def length(self) -> int:
+        """Number of bytes in the range."""
+        return self.last_byte - self.first_byte + 1
+
+    def to_s3_range(self) -> str:
+        """Format the range for the `Range` parameter of `get_object`."""
+        return f"bytes={self.first_byte}-{self.last_byte}"
+
+    def to_content_range(self, file_size: int) -> str:
+        """Format the `Content-Range` header value of a part of a file of `file_size` bytes."""
+        return f"bytes {self.first_byte}-{self.last_byte}/{file_size}"
+
+
+RangeSpec = Tuple[Optional[int], Optional[int]]
+
+
+def parse_range_header(range_header: Optional[str]) -> Optional[List[RangeSpec]]:
+    """
+    Parse a `Range` header into its range specs without resolving them against a file size.
+
+    Per RFC 9110, a header that cannot be parsed is ignored, so the full file should be served.
+
+    :param range_header: Value of the `Range` header, if any.
+
+    :return: (first byte, last byte) pairs where either may be None, e.g. "bytes=-500" is (None, 500),
+        or None if there is no valid header.
+    """
+    if not range_header:
+        return None
+    match = RANGE_HEADER_PATTERN.match(range_header)
+    if not match:
+        return None
+
+    specs: List[RangeSpec] = []
+    for raw_spec in match.group(1).split(","):
+        spec_match = RANGE_SPEC_PATTERN.match(raw_spec)
+        if not spec_match or spec_match.group(1) == spec_match.group(2) == "":
+            return None
+        first_byte = int(spec_match.group(1)) if spec_match.group(1) else None
+        last_byte = int(spec_match.group(2)) if spec_match.group(2) else None
+        if first_byte is not None and last_byte is not None and last_byte < first_byte:
+            return None
+        specs.append((first_byte, last_byte))
+    return specs
+
+
+def format_range_spec(spec: RangeSpec) -> str:
+    """Format a single range spec as a `Range` header value, e.g. "bytes=-500"."""
+    first_byte, last_byte = spec
+    return f"bytes={'' if first_byte is None else first_byte}-{'' if last_byte is None else last_byte}"
+
+
+def resolve_byte_ranges(specs: List[RangeSpec], file_size: int) -> List[ByteRange]:
+    """
+    Resolve range specs against the size of a file, dropping the ranges that fall outside of it.
+
+    :param specs: Range specs returned by `parse_range_header`.
+    :param file_size: Size of the file in bytes.
+
+    :return: The satisfiable byte ranges, in the order they were requested.
+
+    :raises RangeNotSatisfiableError: If none of the ranges overlap the file.
+    """
+    byte_ranges: List[ByteRange] = []
+    for first_byte, last_byte in specs:
+        if first_byte is None:
+            # suffix range: the last `last_byte` bytes
+            if last_byte == 0 or file_size == 0:
+                continue
+            byte_ranges.append(ByteRange(first_byte=max(file_size - last_byte, 0), last_byte=file_size - 1))
+        elif first_byte < file_size:
+            end = file_size - 1 if last_byte is None else min(last_byte, file_size - 1)
+            byte_ranges.append(ByteRange(first_byte=first_byte, last_byte=end))
+
+    if not byte_ranges:
+        raise RangeNotSatisfiableError(f"None of the requested ranges overlap the file of {file_size} bytes")
+    return byte_ranges
+
+
+def format_multipart_byteranges_part_header(
+    boundary: str, content_type: str, byte_range: ByteRange, file_size: int
+) -> bytes:
+    """Format the delimiter and headers that precede one part of a `multipart/byteranges` body."""
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: {byte_range.to_content_range(file_size)}\r\n\r\n"
+    ).encode()
+
+
+def format_multipart_byteranges_end(boundary: str) -> bytes:
+    """Format the closing delimiter of a `multipart/byteranges` body."""
+    return f"\r\n--{boundary}--\r\n".encode()
+
+
+def format_repr_digest(sha256: str) -> str:
+    """Format a hex SHA-256 digest as a `Repr-Digest` header (RFC 9530), e.g. "sha-256=:47DEQp...=:"."""
+    return f"sha-256=:{base64.b64encode(bytes.fromhex(sha256)).decode()}:"
+
+
+def format_http_date(value: datetime) -> str:
+    """Format a timezone-aware datetime as an HTTP-date, e.g. "Thu, 01 Jan 2022 00:00:00 GMT"."""
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse an HTTP-date into a UTC datetime, or return None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        # RFC 9110 dates are always GMT
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_entity_tags(header: Optional[str]) -> List[str]:
+    """
+    Parse an `If-None-Match` or `If-Match` header into its entity tags.
+
+    Weak tags lose their W/ prefix, since `If-None-Match` uses the weak comparison.
+
+    :param header: Value of the header, if any.
+
+    :return: The quoted entity tags, e.g. ['"abc123"'], or ["*"]. Empty if the header is missing.
+    """
+    if not header:
+        return []
+    return [tag.removeprefix("W/") for tag in ENTITY_TAG_PATTERN.findall(header)]
+
+
+def is_not_modified(
+    etag: str,
+    last_modified: datetime,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None,
+) -> bool:
+    """
+    Evaluate the preconditions of a GET or HEAD request against the current validators of a file.
+
+    Per RFC 9110, `If-Modified-Since` is ignored when `If-None-Match` is present, and so is an invalid date.
+
+    :param etag: Current quoted ETag of the file.
+    :param last_modified: Time the file was last modified.
+    :param if_none_match: Value of the request's `If-None-Match` header, if any.
+    :param if_modified_since: Value of the request's `If-Modified-Since` header, if any.
+
+    :return: True if the client's copy is current and a 304 should be returned.
+    """
+    if if_none_match:
+        entity_tags = parse_entity_tags(if_none_match)
+        return "*" in entity_tags or etag.removeprefix("W/") in entity_tags
+
+    modified_since = parse_http_date(if_modified_since)
+    # HTTP-dates have a resolution of one second
+    return modified_since is not None and last_modified.replace(microsecond=0) <= modified_since
+
+
+def accepts_content_encoding(accept_encoding: Optional[str], content_encoding: str) -> bool:
+    """
+    Check whether an `Accept-Encoding` header allows a content coding, e.g. "gzip".
+
+    A coding is allowed if it, or "*", is listed with a non-zero quality. Unlike RFC 9110, a missing header
+    allows none: clients that send no `Accept-Encoding` rarely decode anything.
+
+    :param accept_encoding: Value of the request's `Accept-Encoding` header, if any.
+    :param content_encoding: The coding to check, case-insensitive.
+
+    :return: True if a body in that coding can be sent as is.
+    """
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        name, _, value = params.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    quality = qualities.get(content_encoding.lower(), qualities.get("*", 0.0))
+    return quality > 0
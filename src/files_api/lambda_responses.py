@@ -0,0 +1,36 @@
+"""Pick how a download leaves AWS Lambda by its size, so no response exceeds what Lambda can return."""
+
+from typing import (
+    Literal,
+    Optional,
+)
+
+from files_api.settings import Settings
+
+# "inline": buffered by Mangum and returned in the invocation's payload
+# "streamed": streamed by a response streaming adapter, never held in memory whole
+# "redirect": too large for either, so sent as a redirect to a presigned URL
+LambdaResponseClass = Literal["inline", "streamed", "redirect"]
+
+
+def lambda_response_class(settings: Settings, body_size: int) -> Optional[LambdaResponseClass]:
+    """
+    Classify a download by the size of its body.
+
+    :param settings: The app's settings.
+    :param body_size: Size of the response body in bytes.
+
+    :return: The size class, or None if the app does not run in Lambda.
+    """
+    if not settings.lambda_response_limits_enabled:
+        return None
+    if body_size <= settings.lambda_inline_response_max_bytes:
+        return "inline"
+    if settings.lambda_response_streaming_enabled and body_size <= settings.lambda_streaming_response_max_bytes:
+        return "streamed"
+    return "redirect"
+
+
+def exceeds_lambda_response_limit(settings: Settings, body_size: int) -> bool:
+    """Check whether a download is too large to be returned from Lambda, inline or streamed."""
+    return lambda_response_class(settings, body_size) == "redirect"
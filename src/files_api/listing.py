@@ -0,0 +1,355 @@
+"""List pages of files, from the local key index when it is fresh and from S3 otherwise, or browse a directory."""
+
+import asyncio
+import base64
+import binascii
+import json
+from dataclasses import (
+    asdict,
+    dataclass,
+)
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from botocore.exceptions import ClientError
+from fastapi import (
+    HTTPException,
+    Request,
+    status,
+)
+from loguru import logger
+
+from files_api.coalescing import fetch_file_metadata
+from files_api.s3.blobs import get_pointer_size
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import (
+    KeyIndex,
+    SortBy,
+)
+from files_api.s3.read_objects import (
+    DIRECTORY_DELIMITER,
+    INVALID_ARGUMENT_ERROR_CODE,
+    fetch_s3_directory_page,
+    fetch_s3_objects_metadata,
+    fetch_s3_objects_using_page_token,
+)
+from files_api.schemas import (
+    FileMetadata,
+    GetFilesQueryParams,
+    GetFilesResponse,
+)
+from files_api.settings import Settings
+
+# S3 continuation tokens are base64, which never contains "~"
+INDEX_PAGE_TOKEN_PREFIX = "idx~"
+BROWSE_PAGE_TOKEN_PREFIX = "dir~"
+
+
+@dataclass(frozen=True)
+class IndexPageToken:
+    """
+    A keyset pagination cursor, issued for pages listed from the key index.
+
+    Unlike S3's continuation tokens, it can be resumed from the index or, when sorted by file path, from S3.
+    """
+
+    prefix: str
+    page_size: int
+    sort_by: SortBy
+    descending: bool
+    after: Tuple[Any, str]
+
+    def encode(self) -> str:
+        """Encode the cursor as an opaque page token."""
+        return _encode_page_token(INDEX_PAGE_TOKEN_PREFIX, asdict(self))
+
+    @classmethod
+    def decode(cls, page_token: str) -> Optional["IndexPageToken"]:
+        """
+        Decode a page token.
+
+        :return: The cursor, or None if the page token was issued by S3 or for browsing.
+
+        :raises HTTPException: 422 if the page token looks like a cursor but cannot be decoded.
+        """
+        fields = _decode_page_token(INDEX_PAGE_TOKEN_PREFIX, page_token)
+        if fields is None:
+            return None
+        try:
+            return cls(**{**fields, "after": tuple(fields["after"])})
+        except (TypeError, KeyError) as err:
+            raise _invalid_page_token() from err
+
+
+@dataclass(frozen=True)
+class BrowsePageToken:
+    """
+    A cursor into the browsing of one directory level.
+
+    S3 continuation tokens of delimited listings only resume a listing with the same prefix and delimiter,
+    so the prefix travels with the token.
+    """
+
+    prefix: str
+    page_size: int
+    continuation_token: str
+
+    def encode(self) -> str:
+        """Encode the cursor as an opaque page token."""
+        return _encode_page_token(BROWSE_PAGE_TOKEN_PREFIX, asdict(self))
+
+    @classmethod
+    def decode(cls, page_token: str) -> Optional["BrowsePageToken"]:
+        """
+        Decode a page token.
+
+        :return: The cursor, or None if the page token was not issued for browsing.
+
+        :raises HTTPException: 422 if the page token looks like a cursor but cannot be decoded.
+        """
+        fields = _decode_page_token(BROWSE_PAGE_TOKEN_PREFIX, page_token)
+        if fields is None:
+            return None
+        try:
+            return cls(**fields)
+        except TypeError as err:
+            raise _invalid_page_token() from err
+
+
+async def list_files_page(request: Request, query_params: GetFilesQueryParams) -> GetFilesResponse:
+    """
+    List a page of files, or in browse mode, of the files and subdirectories directly in a directory.
+
+    Browsing always lists from S3, with a delimiter, so deep trees below the directory cost nothing.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and key index.
+    :param query_params: Validated query parameters of the request.
+
+    :return: The page of files and the token of the next page.
+
+    :raises HTTPException: 400 if a sort order needs the key index but it is disabled,
+        422 if the page token is invalid or sent with parameters of a first page,
+        503 if the key index is enabled but too stale to answer.
+    """
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+    s3_executor: S3Executor = request.app.state.s3_executor
+
+    _check_page_token_exclusivity(request)
+    if query_params.page_token:
+        browse_cursor = BrowsePageToken.decode(query_params.page_token)
+        if browse_cursor is not None:
+            return await _browse_directory_page(
+                request, browse_cursor.prefix, browse_cursor.page_size, browse_cursor.continuation_token
+            )
+    elif query_params.mode == "browse":
+        directory = query_params.directory
+        if directory and not directory.endswith(DIRECTORY_DELIMITER):
+            directory += DIRECTORY_DELIMITER
+        return await _browse_directory_page(request, directory, query_params.page_size)
+
+    cursor: Optional[IndexPageToken] = None
+    if query_params.page_token:
+        cursor = IndexPageToken.decode(query_params.page_token)
+        if cursor is None:
+            return await _list_files_page_from_s3_token(request, query_params.page_token, query_params.page_size)
+    prefix = cursor.prefix if cursor else query_params.directory
+    page_size = cursor.page_size if cursor else query_params.page_size
+    sort_by = cursor.sort_by if cursor else query_params.sort_by
+    descending = cursor.descending if cursor else query_params.descending
+    after = cursor.after if cursor else None
+
+    if key_index is not None:
+        page = await s3_executor.run(
+            key_index.list_page,
+            prefix=prefix,
+            page_size=page_size,
+            sort_by=sort_by,
+            descending=descending,
+            after=after,
+        )
+        if page is not None:
+            indexed_objects, next_after = page
+            logger.info("listed {num_objects} objects from the key index", num_objects=len(indexed_objects))
+            return GetFilesResponse(
+                files=[
+                    FileMetadata(file_path=obj.key, last_modified=obj.last_modified, size_bytes=obj.size)
+                    for obj in indexed_objects
+                ],
+                next_page_token=_next_page_token(prefix, page_size, sort_by, descending, next_after),
+            )
+        logger.warning("the key index is too stale to answer, listing from S3")
+
+    if sort_by != "file_path" or descending:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST if key_index is None else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Sorting by anything but ascending file_path needs an up-to-date key index",
+        )
+
+    settings: Settings = request.app.state.settings
+    objects, continuation_token = await s3_executor.run(
+        fetch_s3_objects_metadata,
+        bucket_name=settings.s3_bucket_name,
+        prefix=prefix or None,
+        max_keys=page_size,
+        s3_client=request.app.state.s3_client,
+        start_after=after[1] if after else None,
+    )
+    next_page_token = continuation_token
+    if cursor is not None and continuation_token is not None:
+        # keep issuing cursors, so the next page can come from the index again once it caught up
+        next_page_token = _next_page_token(prefix, page_size, sort_by, descending, (objects[-1]["Key"],) * 2)
+    return await _files_response(request, objects, next_page_token)
+
+
+async def _list_files_page_from_s3_token(request: Request, page_token: str, page_size: int) -> GetFilesResponse:
+    """Continue a listing that S3 paginated."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    logger.debug("fetching objects metadata using a page_token")
+    try:
+        objects, next_page_token = await s3_executor.run(
+            fetch_s3_objects_using_page_token,
+            bucket_name=settings.s3_bucket_name,
+            continuation_token=page_token,
+            max_keys=page_size,
+            s3_client=request.app.state.s3_client,
+        )
+    except ClientError as err:
+        if err.response["Error"]["Code"] == INVALID_ARGUMENT_ERROR_CODE:
+            raise _invalid_page_token() from err
+        raise
+    return await _files_response(request, objects, next_page_token)
+
+
+async def _browse_directory_page(
+    request: Request, prefix: str, page_size: int, continuation_token: Optional[str] = None
+) -> GetFilesResponse:
+    """List one level of a directory: the files directly in it and its subdirectories, from S3."""
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    objects, directories, next_continuation_token = await s3_executor.run(
+        fetch_s3_directory_page,
+        bucket_name=settings.s3_bucket_name,
+        prefix=prefix,
+        max_keys=page_size,
+        continuation_token=continuation_token,
+        s3_client=request.app.state.s3_client,
+    )
+    logger.info(
+        "browsed {num_objects} objects and {num_directories} directories under {prefix}",
+        num_objects=len(objects),
+        num_directories=len(directories),
+        prefix=prefix,
+    )
+    # a key equal to the prefix is the directory's own placeholder, not a file in it
+    objects = [obj for obj in objects if obj["Key"] != prefix]
+    sizes = await _file_sizes(request, objects)
+    return GetFilesResponse(
+        files=[
+            FileMetadata(file_path=obj["Key"], last_modified=obj["LastModified"], size_bytes=size)
+            for obj, size in zip(objects, sizes)
+        ],
+        directories=directories,
+        next_page_token=(
+            BrowsePageToken(prefix=prefix, page_size=page_size, continuation_token=next_continuation_token).encode()
+            if next_continuation_token is not None
+            else None
+        ),
+    )
+
+
+def _check_page_token_exclusivity(request: Request) -> None:
+    """
+    Reject a page token sent along with the parameters of a first page, which the token already carries.
+
+    The query parameters model cannot tell a parameter sent with its default value from one not sent, since
+    FastAPI passes it every parameter, so the raw query string is checked instead.
+
+    :raises HTTPException: 422 naming the parameters the page token excludes.
+    """
+    query_params = request.query_params
+    if not query_params.get("page_token"):
+        return
+    for exclusive_params in (("page_size", "directory"), ("sort_by", "descending"), ("mode",)):
+        if any(name in query_params for name in exclusive_params):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"page_token is mutually exclusive with {' and '.join(exclusive_params)}",
+            )
+
+
+def _encode_page_token(token_prefix: str, fields: Dict[str, Any]) -> str:
+    """Encode the fields of a cursor as an opaque page token."""
+    return token_prefix + base64.urlsafe_b64encode(json.dumps(fields).encode()).decode()
+
+
+def _decode_page_token(token_prefix: str, page_token: str) -> Optional[Dict[str, Any]]:
+    """Decode the fields of a cursor, or return None if the page token is not of this kind."""
+    if not page_token.startswith(token_prefix):
+        return None
+    try:
+        fields = json.loads(base64.urlsafe_b64decode(page_token[len(token_prefix) :]))
+    except (binascii.Error, ValueError) as err:
+        raise _invalid_page_token() from err
+    if not isinstance(fields, dict):
+        raise _invalid_page_token()
+    return fields
+
+
+def _invalid_page_token() -> HTTPException:
+    """Build the 422 error returned for page tokens that look like cursors but cannot be decoded."""
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid page_token")
+
+
+def _next_page_token(
+    prefix: str, page_size: int, sort_by: SortBy, descending: bool, after: Optional[Tuple[Any, str]]
+) -> Optional[str]:
+    """Encode the cursor of the next page, if there is one."""
+    if after is None:
+        return None
+    return IndexPageToken(
+        prefix=prefix, page_size=page_size, sort_by=sort_by, descending=descending, after=after
+    ).encode()
+
+
+async def _files_response(request: Request, objects: List[Any], next_page_token: Optional[str]) -> GetFilesResponse:
+    """Build the response of a page of objects listed by S3."""
+    logger.info(
+        "fetched {num_objects} objects metadata. Has next page: {has_next_page}",
+        num_objects=len(objects),
+        has_next_page=next_page_token is not None,
+    )
+    sizes = await _file_sizes(request, objects)
+    return GetFilesResponse(
+        files=[
+            FileMetadata(file_path=obj["Key"], last_modified=obj["LastModified"], size_bytes=size)
+            for obj, size in zip(objects, sizes)
+        ],
+        next_page_token=next_page_token,
+    )
+
+
+async def _file_sizes(request: Request, objects: List[Any]) -> List[int]:
+    """
+    Get the sizes of the files of objects listed by S3.
+
+    With blob storage on, empty objects may be pointers, whose listed size is not their file's: their metadata
+    is fetched, concurrently, for the size of the blob they point to. Other objects cost no extra call.
+    """
+    settings: Settings = request.app.state.settings
+    if settings.s3_blob_bucket_name is None:
+        return [obj["Size"] for obj in objects]
+
+    async def fetch_size(obj: Dict[str, Any]) -> int:
+        if obj["Size"] != 0:
+            return obj["Size"]
+        metadata = await fetch_file_metadata(request, settings.s3_bucket_name, obj["Key"])
+        # deleted since it was listed
+        return get_pointer_size(metadata) if metadata is not None else 0
+
+    return list(await asyncio.gather(*(fetch_size(obj) for obj in objects)))
@@ -1,6 +1,12 @@
 """Initialize FastAPI REST API app."""
 
+import asyncio
+from contextlib import (
+    asynccontextmanager,
+    suppress,
+)
 from textwrap import dedent
+from typing import AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
@@ -9,12 +15,31 @@ from fastapi.routing import APIRoute
 from files_api.errors import (
     handle_broad_exceptions,
     handle_pydantic_validation_errors,
+    handle_s3_unavailable,
 )
 from files_api.route_handler import RouteHandler
 from files_api.routes import (
     GENERATE_ROUTER,
+    MONITORING_ROUTER,
+    PRESIGNED_ROUTER,
     ROUTER,
 )
+from files_api.s3.disk_cache import ObjectDiskCache
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import (
+    KeyIndex,
+    keep_key_index_fresh,
+)
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.resilience import (
+    CircuitBreaker,
+    PrefixConcurrencyLimiter,
+    S3UnavailableError,
+    install_s3_guards,
+)
+from files_api.s3.sharding import ShardedStorageBackend
+from files_api.s3.single_flight import SingleFlight
+from files_api.s3.storage_backend import create_storage_backend
 from files_api.settings import Settings
 
 
@@ -22,6 +47,34 @@ def custom_generate_unique_id(route: APIRoute):
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Keep the key index, if enabled, reconciled with S3 while the app runs, and release the storage after."""
+    key_index: KeyIndex | None = app.state.key_index
+    disk_cache: ObjectDiskCache | None = app.state.disk_cache
+    refresher = None
+    if key_index is not None:
+        refresher = asyncio.create_task(
+            keep_key_index_fresh(
+                key_index,
+                app.state.s3_executor,
+                interval_seconds=app.state.settings.s3_key_index_refresh_interval_seconds,
+                s3_client=app.state.s3_client,
+            )
+        )
+    try:
+        yield
+    finally:
+        if refresher is not None:
+            refresher.cancel()
+            with suppress(asyncio.CancelledError):
+                await refresher
+        if disk_cache is not None:
+            disk_cache.clear()
+        if isinstance(app.state.s3_client, ShardedStorageBackend):
+            app.state.s3_client.close()
+
+
 def create_app(settings: Settings | None = None) -> FastAPI:
     """Create a FastAPI ROUTERlication."""
     settings = settings or Settings()
@@ -42,13 +95,71 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         docs_url="/",  # its easier to find the docs when they live on the base url
         root_path="/prod",
         generate_unique_id_function=custom_generate_unique_id,
+        lifespan=lifespan,
     )
     app.state.settings = settings
+    app.state.s3_client = create_storage_backend(settings)
+    app.state.s3_circuit_breaker = (
+        CircuitBreaker(
+            failure_threshold=settings.s3_circuit_breaker_failure_threshold,
+            reset_timeout_seconds=settings.s3_circuit_breaker_reset_seconds,
+        )
+        if settings.s3_circuit_breaker_failure_threshold > 0 and settings.storage_backend == "s3"
+        else None
+    )
+    if settings.storage_backend == "s3":
+        install_s3_guards(
+            app.state.s3_client,
+            circuit_breaker=app.state.s3_circuit_breaker,
+            prefix_limiter=(
+                PrefixConcurrencyLimiter(
+                    max_concurrency=settings.s3_prefix_max_concurrency,
+                    max_wait_seconds=settings.s3_prefix_max_wait_seconds,
+                )
+                if settings.s3_prefix_max_concurrency > 0
+                else None
+            ),
+        )
+    app.state.s3_executor = S3Executor(max_workers=settings.s3_executor_max_workers)
+    app.state.disk_cache = (
+        ObjectDiskCache(
+            max_bytes=settings.disk_cache_max_bytes,
+            max_object_bytes=settings.disk_cache_max_object_bytes,
+            directory=settings.disk_cache_directory,
+        )
+        if settings.disk_cache_enabled
+        else None
+    )
+    app.state.metadata_single_flight = SingleFlight() if settings.s3_single_flight_enabled else None
+    app.state.download_single_flight = (
+        SingleFlight()
+        if settings.s3_single_flight_enabled and settings.s3_single_flight_max_object_bytes > 0
+        else None
+    )
+    app.state.metadata_cache = ObjectMetadataCache(
+        max_entries=settings.s3_metadata_cache_max_entries,
+        ttl_seconds=settings.s3_metadata_cache_ttl_seconds,
+        # every write through the API invalidates the metadata cache, so the disk cache follows it
+        on_invalidate=app.state.disk_cache.invalidate if app.state.disk_cache is not None else None,
+    )
+    app.state.key_index = (
+        KeyIndex(
+            bucket_name=settings.s3_bucket_name,
+            path=settings.s3_key_index_path,
+            max_staleness_seconds=settings.s3_key_index_max_staleness_seconds,
+        )
+        if settings.s3_key_index_enabled
+        else None
+    )
     app.router.route_class = RouteHandler
     app.include_router(ROUTER)
     app.include_router(GENERATE_ROUTER)
+    app.include_router(MONITORING_ROUTER)
+    if settings.s3_presigned_urls_enabled:
+        app.include_router(PRESIGNED_ROUTER)
 
     app.add_exception_handler(exc_class_or_status_code=RequestValidationError, handler=handle_pydantic_validation_errors)
+    app.add_exception_handler(exc_class_or_status_code=S3UnavailableError, handler=handle_s3_unavailable)
 
     app.middleware("http")(handle_broad_exceptions)
 
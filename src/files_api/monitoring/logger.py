@@ -1,6 +1,7 @@
 import json
 import sys
 import traceback
+from typing import Optional
 
 import loguru
 from fastapi import (
@@ -58,10 +59,12 @@ def log_request_info(request: Request):
     }
     logger.debug("Request received", http_request=request_info)
 
-def log_response_info(response: Response):
+def log_response_info(response: Response, duration_ms: Optional[float] = None):
     """Log the response info."""
     response_info = {
         "status_code": response.status_code,
         "headers": dict(response.headers.items()),
     }
+    if duration_ms is not None:
+        response_info["duration_ms"] = round(duration_ms, 2)
     logger.debug("Response sent", http_response=response_info)
\ No newline at end of file
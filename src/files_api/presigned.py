@@ -0,0 +1,302 @@
+"""Let clients transfer files straight with S3, using presigned URLs, while the API keeps its metadata consistent."""
+
+import math
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+from typing import Optional
+
+import botocore.exceptions as boto_exceptions
+from fastapi import (
+    HTTPException,
+    Request,
+    status,
+)
+from fastapi.responses import RedirectResponse
+from loguru import logger
+
+from files_api.coalescing import fetch_file_metadata
+from files_api.content_addressing import (
+    link_file_to_blob,
+    resolve_file_location,
+)
+from files_api.lambda_responses import exceeds_lambda_response_limit
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import KeyIndex
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.presigned_urls import (
+    generate_presigned_download_url,
+    generate_presigned_part_urls,
+    generate_presigned_upload_url,
+)
+from files_api.s3.read_objects import (
+    fetch_s3_object_metadata,
+    is_not_found_error,
+)
+from files_api.s3.write_objects import (
+    abort_multipart_upload,
+    complete_multipart_upload,
+    create_multipart_upload,
+)
+from files_api.schemas import (
+    AbortPresignedUploadRequest,
+    CompletePresignedUploadRequest,
+    FileMetadata,
+    PresignedDownloadResponse,
+    PresignedPartUrl,
+    PresignedUploadRequest,
+    PresignedUploadResponse,
+)
+from files_api.settings import Settings
+
+# the most parts S3 accepts in a multipart upload
+S3_MAX_PARTS = 10_000
+# errors of CompleteMultipartUpload caused by the parts the client sent
+INVALID_COMPLETION_ERROR_CODES = ("InvalidPart", "InvalidPartOrder", "EntityTooSmall", "MalformedXML")
+NO_SUCH_UPLOAD_ERROR_CODE = "NoSuchUpload"
+
+
+async def create_presigned_upload(request: Request, body: PresignedUploadRequest) -> PresignedUploadResponse:
+    """
+    Presign the upload of a file: a single PUT up to `s3_multipart_threshold_bytes`, a multipart upload above.
+
+    Parts are `s3_multipart_part_size_bytes`, or larger if the file would otherwise need over 10,000 parts.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client and executor.
+    :param body: The file to upload.
+
+    :return: The URLs to PUT the file or its parts to. With content-addressed storage, a file whose `sha256`
+        is already stored is created at once and gets no URL.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    expires_in = settings.s3_presigned_url_expiration_seconds
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+    content_type = body.content_type or "application/octet-stream"
+
+    if settings.s3_blob_bucket_name is not None and body.sha256 is not None:
+        if await link_file_to_blob(request, body.file_path, body.sha256, content_type) is not None:
+            key_index: Optional[KeyIndex] = request.app.state.key_index
+            if key_index is not None:
+                await s3_executor.run(key_index.refresh_key, body.file_path, s3_client=s3_client)
+            logger.info("created {file_path} from stored content", file_path=body.file_path)
+            return PresignedUploadResponse(
+                file_path=body.file_path,
+                url=None,
+                upload_id=None,
+                parts=[],
+                headers={},
+                expires_at=expires_at,
+                deduplicated=True,
+            )
+
+    if body.size_bytes <= settings.s3_multipart_threshold_bytes:
+        url = generate_presigned_upload_url(
+            bucket_name=settings.s3_bucket_name,
+            object_key=body.file_path,
+            expires_in_seconds=expires_in,
+            content_type=content_type,
+            s3_client=s3_client,
+        )
+        return PresignedUploadResponse(
+            file_path=body.file_path,
+            url=url,
+            upload_id=None,
+            parts=[],
+            headers={"Content-Type": content_type},
+            expires_at=expires_at,
+        )
+
+    part_size = max(settings.s3_multipart_part_size_bytes, math.ceil(body.size_bytes / S3_MAX_PARTS))
+    num_parts = math.ceil(body.size_bytes / part_size)
+    upload_id = await s3_executor.run(
+        create_multipart_upload,
+        bucket_name=settings.s3_bucket_name,
+        object_key=body.file_path,
+        content_type=content_type,
+        s3_client=s3_client,
+    )
+    part_urls = generate_presigned_part_urls(
+        bucket_name=settings.s3_bucket_name,
+        object_key=body.file_path,
+        upload_id=upload_id,
+        num_parts=num_parts,
+        expires_in_seconds=expires_in,
+        s3_client=s3_client,
+    )
+    logger.info(
+        "presigned {num_parts} parts of {file_path}, upload {upload_id}",
+        num_parts=num_parts,
+        file_path=body.file_path,
+        upload_id=upload_id,
+    )
+    return PresignedUploadResponse(
+        file_path=body.file_path,
+        url=None,
+        upload_id=upload_id,
+        parts=[
+            PresignedPartUrl(
+                part_number=part_number,
+                url=url,
+                first_byte=(part_number - 1) * part_size,
+                size_bytes=min(part_size, body.size_bytes - (part_number - 1) * part_size),
+            )
+            for part_number, url in enumerate(part_urls, start=1)
+        ],
+        headers={},
+        expires_at=expires_at,
+    )
+
+
+async def complete_presigned_upload(request: Request, body: CompletePresignedUploadRequest) -> FileMetadata:
+    """
+    Finish an upload made with presigned URLs, and refresh the metadata cache and key index with the new file.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param body: The upload, and for a multipart upload, its parts.
+
+    :return: Metadata of the uploaded file.
+
+    :raises HTTPException: 400 if S3 rejects the parts, 404 if the upload or the uploaded file does not exist.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+
+    if body.upload_id is not None:
+        try:
+            await s3_executor.run(
+                complete_multipart_upload,
+                bucket_name=settings.s3_bucket_name,
+                object_key=body.file_path,
+                upload_id=body.upload_id,
+                parts=[
+                    {"PartNumber": part.part_number, "ETag": part.etag}
+                    for part in sorted(body.parts, key=lambda part: part.part_number)
+                ],
+                s3_client=s3_client,
+                metadata_cache=metadata_cache,
+            )
+        except boto_exceptions.ClientError as err:
+            raise _upload_error(err, body.upload_id) from err
+    else:
+        # the client wrote the object behind the API's back, so whatever was cached about the path is stale
+        metadata_cache.invalidate(settings.s3_bucket_name, body.file_path)
+
+    obj = await s3_executor.run(
+        fetch_s3_object_metadata,
+        bucket_name=settings.s3_bucket_name,
+        object_key=body.file_path,
+        s3_client=s3_client,
+        metadata_cache=metadata_cache,
+    )
+    if obj is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {body.file_path}")
+    if key_index is not None:
+        await s3_executor.run(
+            key_index.upsert, body.file_path, size=obj["ContentLength"], last_modified=obj["LastModified"]
+        )
+
+    logger.info("completed presigned upload of {file_path}", file_path=body.file_path)
+    return FileMetadata(file_path=body.file_path, last_modified=obj["LastModified"], size_bytes=obj["ContentLength"])
+
+
+async def abort_presigned_upload(request: Request, body: AbortPresignedUploadRequest) -> None:
+    """
+    Discard a multipart upload made with presigned URLs, and the parts uploaded so far.
+
+    :raises HTTPException: 404 if the upload does not exist.
+    """
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    try:
+        await s3_executor.run(
+            abort_multipart_upload,
+            bucket_name=settings.s3_bucket_name,
+            object_key=body.file_path,
+            upload_id=body.upload_id,
+            s3_client=request.app.state.s3_client,
+        )
+    except boto_exceptions.ClientError as err:
+        raise _upload_error(err, body.upload_id) from err
+
+
+async def create_presigned_download(request: Request, file_path: str) -> PresignedDownloadResponse:
+    """
+    Presign the download of a file.
+
+    :raises HTTPException: 404 if the file does not exist.
+    """
+    settings: Settings = request.app.state.settings
+
+    # a URL to a missing file would only fail later, at S3
+    location = await resolve_file_location(request, file_path)
+    obj = None
+    if location is not None:
+        obj = await fetch_file_metadata(request, location.bucket_name, location.object_key)
+    if obj is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
+    return PresignedDownloadResponse(
+        file_path=file_path,
+        url=presigned_download_url(
+            request, location.object_key, bucket_name=location.bucket_name, content_type=location.content_type
+        ),
+        size_bytes=obj["ContentLength"],
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.s3_presigned_url_expiration_seconds),
+    )
+
+
+def presigned_download_url(
+    request: Request, file_path: str, bucket_name: Optional[str] = None, content_type: Optional[str] = None
+) -> str:
+    """
+    Presign a GET of a file, or of any object with `bucket_name`, which is a local computation.
+
+    A `content_type` is sent by S3 instead of the object's, as for blobs served under a pointer's type.
+    """
+    settings: Settings = request.app.state.settings
+    return generate_presigned_download_url(
+        bucket_name=bucket_name or settings.s3_bucket_name,
+        object_key=file_path,
+        expires_in_seconds=settings.s3_presigned_url_expiration_seconds,
+        s3_client=request.app.state.s3_client,
+        content_type=content_type,
+    )
+
+
+def should_redirect_download(request: Request, file_size: int) -> bool:
+    """
+    Check whether a whole-file GET is large enough to be redirected to S3 instead of streamed.
+
+    That is above `s3_presigned_download_redirect_threshold_bytes`, or too large to be returned from Lambda.
+    """
+    settings: Settings = request.app.state.settings
+    threshold = settings.s3_presigned_download_redirect_threshold_bytes
+    return (threshold is not None and file_size > threshold) or exceeds_lambda_response_limit(settings, file_size)
+
+
+def download_redirect_response(
+    request: Request, file_path: str, bucket_name: Optional[str] = None, content_type: Optional[str] = None
+) -> RedirectResponse:
+    """Redirect a GET to a presigned URL of the file. 307 keeps the method and headers, `Range` included."""
+    logger.debug("redirecting the download of {file_path} to S3", file_path=file_path)
+    return RedirectResponse(
+        url=presigned_download_url(request, file_path, bucket_name=bucket_name, content_type=content_type),
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+def _upload_error(err: boto_exceptions.ClientError, upload_id: str) -> Exception:
+    """Translate S3's errors about a multipart upload that the client can act on into HTTP errors."""
+    code = err.response["Error"]["Code"]
+    if code == NO_SUCH_UPLOAD_ERROR_CODE or is_not_found_error(err):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Upload not found: {upload_id}")
+    if code in INVALID_COMPLETION_ERROR_CODES:
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err.response["Error"]["Message"])
+    return err
@@ -1,3 +1,4 @@
+import time
 from typing import Callable
 
 from fastapi import (
@@ -32,8 +33,13 @@ class RouteHandler(APIRoute):
             # But we must do logger.configure() because of our handle_broad_exceptions middleware losing context
             logger.configure(extra={"http": request_context})
             log_request_info(request)
+            start_time = time.perf_counter()
             response: Response = await original_route_handler(request)
-            log_response_info(response)
+            duration_ms = (time.perf_counter() - start_time) * 1000
+
+            # expose handler latency to clients and load tests, e.g. Locust or browser dev tools
+            response.headers["Server-Timing"] = f"app;dur={duration_ms:.2f}"
+            log_response_info(response, duration_ms=duration_ms)
 
             return response
 
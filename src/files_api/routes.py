@@ -1,12 +1,20 @@
 """Define API routes."""
 
-from typing import Annotated
+from typing import (
+    Annotated,
+    Any,
+    Dict,
+    Optional,
+    Union,
+)
 
 from fastapi import (
     APIRouter,
     Depends,
+    Header,
     HTTPException,
     Path,
+    Query,
     Request,
     Response,
     UploadFile,
@@ -15,30 +23,79 @@ from fastapi import (
 from fastapi.responses import StreamingResponse
 from loguru import logger
 
+from files_api.archives import ArchiveFormat
+from files_api.bulk_delete import (
+    NDJSON_MEDIA_TYPE,
+    stream_bulk_delete,
+)
+from files_api.coalescing import fetch_file_metadata
+from files_api.compression import content_encoding_for_upload
+from files_api.content_addressing import (
+    resolve_file_location,
+    store_content_as_blob,
+)
+from files_api.copies import stream_copy
+from files_api.directory_downloads import stream_directory_archive
+from files_api.downloads import (
+    Preconditions,
+    file_validator_headers,
+    not_modified_response,
+    representation_headers,
+    stream_file,
+)
 from files_api.genai.create_audio import create_audio_file
 from files_api.genai.create_image import create_image_file
 from files_api.genai.create_text import create_text_file
-from files_api.s3.delete_objects import delete_s3_object
-from files_api.s3.read_objects import (
-    fetch_s3_object,
-    fetch_s3_objects_metadata,
-    fetch_s3_objects_using_page_token,
-    object_exists_in_s3,
+from files_api.listing import list_files_page
+from files_api.presigned import (
+    abort_presigned_upload,
+    complete_presigned_upload,
+    create_presigned_download,
+    create_presigned_upload,
 )
+from files_api.route_handler import RouteHandler
+from files_api.s3.delete_objects import delete_s3_object
+from files_api.s3.disk_cache import ObjectDiskCache
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import KeyIndex
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.read_objects import object_exists_in_s3
+from files_api.s3.resilience import CircuitBreaker
+from files_api.s3.single_flight import SingleFlight
 from files_api.s3.write_objects import upload_s3_object
 from files_api.schemas import (
     PUT_FILE_EXAMPLES,
+    AbortPresignedUploadRequest,
+    BatchUploadResponse,
+    BulkDeleteRequest,
+    CircuitBreakerStats,
+    CompletePresignedUploadRequest,
+    CopyFilesRequest,
+    DiskCacheStats,
     FileMetadata,
     GenerateFilesQueryParams,
     GetFilesQueryParams,
     GetFilesResponse,
+    GetMetricsResponse,
+    MetadataCacheStats,
+    PresignedDownloadResponse,
+    PresignedUploadRequest,
+    PresignedUploadResponse,
     PutFileResponse,
+    SingleFlightStats,
+)
+from files_api.uploads import (
+    batch_upload,
+    upload_file_from_stream,
 )
-from files_api.settings import Settings
 from files_api.utils import object_exists_response
 
-ROUTER = APIRouter(tags=["Files"])
-GENERATE_ROUTER = APIRouter(tags=["Generate Files"])
+# routes keep the class of the router they were declared on, so the custom class is set here
+ROUTER = APIRouter(tags=["Files"], route_class=RouteHandler)
+GENERATE_ROUTER = APIRouter(tags=["Generate Files"], route_class=RouteHandler)
+MONITORING_ROUTER = APIRouter(tags=["Monitoring"], route_class=RouteHandler)
+# only included when presigned URLs are enabled
+PRESIGNED_ROUTER = APIRouter(tags=["Presigned URLs"], route_class=RouteHandler)
 
 ##################
 # --- Routes --- #
@@ -54,21 +111,9 @@ GENERATE_ROUTER = APIRouter(tags=["Generate Files"])
 )
 async def upload_file(request: Request, file_path: str, file: UploadFile, response: Response) -> PutFileResponse:
     """Upload a file."""
-    settings = request.app.state.settings
-    s3_bucket_name = settings.s3_bucket_name
-
-    file_contents: bytes = await file.read()
-
-    response_message, status_code = object_exists_response(s3_bucket_name, file_path)
-    response.status_code = status_code
-
-    logger.debug("trying to upload file to s3: {file_path}", file_path=file_path)
-    upload_s3_object(
-        bucket_name=s3_bucket_name, object_key=file_path, file_content=file_contents, content_type=file.content_type
+    response_message, response.status_code = await upload_file_from_stream(
+        request, file_path, read=file.read, content_type=file.content_type
     )
-
-    logger.info(response_message)
-
     return PutFileResponse(file_path=file_path, message=response_message)
 
 
@@ -77,31 +122,37 @@ async def list_files(
     request: Request,
     query_params: GetFilesQueryParams = Depends(),
 ) -> GetFilesResponse:
-    """List files with pagination."""
-    settings = request.app.state.settings
-    s3_bucket_name = settings.s3_bucket_name
-    if query_params.page_token:
-        logger.debug("fetching objects metadata using a page_token")
-        obj_page = fetch_s3_objects_using_page_token(
-            bucket_name=s3_bucket_name, continuation_token=query_params.page_token, max_keys=query_params.page_size
-        )
-    elif query_params.directory:
-        logger.debug("fetching objects metadata from a specific directory")
-        obj_page = fetch_s3_objects_metadata(
-            bucket_name=s3_bucket_name, prefix=query_params.directory, max_keys=query_params.page_size
-        )
-    else:
-        logger.debug("fetching objects metadata")
-        obj_page = fetch_s3_objects_metadata(bucket_name=s3_bucket_name, max_keys=query_params.page_size)
-
-    logger.info("fetched {num_objects} objects metadata. Has next page: {has_next_page}", num_objects=len(obj_page[0]), has_next_page=obj_page[1] is not None)
-    return GetFilesResponse(
-        files=[
-            FileMetadata(file_path=file["Key"], last_modified=file["LastModified"], size_bytes=file["Size"])
-            for file in obj_page[0]
-        ],
-        next_page_token=obj_page[1],
-    )
+    """List files with pagination, at every depth under a directory or, in browse mode, one level of it."""
+    return await list_files_page(request, query_params)
+
+
+# declared before `get_file`, whose path would otherwise match first
+@ROUTER.get(
+    "/v1/files/archive",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "The files, as an archive built while it is sent.",
+            "content": {
+                "application/zip": {"schema": {"type": "string", "format": "binary"}},
+                "application/x-tar": {"schema": {"type": "string", "format": "binary"}},
+            },
+        },
+        status.HTTP_404_NOT_FOUND: {"description": "No file starts with `directory`."},
+    },
+)
+async def download_directory(
+    request: Request,
+    directory: str = Query(description="Archive every file whose path starts with this prefix."),
+    archive_format: ArchiveFormat = Query(default="zip", alias="format", description="Format of the archive."),
+) -> StreamingResponse:
+    """
+    Download every file in a directory as one zip or tar archive.
+
+    Files are listed and fetched ahead while earlier ones are sent, and the archive is built on the fly,
+    so neither a whole file nor the whole archive is ever held in memory.
+    """
+    return await stream_directory_archive(request, directory, archive_format)
 
 
 @ROUTER.head(
@@ -124,35 +175,62 @@ async def list_files(
                     "example": "Thu, 01 Jan 2022 00:00:00 GMT",
                     "schema": {"type": "string", "format": "date-time"},
                 },
+                "ETag": {
+                    "description": "The entity tag of the file, to send back in `If-None-Match`.",
+                    "example": '"5d41402abc4b2a76b9719d911017c592"',
+                    "schema": {"type": "string"},
+                },
+                "Accept-Ranges": {
+                    "description": "`bytes` if GET accepts a `Range` header, `none` if the file is decompressed.",
+                    "example": "bytes",
+                    "schema": {"type": "string"},
+                },
+                "Content-Encoding": {
+                    "description": "How the file is stored compressed, if the client's `Accept-Encoding` allows it.",
+                    "example": "gzip",
+                    "schema": {"type": "string"},
+                },
             }
         },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The file matches the `If-None-Match` or `If-Modified-Since` header.",
+        },
         status.HTTP_404_NOT_FOUND: {
             "description": "File not found for the given `file_path`.",
         },
     },
 )
-async def get_file_metadata(request: Request, file_path: str, response: Response) -> Response:
+async def get_file_metadata(
+    request: Request,
+    file_path: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+    if_modified_since: Optional[str] = Header(default=None, alias="If-Modified-Since"),
+    accept_encoding: Optional[str] = Header(default=None, alias="Accept-Encoding"),
+) -> Response:
     """
     Retrieve file metadata.
 
     Note: by convention, HEAD requests MUST NOT return a body in the response.
     """
-    settings = request.app.state.settings
-    s3_bucket_name = settings.s3_bucket_name
-
-    object_exists = object_exists_in_s3(bucket_name=settings.s3_bucket_name, object_key=file_path)
-    logger.debug("get_file_metadata object_exists: {obj_exists}", obj_exists=object_exists)
-    if not object_exists:
+    # at most a single HEAD request to S3, none for recently seen keys: the object body is never downloaded.
+    # a file stored as a pointer to a blob takes a second one, to the blob
+    location = await resolve_file_location(request, file_path)
+    obj = None
+    if location is not None:
+        obj = await fetch_file_metadata(request, location.bucket_name, location.object_key)
+    logger.debug("get_file_metadata object_exists: {obj_exists}", obj_exists=obj is not None)
+    if obj is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
-
-    obj = fetch_s3_object(bucket_name=s3_bucket_name, object_key=file_path)
+    if Preconditions(if_none_match=if_none_match, if_modified_since=if_modified_since).is_not_modified(obj):
+        return not_modified_response(file_validator_headers(obj))
 
     response.status_code = status.HTTP_200_OK
-    response.headers["Content-Type"] = obj["ContentType"]
-    response.headers["Content-Length"] = str(obj["ContentLength"])
-    response.headers["Last-Modified"] = str(obj["LastModified"])
+    response.headers["Content-Type"] = location.content_type or obj["ContentType"]
+    # the headers a GET with the same `Accept-Encoding` would return
+    response.headers.update(representation_headers(obj, accept_encoding))
 
-    logger.info("returning object metadata with type {content_type} and length {content_length}", content_type=response.headers["Content-Type"], content_length=response.headers["Content-Length"])
+    logger.info("returning object metadata with type {content_type} and length {content_length}", content_type=response.headers["Content-Type"], content_length=response.headers.get("Content-Length"))
     return response
 
 
@@ -171,12 +249,57 @@ async def get_file_metadata(request: Request, file_path: str, response: Response
                 },
             },
         },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The file matches the `If-None-Match` or `If-Modified-Since` header, so no body is sent.",
+        },
+        status.HTTP_206_PARTIAL_CONTENT: {
+            "description": (
+                "The requested byte range of the file, or a `multipart/byteranges` body if several were requested."
+            ),
+            "headers": {
+                "Content-Range": {
+                    "description": "The range of the file that was returned, for a single range.",
+                    "example": "bytes 0-499/1024",
+                    "schema": {"type": "string"},
+                },
+            },
+        },
+        status.HTTP_307_TEMPORARY_REDIRECT: {
+            "description": "The file is large enough to be downloaded straight from S3, at the presigned URL in "
+            "`Location`. Only sent if a redirect threshold is configured.",
+        },
+        status.HTTP_416_RANGE_NOT_SATISFIABLE: {
+            "description": "None of the requested byte ranges overlap the file.",
+            "headers": {
+                "Content-Range": {
+                    "description": "The size of the file.",
+                    "example": "bytes */1024",
+                    "schema": {"type": "string"},
+                },
+            },
+        },
     },
 )
 async def get_file(
     request: Request,
     file_path: str = Path(pattern=r"^([\w\d\s\-.]+/)*([\w\d\s\-.])+\.\w+$"),
-) -> StreamingResponse:
+    range_header: Optional[str] = Header(
+        default=None,
+        alias="Range",
+        description='Byte ranges to download, e.g. "bytes=0-499", "bytes=-500" or "bytes=0-99,200-299".',
+    ),
+    if_none_match: Optional[str] = Header(
+        default=None, alias="If-None-Match", description="ETag(s) of the copy the client already has."
+    ),
+    if_modified_since: Optional[str] = Header(
+        default=None, alias="If-Modified-Since", description="Ignored when `If-None-Match` is sent."
+    ),
+    accept_encoding: Optional[str] = Header(
+        default=None,
+        alias="Accept-Encoding",
+        description="Encodings the client decodes. Files stored compressed are decompressed for other clients.",
+    ),
+) -> Response:
     """Retrieve a file."""
     # 1 - Business logic: errors that the user can fix
     # error case: object does not exist in the bucket
@@ -185,17 +308,17 @@ async def get_file(
     # 2 - errors that the user cannot fix
     # error case: not authenticated/authorized to make calls to AWS
     # error case: the bucket does not exist
-    settings: Settings = request.app.state.settings
-
-    object_exists = object_exists_in_s3(bucket_name=settings.s3_bucket_name, object_key=file_path)
-    logger.debug("get_file object_exists: {obj_exists}", obj_exists=object_exists)
-    if not object_exists:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
 
-    settings = request.app.state.settings
-    s3_bucket_name = settings.s3_bucket_name
-    obj_response = fetch_s3_object(bucket_name=s3_bucket_name, object_key=file_path)
-    return StreamingResponse(content=obj_response["Body"], media_type=obj_response["ContentType"])
+    # a valid Range header gets a 206 with just those bytes; an invalid one is ignored, per RFC 9110.
+    # a client whose copy is current gets a 304, evaluated by S3 where possible so no body is sent
+    return await stream_file(
+        request,
+        file_path,
+        range_header=range_header,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+        accept_encoding=accept_encoding,
+    )
 
 
 @ROUTER.delete(
@@ -216,18 +339,128 @@ async def delete_file(
     NOTE: DELETE requests MUST NOT return a body in the response.
     """
     settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    key_index: Optional[KeyIndex] = request.app.state.key_index
     s3_bucket_name = settings.s3_bucket_name
 
-    object_exists = object_exists_in_s3(bucket_name=s3_bucket_name, object_key=file_path)
+    # S3's DeleteObject succeeds whether or not the key exists, so a cheap HEAD is the only way to report a 404,
+    # unless the key index is fresh enough to tell
+    object_exists = await s3_executor.run(key_index.contains, file_path) if key_index is not None else None
+    if object_exists is None:
+        object_exists = await s3_executor.run(
+            object_exists_in_s3,
+            bucket_name=s3_bucket_name,
+            object_key=file_path,
+            s3_client=s3_client,
+            metadata_cache=metadata_cache,
+        )
     logger.debug("delete_file object_exists: {obj_exists}", obj_exists=object_exists)
     if not object_exists:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
 
-    delete_s3_object(bucket_name=s3_bucket_name, object_key=file_path)
+    await s3_executor.run(
+        delete_s3_object,
+        bucket_name=s3_bucket_name,
+        object_key=file_path,
+        s3_client=s3_client,
+        metadata_cache=metadata_cache,
+    )
+    if key_index is not None:
+        await s3_executor.run(key_index.remove, file_path)
 
     response.status_code = status.HTTP_204_NO_CONTENT
     return response
 
+@ROUTER.post(
+    "/v1/files/bulk-delete",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": (
+                "One `BulkDeleteBatchResult` JSON object per line as each batch of up to 1000 files is deleted, "
+                "then a `BulkDeleteSummary` line."
+            ),
+            "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}},
+        },
+    },
+)
+async def bulk_delete_files(request: Request, body: BulkDeleteRequest) -> StreamingResponse:
+    """
+    Delete many files at once, by path or by directory.
+
+    Files are deleted in batches of up to 1000 with several batches in flight, and directories are listed
+    while earlier batches are deleted. Results stream back per batch, so large deletions report progress.
+    """
+    return await stream_bulk_delete(request, body)
+
+
+COPY_RESPONSES: Dict[Union[int, str], Dict[str, Any]] = {
+    status.HTTP_200_OK: {
+        "description": "One `CopyBatchResult` JSON object per line as each page of up to 1000 files is done, "
+        "then a `CopySummary` line.",
+        "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}},
+    },
+    status.HTTP_404_NOT_FOUND: {"description": "No file at `source`, or with `recursive`, under it."},
+}
+
+
+@ROUTER.post("/v1/files/copy", response_class=StreamingResponse, responses=COPY_RESPONSES)
+async def copy_files(request: Request, body: CopyFilesRequest) -> StreamingResponse:
+    """
+    Copy a file, or every file under a prefix, without the bytes passing through the API.
+
+    S3 copies each file itself, several at once, and results stream back per page of files.
+    """
+    return await stream_copy(request, body)
+
+
+@ROUTER.post("/v1/files/move", response_class=StreamingResponse, responses=COPY_RESPONSES)
+async def move_files(request: Request, body: CopyFilesRequest) -> StreamingResponse:
+    """
+    Move a file, or every file under a prefix, without the bytes passing through the API.
+
+    Files are copied like `POST /v1/files/copy`, then the originals that were copied are deleted in batches.
+    """
+    return await stream_copy(request, body, move=True)
+
+
+@ROUTER.post(
+    "/v1/files/batch-upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "A multipart form of files named after their paths, or a tar (optionally compressed) "
+            "or zip archive whose entries are named after their paths.",
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                    }
+                },
+                "application/x-tar": {"schema": {"type": "string", "format": "binary"}},
+                "application/gzip": {"schema": {"type": "string", "format": "binary"}},
+                "application/zip": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+    responses={status.HTTP_415_UNSUPPORTED_MEDIA_TYPE: {"description": "The body is not a form or an archive."}},
+)
+async def batch_upload_files(
+    request: Request,
+    directory: str = Query(default="", description="Directory to upload every file into."),
+) -> BatchUploadResponse:
+    """
+    Upload many files in one request, from a multipart form or a tar or zip archive.
+
+    Archives are unpacked as they arrive rather than spooled, and files are uploaded with several in flight.
+    Each file is reported as created, updated or failed; a failed file does not stop the others.
+    """
+    return await batch_upload(request, directory)
+
+
 @GENERATE_ROUTER.post(
     "/v1/files/generate/{file_type:str}/{file_path:path}",
     responses={status.HTTP_201_CREATED: {"model": PutFileResponse, **PUT_FILE_EXAMPLES['201']},},
@@ -236,9 +469,20 @@ async def create_file(request: Request, prompt: str, response: Response, query_p
     """Create a file."""
     print("You are here!")
     settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    key_index: Optional[KeyIndex] = request.app.state.key_index
     s3_bucket_name = settings.s3_bucket_name
 
-    response_message, response.status_code = object_exists_response(s3_bucket_name, query_params.file_path)
+    response_message, response.status_code = await s3_executor.run(
+        object_exists_response,
+        s3_bucket_name,
+        query_params.file_path,
+        s3_client=s3_client,
+        metadata_cache=metadata_cache,
+        key_index=key_index,
+    )
 
 
     logger.debug("create_file file_type: {file_type}", file_type=query_params.file_type)
@@ -257,12 +501,89 @@ async def create_file(request: Request, prompt: str, response: Response, query_p
     if file_contents:
         response.status_code = status.HTTP_201_CREATED
 
-        upload_s3_object(
-            bucket_name=s3_bucket_name, object_key=query_params.file_path, file_content=file_contents, content_type=content_type
-        )
+        if settings.s3_blob_bucket_name is not None:
+            # regenerated files often repeat earlier content, which is then stored once
+            await store_content_as_blob(request, query_params.file_path, file_contents, content_type)
+        else:
+            await s3_executor.run(
+                upload_s3_object,
+                bucket_name=s3_bucket_name,
+                object_key=query_params.file_path,
+                file_content=file_contents,
+                content_type=content_type,
+                s3_client=s3_client,
+                metadata_cache=metadata_cache,
+                content_encoding=content_encoding_for_upload(settings, content_type),
+                compression_level=settings.s3_compression_level,
+            )
+        if key_index is not None:
+            await s3_executor.run(key_index.refresh_key, query_params.file_path, s3_client=s3_client)
 
         logger.info("file created and uploaded to s3 at {obj_key}", obj_key=query_params.file_path)
         return PutFileResponse(file_path=query_params.file_path, message=response_message)
     else:
         logger.error("failed to create file of type {obj_type} at {obj_key}", obj_type=query_params.file_type, obj_key=query_params.file_path)
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@MONITORING_ROUTER.get("/v1/metrics")
+async def get_metrics(request: Request) -> GetMetricsResponse:
+    """Report the runtime counters of the worker process that handles the request."""
+    metadata_cache: ObjectMetadataCache = request.app.state.metadata_cache
+    disk_cache: Optional[ObjectDiskCache] = request.app.state.disk_cache
+    metadata_single_flight: Optional[SingleFlight] = request.app.state.metadata_single_flight
+    download_single_flight: Optional[SingleFlight] = request.app.state.download_single_flight
+    circuit_breaker: Optional[CircuitBreaker] = request.app.state.s3_circuit_breaker
+    return GetMetricsResponse(
+        metadata_cache=MetadataCacheStats(**metadata_cache.stats()),
+        disk_cache=DiskCacheStats(**disk_cache.stats()) if disk_cache is not None else None,
+        metadata_single_flight=(
+            SingleFlightStats(**metadata_single_flight.stats()) if metadata_single_flight is not None else None
+        ),
+        download_single_flight=(
+            SingleFlightStats(**download_single_flight.stats()) if download_single_flight is not None else None
+        ),
+        s3_circuit_breaker=CircuitBreakerStats(**circuit_breaker.stats()) if circuit_breaker is not None else None,
+    )
+
+
+@PRESIGNED_ROUTER.post("/v1/presigned/upload")
+async def presign_upload(request: Request, body: PresignedUploadRequest) -> PresignedUploadResponse:
+    """
+    Get presigned URLs to upload a file straight to S3, as a single PUT or, for large files, in parts.
+
+    Call `POST /v1/presigned/upload/complete` once the file or every part is uploaded.
+    """
+    return await create_presigned_upload(request, body)
+
+
+@PRESIGNED_ROUTER.post(
+    "/v1/presigned/upload/complete",
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "S3 rejected the parts of the multipart upload."},
+        status.HTTP_404_NOT_FOUND: {"description": "The upload, or the uploaded file, does not exist."},
+    },
+)
+async def complete_upload(request: Request, body: CompletePresignedUploadRequest) -> FileMetadata:
+    """Finish an upload made with presigned URLs, so the file shows up in the API at once."""
+    return await complete_presigned_upload(request, body)
+
+
+@PRESIGNED_ROUTER.post(
+    "/v1/presigned/upload/abort",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={status.HTTP_404_NOT_FOUND: {"description": "The multipart upload does not exist."}},
+)
+async def abort_upload(request: Request, body: AbortPresignedUploadRequest) -> Response:
+    """Abandon a multipart upload made with presigned URLs, so S3 discards its parts."""
+    await abort_presigned_upload(request, body)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@PRESIGNED_ROUTER.get(
+    "/v1/presigned/download/{file_path:path}",
+    responses={status.HTTP_404_NOT_FOUND: {"description": "File not found for the given `file_path`."}},
+)
+async def presign_download(request: Request, file_path: str) -> PresignedDownloadResponse:
+    """Get a presigned URL to download a file straight from S3."""
+    return await create_presigned_download(request, file_path)
@@ -0,0 +1,202 @@
+"""Store file contents once per SHA-256 digest, with files becoming pointers to them, and collect orphaned blobs."""
+
+import asyncio
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+from typing import (
+    Any,
+    List,
+    Mapping,
+    Optional,
+    Set,
+)
+
+import boto3
+from loguru import logger
+
+from files_api.s3.delete_objects import (
+    MAX_KEYS_PER_DELETE,
+    delete_s3_objects,
+)
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.read_objects import (
+    fetch_s3_object_metadata,
+    iter_s3_object_pages,
+)
+from files_api.s3.write_objects import replace_s3_object_metadata
+
+try:
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import HeadObjectOutputTypeDef
+except ImportError:
+    ...
+
+# blobs live under "sha256/" in the blob bucket
+BLOB_KEY_PREFIX = "sha256/"
+# user metadata of pointers, which are empty objects at the file's path
+POINTER_SHA256_METADATA_KEY = "blob-sha256"
+POINTER_SIZE_METADATA_KEY = "blob-size"
+
+
+def blob_key_for_digest(sha256: str) -> str:
+    """Key of the blob holding the content with this hex SHA-256 digest, spread over 256 prefixes."""
+    return f"{BLOB_KEY_PREFIX}{sha256[:2]}/{sha256}"
+
+
+def get_pointer_digest(obj: Mapping[str, Any]) -> Optional[str]:
+    """
+    Get the digest of the content a file points to.
+
+    :param obj: Response of `head_object` or `get_object` for the file.
+
+    :return: The hex SHA-256 digest, or None if the file is stored as is rather than as a pointer.
+    """
+    return obj.get("Metadata", {}).get(POINTER_SHA256_METADATA_KEY)
+
+
+def get_pointer_size(obj: Mapping[str, Any]) -> int:
+    """Get the size of a file's content, whether it is stored as is or as a pointer."""
+    size = obj.get("Metadata", {}).get(POINTER_SIZE_METADATA_KEY)
+    return int(size) if size is not None and size.isdigit() else obj["ContentLength"]
+
+
+def write_pointer(  # pylint: disable=too-many-arguments
+    bucket_name: str,
+    object_key: str,
+    sha256: str,
+    size: int,
+    content_type: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> None:
+    """
+    Point a file at a blob: an empty object holding the blob's digest and size in its metadata.
+
+    :param bucket_name: Name of the bucket of the files.
+    :param object_key: Path of the file.
+    :param sha256: Hex SHA-256 digest of the content.
+    :param size: Size of the content in bytes.
+    :param content_type: The MIME type of the file, which may differ from the blob's.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to invalidate the file's metadata in.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=object_key,
+        Body=b"",
+        ContentType=content_type or "application/octet-stream",
+        Metadata={POINTER_SHA256_METADATA_KEY: sha256, POINTER_SIZE_METADATA_KEY: str(size)},
+    )
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, object_key)
+
+
+def claim_blob(
+    blob_bucket_name: str, sha256: str, gc_grace_seconds: int, s3_client: Optional["S3Client"] = None
+) -> Optional["HeadObjectOutputTypeDef"]:
+    """
+    Check whether a blob exists, and keep it from being collected until a pointer to it is written.
+
+    A blob older than half the GC grace period is copied onto itself, whatever its size, which S3 does without
+    any data passing through the API, so it looks recent to a concurrent `collect_orphaned_blobs`.
+
+    :param blob_bucket_name: Name of the blob bucket.
+    :param sha256: Hex SHA-256 digest of the content.
+    :param gc_grace_seconds: Age below which `collect_orphaned_blobs` keeps unreferenced blobs.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Metadata of the blob if it exists, so its content need not be uploaded again, else None.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    blob_key = blob_key_for_digest(sha256)
+    obj = fetch_s3_object_metadata(blob_bucket_name, blob_key, s3_client=s3_client)
+    if obj is None:
+        return None
+    age = datetime.now(timezone.utc) - obj["LastModified"]
+    if age > timedelta(seconds=gc_grace_seconds / 2):
+        _touch_blob(blob_bucket_name, blob_key, obj, s3_client)
+    return obj
+
+
+def _touch_blob(blob_bucket_name: str, blob_key: str, obj: "HeadObjectOutputTypeDef", s3_client: "S3Client") -> None:
+    """Copy a blob onto itself, keeping its content type, encoding and metadata, so it is last modified now."""
+    replace_s3_object_metadata(
+        blob_bucket_name,
+        blob_key,
+        obj["ContentLength"],
+        obj["ETag"],
+        obj["ContentType"],
+        obj.get("Metadata", {}),
+        content_encoding=obj.get("ContentEncoding") or None,
+        s3_client=s3_client,
+    )
+
+
+async def collect_orphaned_blobs(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    bucket_name: str,
+    blob_bucket_name: str,
+    gc_grace_seconds: int,
+    max_concurrency: int = 8,
+    s3_client: Optional["S3Client"] = None,
+) -> List[str]:
+    """
+    Delete the blobs no file points to, older than the grace period.
+
+    Marks by reading the metadata of every empty file, since only empty objects can be pointers, then sweeps
+    the blob bucket. The grace period covers uploads in flight: their blob is written before their pointer.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param bucket_name: Name of the bucket of the files.
+    :param blob_bucket_name: Name of the blob bucket.
+    :param gc_grace_seconds: Age below which blobs are kept even if no file points to them.
+    :param max_concurrency: Maximum number of `head_object` calls in flight while marking.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Keys of the deleted blobs.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_digest(key: str) -> Optional[str]:
+        async with slots:
+            obj = await s3_executor.run(fetch_s3_object_metadata, bucket_name, key, s3_client=s3_client)
+        return get_pointer_digest(obj) if obj is not None else None
+
+    referenced: Set[str] = set()
+    pages = iter_s3_object_pages(bucket_name, prefix="", s3_client=s3_client)
+    while (page := await s3_executor.run(next, pages, None)) is not None:
+        digests = await asyncio.gather(*(fetch_digest(obj["Key"]) for obj in page if obj["Size"] == 0))
+        referenced.update(blob_key_for_digest(digest) for digest in digests if digest is not None)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=gc_grace_seconds)
+    deleted: List[str] = []
+    pages = iter_s3_object_pages(blob_bucket_name, prefix=BLOB_KEY_PREFIX, s3_client=s3_client)
+    while (page := await s3_executor.run(next, pages, None)) is not None:
+        orphans = [obj["Key"] for obj in page if obj["Key"] not in referenced and obj["LastModified"] < cutoff]
+        deleted += await _delete_blobs(s3_executor, blob_bucket_name, orphans, s3_client)
+    logger.info(
+        "deleted {num_deleted} orphaned blobs, {num_referenced} referenced",
+        num_deleted=len(deleted),
+        num_referenced=len(referenced),
+    )
+    return deleted
+
+
+async def _delete_blobs(
+    s3_executor: S3Executor, blob_bucket_name: str, blob_keys: List[str], s3_client: Optional["S3Client"]
+) -> List[str]:
+    """Delete blobs in batches of up to `MAX_KEYS_PER_DELETE`, logging the ones S3 failed to delete."""
+    deleted: List[str] = []
+    for start in range(0, len(blob_keys), MAX_KEYS_PER_DELETE):
+        deleted_keys, errors = await s3_executor.run(
+            delete_s3_objects, blob_bucket_name, blob_keys[start : start + MAX_KEYS_PER_DELETE], s3_client=s3_client
+        )
+        deleted += deleted_keys
+        for error in errors:
+            logger.warning("failed to delete blob {key}: {message}", key=error["Key"], message=error["Message"])
+    return deleted
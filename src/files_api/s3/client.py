@@ -0,0 +1,39 @@
+"""Create the S3 client shared by every request handled by the app."""
+
+import boto3
+from botocore.config import Config
+
+from files_api.settings import Settings
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+
+def create_s3_client(settings: Settings) -> "S3Client":
+    """
+    Create a pooled S3 client configured from the app settings.
+
+    botocore clients are thread safe, so one client (and its connection pool) is created at startup
+    and reused by every request rather than paying for model loading, credential resolution and
+    TLS handshakes on each call.
+
+    :param settings: Settings holding the connection pool size, keep-alive, timeouts and retries.
+
+    :return: A configured S3 client.
+    """
+    config = Config(
+        max_pool_connections=settings.s3_max_pool_connections,
+        connect_timeout=settings.s3_connect_timeout_seconds,
+        read_timeout=settings.s3_read_timeout_seconds,
+        tcp_keepalive=settings.s3_tcp_keepalive,
+        retries={"mode": settings.s3_retry_mode, "total_max_attempts": settings.s3_max_attempts},
+        # whole-object downloads are verified against the SHA-256 recorded at upload as they stream, see
+        # files_api.checksums; botocore would only check the bytes of each call, which for ranged reads
+        # compares part of the body with the checksum of the whole object
+        response_checksum_validation="when_required",
+    )
+    # use a dedicated session: the default boto3 session is not safe to share across threads
+    session = boto3.session.Session()
+    return session.client("s3", config=config)
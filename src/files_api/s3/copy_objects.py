@@ -0,0 +1,202 @@
+"""Functions for copying objects within or across S3 buckets, without downloading them."""
+
+import asyncio
+from datetime import datetime
+from typing import (
+    List,
+    Optional,
+)
+
+import boto3
+from loguru import logger
+
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.s3.write_objects import (
+    abort_multipart_upload,
+    complete_multipart_upload,
+    create_multipart_upload,
+)
+
+try:
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import CompletedPartTypeDef
+except ImportError:
+    ...
+
+
+def copy_s3_object(
+    bucket_name: str,
+    source_key: str,
+    destination_key: str,
+    if_match: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    source_bucket_name: Optional[str] = None,
+) -> datetime:
+    """
+    Copy an object of up to 5 GiB within the bucket, metadata included. S3 copies the bytes itself.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param source_key: Key of the object to copy.
+    :param destination_key: Key of the copy. An existing object there is replaced.
+    :param if_match: Optional ETag the source must still have, so a concurrent overwrite fails the copy.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to invalidate the copy's metadata in.
+    :param source_bucket_name: Bucket of the object to copy, if not `bucket_name`.
+
+    :return: Last modification time of the copy.
+
+    :raises botocore.exceptions.ClientError: With code "NoSuchKey" if the source does not exist,
+        or "PreconditionFailed" if it no longer has the `if_match` ETag.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {"CopySourceIfMatch": if_match} if if_match is not None else {}
+    response = s3_client.copy_object(
+        Bucket=bucket_name,
+        Key=destination_key,
+        CopySource={"Bucket": source_bucket_name or bucket_name, "Key": source_key},
+        **params,
+    )
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, destination_key)
+    return response["CopyObjectResult"]["LastModified"]
+
+
+def upload_part_copy(  # pylint: disable=too-many-arguments
+    bucket_name: str,
+    source_key: str,
+    destination_key: str,
+    upload_id: str,
+    part_number: int,
+    first_byte: int,
+    last_byte: int,
+    if_match: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+    source_bucket_name: Optional[str] = None,
+) -> "CompletedPartTypeDef":
+    """
+    Copy a byte range of an object into one part of a multipart upload.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param source_key: Key of the object to copy from.
+    :param destination_key: Key the multipart upload writes to.
+    :param upload_id: ID returned by `create_multipart_upload`.
+    :param part_number: 1-based position of the part in the object.
+    :param first_byte: Offset of the first byte of the range.
+    :param last_byte: Offset of the last byte of the range, inclusive.
+    :param if_match: Optional ETag the source must still have.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param source_bucket_name: Bucket of the object to copy from, if not `bucket_name`.
+
+    :return: The part number and ETag, as expected by `complete_multipart_upload`.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {"CopySourceIfMatch": if_match} if if_match is not None else {}
+    response = s3_client.upload_part_copy(
+        Bucket=bucket_name,
+        Key=destination_key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        CopySource={"Bucket": source_bucket_name or bucket_name, "Key": source_key},
+        CopySourceRange=f"bytes={first_byte}-{last_byte}",
+        **params,
+    )
+    return {"PartNumber": part_number, "ETag": response["CopyPartResult"]["ETag"]}
+
+
+async def copy_s3_object_in_parts(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    bucket_name: str,
+    source_key: str,
+    destination_key: str,
+    size: int,
+    etag: str,
+    content_type: Optional[str] = None,
+    part_size_bytes: int = 512 * 1024 * 1024,
+    max_concurrency: int = 4,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    source_bucket_name: Optional[str] = None,
+) -> None:
+    """
+    Copy an object of any size as a multipart upload of concurrent `UploadPartCopy` calls.
+
+    Every part is conditional on `etag`, so a concurrent overwrite of the source fails the copy instead of
+    mixing two versions. If anything fails, the multipart upload is aborted before the error is re-raised.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param bucket_name: Name of the S3 bucket.
+    :param source_key: Key of the object to copy.
+    :param destination_key: Key of the copy. An existing object there is replaced.
+    :param size: Size of the source in bytes.
+    :param etag: ETag of the source.
+    :param content_type: The MIME type of the copy. Multipart uploads do not copy it from the source.
+    :param part_size_bytes: Size of each copied part. S3 requires 5 MiB to 5 GiB for every part but the last.
+    :param max_concurrency: Maximum number of parts copied at once.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to invalidate the copy's metadata in once it completed.
+    :param source_bucket_name: Bucket of the object to copy, if not `bucket_name`.
+    """
+    upload_id = await s3_executor.run(
+        create_multipart_upload,
+        bucket_name=bucket_name,
+        object_key=destination_key,
+        content_type=content_type,
+        s3_client=s3_client,
+    )
+    logger.debug(
+        "copying {size} bytes from {source_key} in parts, upload {upload_id}",
+        size=size,
+        source_key=source_key,
+        upload_id=upload_id,
+    )
+
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def copy_part(part_number: int, first_byte: int) -> "CompletedPartTypeDef":
+        async with slots:
+            return await s3_executor.run(
+                upload_part_copy,
+                bucket_name=bucket_name,
+                source_key=source_key,
+                destination_key=destination_key,
+                upload_id=upload_id,
+                part_number=part_number,
+                first_byte=first_byte,
+                last_byte=min(first_byte + part_size_bytes, size) - 1,
+                if_match=etag,
+                s3_client=s3_client,
+                source_bucket_name=source_bucket_name,
+            )
+
+    part_copies: List[asyncio.Task] = [
+        asyncio.create_task(copy_part(part_number, first_byte))
+        for part_number, first_byte in enumerate(range(0, size, part_size_bytes), start=1)
+    ]
+    try:
+        parts = await asyncio.gather(*part_copies)
+        await s3_executor.run(
+            complete_multipart_upload,
+            bucket_name=bucket_name,
+            object_key=destination_key,
+            upload_id=upload_id,
+            parts=list(parts),
+            s3_client=s3_client,
+            metadata_cache=metadata_cache,
+        )
+    except BaseException:
+        for part_copy in part_copies:
+            part_copy.cancel()
+        await asyncio.gather(*part_copies, return_exceptions=True)
+        try:
+            await s3_executor.run(
+                abort_multipart_upload,
+                bucket_name=bucket_name,
+                object_key=destination_key,
+                upload_id=upload_id,
+                s3_client=s3_client,
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("failed to abort multipart copy {upload_id}", upload_id=upload_id)
+        raise
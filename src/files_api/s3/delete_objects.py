@@ -1,23 +1,70 @@
 """Functions for deleting objects from an S3 bucket--the "D" in CRUD."""
 
-from typing import Optional
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
 
 import boto3
 
+from files_api.s3.metadata_cache import ObjectMetadataCache
+
 try:
     from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import ErrorTypeDef
 except ImportError:
     ...
 
+# the most keys S3 accepts in one DeleteObjects call
+MAX_KEYS_PER_DELETE = 1_000
+
 
-def delete_s3_object(bucket_name: str, object_key: str, s3_client: Optional["S3Client"] = None) -> None:
+def delete_s3_object(
+    bucket_name: str,
+    object_key: str,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> None:
     """
     Delete an object from the S3 bucket.
 
     :param bucket_name: Name of the S3 bucket.
     :param object_key: Key of the object to delete.
     :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to invalidate the object's metadata in.
     """
     s3_client = s3_client or boto3.client("s3")
     resp = s3_client.delete_object(Bucket=bucket_name, Key=object_key)
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, object_key)
     print(resp)
+
+
+def delete_s3_objects(
+    bucket_name: str,
+    object_keys: List[str],
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> Tuple[List[str], List["ErrorTypeDef"]]:
+    """
+    Delete up to 1000 objects from the S3 bucket with a single delete_objects call.
+
+    Like `delete_object`, S3 reports keys that did not exist as deleted.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_keys: Keys of the objects to delete, at most `MAX_KEYS_PER_DELETE`.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to invalidate the objects' metadata in.
+
+    :return: Tuple of the deleted keys, and the errors of the keys that could not be deleted.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    response = s3_client.delete_objects(
+        Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in object_keys], "Quiet": False}
+    )
+    deleted_keys = [deleted["Key"] for deleted in response.get("Deleted", [])]
+    if metadata_cache is not None:
+        for key in deleted_keys:
+            metadata_cache.invalidate(bucket_name, key)
+    return deleted_keys, response.get("Errors", [])
@@ -0,0 +1,193 @@
+"""A read-through cache of small object bodies on local disk, so hot files skip the download from S3."""
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+
+@dataclass
+class DiskCacheEntry:
+    """A cached object body: the file it is in, and the object's metadata when it was cached."""
+
+    path: str
+    size: int
+    metadata: Dict[str, Any]
+    # requests sending the file; an entry dropped while it is read keeps its file until they are done
+    readers: int = field(default=0, compare=False)
+    dropped: bool = field(default=False, compare=False)
+
+
+class ObjectDiskCache:
+    """
+    A bounded, thread-safe LRU cache of object bodies on local disk, such as a container's disk or Lambda's `/tmp`.
+
+    Entries hold the object's ETag, which callers check against S3's current one before serving them. Like
+    `ObjectMetadataCache`, writers call `invalidate` once their write completed, and readers pass the
+    `generation` read before their S3 call to `put`, so a body that raced with a write is never cached.
+
+    Requests `acquire` an entry before sending its file and `release` it after, so evicting or invalidating
+    it meanwhile never deletes a file being sent. Each cache owns a fresh directory, removed by `clear`.
+    """
+
+    def __init__(self, max_bytes: int, max_object_bytes: int, directory: Optional[str] = None):
+        """
+        Create an empty cache in a directory of its own.
+
+        :param max_bytes: Maximum total size of the cached files.
+        :param max_object_bytes: Largest object cached.
+        :param directory: Directory to create the cache's own directory in. Defaults to the temporary directory.
+        """
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        parent = directory or tempfile.gettempdir()
+        os.makedirs(parent, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="files-api-cache-", dir=parent)
+        self._entries: "OrderedDict[Tuple[str, str], DiskCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._file_counter = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped by every invalidation, to pass to `put`."""
+        return self._generation
+
+    def acquire(self, bucket_name: str, object_key: str) -> Optional[DiskCacheEntry]:
+        """
+        Look up the cached body of an object, and keep its file until `release` is called.
+
+        :return: The entry, or None on a miss.
+        """
+        key = (bucket_name, object_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.readers += 1
+            self.hits += 1
+            return entry
+
+    def release(self, entry: DiskCacheEntry) -> None:
+        """Signal that a request is done with an acquired entry's file."""
+        with self._lock:
+            entry.readers -= 1
+            delete = entry.dropped and entry.readers == 0
+        if delete:
+            _remove_quietly(entry.path)
+
+    def put(
+        self,
+        bucket_name: str,
+        object_key: str,
+        content: bytes,
+        metadata: Mapping[str, Any],
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store the body of an object, evicting the least recently used ones to stay within `max_bytes`.
+
+        Blocks on disk I/O, so call it from a worker thread.
+
+        :param content: The whole body of the object, as stored in S3.
+        :param metadata: The object's metadata, with at least its `ETag`.
+        :param generation: Value of `generation` read before the S3 call that returned `content`.
+            If an invalidation happened since, the body may be stale and is not stored.
+        """
+        if len(content) > self.max_object_bytes or len(content) > self.max_bytes:
+            return
+        key = (bucket_name, object_key)
+        with self._lock:
+            cached = self._entries.get(key)
+            # concurrent requests that shared one download each offer the same body
+            if cached is not None and cached.metadata.get("ETag") == metadata.get("ETag"):
+                return
+            self._file_counter += 1
+            path = os.path.join(self.directory, f"{self._file_counter}.body")
+        # written under a temporary name, so a reader never sees a partial file
+        with open(path + ".tmp", "wb") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+
+        entry = DiskCacheEntry(path=path, size=len(content), metadata=dict(metadata))
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                dropped = [entry]
+            else:
+                dropped = self._pop(key)
+                self._entries[key] = entry
+                self.total_bytes += entry.size
+                while self.total_bytes > self.max_bytes:
+                    dropped += self._pop(next(iter(self._entries)))
+                    self.evictions += 1
+        self._remove_unread(dropped)
+
+    def invalidate(self, bucket_name: str, object_key: str) -> None:
+        """Forget the body of an object after it was written or deleted."""
+        with self._lock:
+            self._generation += 1
+            dropped = self._pop((bucket_name, object_key))
+        self._remove_unread(dropped)
+
+    def clear(self) -> None:
+        """Forget every entry and remove the cache's directory, e.g. on shutdown."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.total_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters to tune the size of the cache with."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _pop(self, key: Tuple[str, str]) -> List[DiskCacheEntry]:
+        """Remove an entry from the index, with the lock held. Its file is removed once no request reads it."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return []
+        self.total_bytes -= entry.size
+        entry.dropped = True
+        return [entry]
+
+    def _remove_unread(self, entries: List[DiskCacheEntry]) -> None:
+        """Delete the files of dropped entries no request is reading; `release` deletes the others."""
+        with self._lock:
+            unread = [entry for entry in entries if entry.readers == 0]
+        for entry in unread:
+            _remove_quietly(entry.path)
+
+
+def _remove_quietly(path: str) -> None:
+    """Delete a file that may already be gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
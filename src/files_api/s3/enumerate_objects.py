@@ -0,0 +1,250 @@
+"""Enumerate every object under a prefix by listing shards of the keyspace concurrently."""
+
+import asyncio
+from dataclasses import dataclass
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import boto3
+from loguru import logger
+
+from files_api.s3.executor import S3Executor
+from files_api.s3.read_objects import (
+    DEFAULT_MAX_KEYS,
+    fetch_s3_directory_page,
+)
+
+try:
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import ObjectTypeDef
+except ImportError:
+    ...
+
+# characters keys are probed after when sampling a keyspace without subdirectories, in S3's (byte) order
+PROBE_ALPHABET = "!-.0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz~"
+# how many directory levels, and how many character levels, discovery descends at most
+MAX_DISCOVERY_DEPTH = 3
+# the most directories listed, or probes sent, in one discovery round
+MAX_DISCOVERY_FANOUT = 256
+
+
+@dataclass(frozen=True)
+class KeyRangeShard:
+    """
+    The keys after `start_after` and up to `end_at`, inclusive. None leaves that end of the range open.
+
+    Shards built by `shards_from_boundaries` tile the keyspace: every key falls in exactly one of them,
+    whatever the boundaries, so boundaries only affect how evenly the work is split.
+    """
+
+    start_after: Optional[str] = None
+    end_at: Optional[str] = None
+
+
+def shards_from_boundaries(boundaries: Sequence[str]) -> List[KeyRangeShard]:
+    """Split the keyspace at the given keys, each boundary ending one shard and starting the next."""
+    bounds: List[Optional[str]] = [None, *sorted(set(boundaries)), None]
+    return [KeyRangeShard(start_after=start, end_at=end) for start, end in zip(bounds, bounds[1:])]
+
+
+def iter_key_range_pages(
+    bucket_name: str,
+    prefix: str,
+    shard: KeyRangeShard,
+    page_size: int = DEFAULT_MAX_KEYS,
+    s3_client: Optional["S3Client"] = None,
+) -> Iterator[List["ObjectTypeDef"]]:
+    """
+    Enumerate the objects under a prefix that fall in a shard, one listing page at a time.
+
+    :param bucket_name: Name of the S3 bucket to list objects from.
+    :param prefix: Prefix to filter objects by.
+    :param shard: Range of keys to list.
+    :param page_size: Maximum number of objects per page.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Lazy iterator of non-empty lists of objects, in key order. Each `next` call makes at most one S3 call.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {"StartAfter": shard.start_after} if shard.start_after is not None else {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}, **params
+    ):
+        objects = page.get("Contents", [])
+        if shard.end_at is not None and objects and objects[-1]["Key"] >= shard.end_at:
+            # the listing reached the end of the shard: keep its end and stop, the next shard lists the rest
+            objects = [obj for obj in objects if obj["Key"] <= shard.end_at]
+            if objects:
+                yield objects
+            return
+        if objects:
+            yield objects
+
+
+def fetch_first_key_after(
+    bucket_name: str, prefix: str, start_after: str, s3_client: Optional["S3Client"] = None
+) -> Optional[str]:
+    """
+    Sample the keyspace: fetch the first key under a prefix that sorts after `start_after`.
+
+    :return: The key, or None if there is none.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, StartAfter=start_after, MaxKeys=1)
+    contents = response.get("Contents", [])
+    return contents[0]["Key"] if contents else None
+
+
+async def discover_key_range_shards(
+    s3_executor: S3Executor,
+    bucket_name: str,
+    prefix: str = "",
+    num_shards: int = 16,
+    s3_client: Optional["S3Client"] = None,
+) -> List[KeyRangeShard]:
+    """
+    Split the keyspace under a prefix into about `num_shards` shards, from the shape of the bucket.
+
+    Subdirectories are discovered first, breadth first, with delimited listings: they are natural split points.
+    A keyspace with too few of them is sampled instead: keys are probed after each character of
+    `PROBE_ALPHABET`, one character deeper per round, which finds split points in flat keyspaces such as
+    hashes or timestamps. Every round's S3 calls are sent concurrently.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param bucket_name: Name of the S3 bucket.
+    :param prefix: Prefix of the keys to enumerate.
+    :param num_shards: Number of shards wanted. Sparse keyspaces may yield fewer.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Shards that tile the keyspace, in key order.
+    """
+    num_boundaries = num_shards - 1
+    if num_boundaries <= 0:
+        return [KeyRangeShard()]
+
+    boundaries: set = set()
+    directories = [prefix]
+    for _ in range(MAX_DISCOVERY_DEPTH):
+        if len(boundaries) >= num_boundaries or not directories:
+            break
+        pages = await asyncio.gather(
+            *(
+                s3_executor.run(fetch_s3_directory_page, bucket_name, directory, s3_client=s3_client)
+                for directory in directories[:MAX_DISCOVERY_FANOUT]
+            )
+        )
+        directories = sorted(subdirectory for _, subdirectories, _ in pages for subdirectory in subdirectories)
+        boundaries.update(directories)
+
+    probe_bases = [prefix]
+    for _ in range(MAX_DISCOVERY_DEPTH):
+        if len(boundaries) >= num_boundaries or not probe_bases:
+            break
+        probes = [base + char for base in probe_bases for char in PROBE_ALPHABET][:MAX_DISCOVERY_FANOUT]
+        sampled_keys = await asyncio.gather(
+            *(
+                s3_executor.run(fetch_first_key_after, bucket_name, prefix, start_after=probe, s3_client=s3_client)
+                for probe in probes
+            )
+        )
+        sampled = {key for key in sampled_keys if key is not None}
+        boundaries.update(sampled)
+        # probe one character deeper below the populated characters
+        depth = len(probe_bases[0]) + 1
+        probe_bases = sorted({key[:depth] for key in sampled if len(key) > depth})
+
+    shards = shards_from_boundaries(_pick_evenly(sorted(boundaries), num_boundaries))
+    logger.debug("split {prefix!r} into {num_shards} shards", prefix=prefix, num_shards=len(shards))
+    return shards
+
+
+async def iter_s3_objects_sharded(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    bucket_name: str,
+    prefix: str = "",
+    num_shards: int = 16,
+    max_concurrency: int = 8,
+    ordered: bool = True,
+    page_size: int = DEFAULT_MAX_KEYS,
+    max_buffered_pages: int = 4,
+    s3_client: Optional["S3Client"] = None,
+) -> AsyncIterator[List["ObjectTypeDef"]]:
+    """
+    Enumerate every object under a prefix, listing shards of the keyspace concurrently.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param bucket_name: Name of the S3 bucket.
+    :param prefix: Prefix of the keys to enumerate.
+    :param num_shards: Number of shards to split the keyspace into.
+    :param max_concurrency: Maximum number of listing calls in flight.
+    :param ordered: Yield the objects in key order. Shards ahead of the one being yielded buffer up to
+        `max_buffered_pages` pages each, then wait. Unordered, pages are yielded as soon as they are listed.
+    :param page_size: Maximum number of objects per listing page.
+    :param max_buffered_pages: Pages listed ahead per shard, bounding memory to about
+        `num_shards * max_buffered_pages * page_size` objects.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :yield: Non-empty pages of objects, with their keys, sizes, modification times and ETags.
+    """
+    shards = await discover_key_range_shards(s3_executor, bucket_name, prefix, num_shards, s3_client=s3_client)
+    slots = asyncio.Semaphore(max_concurrency)
+    # a page, None once the shard is listed, or the error that stopped it
+    ShardItem = Union[List["ObjectTypeDef"], None, BaseException]
+    if ordered:
+        queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=max_buffered_pages) for _ in shards]
+    else:
+        queues = [asyncio.Queue(maxsize=max_buffered_pages * len(shards))] * len(shards)
+
+    async def list_shard(shard: KeyRangeShard, queue: asyncio.Queue) -> None:
+        pages = iter_key_range_pages(bucket_name, prefix, shard, page_size=page_size, s3_client=s3_client)
+        try:
+            while True:
+                # a slot is held per call, not per shard, so shards blocked on a full buffer never starve the rest
+                async with slots:
+                    page = await s3_executor.run(next, pages, None)
+                await queue.put(page)
+                if page is None:
+                    return
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            await queue.put(err)
+
+    listings = [asyncio.create_task(list_shard(shard, queue)) for shard, queue in zip(shards, queues)]
+    # ordered, each shard's buffer is drained in turn; unordered, the shared buffer is drained until every shard ends
+    sources = [(queue, 1) for queue in queues] if ordered else [(queues[0], len(shards))]
+    num_objects = 0
+    try:
+        for queue, num_listings in sources:
+            while num_listings:
+                item: ShardItem = await queue.get()
+                if item is None:
+                    num_listings -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    num_objects += len(item)
+                    yield item
+    finally:
+        for listing in listings:
+            listing.cancel()
+        await asyncio.gather(*listings, return_exceptions=True)
+    logger.info(
+        "enumerated {num_objects} objects under {prefix!r} in {num_shards} shards",
+        num_objects=num_objects,
+        prefix=prefix,
+        num_shards=len(shards),
+    )
+
+
+def _pick_evenly(items: List[str], count: int) -> List[str]:
+    """Pick `count` items spread evenly over a sorted list, or all of them if there are not more."""
+    if len(items) <= count:
+        return items
+    step = len(items) / (count + 1)
+    return sorted({items[int(step * (i + 1))] for i in range(count)})
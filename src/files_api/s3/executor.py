@@ -0,0 +1,60 @@
+"""Run blocking boto3 calls without stalling the event loop."""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    TypeVar,
+)
+
+try:
+    from botocore.response import StreamingBody
+except ImportError:
+    ...
+
+T = TypeVar("T")
+
+
+class S3Executor:
+    """
+    Bounded thread pool dedicated to S3 calls made from async route handlers.
+
+    boto3 is synchronous, so every S3 call is handed to this pool and awaited. The pool size caps how
+    many S3 calls one worker process has in flight; it should not exceed the S3 client's connection pool.
+    """
+
+    def __init__(self, max_workers: int):
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3")
+
+    async def run(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """
+        Call `func(*args, **kwargs)` on the S3 thread pool and await its result.
+
+        :param func: Blocking function to call, e.g. one of the `files_api.s3` helpers.
+
+        :return: Whatever `func` returns. Exceptions raised by `func` propagate to the caller.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool, functools.partial(func, *args, **kwargs))
+
+    async def iter_chunks(self, body: "StreamingBody", chunk_size: int) -> AsyncGenerator[bytes, None]:
+        """
+        Read an S3 object body chunk by chunk on the S3 thread pool.
+
+        :param body: The `Body` of a `get_object` response.
+        :param chunk_size: Maximum number of bytes read per chunk.
+
+        :yield: Chunks of the object body, in order.
+        """
+        try:
+            while chunk := await self.run(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def shutdown(self) -> None:
+        """Stop accepting new S3 calls and release the worker threads."""
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,286 @@
+"""A local index of the keys in the bucket, to list and look up files without S3 round trips."""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import (
+    datetime,
+    timezone,
+)
+from typing import (
+    Any,
+    Callable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
+
+import boto3
+from loguru import logger
+
+from files_api.s3.blobs import get_pointer_size
+from files_api.s3.executor import S3Executor
+from files_api.s3.read_objects import fetch_s3_object_metadata
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+SortBy = Literal["file_path", "last_modified", "size_bytes"]
+
+# sort orders map to indexed columns; "key" breaks ties so every order is total and pages never overlap
+SORT_COLUMNS = {"file_path": "key", "last_modified": "last_modified", "size_bytes": "size"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_modified REAL NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    written_at REAL NOT NULL DEFAULT 0,
+    seen_in INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS objects_by_last_modified ON objects (last_modified, key);
+CREATE INDEX IF NOT EXISTS objects_by_size ON objects (size, key);
+"""
+
+
+@dataclass(frozen=True)
+class IndexedObject:
+    """An object as listed by the index."""
+
+    key: str
+    size: int
+    last_modified: datetime
+
+
+class KeyIndex:
+    """
+    An index of the keys, sizes and modification times of the objects in a bucket, stored in SQLite.
+
+    The index is built and then reconciled with S3 by `reconcile`, which lists the bucket page by page.
+    The write and delete paths keep it current in between with `refresh_key` and `remove`. Each reconcile
+    leaves alone the keys written since it started, so it never undoes a newer write.
+
+    Answers are only given while the last successful reconcile started less than `max_staleness_seconds`
+    ago, because writes made by other processes are only noticed by reconciles. Otherwise the lookup
+    methods return None and callers fall back to S3.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        path: str = ":memory:",
+        max_staleness_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Open the index, creating its table if needed.
+
+        :param bucket_name: Name of the S3 bucket to index.
+        :param path: Path of the SQLite database file. ":memory:" keeps the index in memory.
+        :param max_staleness_seconds: Maximum age of the last reconcile for the index to answer lookups.
+        :param clock: Wall clock, overridable in tests. It is persisted, so it must survive restarts.
+        """
+        self.bucket_name = bucket_name
+        self.max_staleness_seconds = max_staleness_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript(SCHEMA)
+        self._reconcile_count = 0
+        self.last_reconciled_at: Optional[float] = None
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether the index is recent enough to answer lookups."""
+        return (
+            self.last_reconciled_at is not None
+            and self._clock() - self.last_reconciled_at <= self.max_staleness_seconds
+        )
+
+    def reconcile(self, s3_client: Optional["S3Client"] = None, page_size: int = 1_000) -> int:
+        """
+        Bring the index in line with the bucket by listing all of it, one page per transaction.
+
+        :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+        :param page_size: Number of keys listed, and written to the index, at a time.
+
+        :return: Number of keys in the bucket.
+        """
+        s3_client = s3_client or boto3.client("s3")
+        started_at = self._clock()
+        with self._lock:
+            self._reconcile_count += 1
+            reconcile_id = self._reconcile_count
+
+        num_keys = 0
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, PaginationConfig={"PageSize": page_size}):
+            rows = [
+                {
+                    "key": obj["Key"],
+                    "size": obj["Size"],
+                    "last_modified": obj["LastModified"].timestamp(),
+                    "seen_in": reconcile_id,
+                    "started_at": started_at,
+                }
+                for obj in page.get("Contents", [])
+            ]
+            num_keys += len(rows)
+            with self._lock, self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    """
+                    INSERT INTO objects (key, size, last_modified, seen_in)
+                    VALUES (:key, :size, :last_modified, :seen_in)
+                    ON CONFLICT (key) DO UPDATE SET
+                        size = CASE WHEN written_at > :started_at THEN size ELSE excluded.size END,
+                        last_modified = CASE
+                            WHEN written_at > :started_at THEN last_modified ELSE excluded.last_modified
+                        END,
+                        deleted = CASE WHEN written_at > :started_at THEN deleted ELSE 0 END,
+                        seen_in = excluded.seen_in
+                    """,
+                    rows,
+                )
+
+        with self._lock, self._connection:
+            # keys missing from the listing are gone, unless they were written after it started
+            self._connection.execute(
+                "DELETE FROM objects WHERE seen_in != ? AND written_at <= ?", (reconcile_id, started_at)
+            )
+            self.last_reconciled_at = started_at
+        logger.info("reconciled the key index: {num_keys} keys", num_keys=num_keys)
+        return num_keys
+
+    def upsert(self, key: str, size: int, last_modified: datetime) -> None:
+        """Record an object written through this process."""
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO objects (key, size, last_modified, written_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    size = excluded.size,
+                    last_modified = excluded.last_modified,
+                    deleted = 0,
+                    written_at = excluded.written_at
+                """,
+                (key, size, last_modified.timestamp(), self._clock()),
+            )
+
+    def remove(self, key: str) -> None:
+        """Record an object deleted through this process, keeping a tombstone until the next reconcile."""
+        self.remove_many([key])
+
+    def remove_many(self, keys: List[str]) -> None:
+        """Record objects deleted through this process, in a single transaction."""
+        written_at = self._clock()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "UPDATE objects SET deleted = 1, written_at = ? WHERE key = ?", [(written_at, key) for key in keys]
+            )
+
+    def refresh_key(self, key: str, s3_client: Optional["S3Client"] = None) -> None:
+        """
+        Re-read one object from S3 after writing it, so the index has S3's size and modification time.
+
+        A pointer to a blob is indexed with the size of the blob's content.
+
+        :param key: Key of the object.
+        :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+        """
+        obj = fetch_s3_object_metadata(bucket_name=self.bucket_name, object_key=key, s3_client=s3_client)
+        if obj is None:
+            self.remove(key)
+        else:
+            self.upsert(key, size=get_pointer_size(obj), last_modified=obj["LastModified"])
+
+    def contains(self, key: str) -> Optional[bool]:
+        """
+        Check whether an object exists.
+
+        :return: Whether the key is in the index, or None if the index is too stale to tell.
+        """
+        if not self.is_fresh:
+            return None
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM objects WHERE key = ? AND deleted = 0", (key,)).fetchone()
+        return row is not None
+
+    def list_page(  # pylint: disable=too-many-arguments
+        self,
+        prefix: str = "",
+        page_size: int = 1_000,
+        sort_by: SortBy = "file_path",
+        descending: bool = False,
+        after: Optional[Tuple[Any, str]] = None,
+    ) -> Optional[Tuple[List[IndexedObject], Optional[Tuple[Any, str]]]]:
+        """
+        List a page of objects in any sort order, with keyset pagination.
+
+        :param prefix: Only list keys that start with this prefix.
+        :param page_size: Maximum number of objects to return.
+        :param sort_by: What to sort the objects by. Ties are sorted by key.
+        :param descending: Sort in descending instead of ascending order.
+        :param after: Cursor returned with the previous page.
+
+        :return: The objects and the cursor of the next page, or None as the cursor on the last page.
+            None instead if the index is too stale to answer.
+        """
+        if not self.is_fresh:
+            return None
+
+        column = SORT_COLUMNS[sort_by]
+        clauses = ["deleted = 0"]
+        params: List[Any] = []
+        if prefix:
+            # a range scan on the primary key, unlike LIKE which would need escaping
+            clauses.append("key >= ? AND key < ?")
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if after is not None:
+            clauses.append(f"({column}, key) {'<' if descending else '>'} (?, ?)")
+            params += list(after)
+        direction = "DESC" if descending else "ASC"
+        query = (
+            f"SELECT key, size, last_modified FROM objects WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {column} {direction}, key {direction} LIMIT ?"
+        )
+
+        with self._lock:
+            rows = self._connection.execute(query, [*params, page_size + 1]).fetchall()
+
+        objects = [
+            IndexedObject(key=key, size=size, last_modified=datetime.fromtimestamp(last_modified, tz=timezone.utc))
+            for key, size, last_modified in rows[:page_size]
+        ]
+        if len(rows) <= page_size:
+            return objects, None
+        last_row = rows[page_size - 1]
+        sort_value = {"key": last_row[0], "size": last_row[1], "last_modified": last_row[2]}[column]
+        return objects, (sort_value, last_row[0])
+
+
+async def keep_key_index_fresh(
+    key_index: KeyIndex,
+    s3_executor: S3Executor,
+    interval_seconds: float,
+    s3_client: Optional["S3Client"] = None,
+) -> None:
+    """
+    Build the index, then reconcile it with S3 every `interval_seconds`, until cancelled.
+
+    A failed reconcile is logged and retried at the next interval. The index stops answering lookups
+    if reconciles keep failing for longer than its `max_staleness_seconds`.
+    """
+    while True:
+        try:
+            await s3_executor.run(key_index.reconcile, s3_client=s3_client)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("failed to reconcile the key index")
+        await asyncio.sleep(interval_seconds)
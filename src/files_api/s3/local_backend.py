@@ -0,0 +1,800 @@
+"""Store objects in a local directory instead of S3, answering the calls the API makes to boto3's S3 client."""
+
+import base64
+import binascii
+import errno
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import uuid
+import zlib
+from datetime import (
+    datetime,
+    timezone,
+)
+from email.utils import format_datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import (
+    quote,
+    unquote,
+)
+
+from botocore.exceptions import (
+    ClientError,
+    OperationNotPageableError,
+)
+from botocore.paginate import Paginator
+
+from files_api.s3.paginators import (
+    decode_continuation_token,
+    list_objects_v2_paginator,
+    list_objects_v2_response,
+)
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
+
+# every object is one file: the length of its header, its header of JSON metadata, then its bytes
+_HEADER_LENGTH = struct.Struct(">I")
+_HEADER_READ_BYTES = 4096
+# key segments are stored as directories, last segments as files, each with its own prefix, so that like in S3
+# "a" can be an object while "a/b" is one too
+_DIRECTORY_PREFIX = "d"
+_FILE_PREFIX = "f"
+_TMP_DIRECTORY = ".tmp"
+_UPLOADS_DIRECTORY = ".uploads"
+_UPLOAD_FILE = "upload.json"
+_COPY_CHUNK_BYTES = 8 * 1024 * 1024
+_BYTE_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class LocalObjectBody:
+    """
+    The `Body` of a `get_object` response from local storage: a read-only memory map of the object's file.
+
+    Reads copy straight out of the page cache, without a system call per chunk. The map holds the file it was
+    opened on, so an object overwritten or deleted meanwhile is still read whole, as it was.
+    """
+
+    def __init__(self, fd: int, start: int, end: int):
+        """
+        Map the bytes of an object's file from `start` to `end`.
+
+        :param fd: Open file descriptor of the object's file. The map does not need it to stay open.
+        :param start: Offset of the first byte to read.
+        :param end: Offset after the last byte to read.
+        """
+        self._map: Optional[mmap.mmap] = mmap.mmap(fd, 0, access=mmap.ACCESS_READ) if end > start else None
+        self._position = start
+        self._end = end
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        """Read at most `amt` bytes, or all that are left, like `botocore.response.StreamingBody.read`."""
+        if self._map is None:
+            return b""
+        stop = self._end if amt is None else min(self._end, self._position + amt)
+        chunk = self._map[self._position : stop]
+        self._position = stop
+        return chunk
+
+    def close(self) -> None:
+        """Release the memory map."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class LocalStorageBackend:  # pylint: disable=too-many-public-methods
+    """
+    A `StorageBackend` keeping each bucket in a directory, for running without S3 or benchmarking the API alone.
+
+    Each object is a single file holding its metadata and bytes, written to a temporary file and renamed into
+    place, so readers see a whole object or none, never a partial write. Reads memory-map the file; server-side
+    copies and multipart completions move bytes between files with `sendfile(2)` where the OS allows it.
+
+    Errors are `botocore.exceptions.ClientError`s with S3's codes, such as "NoSuchKey" or "PreconditionFailed",
+    so callers handle them as they do S3's. Listing sorts the keys under the listed prefix on every page, which
+    suits the buckets of a single machine. Thread-safe, like a boto3 client.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True):
+        """
+        Store buckets under a directory.
+
+        :param directory: Directory holding one subdirectory per bucket. Created if missing.
+        :param fsync: Flush files to disk before renaming them into place, so a crash never loses an object
+            whose write succeeded.
+        """
+        self.directory = os.path.abspath(directory)
+        self.fsync = fsync
+        self._tmp_directory = os.path.join(self.directory, _TMP_DIRECTORY)
+        self._uploads_directory = os.path.join(self.directory, _UPLOADS_DIRECTORY)
+        os.makedirs(self._tmp_directory, exist_ok=True)
+        os.makedirs(self._uploads_directory, exist_ok=True)
+
+    # --- reads --- #
+
+    def head_object(  # pylint: disable=invalid-name
+        self, *, Bucket: str, Key: str, IfMatch: Optional[str] = None, IfNoneMatch: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Fetch the metadata of an object. A missing object raises a `ClientError` with code "404"."""
+        fd = self._open_object(Bucket, Key, "HeadObject")
+        try:
+            header, _, size = _read_header(fd)
+        finally:
+            os.close(fd)
+        obj = _object_fields(header, size)
+        _check_conditions(obj, "HeadObject", if_match=IfMatch, if_none_match=IfNoneMatch)
+        return obj
+
+    def get_object(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        Range: Optional[str] = None,
+        IfMatch: Optional[str] = None,
+        IfNoneMatch: Optional[str] = None,
+        IfModifiedSince: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """Fetch an object, or one byte range of it, with its metadata and a `Body` to read it from."""
+        fd = self._open_object(Bucket, Key, "GetObject")
+        try:
+            header, data_offset, size = _read_header(fd)
+            obj = _object_fields(header, size)
+            _check_conditions(
+                obj, "GetObject", if_match=IfMatch, if_none_match=IfNoneMatch, if_modified_since=IfModifiedSince
+            )
+            first_byte, last_byte = 0, size - 1
+            byte_range = _resolve_byte_range(Range, size, "GetObject") if Range is not None else None
+            if byte_range is not None:
+                first_byte, last_byte = byte_range
+                obj["ContentLength"] = last_byte - first_byte + 1
+                obj["ContentRange"] = f"bytes {first_byte}-{last_byte}/{size}"
+            obj["Body"] = LocalObjectBody(fd, data_offset + first_byte, data_offset + last_byte + 1)
+        finally:
+            os.close(fd)
+        return obj
+
+    def list_objects_v2(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Prefix: str = "",
+        Delimiter: Optional[str] = None,
+        MaxKeys: int = 1000,
+        StartAfter: Optional[str] = None,
+        ContinuationToken: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """List the objects under a prefix in key order, grouping those below a "/" into common prefixes if asked."""
+        if Delimiter not in (None, "/"):
+            raise ValueError(f"local storage only lists with the delimiter '/', not {Delimiter!r}")
+        marker = decode_continuation_token(ContinuationToken) if ContinuationToken is not None else StartAfter
+        page, is_truncated = self._list_page(Bucket, Prefix, Delimiter is not None, marker, MaxKeys)
+        contents, common_prefixes = self._page_contents(Bucket, page)
+        params = {"Name": Bucket, "Prefix": Prefix, "MaxKeys": MaxKeys}
+        if Delimiter is not None:
+            params["Delimiter"] = Delimiter
+        return list_objects_v2_response(
+            params, contents, common_prefixes, is_truncated, last_key=page[-1][0] if page else None
+        )
+
+    def get_paginator(self, operation_name: str) -> Paginator:
+        """Page through `list_objects_v2` with botocore's own paginator, as with an S3 client."""
+        if operation_name != "list_objects_v2":
+            raise OperationNotPageableError(operation_name=operation_name)
+        return list_objects_v2_paginator(self.list_objects_v2)
+
+    # --- writes --- #
+
+    def put_object(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        Body: Union[bytes, bytearray, memoryview, Any] = b"",
+        ContentType: Optional[str] = None,
+        ContentEncoding: Optional[str] = None,
+        Metadata: Optional[Dict[str, str]] = None,
+        ChecksumSHA256: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Store an object, replacing any with the same key. A wrong `ChecksumSHA256` rejects it with "BadDigest"."""
+        content = bytes(Body) if isinstance(Body, (bytes, bytearray, memoryview)) else Body.read()
+        _check_sha256(content, ChecksumSHA256, "PutObject")
+        etag = f'"{hashlib.md5(content, usedforsecurity=False).hexdigest()}"'
+        header = _new_header(etag, ContentType, ContentEncoding, Metadata)
+        self._write_file(self._object_path(Bucket, Key), header, lambda target: target.write(content), "PutObject")
+        return {"ETag": etag}
+
+    def copy_object(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        CopySource: Dict[str, str],
+        CopySourceIfMatch: Optional[str] = None,
+        MetadataDirective: str = "COPY",
+        ContentType: Optional[str] = None,
+        ContentEncoding: Optional[str] = None,
+        Metadata: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Copy an object, with its metadata unless `MetadataDirective` is "REPLACE". The bytes never leave the OS."""
+        if (CopySource["Bucket"], CopySource["Key"]) == (Bucket, Key) and MetadataDirective != "REPLACE":
+            raise _client_error(
+                "CopyObject",
+                "InvalidRequest",
+                "This copy request is illegal because it is trying to copy an object to itself without changing "
+                "the object's metadata.",
+                400,
+            )
+        fd = self._open_object(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        try:
+            source_header, data_offset, size = _read_header(fd)
+            _check_conditions(_object_fields(source_header, size), "CopyObject", if_match=CopySourceIfMatch)
+            if MetadataDirective == "REPLACE":
+                header = _new_header(source_header["ETag"], ContentType, ContentEncoding, Metadata)
+            else:
+                header = {**source_header, "LastModified": _now().isoformat()}
+            self._write_file(
+                self._object_path(Bucket, Key),
+                header,
+                lambda target: _copy_bytes(fd, target, data_offset, size),
+                "CopyObject",
+            )
+        finally:
+            os.close(fd)
+        last_modified = datetime.fromisoformat(header["LastModified"])
+        return {"CopyObjectResult": {"ETag": header["ETag"], "LastModified": last_modified}}
+
+    def delete_object(self, *, Bucket: str, Key: str) -> Dict[str, Any]:  # pylint: disable=invalid-name
+        """Delete an object. Deleting a missing one succeeds, as in S3."""
+        self._delete_file(Bucket, Key)
+        return {}
+
+    def delete_objects(self, *, Bucket: str, Delete: Dict[str, Any]) -> Dict[str, Any]:  # pylint: disable=invalid-name
+        """Delete several objects, reporting each as deleted like S3's non-quiet mode."""
+        deleted = []
+        for obj in Delete["Objects"]:
+            self._delete_file(Bucket, obj["Key"])
+            deleted.append({"Key": obj["Key"]})
+        return {"Deleted": deleted} if not Delete.get("Quiet") else {}
+
+    # --- multipart uploads --- #
+
+    def create_multipart_upload(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        ContentType: Optional[str] = None,
+        ContentEncoding: Optional[str] = None,
+        Metadata: Optional[Dict[str, str]] = None,
+        ChecksumAlgorithm: Optional[str] = None,  # pylint: disable=unused-argument
+        ChecksumType: Optional[str] = None,  # pylint: disable=unused-argument
+    ) -> Dict[str, Any]:
+        """Start a multipart upload, whose parts wait in their own directory until it is completed or aborted."""
+        upload_id = uuid.uuid4().hex
+        upload_directory = os.path.join(self._uploads_directory, upload_id)
+        os.makedirs(upload_directory)
+        upload: Dict[str, Any] = {
+            "Bucket": Bucket,
+            "Key": Key,
+            "ContentType": ContentType,
+            "ContentEncoding": ContentEncoding,
+        }
+        upload["Metadata"] = Metadata or {}
+        with open(os.path.join(upload_directory, _UPLOAD_FILE), "w", encoding="utf-8") as file:
+            json.dump(upload, file)
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def upload_part(  # pylint: disable=invalid-name,too-many-arguments
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        UploadId: str,
+        PartNumber: int,
+        Body: Union[bytes, bytearray, memoryview, Any] = b"",
+        ChecksumSHA256: Optional[str] = None,
+        ChecksumCRC32: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Store one part of a multipart upload, replacing an earlier one with the same number.
+
+        A wrong `ChecksumSHA256` or `ChecksumCRC32` rejects the part with "BadDigest".
+        """
+        upload_directory = self._upload_directory(Bucket, Key, UploadId, "UploadPart")
+        content = bytes(Body) if isinstance(Body, (bytes, bytearray, memoryview)) else Body.read()
+        _check_sha256(content, ChecksumSHA256, "UploadPart")
+        _check_crc32(content, ChecksumCRC32, "UploadPart")
+        etag = f'"{hashlib.md5(content, usedforsecurity=False).hexdigest()}"'
+        self._write_file(
+            os.path.join(upload_directory, str(PartNumber)),
+            {"ETag": etag},
+            lambda target: target.write(content),
+            "UploadPart",
+        )
+        return {"ETag": etag}
+
+    def upload_part_copy(  # pylint: disable=invalid-name,too-many-arguments,too-many-locals
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        UploadId: str,
+        PartNumber: int,
+        CopySource: Dict[str, str],
+        CopySourceRange: Optional[str] = None,
+        CopySourceIfMatch: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Copy a byte range of an object as one part of a multipart upload, without the bytes leaving the OS."""
+        upload_directory = self._upload_directory(Bucket, Key, UploadId, "UploadPartCopy")
+        fd = self._open_object(CopySource["Bucket"], CopySource["Key"], "UploadPartCopy")
+        try:
+            source_header, data_offset, size = _read_header(fd)
+            _check_conditions(_object_fields(source_header, size), "UploadPartCopy", if_match=CopySourceIfMatch)
+            first_byte, last_byte = 0, size - 1
+            if CopySourceRange is not None:
+                byte_range = _resolve_byte_range(CopySourceRange, size, "UploadPartCopy")
+                if byte_range is None:
+                    raise _client_error(
+                        "UploadPartCopy", "InvalidArgument", "The x-amz-copy-source-range value is invalid", 400
+                    )
+                first_byte, last_byte = byte_range
+            # the part's ETag only needs to be unique, so it is derived from the range instead of hashing its bytes
+            etag_source = f"{source_header['ETag']}{first_byte}-{last_byte}".encode()
+            etag = f'"{hashlib.md5(etag_source, usedforsecurity=False).hexdigest()}"'
+            self._write_file(
+                os.path.join(upload_directory, str(PartNumber)),
+                {"ETag": etag},
+                lambda target: _copy_bytes(fd, target, data_offset + first_byte, last_byte - first_byte + 1),
+                "UploadPartCopy",
+            )
+        finally:
+            os.close(fd)
+        return {"CopyPartResult": {"ETag": etag, "LastModified": _now()}}
+
+    def complete_multipart_upload(  # pylint: disable=invalid-name,too-many-arguments,too-many-locals
+        self,
+        *,
+        Bucket: str,
+        Key: str,
+        UploadId: str,
+        MultipartUpload: Dict[str, Any],
+        ChecksumCRC32: Optional[str] = None,  # pylint: disable=unused-argument
+        ChecksumType: Optional[str] = None,  # pylint: disable=unused-argument
+    ) -> Dict[str, Any]:
+        """
+        Join the parts of a multipart upload into the object, with an ETag made like S3's multipart ETags.
+
+        Parts are checked against their checksums as they are uploaded. The whole object's is not checked, which would
+        mean reading it back instead of joining the parts' files.
+        """
+        operation_name = "CompleteMultipartUpload"
+        upload_directory = self._upload_directory(Bucket, Key, UploadId, operation_name)
+        with open(os.path.join(upload_directory, _UPLOAD_FILE), encoding="utf-8") as file:
+            upload = json.load(file)
+        parts = MultipartUpload["Parts"]
+        part_files: List[Tuple[int, int, int]] = []
+        try:
+            _open_parts(upload_directory, parts, part_files)
+            digests = b"".join(binascii.unhexlify(part["ETag"].strip('"')) for part in parts)
+            etag = f'"{hashlib.md5(digests, usedforsecurity=False).hexdigest()}-{len(parts)}"'
+            header = _new_header(etag, upload["ContentType"], upload["ContentEncoding"], upload["Metadata"])
+
+            def write_parts(target: Any) -> None:
+                for fd, data_offset, size in part_files:
+                    _copy_bytes(fd, target, data_offset, size)
+
+            self._write_file(self._object_path(Bucket, Key), header, write_parts, operation_name)
+        finally:
+            for fd, _, _ in part_files:
+                os.close(fd)
+        shutil.rmtree(upload_directory, ignore_errors=True)
+        return {"Bucket": Bucket, "Key": Key, "ETag": etag}
+
+    def abort_multipart_upload(  # pylint: disable=invalid-name
+        self, *, Bucket: str, Key: str, UploadId: str
+    ) -> Dict[str, Any]:
+        """Discard a multipart upload and its parts."""
+        shutil.rmtree(self._upload_directory(Bucket, Key, UploadId, "AbortMultipartUpload"), ignore_errors=True)
+        return {}
+
+    # --- files --- #
+
+    def _bucket_directory(self, bucket_name: str) -> str:
+        """Directory of a bucket. Bucket names cannot start with ".", unlike the backend's own directories."""
+        return os.path.join(self.directory, quote(bucket_name, safe=""))
+
+    def _object_path(self, bucket_name: str, object_key: str) -> str:
+        """File of an object: one directory per "/"-separated segment of its key, then a file for the last one."""
+        *directories, name = object_key.split("/")
+        return os.path.join(
+            self._bucket_directory(bucket_name),
+            *(_DIRECTORY_PREFIX + quote(segment, safe="") for segment in directories),
+            _FILE_PREFIX + quote(name, safe=""),
+        )
+
+    def _open_object(self, bucket_name: str, object_key: str, operation_name: str) -> int:
+        """Open the file of an object, raising S3's "not found" error if there is none."""
+        try:
+            return os.open(self._object_path(bucket_name, object_key), os.O_RDONLY)
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR, errno.ENAMETOOLONG):
+                raise
+        if operation_name == "HeadObject":
+            # HEAD responses have no body, so S3 errors on them carry only the status code
+            raise _client_error(operation_name, "404", "Not Found", 404)
+        raise _client_error(operation_name, "NoSuchKey", "The specified key does not exist.", 404, Key=object_key)
+
+    def _upload_directory(self, bucket_name: str, object_key: str, upload_id: str, operation_name: str) -> str:
+        """Directory of a multipart upload's parts, raising "NoSuchUpload" if it is not in progress for the key."""
+        upload_directory = os.path.join(self._uploads_directory, quote(upload_id, safe=""))
+        try:
+            with open(os.path.join(upload_directory, _UPLOAD_FILE), encoding="utf-8") as file:
+                upload = json.load(file)
+        except FileNotFoundError:
+            upload = None
+        if upload is None or (upload["Bucket"], upload["Key"]) != (bucket_name, object_key):
+            raise _client_error(
+                operation_name,
+                "NoSuchUpload",
+                "The specified upload does not exist. The upload ID may be invalid, or the upload may have been "
+                "aborted or completed.",
+                404,
+            )
+        return upload_directory
+
+    def _write_file(
+        self, path: str, header: Dict[str, Any], write_body: Callable[[Any], Any], operation_name: str
+    ) -> None:
+        """Write a header and a body to a temporary file, then rename it to `path` in one atomic step."""
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self._tmp_directory)
+        try:
+            # unbuffered, so the body can be copied in with sendfile right after the header
+            with os.fdopen(tmp_fd, "wb", buffering=0) as target:
+                header_bytes = json.dumps(header).encode()
+                target.write(_HEADER_LENGTH.pack(len(header_bytes)) + header_bytes)
+                write_body(target)
+                if self.fsync:
+                    os.fsync(target.fileno())
+            self._rename_into_place(tmp_path, path, operation_name)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+
+    def _rename_into_place(self, tmp_path: str, path: str, operation_name: str) -> None:
+        """Move a written file to its final path, creating the directories of its key."""
+        directory = os.path.dirname(path)
+        for attempt in range(3):
+            try:
+                os.makedirs(directory, exist_ok=True)
+                os.replace(tmp_path, path)
+                break
+            except FileNotFoundError:
+                # a delete removed the emptied directory in between
+                if attempt == 2:
+                    raise
+            except OSError as err:
+                if err.errno != errno.ENAMETOOLONG:
+                    raise
+                raise _client_error(operation_name, "KeyTooLongError", "Your key is too long.", 400) from err
+        if self.fsync:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _delete_file(self, bucket_name: str, object_key: str) -> None:
+        """Remove the file of an object, and the directories of its key left empty."""
+        path = self._object_path(bucket_name, object_key)
+        try:
+            os.unlink(path)
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR, errno.ENAMETOOLONG):
+                raise
+            return
+        bucket_directory = self._bucket_directory(bucket_name)
+        directory = os.path.dirname(path)
+        while directory != bucket_directory:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # not empty, or already gone
+                return
+            directory = os.path.dirname(directory)
+
+    def _iter_entries(self, bucket_name: str, prefix: str, group_directories: bool) -> Iterator[Tuple[str, bool]]:
+        """
+        Find the keys under a prefix, in no particular order, looking only in the directory the prefix points to.
+
+        :return: Lazy iterator of (key, False) for objects, and, if `group_directories`, (common prefix, True)
+            for the directories directly below the prefix.
+        """
+        directory_key, separator, name_start = prefix.rpartition("/")
+        directory = self._bucket_directory(bucket_name)
+        key_start = ""
+        if separator:
+            directory = os.path.dirname(self._object_path(bucket_name, prefix))
+            key_start = directory_key + "/"
+        try:
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for entry in entries:
+            segment = unquote(entry.name[1:])
+            if not segment.startswith(name_start):
+                continue
+            if entry.name.startswith(_FILE_PREFIX):
+                yield key_start + segment, False
+            elif group_directories:
+                if any(_walk_keys(entry.path, "")):
+                    yield key_start + segment + "/", True
+            else:
+                for key in _walk_keys(entry.path, key_start + segment + "/"):
+                    yield key, False
+
+    def _list_page(
+        self, bucket_name: str, prefix: str, group_directories: bool, marker: Optional[str], max_keys: int
+    ) -> Tuple[List[Tuple[str, bool]], bool]:
+        """
+        List the keys and common prefixes of a page in key order, after `marker`.
+
+        :return: Up to `max_keys` entries, as `_iter_entries` yields them, and whether the listing continues after.
+        """
+        entries = sorted(
+            entry
+            for entry in self._iter_entries(bucket_name, prefix, group_directories=group_directories)
+            if marker is None or entry[0] > marker
+        )
+        return entries[:max_keys], len(entries) > max_keys
+
+    def _page_contents(
+        self, bucket_name: str, page: List[Tuple[str, bool]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+        """Get the objects and common prefixes of a page of entries, without the objects deleted since listed."""
+        objects = (self._list_entry(bucket_name, key) for key, is_prefix in page if not is_prefix)
+        return [obj for obj in objects if obj], [{"Prefix": key} for key, is_prefix in page if is_prefix]
+
+    def _list_entry(self, bucket_name: str, object_key: str) -> Optional[Dict[str, Any]]:
+        """Get the listing entry of an object, or None if it was deleted since its key was found."""
+        try:
+            fd = os.open(self._object_path(bucket_name, object_key), os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            header, _, size = _read_header(fd)
+        finally:
+            os.close(fd)
+        return {
+            "Key": object_key,
+            "Size": size,
+            "ETag": header["ETag"],
+            "LastModified": datetime.fromisoformat(header["LastModified"]),
+            "StorageClass": "STANDARD",
+        }
+
+
+def _walk_keys(directory: str, key_start: str) -> Iterator[str]:
+    """Find the keys of every object below a directory of a key segment."""
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        segment = unquote(entry.name[1:])
+        if entry.name.startswith(_FILE_PREFIX):
+            yield key_start + segment
+        else:
+            yield from _walk_keys(entry.path, key_start + segment + "/")
+
+
+def _read_header(fd: int) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Read the header of an object's file, usually in a single read.
+
+    :return: Tuple of the header, the offset of the object's first byte, and the object's size.
+    """
+    file_size = os.fstat(fd).st_size
+    start = os.pread(fd, _HEADER_READ_BYTES, 0)
+    (header_length,) = _HEADER_LENGTH.unpack_from(start)
+    data_offset = _HEADER_LENGTH.size + header_length
+    if len(start) < data_offset:
+        start += os.pread(fd, data_offset - len(start), len(start))
+    return json.loads(start[_HEADER_LENGTH.size : data_offset]), data_offset, file_size - data_offset
+
+
+def _new_header(
+    etag: str, content_type: Optional[str], content_encoding: Optional[str], metadata: Optional[Dict[str, str]]
+) -> Dict[str, Any]:
+    """Build the header of a new object. S3 lowercases the names of user metadata."""
+    return {
+        "ETag": etag,
+        "LastModified": _now().isoformat(),
+        "ContentType": content_type or "binary/octet-stream",
+        "ContentEncoding": content_encoding,
+        "Metadata": {name.lower(): value for name, value in (metadata or {}).items()},
+    }
+
+
+def _object_fields(header: Dict[str, Any], size: int) -> Dict[str, Any]:
+    """Get the fields of a `head_object` or `get_object` response for an object."""
+    obj = {
+        "ContentLength": size,
+        "ContentType": header["ContentType"],
+        "ETag": header["ETag"],
+        "LastModified": datetime.fromisoformat(header["LastModified"]),
+        "Metadata": dict(header["Metadata"]),
+        "AcceptRanges": "bytes",
+    }
+    if header["ContentEncoding"]:
+        obj["ContentEncoding"] = header["ContentEncoding"]
+    return obj
+
+
+def _check_conditions(
+    obj: Dict[str, Any],
+    operation_name: str,
+    if_match: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[datetime] = None,
+) -> None:
+    """Raise S3's errors for conditions that fail: "PreconditionFailed" (412), or "304" if the copy is current."""
+    if if_match is not None and if_match not in ("*", obj["ETag"]):
+        raise _client_error(
+            operation_name, "PreconditionFailed", "At least one of the pre-conditions you specified did not hold", 412
+        )
+    if if_none_match is not None:
+        not_modified = if_none_match in ("*", obj["ETag"])
+    else:
+        not_modified = if_modified_since is not None and obj["LastModified"] <= if_modified_since
+    if not_modified:
+        headers = {"etag": obj["ETag"], "last-modified": format_datetime(obj["LastModified"], usegmt=True)}
+        raise _client_error(operation_name, "304", "Not Modified", 304, headers=headers)
+
+
+def _resolve_byte_range(byte_range: str, size: int, operation_name: str) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a single HTTP byte range, e.g. "bytes=0-1023", against an object's size.
+
+    :return: The offsets of the range's first and last bytes, or None if the range is malformed, which S3 ignores.
+
+    :raises ClientError: With code "InvalidRange" if the range does not overlap the object.
+    """
+    match = _BYTE_RANGE_PATTERN.match(byte_range)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.group(1), match.group(2)
+    if first == "":
+        # a suffix range: the last bytes of the object
+        first_byte, last_byte = max(0, size - int(last)), size - 1
+        satisfiable = int(last) > 0 and size > 0
+    else:
+        first_byte = int(first)
+        last_byte = size - 1 if last == "" else min(int(last), size - 1)
+        if last != "" and int(last) < first_byte:
+            return None
+        satisfiable = first_byte < size
+    if not satisfiable:
+        raise _client_error(
+            operation_name, "InvalidRange", "The requested range is not satisfiable", 416, ActualObjectSize=str(size)
+        )
+    return first_byte, last_byte
+
+
+def _open_parts(upload_directory: str, parts: List[Dict[str, Any]], part_files: List[Tuple[int, int, int]]) -> None:
+    """
+    Open the files of the parts to join into an object, checking them as S3 does.
+
+    :param upload_directory: Directory of the multipart upload.
+    :param parts: Part numbers and ETags of the parts, as given to `complete_multipart_upload`.
+    :param part_files: List the part files are appended to as they are opened, as (fd, data offset, size), for
+        the caller to close them even if a later part is rejected.
+
+    :raises ClientError: With S3's codes "InvalidPartOrder", "InvalidPart" or "EntityTooSmall".
+    """
+    operation_name = "CompleteMultipartUpload"
+    part_numbers = [part["PartNumber"] for part in parts]
+    if not parts or part_numbers != sorted(set(part_numbers)):
+        raise _client_error(operation_name, "InvalidPartOrder", "The list of parts was not in ascending order.", 400)
+    for index, part in enumerate(parts):
+        try:
+            fd = os.open(os.path.join(upload_directory, str(part["PartNumber"])), os.O_RDONLY)
+        except FileNotFoundError as err:
+            raise _client_error(operation_name, "InvalidPart", "One or more parts could not be found.", 400) from err
+        header, data_offset, size = _read_header(fd)
+        part_files.append((fd, data_offset, size))
+        if header["ETag"] != part["ETag"]:
+            raise _client_error(operation_name, "InvalidPart", "One or more parts could not be found.", 400)
+        if index < len(parts) - 1 and size < S3_MIN_PART_SIZE_BYTES:
+            raise _client_error(
+                operation_name, "EntityTooSmall", "Your proposed upload is smaller than the minimum size.", 400
+            )
+
+
+def _check_sha256(content: bytes, checksum_sha256: Optional[str], operation_name: str) -> None:
+    """Reject content whose SHA-256 differs from the base64 checksum sent with it, as S3 does."""
+    if checksum_sha256 is not None and base64.b64encode(hashlib.sha256(content).digest()).decode() != checksum_sha256:
+        raise _client_error(
+            operation_name, "BadDigest", "The SHA256 you specified did not match the calculated checksum.", 400
+        )
+
+
+def _check_crc32(content: bytes, checksum_crc32: Optional[str], operation_name: str) -> None:
+    """Reject content whose CRC32 differs from the base64 checksum sent with it, as S3 does."""
+    if (
+        checksum_crc32 is not None
+        and base64.b64encode(zlib.crc32(content).to_bytes(4, "big")).decode() != checksum_crc32
+    ):
+        raise _client_error(
+            operation_name, "BadDigest", "The CRC32 you specified did not match the calculated checksum.", 400
+        )
+
+
+def _copy_bytes(source_fd: int, target: Any, offset: int, count: int) -> None:
+    """Append `count` bytes of a file at `offset` to an unbuffered file, in the kernel with sendfile if possible."""
+    target_fd = target.fileno()
+    if hasattr(os, "sendfile"):
+        try:
+            while count > 0:
+                sent = os.sendfile(target_fd, source_fd, offset, count)
+                if sent == 0:
+                    return
+                offset += sent
+                count -= sent
+            return
+        except OSError as err:
+            # e.g. macOS, whose sendfile only writes to sockets
+            if err.errno not in (errno.EINVAL, errno.ENOTSOCK, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+    while count > 0:
+        chunk = os.pread(source_fd, min(count, _COPY_CHUNK_BYTES), offset)
+        if not chunk:
+            return
+        target.write(chunk)
+        offset += len(chunk)
+        count -= len(chunk)
+
+
+def _client_error(
+    operation_name: str,
+    code: str,
+    message: str,
+    status_code: int,
+    headers: Optional[Dict[str, str]] = None,
+    **details: str,
+) -> ClientError:
+    """Build the `ClientError` an S3 client raises for an error response."""
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": message, **details},
+            "ResponseMetadata": {"HTTPStatusCode": status_code, "HTTPHeaders": headers or {}},
+        },
+        operation_name,
+    )
+
+
+def _now() -> datetime:
+    """Get the current time, to the second like S3's Last-Modified."""
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _remove_quietly(path: str) -> None:
+    """Remove a file, ignoring it being gone already."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
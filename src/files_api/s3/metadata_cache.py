@@ -0,0 +1,143 @@
+"""An in-process cache of object metadata, so hot keys skip the round trip to S3."""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+try:
+    from mypy_boto3_s3.type_defs import HeadObjectOutputTypeDef
+except ImportError:
+    ...
+
+
+@dataclass(frozen=True)
+class CachedMetadata:
+    """A cache entry: the object's metadata, or None if the object did not exist."""
+
+    metadata: Optional["HeadObjectOutputTypeDef"]
+    expires_at: float
+
+
+class ObjectMetadataCache:
+    """
+    A bounded, thread-safe LRU cache of `head_object` responses with a TTL.
+
+    Lookups that found no object are cached too, as negative entries. The cache only sees the writes made
+    by this process, so entries are kept for at most `ttl_seconds` to bound how stale they get when other
+    processes write to the bucket.
+
+    Writers call `invalidate` once their write completed. Readers pass the `generation` read before their
+    S3 call to `put`, so a response that raced with a write is never cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        on_invalidate: Optional[Callable[[str, str], None]] = None,
+    ):
+        """
+        Create an empty cache.
+
+        :param max_entries: Maximum number of keys to keep. 0 disables the cache.
+        :param ttl_seconds: Seconds an entry stays valid after it was stored.
+        :param clock: Monotonic clock, overridable in tests.
+        :param on_invalidate: Called with the bucket and key of every invalidation, so caches of other
+            data about objects, such as their bodies, see every write too.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._on_invalidate = on_invalidate
+        self._entries: "OrderedDict[Tuple[str, str], CachedMetadata]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped by every invalidation, to pass to `put`."""
+        return self._generation
+
+    def get(self, bucket_name: str, object_key: str) -> Optional[CachedMetadata]:
+        """
+        Look up the metadata of an object.
+
+        :return: The cached entry, whose `metadata` is None if the object did not exist, or None on a miss.
+        """
+        key = (bucket_name, object_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        bucket_name: str,
+        object_key: str,
+        metadata: Optional[Mapping[str, Any]],
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store the metadata of an object, or None if it does not exist.
+
+        :param metadata: Response of `head_object`, or a dict with the same keys.
+        :param generation: Value of `generation` read before the S3 call that returned `metadata`.
+            If an invalidation happened since, the metadata may be stale and is not stored.
+        """
+        if self.max_entries == 0:
+            return
+        stored: Any = None
+        if metadata is not None:
+            stored = {name: value for name, value in metadata.items() if name != "ResponseMetadata"}
+
+        key = (bucket_name, object_key)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = CachedMetadata(metadata=stored, expires_at=self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, bucket_name: str, object_key: str) -> None:
+        """Forget the metadata of an object after it was written or deleted."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop((bucket_name, object_key), None)
+        if self._on_invalidate is not None:
+            self._on_invalidate(bucket_name, object_key)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters to tune the size and TTL of the cache with."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,92 @@
+"""List like S3 in storage backends that are not boto3 clients: responses, continuation tokens and paginators."""
+
+import base64
+import binascii
+import functools
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import botocore.session
+from botocore.exceptions import ClientError
+from botocore.paginate import Paginator
+
+
+def list_objects_v2_paginator(list_objects_v2: Callable[..., Dict[str, Any]]) -> Paginator:
+    """
+    Page through a `list_objects_v2` method with botocore's own paginator, as `get_paginator` of an S3 client does.
+
+    :param list_objects_v2: The method, taking and returning what S3's `ListObjectsV2` does.
+
+    :return: The paginator, including `MaxItems`, `PageSize` and `resume_token` support.
+    """
+    pagination_config, operation_model = _list_objects_v2_paging()
+    return Paginator(list_objects_v2, pagination_config, operation_model)
+
+
+def encode_continuation_token(last_key: str) -> str:
+    """Build the continuation token of the page following the one ending with `last_key`."""
+    return base64.urlsafe_b64encode(last_key.encode()).decode()
+
+
+def list_objects_v2_response(
+    params: Dict[str, Any],
+    contents: List[Dict[str, Any]],
+    common_prefixes: List[Dict[str, str]],
+    is_truncated: bool,
+    last_key: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Build a `list_objects_v2` response like S3's.
+
+    :param params: The `Name`, `Prefix`, `MaxKeys` and `Delimiter` of the listing, as the response echoes them.
+    :param contents: The objects of the page.
+    :param common_prefixes: The common prefixes of the page.
+    :param is_truncated: Whether the listing continues after the page.
+    :param last_key: The last key or common prefix of the page, to continue the listing after.
+    """
+    response: Dict[str, Any] = {
+        **params,
+        "KeyCount": len(contents) + len(common_prefixes),
+        "IsTruncated": is_truncated,
+    }
+    if contents:
+        response["Contents"] = contents
+    if common_prefixes:
+        response["CommonPrefixes"] = common_prefixes
+    if is_truncated and last_key is not None:
+        response["NextContinuationToken"] = encode_continuation_token(last_key)
+    return response
+
+
+def decode_continuation_token(token: str) -> str:
+    """
+    Get the last key of the page a continuation token follows.
+
+    :raises ClientError: With S3's code "InvalidArgument" if the token was not made by `encode_continuation_token`.
+    """
+    try:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as err:
+        raise ClientError(
+            {
+                "Error": {"Code": "InvalidArgument", "Message": "The continuation token provided is incorrect"},
+                "ResponseMetadata": {"HTTPStatusCode": 400, "HTTPHeaders": {}},
+            },
+            "ListObjectsV2",
+        ) from err
+
+
+@functools.lru_cache(maxsize=None)
+def _list_objects_v2_paging() -> Tuple[Dict[str, Any], Any]:
+    """Load botocore's pagination config and model of ListObjectsV2, once."""
+    session = botocore.session.get_session()
+    return (
+        session.get_paginator_model("s3").get_paginator("ListObjectsV2"),
+        session.get_service_model("s3").operation_model("ListObjectsV2"),
+    )
@@ -0,0 +1,99 @@
+"""Functions for presigning S3 requests, so clients can transfer objects with S3 directly."""
+
+from typing import (
+    List,
+    Optional,
+)
+
+import boto3
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+
+def generate_presigned_download_url(
+    bucket_name: str,
+    object_key: str,
+    expires_in_seconds: int,
+    s3_client: Optional["S3Client"] = None,
+    content_type: Optional[str] = None,
+) -> str:
+    """
+    Presign a GET of an object. Signing is local: no request is sent to S3.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to download.
+    :param expires_in_seconds: Seconds the URL stays valid.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param content_type: Optional `Content-Type` for S3 to answer with instead of the object's.
+
+    :return: The URL, which also accepts `Range` and conditional headers.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {"Bucket": bucket_name, "Key": object_key}
+    if content_type is not None:
+        params["ResponseContentType"] = content_type
+    return s3_client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in_seconds)
+
+
+def generate_presigned_upload_url(
+    bucket_name: str,
+    object_key: str,
+    expires_in_seconds: int,
+    content_type: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+) -> str:
+    """
+    Presign a PUT of a whole object, of up to 5 GiB.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to upload.
+    :param expires_in_seconds: Seconds the URL stays valid.
+    :param content_type: MIME type the client must send as `Content-Type`, which is part of the signature.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: The URL.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    return s3_client.generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": bucket_name,
+            "Key": object_key,
+            "ContentType": content_type or "application/octet-stream",
+        },
+        ExpiresIn=expires_in_seconds,
+    )
+
+
+def generate_presigned_part_urls(
+    bucket_name: str,
+    object_key: str,
+    upload_id: str,
+    num_parts: int,
+    expires_in_seconds: int,
+    s3_client: Optional["S3Client"] = None,
+) -> List[str]:
+    """
+    Presign the PUT of every part of a multipart upload.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object being uploaded.
+    :param upload_id: ID returned by `create_multipart_upload`.
+    :param num_parts: Number of parts, at most 10,000.
+    :param expires_in_seconds: Seconds the URLs stay valid.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: The URL of each part, in part number order starting at 1.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    return [
+        s3_client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket_name, "Key": object_key, "UploadId": upload_id, "PartNumber": part_number},
+            ExpiresIn=expires_in_seconds,
+        )
+        for part_number in range(1, num_parts + 1)
+    ]
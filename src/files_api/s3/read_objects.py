@@ -1,20 +1,32 @@
 """Functions for reading objects from an S3 bucket--the "R" in CRUD."""
 
+import asyncio
+from collections import deque
+from datetime import datetime
 from typing import (
     Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Deque,
     Dict,
+    Iterator,
+    List,
     Optional,
+    Tuple,
 )
 
 import boto3
 import botocore.exceptions as boto_exceptions
 
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
 from files_api.utils import list_flatten
 
 try:
     from mypy_boto3_s3 import S3Client
     from mypy_boto3_s3.type_defs import (
         GetObjectOutputTypeDef,
+        HeadObjectOutputTypeDef,
         ObjectTypeDef,
     )
 except ImportError as e:
@@ -22,49 +34,292 @@ except ImportError as e:
     ...
 
 DEFAULT_MAX_KEYS = 1_000
+DIRECTORY_DELIMITER = "/"
+NOT_FOUND_ERROR_CODES = ("404", "NoSuchKey")
+NOT_MODIFIED_ERROR_CODE = "304"
+# e.g. a continuation token S3 did not issue
+INVALID_ARGUMENT_ERROR_CODE = "InvalidArgument"
 
 
-def object_exists_in_s3(bucket_name: str, object_key: str, s3_client: Optional["S3Client"] = None) -> bool:
+def is_not_found_error(error: boto_exceptions.ClientError) -> bool:
+    """
+    Check whether an S3 error means the object does not exist.
+
+    `head_object` reports a missing key as "404" (HEAD responses have no body) while `get_object` reports "NoSuchKey".
+
+    :param error: Error raised by the S3 client.
+
+    :return: True if the error is a "not found" error, False otherwise.
+    """
+    return error.response["Error"]["Code"] in NOT_FOUND_ERROR_CODES
+
+
+def is_not_modified_error(error: boto_exceptions.ClientError) -> bool:
+    """
+    Check whether an S3 error is the 304 of a conditional `get_object` whose object has not changed.
+
+    The headers of the 304, including the object's ETag and Last-Modified, are in `error.response["ResponseMetadata"]`.
+
+    :param error: Error raised by the S3 client.
+
+    :return: True if the error is a "not modified" response, False otherwise.
+    """
+    return error.response["Error"]["Code"] == NOT_MODIFIED_ERROR_CODE
+
+
+def object_exists_in_s3(
+    bucket_name: str,
+    object_key: str,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> bool:
     """
     Check if an object exists in the S3 bucket using head_object.
 
     :param bucket_name: Name of the S3 bucket.
     :param object_key: Key of the object to check.
     :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to answer from, and to store the answer in.
 
     :return: True if the object exists, False otherwise.
     """
+    obj = fetch_s3_object_metadata(
+        bucket_name=bucket_name, object_key=object_key, s3_client=s3_client, metadata_cache=metadata_cache
+    )
+    return obj is not None
+
+
+def fetch_s3_object_metadata(
+    bucket_name: str,
+    object_key: str,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> Optional["HeadObjectOutputTypeDef"]:
+    """
+    Fetch metadata of an object in the S3 bucket with a single head_object call, without downloading its body.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to fetch.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param metadata_cache: Optional cache to answer from, and to store the answer in, including "not found".
+
+    :return: Metadata of the object, or None if the object does not exist.
+    """
+    if metadata_cache is not None:
+        cached = metadata_cache.get(bucket_name, object_key)
+        if cached is not None:
+            return cached.metadata
+        generation = metadata_cache.generation
+
+    s3_client = s3_client or boto3.client("s3")
     try:
-        s3_client = s3_client or boto3.client("s3")
-        obj = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-        obj.get("Body")
-    except boto_exceptions.ClientError as e:
-        error_code = e.response["Error"]["Code"]
-        if error_code in ("404", "NoSuchKey"):
-            return False
+        obj: Optional["HeadObjectOutputTypeDef"] = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+    except boto_exceptions.ClientError as err:
+        if not is_not_found_error(err):
+            raise
+        obj = None
 
-    return True
+    if metadata_cache is not None:
+        metadata_cache.put(bucket_name, object_key, obj, generation=generation)
+    return obj
 
 
 def fetch_s3_object(
     bucket_name: str,
     object_key: str,
     s3_client: Optional["S3Client"] = None,
+    byte_range: Optional[str] = None,
+    if_match: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[datetime] = None,
 ) -> "GetObjectOutputTypeDef":
     """
-    Fetch metadata of an object in the S3 bucket.
+    Fetch an object in the S3 bucket: its metadata and a stream of its body.
 
     :param bucket_name: Name of the S3 bucket.
     :param object_key: Key of the object to fetch.
     :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param byte_range: Optional HTTP range of bytes to fetch, e.g. "bytes=0-1023".
+    :param if_match: Optional ETag the object must still have, e.g. to keep ranged reads of one object consistent.
+    :param if_none_match: Optional ETag held by the client; if the object still has it, S3 answers 304.
+    :param if_modified_since: Optional time the client's copy is from; if the object is older, S3 answers 304.
+
+    :return: Metadata of the object and its body.
 
-    :return: Metadata of the object.
+    :raises botocore.exceptions.ClientError: With code "NoSuchKey" if the object does not exist,
+        or "304" if a condition says the client's copy is current.
     """
     s3_client = s3_client or boto3.client("s3")
-    obj = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+    params: Dict[str, Any] = {}
+    if byte_range is not None:
+        params["Range"] = byte_range
+    if if_match is not None:
+        params["IfMatch"] = if_match
+    if if_none_match is not None:
+        params["IfNoneMatch"] = if_none_match
+    if if_modified_since is not None:
+        params["IfModifiedSince"] = if_modified_since
+
+    obj = s3_client.get_object(Bucket=bucket_name, Key=object_key, **params)
     return obj
 
 
+def fetch_s3_object_start(
+    bucket_name: str,
+    object_key: str,
+    max_bytes: int,
+    s3_client: Optional["S3Client"] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[datetime] = None,
+) -> "GetObjectOutputTypeDef":
+    """
+    Fetch an object, downloading at most its first `max_bytes` bytes.
+
+    Objects of up to `max_bytes` bytes arrive whole in this single request. For larger objects,
+    `get_object_size` of the response tells how many bytes are left to fetch.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to fetch.
+    :param max_bytes: Maximum number of bytes to download.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param if_none_match: Optional ETag held by the client, see `fetch_s3_object`.
+    :param if_modified_since: Optional time the client's copy is from, see `fetch_s3_object`.
+
+    :return: Metadata of the object and the body of its first bytes.
+
+    :raises botocore.exceptions.ClientError: With code "NoSuchKey" if the object does not exist,
+        or "304" if a condition says the client's copy is current.
+    """
+    conditions: Dict[str, Any] = {"if_none_match": if_none_match, "if_modified_since": if_modified_since}
+    try:
+        return fetch_s3_object(
+            bucket_name=bucket_name,
+            object_key=object_key,
+            s3_client=s3_client,
+            byte_range=f"bytes=0-{max_bytes - 1}",
+            **conditions,
+        )
+    except boto_exceptions.ClientError as err:
+        # S3 rejects every range on an empty object
+        if err.response["Error"]["Code"] != "InvalidRange":
+            raise
+        return fetch_s3_object(bucket_name=bucket_name, object_key=object_key, s3_client=s3_client, **conditions)
+
+
+def get_object_size(obj: "GetObjectOutputTypeDef") -> int:
+    """
+    Get the full size of an object from a possibly ranged `get_object` response.
+
+    :param obj: Response of `get_object`.
+
+    :return: Size of the whole object in bytes.
+    """
+    content_range = obj.get("ContentRange")
+    if content_range:
+        # e.g. "bytes 0-1023/4096"
+        return int(content_range.rsplit("/", 1)[1])
+    return obj["ContentLength"]
+
+
+def read_s3_object_range(
+    bucket_name: str,
+    object_key: str,
+    first_byte: int,
+    last_byte: int,
+    if_match: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+) -> bytes:
+    """
+    Download a range of an object into memory.
+
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to read.
+    :param first_byte: Offset of the first byte to read.
+    :param last_byte: Offset of the last byte to read, inclusive.
+    :param if_match: Optional ETag the object must still have.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: The bytes of the range.
+    """
+    obj = fetch_s3_object(
+        bucket_name=bucket_name,
+        object_key=object_key,
+        s3_client=s3_client,
+        byte_range=f"bytes={first_byte}-{last_byte}",
+        if_match=if_match,
+    )
+    return obj["Body"].read()
+
+
+async def iter_s3_object_parts(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    head_chunks: AsyncIterator[bytes],
+    bucket_name: str,
+    object_key: str,
+    etag: str,
+    start: int,
+    total_size: int,
+    part_size: int,
+    max_concurrency: int,
+    s3_client: Optional["S3Client"] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Stream an object whose first bytes are already being downloaded, fetching the rest with concurrent ranged GETs.
+
+    Up to `max_concurrency` ranges of `part_size` bytes are downloaded ahead while earlier bytes are being
+    sent. Parts are yielded in order, so the read-ahead window doubles as a reorder buffer and memory stays
+    below `max_concurrency * part_size`. Every ranged GET is conditional on `etag` so a concurrent
+    overwrite fails the download instead of mixing two versions of the object.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param head_chunks: Chunks of the first `start` bytes of the object.
+    :param bucket_name: Name of the S3 bucket.
+    :param object_key: Key of the object to read.
+    :param etag: ETag of the object.
+    :param start: Offset of the first byte not covered by `head_chunks`.
+    :param total_size: Size of the whole object in bytes.
+    :param part_size: Size of each ranged GET.
+    :param max_concurrency: Maximum number of ranged GETs in flight.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :yield: The bytes of the object, in order.
+    """
+    part_offsets = iter(range(start, total_size, part_size))
+    read_ahead: Deque[asyncio.Future] = deque()
+
+    def fill_read_ahead() -> None:
+        while len(read_ahead) < max_concurrency:
+            offset = next(part_offsets, None)
+            if offset is None:
+                return
+            read_ahead.append(
+                asyncio.ensure_future(
+                    s3_executor.run(
+                        read_s3_object_range,
+                        bucket_name=bucket_name,
+                        object_key=object_key,
+                        first_byte=offset,
+                        last_byte=min(offset + part_size, total_size) - 1,
+                        if_match=etag,
+                        s3_client=s3_client,
+                    )
+                )
+            )
+
+    try:
+        # start fetching the next parts before sending the first bytes
+        fill_read_ahead()
+        async for chunk in head_chunks:
+            yield chunk
+        while read_ahead:
+            part = await read_ahead.popleft()
+            fill_read_ahead()
+            yield part
+    finally:
+        for pending_part in read_ahead:
+            pending_part.cancel()
+
+
 def fetch_s3_objects_using_page_token(
     bucket_name: str,
     continuation_token: str,
@@ -90,9 +345,9 @@ def fetch_s3_objects_using_page_token(
         Bucket=bucket_name, PaginationConfig={"MaxItems": max_keys, "StartingToken": continuation_token}
     )
 
-    object_data = list(list_flatten([page["Contents"] for page in page_iterator]))
+    object_data = list(list_flatten([page.get("Contents", []) for page in page_iterator]))
 
-    return (object_data, str(page_iterator.resume_token))
+    return (object_data, page_iterator.resume_token)
 
 
 def fetch_s3_objects_metadata(
@@ -100,6 +355,7 @@ def fetch_s3_objects_metadata(
     prefix: Optional[str] = None,
     max_keys: Optional[int] = DEFAULT_MAX_KEYS,
     s3_client: Optional["S3Client"] = None,
+    start_after: Optional[str] = None,
 ) -> tuple[list["ObjectTypeDef"], Optional[str]]:
     """
     Fetch list of object keys and their metadata.
@@ -108,6 +364,7 @@ def fetch_s3_objects_metadata(
     :param prefix: Prefix to filter objects by.
     :param max_keys: Maximum number of keys to return within this page.
     :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+    :param start_after: Optional key to start listing after, e.g. the last key of the previous page.
 
     :return: Tuple of a list of objects and the next continuation token.
         1. Possibly empty list of objects in the current page.
@@ -118,6 +375,8 @@ def fetch_s3_objects_metadata(
     params: Dict[str, Any] = {}
     if prefix is not None:
         params["Prefix"] = prefix
+    if start_after is not None:
+        params["StartAfter"] = start_after
 
     objects_metadata = s3_client.list_objects_v2(Bucket=bucket_name, MaxKeys=max_keys, **params)
 
@@ -125,3 +384,90 @@ def fetch_s3_objects_metadata(
         objects_metadata.get("Contents", []),
         objects_metadata.get("NextContinuationToken") if objects_metadata.get("IsTruncated") else None,
     )
+
+
+def fetch_s3_directory_page(
+    bucket_name: str,
+    prefix: str,
+    max_keys: Optional[int] = DEFAULT_MAX_KEYS,
+    continuation_token: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+) -> Tuple[List["ObjectTypeDef"], List[str], Optional[str]]:
+    """
+    Fetch one level of a directory: the objects directly under a prefix, and its subdirectories.
+
+    S3 groups every key with a "/" after the prefix into one common prefix, so a page costs the same
+    whatever the depth of the tree below it.
+
+    :param bucket_name: Name of the S3 bucket to list objects from.
+    :param prefix: Prefix of the directory, usually ending in "/".
+    :param max_keys: Maximum number of objects and subdirectories, together, to return within this page.
+    :param continuation_token: Token of the page to fetch, as returned for the previous page.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Tuple of
+        1. Possibly empty list of objects in the current page.
+        2. Possibly empty list of subdirectories in the current page, each ending in "/".
+        3. Next continuation token if there are more pages, otherwise None.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params: Dict[str, Any] = {}
+    if continuation_token is not None:
+        params["ContinuationToken"] = continuation_token
+
+    response = s3_client.list_objects_v2(
+        Bucket=bucket_name,
+        Prefix=prefix,
+        Delimiter=DIRECTORY_DELIMITER,
+        MaxKeys=max_keys or DEFAULT_MAX_KEYS,
+        **params,
+    )
+    return (
+        response.get("Contents", []),
+        [common_prefix["Prefix"] for common_prefix in response.get("CommonPrefixes", [])],
+        response.get("NextContinuationToken") if response.get("IsTruncated") else None,
+    )
+
+
+def iter_s3_object_pages(
+    bucket_name: str,
+    prefix: str,
+    page_size: int = DEFAULT_MAX_KEYS,
+    s3_client: Optional["S3Client"] = None,
+) -> Iterator[List["ObjectTypeDef"]]:
+    """
+    Enumerate the objects under a prefix, with their sizes and ETags, one listing page at a time.
+
+    :param bucket_name: Name of the S3 bucket to list objects from.
+    :param prefix: Prefix to filter objects by.
+    :param page_size: Maximum number of objects per page.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Lazy iterator of non-empty lists of objects. Each `next` call makes at most one S3 call.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={"PageSize": page_size}):
+        objects = page.get("Contents", [])
+        if objects:
+            yield objects
+
+
+def iter_s3_object_key_pages(
+    bucket_name: str,
+    prefix: str,
+    page_size: int = DEFAULT_MAX_KEYS,
+    s3_client: Optional["S3Client"] = None,
+) -> Iterator[List[str]]:
+    """
+    Enumerate the keys under a prefix, one listing page at a time.
+
+    :param bucket_name: Name of the S3 bucket to list objects from.
+    :param prefix: Prefix to filter objects by.
+    :param page_size: Maximum number of keys per page.
+    :param s3_client: Optional S3 client to use. If not provided, a new client will be created.
+
+    :return: Lazy iterator of non-empty lists of keys. Each `next` call makes at most one S3 call.
+    """
+    for objects in iter_s3_object_pages(bucket_name, prefix, page_size=page_size, s3_client=s3_client):
+        yield [obj["Key"] for obj in objects]
@@ -0,0 +1,255 @@
+"""Shed load quickly while S3 throttles or fails, instead of piling more requests onto it."""
+
+import math
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+# errors S3 returns when it is overloaded, after botocore's own retries gave up
+THROTTLING_ERROR_CODES = frozenset({"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded"})
+# entries of botocore's per-call context: the bucket and key prefix of the call, and its prefix limiter slot
+_PREFIX_CONTEXT_KEY = "files_api_prefix"
+_SLOT_CONTEXT_KEY = "files_api_prefix_slot"
+
+
+class S3UnavailableError(Exception):
+    """S3 is throttling or failing: the call failed after every retry, or was not made at all to shed load."""
+
+    def __init__(self, message: str, retry_after_seconds: int):
+        """
+        Describe the failure and when clients may retry.
+
+        :param message: What went wrong.
+        :param retry_after_seconds: Seconds clients should wait before retrying, for a `Retry-After` header.
+        """
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+
+class CircuitBreaker:
+    """
+    Stop calling S3 for a while once calls keep failing with throttling or server errors.
+
+    Closed, calls go through. After `failure_threshold` consecutive failures it opens, and calls fail at once
+    for `reset_timeout_seconds`. Then it is half-open: a single probe call goes through, which closes the
+    circuit if it succeeds and opens it again if not. Thread-safe, since S3 calls run on a thread pool.
+    """
+
+    def __init__(
+        self, failure_threshold: int, reset_timeout_seconds: float, clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Create a closed circuit.
+
+        :param failure_threshold: Consecutive failed calls that open the circuit.
+        :param reset_timeout_seconds: Seconds the circuit stays open before a probe call is let through.
+        :param clock: Monotonic clock, overridable in tests.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @property
+    def state(self) -> str:
+        """State of the circuit: "closed", "open", or "half_open" once the reset timeout elapsed."""
+        with self._lock:
+            return self._state()
+
+    def before_call(self) -> None:
+        """
+        Let a call through, or reject it.
+
+        :raises S3UnavailableError: If the circuit is open, or half-open with its probe call in flight.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected_calls += 1
+            retry_after_seconds = self._retry_after_seconds()
+        raise S3UnavailableError("S3 is unavailable, calls are paused", retry_after_seconds=retry_after_seconds)
+
+    def record_success(self) -> None:
+        """Close the circuit after a call S3 answered without throttling or a server error."""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a call that S3 throttled or failed, and open the circuit on a failed probe or too many failures."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._probe_in_flight or (
+                self._opened_at is None and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self.times_opened += 1
+            self._probe_in_flight = False
+
+    def retry_after_seconds(self) -> int:
+        """Whole seconds until the circuit lets a call through again, at least 1."""
+        with self._lock:
+            return self._retry_after_seconds()
+
+    def stats(self) -> Dict[str, Union[int, str]]:
+        """Counters to tune the thresholds with."""
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected_calls,
+            }
+
+    def _state(self) -> str:
+        """State of the circuit, with the lock held."""
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout_seconds:
+            return "open"
+        return "half_open"
+
+    def _retry_after_seconds(self) -> int:
+        """Seconds until the circuit half-opens, with the lock held."""
+        if self._opened_at is None:
+            return 1
+        remaining = self.reset_timeout_seconds - (self._clock() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+
+class PrefixConcurrencyLimiter:
+    """
+    Bound the S3 calls in flight per bucket and key prefix, since S3 scales its request rate per prefix.
+
+    The prefix of a key is its first path segment, e.g. "reports/" for "reports/2024/q1.csv". Calls over
+    the limit wait for a slot, up to `max_wait_seconds`, on the S3 thread pool.
+    """
+
+    def __init__(self, max_concurrency: int, max_wait_seconds: float):
+        """
+        Create a limiter with no calls in flight.
+
+        :param max_concurrency: Maximum number of calls in flight per prefix.
+        :param max_wait_seconds: Seconds a call waits for a slot before it is rejected.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_wait_seconds = max_wait_seconds
+        self._slots: Dict[Tuple[str, str], threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self.rejected_calls = 0
+
+    def acquire(self, bucket_name: str, prefix: str) -> threading.BoundedSemaphore:
+        """
+        Wait for a slot for a call to a prefix.
+
+        :return: The slot, to pass to `release` once the call finished.
+
+        :raises S3UnavailableError: If no slot freed up within `max_wait_seconds`.
+        """
+        with self._lock:
+            slot = self._slots.setdefault((bucket_name, prefix), threading.BoundedSemaphore(self.max_concurrency))
+        if not slot.acquire(timeout=self.max_wait_seconds):
+            with self._lock:
+                self.rejected_calls += 1
+            raise S3UnavailableError(
+                f"too many S3 calls in flight for prefix {prefix!r}",
+                retry_after_seconds=max(1, math.ceil(self.max_wait_seconds)),
+            )
+        return slot
+
+    @staticmethod
+    def release(slot: threading.BoundedSemaphore) -> None:
+        """Free the slot of a finished call."""
+        slot.release()
+
+
+def key_prefix(object_key: str) -> str:
+    """Get the first path segment of a key, with its trailing slash, or "" for keys at the top level."""
+    head, separator, _ = object_key.partition("/")
+    return head + separator if separator else ""
+
+
+def install_s3_guards(
+    s3_client: "S3Client",
+    circuit_breaker: Optional[CircuitBreaker] = None,
+    prefix_limiter: Optional[PrefixConcurrencyLimiter] = None,
+) -> None:
+    """
+    Guard every call of an S3 client with a circuit breaker and a per-prefix concurrency limit.
+
+    Calls that S3 still throttles or fails with a server error once botocore's retries gave up raise
+    `S3UnavailableError` instead of `ClientError`, so the app answers them with 503 and `Retry-After`.
+
+    :param s3_client: The client to guard.
+    :param circuit_breaker: Optional circuit breaker every call goes through.
+    :param prefix_limiter: Optional limiter of the calls in flight per prefix.
+    """
+
+    def remember_prefix(params: Dict[str, Any], context: Dict[str, Any], **kwargs) -> None:
+        key = params.get("Key", params.get("Prefix", ""))
+        context[_PREFIX_CONTEXT_KEY] = (params.get("Bucket", ""), key_prefix(key))
+
+    def before_call(context: Dict[str, Any], **kwargs) -> None:
+        if prefix_limiter is not None:
+            context[_SLOT_CONTEXT_KEY] = prefix_limiter.acquire(*context.get(_PREFIX_CONTEXT_KEY, ("", "")))
+        if circuit_breaker is not None:
+            try:
+                circuit_breaker.before_call()
+            except S3UnavailableError:
+                release_slot(context)
+                raise
+
+    def after_call(http_response: Any, parsed: Dict[str, Any], context: Dict[str, Any], **kwargs) -> None:
+        release_slot(context)
+        error_code = parsed.get("Error", {}).get("Code")
+        if http_response.status_code < 500 and error_code not in THROTTLING_ERROR_CODES:
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+            return
+        retry_after_seconds = 1
+        if circuit_breaker is not None:
+            circuit_breaker.record_failure()
+            retry_after_seconds = circuit_breaker.retry_after_seconds()
+        raise S3UnavailableError(
+            f"S3 answered {http_response.status_code} {error_code} after every retry",
+            retry_after_seconds=retry_after_seconds,
+        )
+
+    def after_call_error(context: Dict[str, Any], **kwargs) -> None:
+        # the connection failed or timed out, which an overloaded endpoint does too
+        release_slot(context)
+        if circuit_breaker is not None:
+            circuit_breaker.record_failure()
+
+    def release_slot(context: Dict[str, Any]) -> None:
+        slot = context.pop(_SLOT_CONTEXT_KEY, None)
+        if slot is not None:
+            PrefixConcurrencyLimiter.release(slot)
+
+    events = s3_client.meta.events
+    events.register("before-parameter-build.s3", remember_prefix)
+    events.register("before-call.s3", before_call)
+    events.register("after-call.s3", after_call)
+    events.register("after-call-error.s3", after_call_error)
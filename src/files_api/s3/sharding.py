@@ -0,0 +1,571 @@
+"""Spread the files of one logical bucket over several buckets or key prefixes, and move files when shards change."""
+
+import asyncio
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import boto3
+from botocore.exceptions import (
+    ClientError,
+    OperationNotPageableError,
+)
+from botocore.paginate import Paginator
+from loguru import logger
+
+from files_api.s3.copy_objects import (
+    copy_s3_object,
+    copy_s3_object_in_parts,
+)
+from files_api.s3.delete_objects import (
+    MAX_KEYS_PER_DELETE,
+    delete_s3_objects,
+)
+from files_api.s3.executor import S3Executor
+from files_api.s3.paginators import (
+    decode_continuation_token,
+    list_objects_v2_paginator,
+    list_objects_v2_response,
+)
+from files_api.s3.read_objects import (
+    fetch_s3_object_metadata,
+    is_not_found_error,
+    iter_s3_object_pages,
+)
+from files_api.settings import S3_MAX_COPY_OBJECT_BYTES
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+# a key or common prefix of a shard's listing, relative to the shard's prefix: (key, is a common prefix, S3 entry)
+_ListingEntry = Tuple[str, bool, Dict[str, Any]]
+
+# sorts after every character S3 allows in keys, so that listing after "<common prefix>" + it skips its keys
+_MAX_CHARACTER = "\U0010ffff"
+
+
+@dataclass(frozen=True)
+class BucketShard:
+    """The keys under `prefix` in the bucket `bucket_name`, holding a share of the logical bucket's files."""
+
+    bucket_name: str
+    prefix: str = ""
+
+    @classmethod
+    def parse(cls, shard: str) -> "BucketShard":
+        """
+        Parse a shard written as "bucket" or "bucket/prefix/".
+
+        :raises ValueError: If the bucket name is empty.
+        """
+        bucket_name, _, prefix = shard.partition("/")
+        if not bucket_name:
+            raise ValueError(f"shard {shard!r} has no bucket name")
+        return cls(bucket_name=bucket_name, prefix=f"{prefix}/" if prefix and not prefix.endswith("/") else prefix)
+
+    def __str__(self) -> str:
+        """Format the shard as it is configured, e.g. "bucket/prefix/"."""
+        return f"{self.bucket_name}/{self.prefix}"
+
+
+class ShardMap:
+    """
+    Places each key on one of the shards with rendezvous hashing: on the shard scoring highest for the key.
+
+    A key's scores only depend on the key and each shard's name, so adding a shard only moves the keys it now
+    scores highest for, about 1/N of them, all onto the new shard. Removing one only moves the keys it held.
+    """
+
+    def __init__(self, shards: Sequence[BucketShard]):
+        """
+        :param shards: The shards, in any order.
+
+        :raises ValueError: If there are no shards, or two shards in the same bucket could hold the same keys.
+        """
+        if not shards:
+            raise ValueError("a shard map needs at least one shard")
+        self.shards: Tuple[BucketShard, ...] = tuple(shards)
+        for index, shard in enumerate(self.shards):
+            for other in self.shards[index + 1 :]:
+                if shard.bucket_name == other.bucket_name and (
+                    shard.prefix.startswith(other.prefix) or other.prefix.startswith(shard.prefix)
+                ):
+                    raise ValueError(f"shards {shard} and {other} overlap")
+        self._names = [(shard, str(shard).encode()) for shard in self.shards]
+
+    def rank(self, key: str) -> List[BucketShard]:
+        """Get the shards from the one holding `key` to the one least likely to, e.g. before shards were added."""
+        scores = [
+            (hashlib.blake2b(name + b"\n" + key.encode(), digest_size=8).digest(), shard)
+            for shard, name in self._names
+        ]
+        return [shard for _, shard in sorted(scores, key=lambda score: score[0], reverse=True)]
+
+    def shard_for(self, key: str) -> BucketShard:
+        """Get the shard holding `key`."""
+        if len(self.shards) == 1:
+            return self.shards[0]
+        return self.rank(key)[0]
+
+
+class ShardedStorageBackend:  # pylint: disable=too-many-public-methods
+    """
+    A storage backend answering for one logical bucket from the shards of a `ShardMap`, which API clients never see.
+
+    Calls naming `bucket_name` are sent to the shard of their key, with the key under the shard's prefix, and
+    listings merge the listings of every shard in key order. Calls naming any other bucket, e.g. the blob bucket,
+    are passed through as they are.
+
+    With `read_fallback`, reads, copies and deletes of a key also try the shard ranked second for it, which held
+    it before the last shard was added: files stay readable while `rebalance_shards` moves them.
+    """
+
+    def __init__(
+        self,
+        storage: "S3Client",
+        bucket_name: str,
+        shard_map: ShardMap,
+        read_fallback: bool = False,
+    ):
+        """
+        Store the logical bucket's files on the shards of `shard_map`.
+
+        :param storage: The S3 client or storage backend holding the shards.
+        :param bucket_name: Name of the logical bucket the API is configured with.
+        :param shard_map: Where each key of the logical bucket is stored.
+        :param read_fallback: Whether to also look for keys on the shard ranked second for them.
+        """
+        self.storage = storage
+        self.bucket_name = bucket_name
+        self.shard_map = shard_map
+        self.read_fallback = read_fallback
+        self._listing_executor = ThreadPoolExecutor(
+            max_workers=len(shard_map.shards), thread_name_prefix="shard-listing"
+        )
+
+    def close(self) -> None:
+        """Release the threads listing the shards."""
+        self._listing_executor.shutdown()
+
+    @property
+    def meta(self) -> Any:
+        """The `meta` of the storage, so event hooks such as the S3 guards see every call sent to a shard."""
+        return self.storage.meta
+
+    # --- reads --- #
+
+    def head_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Fetch the metadata of an object from its shard."""
+        return self._call_with_fallback(self.storage.head_object, kwargs)
+
+    def get_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Fetch an object, or a byte range of it, from its shard."""
+        return self._call_with_fallback(self.storage.get_object, kwargs)
+
+    def list_objects_v2(  # pylint: disable=invalid-name,too-many-arguments,too-many-locals
+        self,
+        *,
+        Bucket: str,
+        Prefix: str = "",
+        Delimiter: Optional[str] = None,
+        MaxKeys: int = 1000,
+        StartAfter: Optional[str] = None,
+        ContinuationToken: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        List one page of the objects under a prefix, merged from every shard in key order.
+
+        Every shard is listed concurrently from after the previous page, and the page ends at the first key
+        a truncated shard may not have listed past, so no key is skipped. Continuation tokens are the page's
+        last key, so they are the same whichever shard the page ended on.
+        """
+        if Bucket != self.bucket_name:
+            params = _optional_params(ContinuationToken=ContinuationToken, StartAfter=StartAfter, Delimiter=Delimiter)
+            return self.storage.list_objects_v2(Bucket=Bucket, Prefix=Prefix, MaxKeys=MaxKeys, **params, **kwargs)
+
+        marker = decode_continuation_token(ContinuationToken) if ContinuationToken is not None else StartAfter
+        params = {"Prefix": Prefix, "MaxKeys": MaxKeys, **_optional_params(Delimiter=Delimiter), **kwargs}
+        listings = list(
+            self._listing_executor.map(lambda shard: self._list_shard(shard, marker, params), self.shard_map.shards)
+        )
+        # a truncated shard may hold keys after its last listed one: stop the page at the first such key
+        truncated_at = [entries[-1][0] for entries, is_truncated in listings if is_truncated and entries]
+        contents, common_prefixes, last_key, is_truncated = self._merge_listings(
+            [entries for entries, _ in listings], MaxKeys, end_at=min(truncated_at, default=None)
+        )
+        return list_objects_v2_response(
+            {"Name": Bucket, "Prefix": Prefix, "MaxKeys": MaxKeys, **_optional_params(Delimiter=Delimiter)},
+            contents,
+            common_prefixes,
+            is_truncated,
+            last_key,
+        )
+
+    def get_paginator(self, operation_name: str) -> Paginator:
+        """Page through the merged `list_objects_v2` with botocore's own paginator, as with an S3 client."""
+        if operation_name != "list_objects_v2":
+            raise OperationNotPageableError(operation_name=operation_name)
+        return list_objects_v2_paginator(self.list_objects_v2)
+
+    def generate_presigned_url(  # pylint: disable=invalid-name
+        self, ClientMethod: str, Params: Dict[str, Any], **kwargs: Any
+    ) -> str:
+        """Presign a call to the shard of the object, which S3 then serves without the API."""
+        return self.storage.generate_presigned_url(ClientMethod, Params=self._to_shard(Params), **kwargs)
+
+    # --- writes --- #
+
+    def put_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Store an object on its shard."""
+        return self.storage.put_object(**self._to_shard(kwargs))
+
+    def copy_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Copy an object from its shard to the destination's shard, which S3 does server-side across buckets."""
+        return self._copy_with_fallback(self.storage.copy_object, kwargs)
+
+    def delete_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Delete an object from its shard, and from the shard it may not have been moved from yet."""
+        response = self.storage.delete_object(**self._to_shard(kwargs))
+        fallback = self._fallback_shard(kwargs)
+        if fallback is not None:
+            self.storage.delete_object(**self._to_shard(kwargs, fallback))
+        return response
+
+    def delete_objects(self, **kwargs: Any) -> Dict[str, Any]:
+        """Delete several objects, with one `delete_objects` call per shard holding some of them."""
+        if kwargs["Bucket"] != self.bucket_name:
+            return self.storage.delete_objects(**kwargs)
+        keys_by_shard: Dict[BucketShard, List[str]] = {}
+        for obj in kwargs["Delete"]["Objects"]:
+            for shard in self.shard_map.rank(obj["Key"])[: 2 if self.read_fallback else 1]:
+                keys_by_shard.setdefault(shard, []).append(obj["Key"])
+
+        deleted: Dict[str, Dict[str, Any]] = {}
+        errors: List[Dict[str, Any]] = []
+        for shard, keys in keys_by_shard.items():
+            shard_deleted, shard_errors = self._delete_from_shard(shard, keys, kwargs)
+            # a key deleted from both its shard and its fallback shard is reported once
+            deleted.update((obj["Key"], obj) for obj in shard_deleted)
+            errors += shard_errors
+        response = {"Deleted": list(deleted.values())} if deleted else {}
+        if errors:
+            response["Errors"] = errors
+        return response
+
+    def create_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Start a multipart upload on the object's shard."""
+        return self.storage.create_multipart_upload(**self._to_shard(kwargs))
+
+    def upload_part(self, **kwargs: Any) -> Dict[str, Any]:
+        """Store one part of a multipart upload on the object's shard."""
+        return self.storage.upload_part(**self._to_shard(kwargs))
+
+    def upload_part_copy(self, **kwargs: Any) -> Dict[str, Any]:
+        """Copy a byte range of an object, on any shard, as one part of a multipart upload."""
+        return self._copy_with_fallback(self.storage.upload_part_copy, kwargs)
+
+    def complete_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Join the parts of a multipart upload on the object's shard."""
+        return self.storage.complete_multipart_upload(**self._to_shard(kwargs))
+
+    def abort_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Discard a multipart upload on the object's shard."""
+        return self.storage.abort_multipart_upload(**self._to_shard(kwargs))
+
+    # --- shard listings and batches --- #
+
+    def _list_shard(
+        self, shard: BucketShard, marker: Optional[str], params: Dict[str, Any]
+    ) -> Tuple[List[_ListingEntry], bool]:
+        """
+        List one page of a shard after `marker`, as sorted entries with keys relative to the shard's prefix.
+
+        :param shard: The shard to list.
+        :param marker: The last key or common prefix of the previous page, if any.
+        :param params: The `list_objects_v2` parameters of the merged listing, with keys relative to the shards.
+
+        :return: The entries, and whether the shard has more.
+        """
+        start_after = _start_after(marker, params["Prefix"], params.get("Delimiter")) if marker is not None else None
+        response = self.storage.list_objects_v2(
+            **{
+                **params,
+                "Bucket": shard.bucket_name,
+                "Prefix": shard.prefix + params["Prefix"],
+                **_optional_params(StartAfter=shard.prefix + start_after if start_after is not None else None),
+            }
+        )
+        prefix_length = len(shard.prefix)
+        entries = [(obj["Key"][prefix_length:], False, obj) for obj in response.get("Contents", [])]
+        entries += [
+            (common_prefix["Prefix"][prefix_length:], True, common_prefix)
+            for common_prefix in response.get("CommonPrefixes", [])
+        ]
+        entries = [entry for entry in entries if marker is None or entry[0] > marker]
+        return sorted(entries, key=lambda entry: entry[0]), bool(response.get("IsTruncated"))
+
+    def _merge_listings(
+        self, listings: List[List[_ListingEntry]], max_keys: int, end_at: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]], Optional[str], bool]:
+        """
+        Merge the sorted entries of every shard into one page, in key order.
+
+        :param listings: The entries of each shard, in the order of the shard map.
+        :param max_keys: Maximum number of keys and common prefixes in the page.
+        :param end_at: The last key the page may hold, if a shard was not listed past it.
+
+        :return: The objects and common prefixes of the page, its last key, and whether the listing continues
+            after it.
+        """
+        contents: List[Dict[str, Any]] = []
+        common_prefixes: List[Dict[str, str]] = []
+        last_key: Optional[str] = None
+        for key, is_prefix, obj, shard in self._iter_merged(listings):
+            if end_at is not None and key > end_at:
+                break
+            if key == last_key:
+                # the same common prefix on several shards, or a key not moved yet by `rebalance_shards`:
+                # the copy on the key's own shard wins
+                if not is_prefix and shard == self.shard_map.shard_for(key):
+                    contents[-1] = {**obj, "Key": key}
+                continue
+            if len(contents) + len(common_prefixes) == max_keys:
+                return contents, common_prefixes, last_key, True
+            if is_prefix:
+                common_prefixes.append({"Prefix": key})
+            else:
+                contents.append({**obj, "Key": key})
+            last_key = key
+        return contents, common_prefixes, last_key, end_at is not None
+
+    def _iter_merged(
+        self, listings: List[List[_ListingEntry]]
+    ) -> Iterator[Tuple[str, bool, Dict[str, Any], BucketShard]]:
+        """Merge the sorted entries of every shard in key order, each with the shard it was listed from."""
+        return heapq.merge(
+            *(
+                ((key, is_prefix, obj, shard) for key, is_prefix, obj in entries)
+                for entries, shard in zip(listings, self.shard_map.shards)
+            ),
+            key=lambda entry: entry[0],
+        )
+
+    def _delete_from_shard(
+        self, shard: BucketShard, keys: List[str], params: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Delete keys from a shard in batches of up to `MAX_KEYS_PER_DELETE`.
+
+        :param shard: The shard to delete from.
+        :param keys: The keys, relative to the shard's prefix.
+        :param params: The `delete_objects` parameters naming the logical bucket.
+
+        :return: The deleted objects and the errors, with keys relative to the shard's prefix.
+        """
+        deleted: List[Dict[str, Any]] = []
+        errors: List[Dict[str, Any]] = []
+        prefix_length = len(shard.prefix)
+        for start in range(0, len(keys), MAX_KEYS_PER_DELETE):
+            batch = [{"Key": shard.prefix + key} for key in keys[start : start + MAX_KEYS_PER_DELETE]]
+            response = self.storage.delete_objects(
+                **{**params, "Bucket": shard.bucket_name, "Delete": {**params["Delete"], "Objects": batch}}
+            )
+            deleted += [{**obj, "Key": obj["Key"][prefix_length:]} for obj in response.get("Deleted", [])]
+            errors += [{**error, "Key": error["Key"][prefix_length:]} for error in response.get("Errors", [])]
+        return deleted, errors
+
+    # --- shard routing --- #
+
+    def _to_shard(self, params: Dict[str, Any], shard: Optional[BucketShard] = None) -> Dict[str, Any]:
+        """Point the `Bucket` and `Key` of a call naming the logical bucket at the key's shard, or at `shard`."""
+        if params.get("Bucket") != self.bucket_name:
+            return params
+        shard = shard or self.shard_map.shard_for(params["Key"])
+        return {**params, "Bucket": shard.bucket_name, "Key": shard.prefix + params["Key"]}
+
+    def _fallback_shard(self, params: Dict[str, Any]) -> Optional[BucketShard]:
+        """Get the shard that may still hold the key of a call naming the logical bucket, if reads fall back."""
+        if not self.read_fallback or params.get("Bucket") != self.bucket_name or len(self.shard_map.shards) == 1:
+            return None
+        return self.shard_map.rank(params["Key"])[1]
+
+    def _call_with_fallback(self, method: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Call `method` on the key's shard, then on its fallback shard if the key was not found."""
+        try:
+            return method(**self._to_shard(params))
+        except ClientError as err:
+            fallback = self._fallback_shard(params)
+            if fallback is None or not is_not_found_error(err):
+                raise
+        return method(**self._to_shard(params, fallback))
+
+    def _copy_with_fallback(self, method: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a copy `method` with its destination and source on their shards, retrying a source not found."""
+        source = params["CopySource"]
+        params = self._to_shard(params)
+        try:
+            return method(**{**params, "CopySource": self._to_shard(source)})
+        except ClientError as err:
+            fallback = self._fallback_shard(source)
+            if fallback is None or not is_not_found_error(err):
+                raise
+        return method(**{**params, "CopySource": self._to_shard(source, fallback)})
+
+
+@dataclass(frozen=True)
+class ShardMove:
+    """A file on a shard other than its own, moved or to be moved by `rebalance_shards`."""
+
+    key: str
+    source: BucketShard
+    destination: BucketShard
+    size: int
+
+
+async def rebalance_shards(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    shard_map: ShardMap,
+    max_concurrency: int = 8,
+    part_size_bytes: int = 512 * 1024 * 1024,
+    dry_run: bool = False,
+    s3_client: Optional["S3Client"] = None,
+) -> List[ShardMove]:
+    """
+    Move every file not on its own shard to it, e.g. after adding shards, with server-side copies.
+
+    Run it once the API uses the new shards with `read_fallback`, so files stay readable until moved. A file
+    already on its own shard, written there since, is newer: the misplaced copy is only deleted. Each copy is
+    conditional on the ETag listed, so a file overwritten meanwhile is left for the next run.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param shard_map: The shards, including any new ones.
+    :param max_concurrency: Maximum number of files moved at once.
+    :param part_size_bytes: Size of the parts files over 5 GiB are copied in.
+    :param dry_run: Only find the files to move, without moving them.
+    :param s3_client: Optional S3 client holding the shards, not sharded itself. If not provided, a new client
+        will be created.
+
+    :return: The files moved, or to move with `dry_run`.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def move_file(move: ShardMove, etag: str) -> bool:
+        async with slots:
+            return await _move_file(s3_executor, move, etag, part_size_bytes, s3_client)
+
+    moves: List[ShardMove] = []
+    for shard in shard_map.shards:
+        pages = iter_s3_object_pages(shard.bucket_name, prefix=shard.prefix, s3_client=s3_client)
+        while (page := await s3_executor.run(next, pages, None)) is not None:
+            misplaced = list(_iter_misplaced(shard_map, shard, page))
+            if dry_run:
+                moves += [move for move, _ in misplaced]
+                continue
+            moved = await asyncio.gather(*(move_file(move, etag) for move, etag in misplaced))
+            page_moves = [move for (move, _), is_moved in zip(misplaced, moved) if is_moved]
+            await _delete_moved(s3_executor, shard, [move.key for move in page_moves], s3_client)
+            moves += page_moves
+    logger.info("moved {num_moved} files between shards", num_moved=len(moves))
+    return moves
+
+
+async def _move_file(
+    s3_executor: S3Executor, move: ShardMove, etag: str, part_size_bytes: int, s3_client: "S3Client"
+) -> bool:
+    """
+    Copy a misplaced file to its own shard, unless a newer one is already there.
+
+    :return: Whether the file is on its own shard, so the misplaced copy can be deleted.
+    """
+    destination_key = move.destination.prefix + move.key
+    if await s3_executor.run(
+        fetch_s3_object_metadata, move.destination.bucket_name, destination_key, s3_client=s3_client
+    ):
+        return True
+    source_key = move.source.prefix + move.key
+    try:
+        if move.size <= S3_MAX_COPY_OBJECT_BYTES:
+            await s3_executor.run(
+                copy_s3_object,
+                bucket_name=move.destination.bucket_name,
+                source_key=source_key,
+                destination_key=destination_key,
+                if_match=etag,
+                s3_client=s3_client,
+                source_bucket_name=move.source.bucket_name,
+            )
+        else:
+            source = await s3_executor.run(
+                fetch_s3_object_metadata, move.source.bucket_name, source_key, s3_client=s3_client
+            )
+            await copy_s3_object_in_parts(
+                s3_executor,
+                bucket_name=move.destination.bucket_name,
+                source_key=source_key,
+                destination_key=destination_key,
+                size=move.size,
+                etag=etag,
+                content_type=source.get("ContentType") if source else None,
+                part_size_bytes=part_size_bytes,
+                s3_client=s3_client,
+                source_bucket_name=move.source.bucket_name,
+            )
+    except ClientError as err:
+        logger.warning("failed to move {key} to {shard}: {err}", key=move.key, shard=move.destination, err=err)
+        return False
+    return True
+
+
+async def _delete_moved(s3_executor: S3Executor, shard: BucketShard, keys: List[str], s3_client: "S3Client") -> None:
+    """Delete the copies of moved files left on `shard`, in batches of up to `MAX_KEYS_PER_DELETE`."""
+    source_keys = [shard.prefix + key for key in keys]
+    for start in range(0, len(source_keys), MAX_KEYS_PER_DELETE):
+        _, errors = await s3_executor.run(
+            delete_s3_objects, shard.bucket_name, source_keys[start : start + MAX_KEYS_PER_DELETE], s3_client=s3_client
+        )
+        for error in errors:
+            logger.warning("failed to delete moved {key}: {message}", key=error["Key"], message=error["Message"])
+
+
+def _iter_misplaced(
+    shard_map: ShardMap, shard: BucketShard, objects: List[Dict[str, Any]]
+) -> Iterator[Tuple[ShardMove, str]]:
+    """Find the objects listed from `shard` that belong on another shard, with their ETags."""
+    for obj in objects:
+        key = obj["Key"][len(shard.prefix) :]
+        destination = shard_map.shard_for(key)
+        if destination != shard:
+            yield ShardMove(key=key, source=shard, destination=destination, size=obj["Size"]), obj["ETag"]
+
+
+def _optional_params(**params: Any) -> Dict[str, Any]:
+    """Drop the parameters that are None, which boto3 would reject rather than leave out."""
+    return {name: value for name, value in params.items() if value is not None}
+
+
+def _start_after(marker: str, prefix: str, delimiter: Optional[str]) -> str:
+    """
+    Get the key to list shards after, to continue a listing after `marker`.
+
+    With a delimiter, a marker holding one past `prefix` is a common prefix, listed with all its keys: the shards
+    are listed after all of them instead of returning the common prefix again.
+    """
+    if delimiter and marker.startswith(prefix):
+        end = marker.find(delimiter, len(prefix))
+        if end != -1:
+            return marker[: end + len(delimiter)] + _MAX_CHARACTER
+    return marker
@@ -0,0 +1,66 @@
+"""Coalesce concurrent identical calls into one, so a burst of requests for a hot key costs one S3 call."""
+
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Share the result of an in-flight async call with every caller asking for the same key meanwhile.
+
+    Each call runs as its own task, so a caller giving up, e.g. because its client disconnected, never fails
+    the others waiting on it. Nothing is kept once a call finished: callers arriving later start a new one.
+    Keys should include whatever makes an earlier result stale, such as a cache generation, so a call started
+    before a write is never shared with callers arriving after it.
+
+    Calls are shared within one event loop, which is one worker process.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await `func()`, or the call of it already in flight for `key`.
+
+        :param key: Identifies calls that return the same result.
+        :param func: Starts the call, e.g. `lambda: s3_executor.run(...)`.
+
+        :return: The result of the shared call. Its exception, if any, is raised to every caller.
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Counters of how many calls were answered by another one in flight."""
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": coalesced / self.calls if self.calls else 0.0,
+        }
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        """Drop a finished call, and mark its exception retrieved in case every caller gave up on it."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()
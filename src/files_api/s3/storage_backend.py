@@ -0,0 +1,108 @@
+"""The object storage the API stores files in: S3, or a local directory, optionally sharded."""
+
+from typing import (
+    Any,
+    Dict,
+    Protocol,
+)
+
+from files_api.s3.client import create_s3_client
+from files_api.s3.local_backend import LocalStorageBackend
+from files_api.s3.sharding import (
+    BucketShard,
+    ShardedStorageBackend,
+    ShardMap,
+)
+from files_api.settings import Settings
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+
+class StorageBackend(Protocol):
+    """
+    The object storage calls the API makes, in the shape of boto3's S3 client.
+
+    Every function taking an `s3_client` calls a backend through this interface, so a boto3 S3 client is one
+    and `LocalStorageBackend` is another. Backends take the same keyword arguments and return the same response
+    fields as S3 does, and fail with `botocore.exceptions.ClientError`s carrying S3's error codes.
+    """
+
+    def head_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Fetch the metadata of an object."""
+
+    def get_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Fetch an object, or a byte range of it, and a `Body` to read it from."""
+
+    def list_objects_v2(self, **kwargs: Any) -> Dict[str, Any]:
+        """List one page of the objects under a prefix."""
+
+    def get_paginator(self, operation_name: str) -> Any:
+        """Page through `list_objects_v2`."""
+
+    def put_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Store an object."""
+
+    def copy_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Copy an object within the storage."""
+
+    def delete_object(self, **kwargs: Any) -> Dict[str, Any]:
+        """Delete an object."""
+
+    def delete_objects(self, **kwargs: Any) -> Dict[str, Any]:
+        """Delete several objects."""
+
+    def create_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Start a multipart upload."""
+
+    def upload_part(self, **kwargs: Any) -> Dict[str, Any]:
+        """Store one part of a multipart upload."""
+
+    def upload_part_copy(self, **kwargs: Any) -> Dict[str, Any]:
+        """Copy a byte range of an object as one part of a multipart upload."""
+
+    def complete_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Join the parts of a multipart upload into an object."""
+
+    def abort_multipart_upload(self, **kwargs: Any) -> Dict[str, Any]:
+        """Discard a multipart upload."""
+
+
+def create_storage_backend(settings: Settings) -> "S3Client":
+    """
+    Create the storage backend chosen by `settings.storage_backend`, spread over `settings.s3_shards` if set.
+
+    :param settings: Settings choosing the backend and configuring it.
+
+    :return: A pooled S3 client, or a `LocalStorageBackend` standing in for one, wrapped in a
+        `ShardedStorageBackend` if sharded.
+    """
+    storage = create_unsharded_storage_backend(settings)
+    if not settings.s3_shards:
+        return storage
+    return ShardedStorageBackend(  # type: ignore[return-value]
+        storage,
+        bucket_name=settings.s3_bucket_name,
+        shard_map=create_shard_map(settings),
+        read_fallback=settings.s3_shard_read_fallback,
+    )
+
+
+def create_unsharded_storage_backend(settings: Settings) -> "S3Client":
+    """Create the storage backend chosen by `settings.storage_backend`, calling the shards' buckets directly."""
+    if settings.storage_backend == "local":
+        return LocalStorageBackend(  # type: ignore[return-value]
+            directory=settings.local_storage_directory, fsync=settings.local_storage_fsync
+        )
+    return create_s3_client(settings)
+
+
+def create_shard_map(settings: Settings) -> ShardMap:
+    """
+    Create the map of `settings.s3_shards`.
+
+    :raises ValueError: If two shards overlap.
+    """
+    return ShardMap([BucketShard.parse(shard) for shard in settings.s3_shards])
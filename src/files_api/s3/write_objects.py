@@ -1,11 +1,38 @@
 """Functions for writing objects from an S3 bucket--the "C" and "U" in CRUD."""
 
-from typing import Optional
+import asyncio
+import hashlib
+import zlib
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+)
 
 import boto3
+from loguru import logger
+
+from files_api.checksums import (
+    SHA256_METADATA_KEY,
+    crc32_checksum,
+    sha256_checksum,
+)
+from files_api.compression import (
+    UNCOMPRESSED_SIZE_METADATA_KEY,
+    ContentEncoding,
+    compress,
+)
+from files_api.s3.executor import S3Executor
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from files_api.settings import S3_MAX_COPY_OBJECT_BYTES
 
 try:
     from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import CompletedPartTypeDef
 except ImportError:
     ...
 
@@ -16,23 +43,409 @@ def upload_s3_object(
     file_content: bytes,
     content_type: Optional[str] = None,
     s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    content_encoding: Optional[ContentEncoding] = None,
+    compression_level: Optional[int] = None,
 ) -> None:
     """
     Upload a file to an S3 bucket.
 
+    The SHA-256 digest of the stored bytes is sent along, so S3 rejects a body corrupted on the way, and kept in
+    the object's metadata, so downloads can be verified too. botocore then skips its own default checksum, which
+    keeps this to a single pass over the bytes.
+
     :param bucket_name: The name of the S3 bucket.
     :param object_key: path to the object in the S3 bucket.
     :param file_content: The content of the file to upload.
     :param content_type: The MIME type of the file, e.g. "text/plain" for a text file.
     :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param metadata_cache: An optional cache to invalidate the object's metadata in.
+    :param content_encoding: Store the file compressed with this encoding, recording it as the object's
+        `Content-Encoding` and its uncompressed size in its metadata. Files that do not shrink are stored as is.
+    :param compression_level: Compression level, defaulting to the encoding's own default.
     """
     s3_client = s3_client or boto3.client("s3")
     content_type = content_type or "application/octet-stream"
+    params = {}
+    metadata = {}
+    if content_encoding is not None:
+        compressed = compress(file_content, content_encoding, compression_level)
+        if len(compressed) < len(file_content):
+            params = {"ContentEncoding": content_encoding}
+            metadata[UNCOMPRESSED_SIZE_METADATA_KEY] = str(len(file_content))
+            file_content = compressed
+    digest = hashlib.sha256(file_content).digest()
+    metadata[SHA256_METADATA_KEY] = digest.hex()
     print(
         s3_client.put_object(
             Bucket=bucket_name,
             Key=object_key,
             Body=file_content,
             ContentType=content_type,
+            Metadata=metadata,
+            ChecksumSHA256=sha256_checksum(digest),
+            **params,
         )
     )
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, object_key)
+
+
+def create_multipart_upload(
+    bucket_name: str,
+    object_key: str,
+    content_type: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+    checksum_crc32: bool = False,
+    metadata: Optional[Dict[str, str]] = None,
+    content_encoding: Optional[str] = None,
+) -> str:
+    """
+    Start a multipart upload.
+
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param content_type: The MIME type of the file, e.g. "text/plain" for a text file.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param checksum_crc32: Require a CRC32 checksum with every part, see `upload_part`, and have S3 check the whole
+        object against the CRC32 given to `complete_multipart_upload`.
+    :param metadata: User metadata of the object, which multipart uploads do not copy from a source.
+    :param content_encoding: The `Content-Encoding` of the object, if its bytes are stored compressed.
+
+    :return: The upload ID identifying the multipart upload in later calls.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    content_type = content_type or "application/octet-stream"
+    # a full-object checksum, unlike the default composite one, can be computed as the stream is read
+    params: Dict[str, Any] = {"ChecksumAlgorithm": "CRC32", "ChecksumType": "FULL_OBJECT"} if checksum_crc32 else {}
+    if content_encoding is not None:
+        params["ContentEncoding"] = content_encoding
+    response = s3_client.create_multipart_upload(
+        Bucket=bucket_name, Key=object_key, ContentType=content_type, Metadata=metadata or {}, **params
+    )
+    return response["UploadId"]
+
+
+def upload_part(
+    bucket_name: str,
+    object_key: str,
+    upload_id: str,
+    part_number: int,
+    part_content: bytes,
+    s3_client: Optional["S3Client"] = None,
+    checksum_crc32: bool = False,
+) -> "CompletedPartTypeDef":
+    """
+    Upload one part of a multipart upload.
+
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param upload_id: ID returned by `create_multipart_upload`.
+    :param part_number: 1-based position of the part in the object.
+    :param part_content: The bytes of the part. Every part but the last must be at least 5 MiB.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param checksum_crc32: Send the CRC32 of the part, for S3 to check it against, if the upload was created with
+        `checksum_crc32`.
+
+    :return: The part number, ETag and checksum, as expected by `complete_multipart_upload`.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {}
+    if checksum_crc32:
+        params["ChecksumCRC32"] = crc32_checksum(zlib.crc32(part_content))
+    response = s3_client.upload_part(
+        Bucket=bucket_name, Key=object_key, UploadId=upload_id, PartNumber=part_number, Body=part_content, **params
+    )
+    return {"PartNumber": part_number, "ETag": response["ETag"], **params}
+
+
+def complete_multipart_upload(
+    bucket_name: str,
+    object_key: str,
+    upload_id: str,
+    parts: List["CompletedPartTypeDef"],
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    crc32: Optional[int] = None,
+) -> None:
+    """
+    Assemble the uploaded parts into the final object.
+
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param upload_id: ID returned by `create_multipart_upload`.
+    :param parts: Part numbers and ETags of every uploaded part, in ascending part number order.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param metadata_cache: An optional cache to invalidate the object's metadata in.
+    :param crc32: CRC32 of the whole object, for S3 to check the assembled parts against, if the upload was created
+        with `checksum_crc32`.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    params = {"ChecksumCRC32": crc32_checksum(crc32), "ChecksumType": "FULL_OBJECT"} if crc32 is not None else {}
+    s3_client.complete_multipart_upload(
+        Bucket=bucket_name, Key=object_key, UploadId=upload_id, MultipartUpload={"Parts": parts}, **params
+    )
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, object_key)
+
+
+def abort_multipart_upload(
+    bucket_name: str,
+    object_key: str,
+    upload_id: str,
+    s3_client: Optional["S3Client"] = None,
+) -> None:
+    """
+    Abort a multipart upload so S3 discards (and stops billing for) its uploaded parts.
+
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param upload_id: ID returned by `create_multipart_upload`.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_key, UploadId=upload_id)
+
+
+def replace_s3_object_metadata(  # pylint: disable=too-many-arguments
+    bucket_name: str,
+    object_key: str,
+    size: int,
+    etag: str,
+    content_type: str,
+    metadata: Dict[str, str],
+    content_encoding: Optional[str] = None,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+) -> None:
+    """
+    Replace the user metadata of an object by copying it onto itself, which S3 does without the bytes leaving it.
+
+    The copy is conditional on `etag`, so an object overwritten meanwhile is left alone. Objects above the 5 GiB
+    limit of `copy_object` are copied onto themselves as a multipart upload of `UploadPartCopy` calls.
+
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param size: Size of the object in bytes.
+    :param etag: ETag of the object.
+    :param content_type: The MIME type of the object, which the copy must be given again.
+    :param metadata: The new user metadata, replacing all of the current one.
+    :param content_encoding: The `Content-Encoding` of the object, if any, which the copy must be given again.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param metadata_cache: An optional cache to invalidate the object's metadata in.
+
+    :raises botocore.exceptions.ClientError: With code "PreconditionFailed" if the object no longer has `etag`.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    copy_source = {"Bucket": bucket_name, "Key": object_key}
+    if size <= S3_MAX_COPY_OBJECT_BYTES:
+        params = {"ContentEncoding": content_encoding} if content_encoding else {}
+        s3_client.copy_object(
+            Bucket=bucket_name,
+            Key=object_key,
+            CopySource=copy_source,
+            CopySourceIfMatch=etag,
+            MetadataDirective="REPLACE",
+            ContentType=content_type,
+            Metadata=metadata,
+            **params,
+        )
+    else:
+        upload_id = create_multipart_upload(
+            bucket_name,
+            object_key,
+            content_type=content_type,
+            s3_client=s3_client,
+            metadata=metadata,
+            content_encoding=content_encoding,
+        )
+        try:
+            parts: List["CompletedPartTypeDef"] = []
+            for part_number, first_byte in enumerate(range(0, size, S3_MAX_COPY_OBJECT_BYTES), start=1):
+                last_byte = min(first_byte + S3_MAX_COPY_OBJECT_BYTES, size) - 1
+                response = s3_client.upload_part_copy(
+                    Bucket=bucket_name,
+                    Key=object_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    CopySource=copy_source,
+                    CopySourceRange=f"bytes={first_byte}-{last_byte}",
+                    CopySourceIfMatch=etag,
+                )
+                parts.append({"PartNumber": part_number, "ETag": response["CopyPartResult"]["ETag"]})
+            complete_multipart_upload(bucket_name, object_key, upload_id, parts, s3_client=s3_client)
+        except BaseException:
+            abort_multipart_upload(bucket_name, object_key, upload_id, s3_client=s3_client)
+            raise
+    if metadata_cache is not None:
+        metadata_cache.invalidate(bucket_name, object_key)
+
+
+async def upload_s3_object_from_stream(  # pylint: disable=too-many-arguments
+    s3_executor: S3Executor,
+    read: Callable[[int], Awaitable[bytes]],
+    bucket_name: str,
+    object_key: str,
+    content_type: Optional[str] = None,
+    multipart_threshold_bytes: int = 8 * 1024 * 1024,
+    part_size_bytes: int = 8 * 1024 * 1024,
+    max_concurrency: int = 4,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    content_encoding: Optional[ContentEncoding] = None,
+    compression_level: Optional[int] = None,
+) -> None:
+    """
+    Upload a stream to S3 without holding all of it in memory.
+
+    Streams up to `multipart_threshold_bytes` are sent with a single `put_object`, compressed if
+    `content_encoding` is set. Larger streams are stored as is, since their uncompressed size is not known
+    when the upload starts: they are read in `part_size_bytes` chunks and sent as a multipart upload with
+    up to `max_concurrency` parts in flight, so at most `max_concurrency + 1` parts are held in memory.
+    Each part's CRC32 is computed on the S3 thread pool as it is sent, for S3 to check the part against. The
+    CRC32 of the whole stream is computed too as it is read, for S3 to check the assembled object against
+    when the upload completes. S3 keeps it as the object's full-object checksum, which the SDK verifies whole
+    downloads with. If anything fails, the multipart upload is aborted before the error is re-raised.
+
+    :param s3_executor: Executor the blocking S3 calls are run on.
+    :param read: Async function returning up to `n` bytes of the stream, or b"" at the end, e.g. `UploadFile.read`.
+    :param bucket_name: The name of the S3 bucket.
+    :param object_key: path to the object in the S3 bucket.
+    :param content_type: The MIME type of the file, e.g. "text/plain" for a text file.
+    :param multipart_threshold_bytes: Largest stream sent with a single `put_object`.
+    :param part_size_bytes: Size of each part of a multipart upload.
+    :param max_concurrency: Maximum number of parts uploaded at once.
+    :param s3_client: An optional boto3 S3 client. If not provided, one will be created.
+    :param metadata_cache: An optional cache to invalidate the object's metadata in once the upload completed.
+    :param content_encoding: Encoding to compress streams sent with a single `put_object` with.
+    :param compression_level: Compression level, defaulting to the encoding's own default.
+    """
+    head = await _read_up_to(read, multipart_threshold_bytes + 1)
+    if len(head) <= multipart_threshold_bytes:
+        await s3_executor.run(
+            upload_s3_object,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            file_content=head,
+            content_type=content_type,
+            s3_client=s3_client,
+            metadata_cache=metadata_cache,
+            content_encoding=content_encoding,
+            compression_level=compression_level,
+        )
+        return
+
+    upload_id = await s3_executor.run(
+        create_multipart_upload,
+        bucket_name=bucket_name,
+        object_key=object_key,
+        content_type=content_type,
+        s3_client=s3_client,
+        checksum_crc32=True,
+    )
+    logger.debug("started multipart upload {upload_id} for {object_key}", upload_id=upload_id, object_key=object_key)
+
+    slots = asyncio.Semaphore(max_concurrency)
+    part_uploads: List[asyncio.Task] = []
+    crc32 = 0
+
+    async def send_part(part_number: int, part_content: bytes) -> "CompletedPartTypeDef":
+        try:
+            return await s3_executor.run(
+                upload_part,
+                bucket_name=bucket_name,
+                object_key=object_key,
+                upload_id=upload_id,
+                part_number=part_number,
+                part_content=part_content,
+                s3_client=s3_client,
+                checksum_crc32=True,
+            )
+        finally:
+            slots.release()
+
+    try:
+        part_number = 0
+        async for part_content in _iter_parts(read, part_size_bytes, head):
+            # wait for a free slot before reading further, which bounds the parts held in memory
+            await slots.acquire()
+            _raise_first_error(part_uploads)
+            part_number += 1
+            part_uploads.append(asyncio.create_task(send_part(part_number, part_content)))
+            # zlib releases the GIL on large buffers
+            crc32 = await asyncio.to_thread(zlib.crc32, part_content, crc32)
+
+        parts = await asyncio.gather(*part_uploads)
+        await s3_executor.run(
+            complete_multipart_upload,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            upload_id=upload_id,
+            parts=list(parts),
+            s3_client=s3_client,
+            metadata_cache=metadata_cache,
+            crc32=crc32,
+        )
+    except BaseException:
+        for part_upload in part_uploads:
+            part_upload.cancel()
+        await asyncio.gather(*part_uploads, return_exceptions=True)
+        await _abort_quietly(s3_executor, bucket_name, object_key, upload_id, s3_client)
+        raise
+
+
+async def _read_up_to(read: Callable[[int], Awaitable[bytes]], size: int) -> bytes:
+    """Read `size` bytes from the stream, or fewer if the stream ends first."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = await read(size - len(buffer))
+        if not chunk:
+            break
+        buffer += chunk
+    return bytes(buffer)
+
+
+async def _iter_parts(read: Callable[[int], Awaitable[bytes]], part_size: int, head: bytes) -> AsyncIterator[bytes]:
+    """Yield the already read `head` followed by the rest of the stream, in chunks of `part_size` bytes."""
+    for start in range(0, len(head) - len(head) % part_size, part_size):
+        yield head[start : start + part_size]
+
+    remainder = head[len(head) - len(head) % part_size :]
+    while True:
+        part = remainder + await _read_up_to(read, part_size - len(remainder))
+        remainder = b""
+        if not part:
+            return
+        yield part
+        if len(part) < part_size:
+            return
+
+
+def _raise_first_error(tasks: List[asyncio.Task]) -> None:
+    """Re-raise the error of the first finished task that failed, if any."""
+    for task in tasks:
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            raise task.exception()  # type: ignore[misc]
+
+
+async def _abort_quietly(
+    s3_executor: S3Executor,
+    bucket_name: str,
+    object_key: str,
+    upload_id: str,
+    s3_client: Optional["S3Client"],
+) -> None:
+    """Abort a multipart upload without masking the error that caused the abort."""
+    try:
+        await s3_executor.run(
+            abort_multipart_upload,
+            bucket_name=bucket_name,
+            object_key=object_key,
+            upload_id=upload_id,
+            s3_client=s3_client,
+        )
+        logger.warning(
+            "aborted multipart upload {upload_id} for {object_key}", upload_id=upload_id, object_key=object_key
+        )
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("failed to abort multipart upload {upload_id}", upload_id=upload_id)
@@ -3,7 +3,9 @@
 # read (cRud)
 from datetime import datetime
 from typing import (
+    Dict,
     List,
+    Literal,
     Optional,
 )
 
@@ -16,12 +18,17 @@ from pydantic import (
 )
 from typing_extensions import Self
 
+from files_api.s3.key_index import SortBy
+
 # Default values are ok as long as they are overrideable by environment variables
 DEFAULT_GET_FILES_PAGE_SIZE = 10
 DEFAULT_GET_FILES_MIN_PAGE_SIZE = 10
 DEFAULT_GET_FILES_MAX_PAGE_SIZE = 100
 DEFAULT_GET_FILES_DIRECTORY = ""
 
+# "recursive" lists every file under the directory, "browse" one level of it at a time
+ListingMode = Literal["recursive", "browse"]
+
 
 class FileMetadata(BaseModel):
     """File metadata response details."""
@@ -55,18 +62,32 @@ class GetFilesQueryParams(BaseModel):
         description="Directory in which to list files. Mutually exclusive with `page_token`.",
     )
     page_token: Optional[str] = Field(
-        default=None, description="Token to continue pagination. Mutually exclusive with `directory` and `page_size`."
+        default=None,
+        description="Token to continue pagination. Mutually exclusive with `directory`, `page_size`, `sort_by` "
+        "and `descending`.",
+    )
+    sort_by: SortBy = Field(
+        default="file_path",
+        description="What to sort the files by. Sorting by anything but `file_path` needs the key index to be "
+        "enabled. Mutually exclusive with `page_token`.",
+    )
+    descending: bool = Field(
+        default=False,
+        description="Sort in descending order. Needs the key index to be enabled. "
+        "Mutually exclusive with `page_token`.",
+    )
+    mode: ListingMode = Field(
+        default="recursive",
+        description="`recursive` lists every file under `directory`, at any depth. `browse` lists one level: the "
+        "files directly in `directory` and its subdirectories, paginated together in `file_path` order. "
+        "Mutually exclusive with `page_token`.",
     )
 
     @model_validator(mode="after")
-    def check_page_token_exclusivity(self) -> Self:
-        """Validate that the page_token parameter does not coexist with directory and page_size."""
-        if self.page_token:
-            get_files_query_params: dict = self.model_dump(exclude_unset=True)
-            page_size_set = "page_size" in get_files_query_params.keys()
-            directory_set = "directory" in get_files_query_params.keys()
-            if page_size_set or directory_set:
-                raise ValueError("page_token is mutually exclusive with page_size and directory")
+    def check_browse_order(self) -> Self:
+        """Validate that browsing, which S3 answers in key order, is not asked for another order."""
+        if self.mode == "browse" and (self.sort_by != "file_path" or self.descending):
+            raise ValueError("browse mode lists in ascending file_path order only")
         return self
 
 
@@ -74,6 +95,10 @@ class GetFilesResponse(BaseModel):
     """Fetch page of files response data."""
 
     files: List[FileMetadata] = Field(description="List of file metadata.")
+    directories: List[str] = Field(
+        default_factory=list,
+        description="Subdirectories in this page, each ending in \"/\". Only listed in browse mode.",
+    )
     next_page_token: Optional[str] = Field(
         description="Next page token. Missing if the response contained the last page."
     )
@@ -93,6 +118,7 @@ class GetFilesResponse(BaseModel):
                         "size_bytes": 256,
                     },
                 ],
+                "directories": [],
                 "next_page_token": "next_page_token_example",
             }
         }
@@ -141,4 +167,297 @@ class GenerateFilesQueryParams(BaseModel):
         ...,
         description="The type of file to generate.",
         json_schema_extra={"example": "Text"},
-    )
\ No newline at end of file
+    )
+
+
+class MetadataCacheStats(BaseModel):
+    """Counters of the in-process object metadata cache."""
+
+    hits: int = Field(description="Lookups answered from the cache, including cached 404s.")
+    misses: int = Field(description="Lookups that had to ask S3.")
+    evictions: int = Field(description="Entries dropped because the cache was full.")
+    expirations: int = Field(description="Entries dropped because they outlived the TTL.")
+    entries: int = Field(description="Entries currently cached.")
+    max_entries: int = Field(description="Maximum number of entries. 0 means the cache is disabled.")
+
+
+class DiskCacheStats(BaseModel):
+    """Counters of the local disk cache of small object bodies."""
+
+    hits: int = Field(description="Lookups that found a cached body, before checking its ETag against S3.")
+    misses: int = Field(description="Lookups that had to download the body.")
+    evictions: int = Field(description="Bodies dropped because the cache was full.")
+    entries: int = Field(description="Bodies currently cached.")
+    bytes: int = Field(description="Total size of the cached bodies.")
+    max_bytes: int = Field(description="Maximum total size of the cached bodies.")
+
+
+class SingleFlightStats(BaseModel):
+    """Counters of the S3 calls shared by concurrent requests for the same key."""
+
+    calls: int = Field(description="Calls requested, including those answered by another call in flight.")
+    executions: int = Field(description="Calls actually made to S3.")
+    coalesced: int = Field(description="Calls answered by another call in flight.")
+    coalescing_ratio: float = Field(description="Share of the calls answered by another call in flight.")
+
+
+class CircuitBreakerStats(BaseModel):
+    """State and counters of the circuit breaker guarding S3 calls."""
+
+    state: Literal["closed", "open", "half_open"] = Field(
+        description="closed: calls go through. open: calls are rejected with 503. half_open: one probe goes through."
+    )
+    consecutive_failures: int = Field(description="S3 calls failed in a row with throttling or server errors.")
+    times_opened: int = Field(description="Times the circuit opened.")
+    rejected_calls: int = Field(description="S3 calls rejected without being made.")
+
+
+class GetMetricsResponse(BaseModel):
+    """Runtime metrics of this worker process."""
+
+    metadata_cache: MetadataCacheStats = Field(description="Counters of the object metadata cache.")
+    disk_cache: Optional[DiskCacheStats] = Field(
+        default=None, description="Counters of the local disk cache, if it is enabled."
+    )
+    metadata_single_flight: Optional[SingleFlightStats] = Field(
+        default=None, description="Coalescing of metadata lookups, if request coalescing is enabled."
+    )
+    download_single_flight: Optional[SingleFlightStats] = Field(
+        default=None, description="Coalescing of downloads of the start of files, if enabled."
+    )
+    s3_circuit_breaker: Optional[CircuitBreakerStats] = Field(
+        default=None, description="State of the circuit breaker guarding S3 calls, if it is enabled."
+    )
+
+
+class BulkDeleteRequest(BaseModel):
+    """Files to delete with `POST /v1/files/bulk-delete`: either an explicit list, or everything in a directory."""
+
+    file_paths: Optional[List[str]] = Field(
+        default=None,
+        min_length=1,
+        description="Paths of the files to delete. Mutually exclusive with `directory`.",
+    )
+    directory: Optional[str] = Field(
+        default=None,
+        min_length=1,
+        description="Delete every file whose path starts with this prefix. Mutually exclusive with `file_paths`.",
+    )
+
+    model_config = ConfigDict(json_schema_extra={"example": {"directory": "generated/2024-01-01/"}})
+
+    @model_validator(mode="after")
+    def check_exactly_one_selector(self) -> Self:
+        """Validate that exactly one of file_paths and directory is given."""
+        if (self.file_paths is None) == (self.directory is None):
+            raise ValueError("exactly one of file_paths and directory is required")
+        return self
+
+
+class BulkDeleteError(BaseModel):
+    """A file that could not be deleted."""
+
+    file_path: str = Field(description="Path of the file.")
+    code: str = Field(description='S3 error code, e.g. "AccessDenied".')
+    message: str = Field(description="S3 error message.")
+
+
+class BulkDeleteBatchResult(BaseModel):
+    """Outcome of one batch of a bulk delete, streamed as soon as the batch completes."""
+
+    deleted: List[str] = Field(description="Paths of the deleted files. S3 reports missing files as deleted.")
+    errors: List[BulkDeleteError] = Field(description="Files that could not be deleted.")
+
+
+class BulkDeleteSummary(BaseModel):
+    """Last line of a bulk delete response."""
+
+    done: bool = Field(default=True, description="Always true: marks the end of the response.")
+    deleted_count: int = Field(description="Number of deleted files.")
+    error_count: int = Field(description="Number of files that could not be deleted.")
+
+
+class BatchUploadResult(BaseModel):
+    """Outcome of one file of a batch upload."""
+
+    file_path: str = Field(description="Path of the file, or its name in the request if it is not a valid path.")
+    status: Literal["created", "updated", "failed"] = Field(
+        description="Whether the file is new, replaced an existing one, or could not be uploaded."
+    )
+    message: str = Field(description="Additional details on the upload of the file.")
+
+
+class BatchUploadResponse(BaseModel):
+    """Outcome of a batch upload."""
+
+    files: List[BatchUploadResult] = Field(description="One result per file, in the order of the request body.")
+    error: Optional[str] = Field(
+        default=None,
+        description="Set if the archive turned out to be malformed: only the files before the error were uploaded.",
+    )
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "files": [
+                    {
+                        "file_path": "docs/README.md",
+                        "status": "created",
+                        "message": "New file uploaded at path: /docs/README.md",
+                    },
+                    {
+                        "file_path": "docs/index.html",
+                        "status": "updated",
+                        "message": "Existing file updated at path: /docs/index.html",
+                    },
+                ],
+                "error": None,
+            }
+        }
+    )
+
+
+class CopyFilesRequest(BaseModel):
+    """What `POST /v1/files/copy` and `POST /v1/files/move` copy: one file, or with `recursive`, a whole prefix."""
+
+    source: str = Field(min_length=1, description="Path of the file, or with `recursive`, prefix of the files.")
+    destination: str = Field(
+        min_length=1,
+        description="New path of the file, or with `recursive`, prefix that replaces `source` in each path.",
+    )
+    recursive: bool = Field(default=False, description="Copy every file whose path starts with `source`.")
+
+    model_config = ConfigDict(
+        json_schema_extra={"example": {"source": "drafts/2024/", "destination": "published/2024/", "recursive": True}}
+    )
+
+    @model_validator(mode="after")
+    def check_distinct_paths(self) -> Self:
+        """Validate that the copies neither overwrite their sources nor land where the source is being listed."""
+        if self.source == self.destination:
+            raise ValueError("source and destination must differ")
+        if self.recursive and self.destination.startswith(self.source):
+            raise ValueError("destination must not be inside source")
+        return self
+
+
+class CopiedFile(BaseModel):
+    """A file copied by a copy or move."""
+
+    source: str = Field(description="Path of the original file.")
+    destination: str = Field(description="Path of the copy.")
+
+
+class CopyError(BaseModel):
+    """A file that could not be copied, or for a move, whose original could not be deleted."""
+
+    file_path: str = Field(description="Path of the original file.")
+    code: str = Field(description='S3 error code, e.g. "PreconditionFailed".')
+    message: str = Field(description="S3 error message.")
+
+
+class CopyBatchResult(BaseModel):
+    """Outcome of one listing page of a copy or move, streamed as soon as the page is done."""
+
+    copied: List[CopiedFile] = Field(description="Files copied.")
+    deleted: List[str] = Field(description="For a move, originals deleted after they were copied.")
+    errors: List[CopyError] = Field(description="Files that could not be copied or deleted.")
+
+
+class CopySummary(BaseModel):
+    """Last line of a copy or move response."""
+
+    done: bool = Field(default=True, description="Always true: marks the end of the response.")
+    copied_count: int = Field(description="Number of copied files.")
+    deleted_count: int = Field(description="Number of deleted originals, for a move.")
+    error_count: int = Field(description="Number of files that could not be copied or deleted.")
+
+
+class PresignedUploadRequest(BaseModel):
+    """A file a client wants to upload straight to S3."""
+
+    file_path: str = Field(min_length=1, description="Path to upload the file to.")
+    size_bytes: int = Field(ge=0, description="Size of the file, which decides between a single PUT and parts.")
+    content_type: Optional[str] = Field(
+        default=None, description='MIME type of the file. Defaults to "application/octet-stream".'
+    )
+    sha256: Optional[str] = Field(
+        default=None,
+        pattern=r"^[0-9a-f]{64}$",
+        description="Hex SHA-256 digest of the file. With content-addressed storage, a file whose content is "
+        "already stored is created at once, without any upload.",
+    )
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {"file_path": "videos/talk.mp4", "size_bytes": 734003200, "content_type": "video/mp4"}
+        }
+    )
+
+
+class PresignedPartUrl(BaseModel):
+    """Where to PUT one part of a multipart upload."""
+
+    part_number: int = Field(description="1-based position of the part. Send its ETag back on completion.")
+    url: str = Field(description="Presigned URL to PUT the part to.")
+    first_byte: int = Field(description="Offset of the first byte of the file in this part.")
+    size_bytes: int = Field(description="Size of the part.")
+
+
+class PresignedUploadResponse(BaseModel):
+    """
+    How to upload a file straight to S3: PUT it whole to `url`, or PUT each of `parts`.
+
+    Then call `POST /v1/presigned/upload/complete`, so the API finishes the upload and refreshes its metadata.
+    """
+
+    file_path: str = Field(description="Path the file is uploaded to.")
+    url: Optional[str] = Field(description="Presigned URL to PUT the whole file to. Missing for multipart uploads.")
+    upload_id: Optional[str] = Field(description="ID of the multipart upload. Missing for single PUT uploads.")
+    parts: List[PresignedPartUrl] = Field(description="Presigned URL of each part. Empty for single PUT uploads.")
+    headers: Dict[str, str] = Field(description="Headers to send with the PUT of a whole file, which are signed.")
+    expires_at: datetime = Field(description="When the URLs stop working.")
+    deduplicated: bool = Field(
+        default=False,
+        description="The content was already stored and the file was created: there is nothing to upload or complete.",
+    )
+
+
+class CompletedUploadPart(BaseModel):
+    """A part uploaded with a presigned URL."""
+
+    part_number: int = Field(ge=1, le=10_000, description="1-based position of the part.")
+    etag: str = Field(description="`ETag` header of S3's response to the PUT of the part.")
+
+
+class CompletePresignedUploadRequest(BaseModel):
+    """An upload made with presigned URLs, for the API to finish and take note of."""
+
+    file_path: str = Field(min_length=1, description="Path the file was uploaded to.")
+    upload_id: Optional[str] = Field(default=None, description="ID of the multipart upload, if it was one.")
+    parts: List[CompletedUploadPart] = Field(
+        default_factory=list, description="Every uploaded part of a multipart upload, in any order."
+    )
+
+    @model_validator(mode="after")
+    def check_parts_match_upload_kind(self) -> Self:
+        """Validate that multipart uploads list their parts, and single PUT uploads do not."""
+        if (self.upload_id is None) != (not self.parts):
+            raise ValueError("parts are required with upload_id, and only with it")
+        return self
+
+
+class AbortPresignedUploadRequest(BaseModel):
+    """A multipart upload made with presigned URLs, for S3 to discard."""
+
+    file_path: str = Field(min_length=1, description="Path the file was being uploaded to.")
+    upload_id: str = Field(min_length=1, description="ID of the multipart upload.")
+
+
+class PresignedDownloadResponse(BaseModel):
+    """Where to download a file straight from S3."""
+
+    file_path: str = Field(description="Path to the file.")
+    url: str = Field(description="Presigned URL to GET the file from. It accepts `Range` headers.")
+    size_bytes: int = Field(description="Length of file in bytes.")
+    expires_at: datetime = Field(description="When the URL stops working.")
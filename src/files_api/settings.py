@@ -1,11 +1,26 @@
 """Define settings for FastAPI app."""
 
-from pydantic import Field  # BaseModel,
+import importlib.util
+from typing import (
+    List,
+    Literal,
+    Optional,
+)
+
+from pydantic import (  # BaseModel,
+    Field,
+    model_validator,
+)
 from pydantic_settings import (
     BaseSettings,
     SettingsConfigDict,
 )
 
+S3_MIN_PART_SIZE_BYTES = 5 * 1024 * 1024
+S3_MAX_COPY_OBJECT_BYTES = 5 * 1024 * 1024 * 1024
+# Lambda returns at most 6 MB inline, and Mangum base64-encodes binary bodies, which inflates them by a third
+LAMBDA_MAX_INLINE_RESPONSE_BYTES = 4 * 1024 * 1024
+
 
 class Settings(BaseSettings):
     """
@@ -17,4 +32,341 @@ class Settings(BaseSettings):
 
     s3_bucket_name: str = Field(...)
 
+    # --- storage backend --- #
+    storage_backend: Literal["s3", "local"] = Field(
+        default="s3",
+        description="Where files are stored: in S3, or in local_storage_directory on this machine, e.g. to run "
+        "without S3 or to benchmark the API on its own.",
+    )
+    local_storage_directory: Optional[str] = Field(
+        default=None,
+        description="Directory of the local storage backend, holding a subdirectory per bucket. Required with "
+        "storage_backend=local.",
+    )
+    local_storage_fsync: bool = Field(
+        default=True,
+        description="Flush each write of the local storage backend to disk before it succeeds. Disable for "
+        "benchmarks.",
+    )
+
+    # --- shared S3 client --- #
+    s3_max_pool_connections: int = Field(
+        default=50, ge=1, description="Maximum number of pooled HTTP connections the shared S3 client keeps open."
+    )
+    s3_connect_timeout_seconds: float = Field(
+        default=5.0, gt=0, description="Seconds to wait while opening a connection to S3."
+    )
+    s3_read_timeout_seconds: float = Field(default=60.0, gt=0, description="Seconds to wait while reading from S3.")
+    s3_tcp_keepalive: bool = Field(default=True, description="Enable TCP keep-alive on pooled S3 connections.")
+
+    # --- S3 throttling and outages --- #
+    s3_retry_mode: Literal["legacy", "standard", "adaptive"] = Field(
+        default="adaptive",
+        description="botocore retry mode. All retry with jittered exponential backoff; adaptive also slows the "
+        "client's own request rate down while S3 throttles it.",
+    )
+    s3_max_attempts: int = Field(
+        default=5, ge=1, description="Attempts per S3 call, including the first, before its error is returned."
+    )
+    s3_circuit_breaker_failure_threshold: int = Field(
+        default=5,
+        ge=0,
+        description="Consecutive S3 calls failing with throttling or server errors, after their retries, that "
+        "stop the worker from calling S3 and answer 503 at once. 0 disables the circuit breaker.",
+    )
+    s3_circuit_breaker_reset_seconds: float = Field(
+        default=10.0, gt=0, description="Seconds S3 calls stay paused before a single probe call is let through."
+    )
+    s3_prefix_max_concurrency: int = Field(
+        default=16,
+        ge=0,
+        description="Maximum number of S3 calls in flight per bucket and first path segment of the key, which is "
+        "how S3 partitions its request rate. 0 disables the limit.",
+    )
+    s3_prefix_max_wait_seconds: float = Field(
+        default=5.0, ge=0, description="Seconds an S3 call waits for its prefix to have a free slot before a 503."
+    )
+
+    # --- non-blocking S3 access --- #
+    s3_executor_max_workers: int = Field(
+        default=32,
+        ge=1,
+        description="Maximum number of S3 calls one worker process runs concurrently off the event loop.",
+    )
+    s3_stream_chunk_size_bytes: int = Field(
+        default=1024 * 1024, ge=1, description="Size of the chunks read from S3 when streaming a download."
+    )
+
+    # --- streaming multipart upload --- #
+    s3_multipart_threshold_bytes: int = Field(
+        default=8 * 1024 * 1024,
+        ge=0,
+        description="Uploads up to this size are sent with a single put_object; larger ones use a multipart upload.",
+    )
+    s3_multipart_part_size_bytes: int = Field(
+        default=8 * 1024 * 1024,
+        ge=S3_MIN_PART_SIZE_BYTES,
+        description="Size of each multipart upload part. S3 requires at least 5 MiB for every part but the last.",
+    )
+    s3_multipart_max_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Maximum number of parts uploaded at once per upload. Memory per upload stays below "
+        "(max concurrency + 1) * part size.",
+    )
+
+    # --- parallel ranged downloads --- #
+    s3_parallel_download_threshold_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        ge=1,
+        description="Objects larger than this are downloaded with concurrent ranged GETs.",
+    )
+    s3_parallel_download_part_size_bytes: int = Field(
+        default=8 * 1024 * 1024, ge=1, description="Size of each ranged GET of a parallel download."
+    )
+    s3_parallel_download_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Maximum number of ranged GETs in flight per download. Memory per download stays below "
+        "concurrency * part size. Set to 1 to always download with a single GET.",
+    )
+
+    # --- object metadata cache --- #
+    s3_metadata_cache_max_entries: int = Field(
+        default=10_000, ge=0, description="Maximum number of objects whose metadata is cached. Set to 0 to disable."
+    )
+    s3_metadata_cache_ttl_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        description="Seconds cached metadata stays valid. Writes made through this process invalidate it at once; "
+        "this bounds how long writes from other processes go unnoticed.",
+    )
+
+    # --- request coalescing --- #
+    s3_single_flight_enabled: bool = Field(
+        default=True,
+        description="Let concurrent requests for the same file share one S3 call: metadata lookups, and the download "
+        "of the file's first s3_single_flight_max_object_bytes.",
+    )
+    s3_single_flight_max_object_bytes: int = Field(
+        default=1024 * 1024,
+        ge=0,
+        description="Bytes of a file downloaded once into memory for all concurrent requests of it, so files up to "
+        "this size are fetched once per burst. 0 only coalesces metadata lookups.",
+    )
+
+    # --- local disk cache --- #
+    disk_cache_enabled: bool = Field(
+        default=False,
+        description="Keep the bodies of small, recently downloaded files on local disk, and serve them from there "
+        "while their ETag is current.",
+    )
+    disk_cache_directory: Optional[str] = Field(
+        default=None,
+        description="Directory the cache creates its own directory in, such as Lambda's /tmp. Defaults to the "
+        "temporary directory.",
+    )
+    disk_cache_max_bytes: int = Field(
+        default=512 * 1024 * 1024, ge=1, description="Maximum total size of the cached files, per worker process."
+    )
+    disk_cache_max_object_bytes: int = Field(
+        default=8 * 1024 * 1024, ge=1, description="Largest file cached. Larger files are always downloaded from S3."
+    )
+
+    # --- local key index --- #
+    s3_key_index_enabled: bool = Field(
+        default=False,
+        description="Keep an index of the bucket's keys to list files, in any sort order, and check whether they "
+        "exist without calling S3. Meant for long-running servers: it is built by listing the whole bucket.",
+    )
+    s3_key_index_path: str = Field(
+        default=":memory:",
+        description='SQLite database file the key index is stored in. ":memory:" keeps it in memory.',
+    )
+    s3_key_index_refresh_interval_seconds: float = Field(
+        default=60.0, gt=0, description="Seconds between reconciles of the key index with a listing of the bucket."
+    )
+    s3_key_index_max_staleness_seconds: float = Field(
+        default=300.0,
+        gt=0,
+        description="The key index only answers while its last reconcile started less than this many seconds ago; "
+        "requests fall back to S3 otherwise. This bounds how long writes from other processes go unnoticed.",
+    )
+
+    # --- bulk delete --- #
+    s3_bulk_delete_batch_size: int = Field(
+        default=1_000, ge=1, le=1_000, description="Keys per DeleteObjects call. S3 accepts at most 1000."
+    )
+    s3_bulk_delete_max_concurrency: int = Field(
+        default=4, ge=1, description="Maximum number of DeleteObjects calls in flight per bulk delete."
+    )
+
+    # --- batch upload --- #
+    s3_batch_upload_max_concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum number of files uploaded at once per batch upload. Files up to the multipart threshold "
+        "are buffered while they wait, so memory per batch stays below max concurrency * multipart threshold.",
+    )
+    s3_batch_upload_max_files: int = Field(
+        default=10_000, ge=1, description="Maximum number of files in a multipart form sent to the batch upload."
+    )
+
+    # --- directory archives --- #
+    s3_archive_prefetch_window: int = Field(
+        default=8,
+        ge=1,
+        description="Number of files ahead of the one being sent whose download is started when archiving a "
+        "directory. Each holds one stream chunk in memory.",
+    )
+    s3_archive_zip_compression_level: int = Field(
+        default=1,
+        ge=0,
+        le=9,
+        description="zlib compression level of zip archives of directories. 0 skips compression, 9 compresses most.",
+    )
+
+    # --- server-side copy --- #
+    s3_copy_multipart_threshold_bytes: int = Field(
+        default=S3_MAX_COPY_OBJECT_BYTES,
+        ge=0,
+        le=S3_MAX_COPY_OBJECT_BYTES,
+        description="Objects up to this size are copied with a single CopyObject; larger ones with UploadPartCopy. "
+        "S3 copies at most 5 GiB per CopyObject.",
+    )
+    s3_copy_part_size_bytes: int = Field(
+        default=512 * 1024 * 1024,
+        ge=S3_MIN_PART_SIZE_BYTES,
+        le=S3_MAX_COPY_OBJECT_BYTES,
+        description="Size of each UploadPartCopy part.",
+    )
+    s3_copy_max_concurrency: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum number of files, and of parts of each large file, copied at once per copy or move.",
+    )
+
+    # --- presigned URLs --- #
+    s3_presigned_urls_enabled: bool = Field(
+        default=False,
+        description="Serve the /v1/presigned endpoints, which let clients upload and download straight with S3.",
+    )
+    s3_presigned_url_expiration_seconds: int = Field(
+        default=900, ge=1, le=7 * 24 * 3600, description="Seconds presigned URLs stay valid. S3 allows up to 7 days."
+    )
+    s3_presigned_download_redirect_threshold_bytes: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="GETs of whole files larger than this are redirected to a presigned URL instead of being "
+        "streamed through the API. Unset to always stream.",
+    )
+
+    # --- AWS Lambda responses --- #
+    lambda_response_limits_enabled: bool = Field(
+        default=False,
+        description="Set by the Lambda handler. File downloads then pick an inline, streamed or redirected response "
+        "by size, so no body exceeds what Lambda can return.",
+    )
+    lambda_inline_response_max_bytes: int = Field(
+        default=LAMBDA_MAX_INLINE_RESPONSE_BYTES,
+        ge=0,
+        le=LAMBDA_MAX_INLINE_RESPONSE_BYTES,
+        description="Largest download returned inline. Mangum buffers the whole body in memory before returning it.",
+    )
+    lambda_response_streaming_enabled: bool = Field(
+        default=False,
+        description="The app runs behind an adapter in Lambda's response streaming mode, such as the Lambda Web "
+        "Adapter, so downloads above the inline limit are streamed instead of redirected.",
+    )
+    lambda_streaming_response_max_bytes: int = Field(
+        default=20 * 1024 * 1024,
+        ge=0,
+        description="Largest download streamed out of Lambda, whose streamed responses are capped at 20 MiB by "
+        "default. Larger downloads are redirected to a presigned URL.",
+    )
+
+    # --- compression at rest --- #
+    s3_compression_encoding: Optional[Literal["gzip", "zstd"]] = Field(
+        default=None,
+        description="Store uploads of compressible content types compressed with this encoding. zstd needs the "
+        "`compression` extra. Unset to store every upload as is.",
+    )
+    s3_compression_level: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=22,
+        description="Compression level: 1-9 for gzip (default 6), 1-22 for zstd (default 3).",
+    )
+    s3_compressible_content_types: List[str] = Field(
+        default=[
+            "text/",
+            "application/json",
+            "application/x-ndjson",
+            "application/xml",
+            "application/javascript",
+            "application/csv",
+            "image/svg+xml",
+        ],
+        description="Media types, or prefixes of them such as `text/`, whose uploads are compressed.",
+    )
+
+    # --- content-addressed storage --- #
+    s3_blob_bucket_name: Optional[str] = Field(
+        default=None,
+        description="Store the content of uploaded files once per SHA-256 digest in this bucket, files becoming "
+        "empty pointer objects in s3_bucket_name. Unset to store files as is.",
+    )
+    s3_blob_gc_grace_seconds: int = Field(
+        default=24 * 3600,
+        ge=60,
+        description="Age below which unreferenced blobs survive garbage collection, which must exceed the "
+        "longest upload.",
+    )
+
+    # --- sharding --- #
+    s3_shards: List[str] = Field(
+        default=[],
+        description='Spread the files of s3_bucket_name over these shards, each written "bucket" or '
+        '"bucket/prefix/", by a stable hash of their path. Unset to store files in s3_bucket_name itself.',
+    )
+    s3_shard_read_fallback: bool = Field(
+        default=False,
+        description="Also look for files on the shard they were on before the last shard was added, while "
+        "`files-api rebalance` moves them.",
+    )
+
     model_config = SettingsConfigDict(case_sensitive=False)
+
+    @model_validator(mode="after")
+    def check_storage_backend(self) -> "Settings":
+        """Fail at startup on a local storage setup missing its directory, or relying on presigned URLs."""
+        if self.storage_backend != "local":
+            return self
+        if not self.local_storage_directory:
+            raise ValueError("storage_backend=local needs local_storage_directory")
+        if (
+            self.s3_presigned_urls_enabled
+            or self.s3_presigned_download_redirect_threshold_bytes is not None
+            or self.lambda_response_limits_enabled
+        ):
+            raise ValueError("storage_backend=local cannot presign URLs, so it cannot redirect downloads to them")
+        return self
+
+    @model_validator(mode="after")
+    def check_shards(self) -> "Settings":
+        """Fail at startup on shards without a bucket, or sharing the blob bucket, whose blobs they would list."""
+        shard_buckets = {shard.partition("/")[0] for shard in self.s3_shards}
+        if "" in shard_buckets:
+            raise ValueError("every shard in s3_shards needs a bucket name")
+        if self.s3_blob_bucket_name in shard_buckets:
+            raise ValueError("s3_shards cannot be in s3_blob_bucket_name")
+        return self
+
+    @model_validator(mode="after")
+    def check_compression(self) -> "Settings":
+        """Fail at startup, rather than on the first upload, on a compression setup that cannot work."""
+        if self.s3_compression_encoding == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise ValueError("s3_compression_encoding=zstd needs the zstandard package, from the compression extra")
+        if self.s3_compression_encoding == "gzip" and (self.s3_compression_level or 0) > 9:
+            raise ValueError("gzip compression levels go from 1 to 9")
+        return self
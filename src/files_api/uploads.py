@@ -0,0 +1,321 @@
+"""Upload files to S3, one at a time or many from a multipart form or an archive."""
+
+import asyncio
+import io
+import mimetypes
+import posixpath
+from dataclasses import dataclass
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from fastapi import (
+    HTTPException,
+    Request,
+    status,
+)
+from loguru import logger
+from starlette.datastructures import UploadFile
+
+from files_api.archives import (
+    ArchiveEntry,
+    ArchiveError,
+    AsyncStreamReader,
+    iter_tar_entries,
+    iter_zip_entries,
+)
+from files_api.compression import content_encoding_for_upload
+from files_api.content_addressing import upload_file_as_blob
+from files_api.s3.executor import S3Executor
+from files_api.s3.key_index import KeyIndex
+from files_api.s3.read_objects import iter_s3_object_pages
+from files_api.s3.write_objects import upload_s3_object_from_stream
+from files_api.schemas import (
+    BatchUploadResponse,
+    BatchUploadResult,
+)
+from files_api.settings import Settings
+from files_api.utils import (
+    object_exists_response,
+    upload_response,
+)
+
+MULTIPART_FORM_MEDIA_TYPE = "multipart/form-data"
+TAR_MEDIA_TYPES = {
+    "application/x-tar",
+    "application/x-gtar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-compressed-tar",
+}
+ZIP_MEDIA_TYPES = {"application/zip", "application/x-zip-compressed"}
+ARCHIVE_READ_BUFFER_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class _BatchEntry:
+    """A file of a batch upload, to be read once with `read`."""
+
+    name: str
+    size: Optional[int]
+    read: Callable[[int], Awaitable[bytes]]
+    content_type: Optional[str]
+
+
+async def upload_file_from_stream(
+    request: Request,
+    file_path: str,
+    read: Callable[[int], Awaitable[bytes]],
+    content_type: Optional[str] = None,
+    exists: Optional[bool] = None,
+) -> Tuple[str, int]:
+    """
+    Upload a file, reporting whether it was created or replaced an existing one.
+
+    :param request: The incoming request, used to reach the app's settings, S3 client, executor and caches.
+    :param file_path: Path to upload the file to.
+    :param read: Async function returning up to `n` bytes of the file, or b"" at the end, e.g. `UploadFile.read`.
+    :param content_type: The MIME type of the file.
+    :param exists: Whether a file is already at `file_path`, if the caller knows, else it is looked up.
+
+    :return: A message for the response and its status code: 201 if the file is new, 200 if it was updated.
+    """
+    settings: Settings = request.app.state.settings
+    s3_client = request.app.state.s3_client
+    s3_executor: S3Executor = request.app.state.s3_executor
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+
+    if exists is None:
+        response_message, status_code = await s3_executor.run(
+            object_exists_response,
+            settings.s3_bucket_name,
+            file_path,
+            s3_client=s3_client,
+            metadata_cache=request.app.state.metadata_cache,
+            key_index=key_index,
+        )
+    else:
+        response_message, status_code = upload_response(file_path, exists)
+
+    logger.debug("trying to upload file to s3: {file_path}", file_path=file_path)
+    if settings.s3_blob_bucket_name is not None:
+        await upload_file_as_blob(request, file_path, read=read, content_type=content_type)
+    else:
+        # read the upload in chunks: large files become a multipart upload instead of being loaded into memory
+        await upload_s3_object_from_stream(
+            s3_executor,
+            read=read,
+            bucket_name=settings.s3_bucket_name,
+            object_key=file_path,
+            content_type=content_type,
+            multipart_threshold_bytes=settings.s3_multipart_threshold_bytes,
+            part_size_bytes=settings.s3_multipart_part_size_bytes,
+            max_concurrency=settings.s3_multipart_max_concurrency,
+            s3_client=s3_client,
+            metadata_cache=request.app.state.metadata_cache,
+            content_encoding=content_encoding_for_upload(settings, content_type),
+            compression_level=settings.s3_compression_level,
+        )
+    if key_index is not None:
+        # read S3's size and modification time back, so listings from the index include the write at once
+        await s3_executor.run(key_index.refresh_key, file_path, s3_client=s3_client)
+
+    logger.info(response_message)
+    return response_message, status_code
+
+
+async def batch_upload(request: Request, directory: str = "") -> BatchUploadResponse:
+    """
+    Upload every file of a multipart form, or of a tar or zip archive, with several uploads in flight.
+
+    Archives are unpacked as the request body arrives. Files up to `s3_multipart_threshold_bytes` are read
+    into memory and uploaded concurrently, up to `s3_batch_upload_max_concurrency` at once; larger ones are
+    streamed to a multipart upload before the next file is read, so memory stays bounded either way.
+
+    :param request: The incoming request. Its `Content-Type` selects how the body is read.
+    :param directory: Prefix of the path of every uploaded file.
+
+    :return: The outcome of each file, in the order of the request body. If the archive turns out to be
+        malformed, the files before the error are uploaded and `error` describes it.
+
+    :raises HTTPException: 415 if the body is neither a multipart form nor a supported archive.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type == MULTIPART_FORM_MEDIA_TYPE:
+        settings: Settings = request.app.state.settings
+        form = await request.form(
+            max_files=settings.s3_batch_upload_max_files, max_fields=settings.s3_batch_upload_max_files
+        )
+        try:
+            return await _upload_entries(request, _iter_form_entries(form.multi_items()), directory)
+        finally:
+            await form.close()
+    if media_type in TAR_MEDIA_TYPES:
+        return await _upload_entries(request, _iter_archive_entries(request, iter_tar_entries), directory)
+    if media_type in ZIP_MEDIA_TYPES:
+        return await _upload_entries(request, _iter_archive_entries(request, iter_zip_entries), directory)
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail=f"Expected {MULTIPART_FORM_MEDIA_TYPE}, a tar or a zip archive, got: {media_type or 'nothing'}",
+    )
+
+
+async def _upload_entries(
+    request: Request, entries: AsyncIterator[_BatchEntry], directory: str
+) -> BatchUploadResponse:
+    """Upload the entries of a batch, small ones concurrently, and collect their results in order."""
+    settings: Settings = request.app.state.settings
+    slots = asyncio.Semaphore(settings.s3_batch_upload_max_concurrency)
+    results: List[asyncio.Future] = []
+    existing_paths = await _list_existing_paths(request, directory)
+
+    async def upload(file_path: str, read: Callable[[int], Awaitable[bytes]], entry: _BatchEntry) -> BatchUploadResult:
+        exists = _claim_path(existing_paths, file_path)
+        try:
+            message, status_code = await upload_file_from_stream(request, file_path, read, entry.content_type, exists)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("failed to upload {file_path}", file_path=file_path)
+            return BatchUploadResult(file_path=file_path, status="failed", message="Upload failed.")
+        created = status_code == status.HTTP_201_CREATED
+        return BatchUploadResult(file_path=file_path, status="created" if created else "updated", message=message)
+
+    async def upload_buffered(file_path: str, content: bytes, entry: _BatchEntry) -> BatchUploadResult:
+        try:
+            return await upload(file_path, _async_reader(io.BytesIO(content)), entry)
+        finally:
+            slots.release()
+
+    error: Optional[str] = None
+    try:
+        async for entry in entries:
+            file_path = _to_file_path(directory, entry.name)
+            if file_path is None:
+                result: asyncio.Future = asyncio.get_running_loop().create_future()
+                result.set_result(
+                    BatchUploadResult(file_path=entry.name, status="failed", message="Invalid file path.")
+                )
+                results.append(result)
+            elif entry.size is not None and entry.size <= settings.s3_multipart_threshold_bytes:
+                # wait for a free slot before reading the file, which bounds the files held in memory
+                await slots.acquire()
+                try:
+                    content = await _read_all(entry.read)
+                except BaseException:
+                    slots.release()
+                    raise
+                results.append(asyncio.create_task(upload_buffered(file_path, content, entry)))
+            else:
+                # the file must be read to its end before the next one, so large ones are uploaded in line
+                results.append(asyncio.ensure_future(upload(file_path, entry.read, entry)))
+                await results[-1]
+    except ArchiveError as err:
+        logger.warning("stopped reading a malformed archive: {error}", error=err)
+        error = str(err)
+    except BaseException:
+        for pending in results:
+            pending.cancel()
+        raise
+
+    files = list(await asyncio.gather(*results))
+    logger.info(
+        "batch uploaded {num_files} files, {num_failed} failed",
+        num_files=len(files),
+        num_failed=sum(file.status == "failed" for file in files),
+    )
+    return BatchUploadResponse(files=files, error=error)
+
+
+async def _list_existing_paths(request: Request, directory: str) -> Optional[Set[str]]:
+    """
+    List the files under the directory of a batch once, to tell the files it creates from those it updates.
+
+    :return: The paths of the files, or None if a fresh key index can tell for each file without calling S3.
+    """
+    settings: Settings = request.app.state.settings
+    s3_executor: S3Executor = request.app.state.s3_executor
+    key_index: Optional[KeyIndex] = request.app.state.key_index
+    if key_index is not None and key_index.is_fresh:
+        return None
+
+    existing_paths: Set[str] = set()
+    prefix = posixpath.join(directory, "") if directory else ""
+    pages = iter_s3_object_pages(settings.s3_bucket_name, prefix=prefix, s3_client=request.app.state.s3_client)
+    while (page := await s3_executor.run(next, pages, None)) is not None:
+        existing_paths.update(obj["Key"] for obj in page)
+    return existing_paths
+
+
+def _claim_path(existing_paths: Optional[Set[str]], file_path: str) -> Optional[bool]:
+    """Tell whether a file of a batch updates an existing file, one listed or earlier in the batch, if known."""
+    if existing_paths is None:
+        return None
+    exists = file_path in existing_paths
+    existing_paths.add(file_path)
+    return exists
+
+
+async def _iter_form_entries(items: Sequence[Tuple[str, Any]]) -> AsyncIterator[_BatchEntry]:
+    """Yield the files of a parsed multipart form, named after their filename."""
+    for _, value in items:
+        if isinstance(value, UploadFile):
+            yield _BatchEntry(
+                name=value.filename or "", size=value.size, read=value.read, content_type=value.content_type
+            )
+
+
+async def _iter_archive_entries(
+    request: Request, iter_entries: Callable[[IO[bytes]], Iterator[ArchiveEntry]]
+) -> AsyncIterator[_BatchEntry]:
+    """Yield the files of an archive in the request body, parsed in a worker thread as the body arrives."""
+    stream = io.BufferedReader(
+        AsyncStreamReader(request.stream(), asyncio.get_running_loop()), buffer_size=ARCHIVE_READ_BUFFER_BYTES
+    )
+    entries = iter_entries(stream)
+    while True:
+        # the parser blocks on the body, so it runs off the event loop, which keeps receiving the body
+        entry: Optional[ArchiveEntry] = await asyncio.to_thread(next, entries, None)
+        if entry is None:
+            return
+        yield _BatchEntry(
+            name=entry.name,
+            size=entry.size,
+            read=_async_reader(entry.reader, threaded=True),
+            content_type=mimetypes.guess_type(entry.name)[0],
+        )
+
+
+async def _read_all(read: Callable[[int], Awaitable[bytes]]) -> bytes:
+    """Read a stream to its end."""
+    buffer = bytearray()
+    while chunk := await read(ARCHIVE_READ_BUFFER_BYTES):
+        buffer += chunk
+    return bytes(buffer)
+
+
+def _async_reader(stream: IO[bytes], threaded: bool = False) -> Callable[[int], Awaitable[bytes]]:
+    """Wrap the `read` of a blocking stream, in a worker thread if reading it may block."""
+
+    async def read(size: int) -> bytes:
+        if threaded:
+            return await asyncio.to_thread(stream.read, size)
+        return stream.read(size)
+
+    return read
+
+
+def _to_file_path(directory: str, name: str) -> Optional[str]:
+    """Join the directory and the name of an uploaded file, or None if the name is not a relative path."""
+    name = name.removeprefix("./")
+    if not name or name.startswith("/") or ".." in name.split("/"):
+        return None
+    return posixpath.join(directory, name) if directory else name
@@ -1,10 +1,26 @@
 """Utilities file for files_api."""
 
-from typing import List
+from typing import (
+    TYPE_CHECKING,
+    List,
+    Optional,
+    Tuple,
+)
 
 from fastapi import status
 from loguru import logger
 
+from files_api.s3.metadata_cache import ObjectMetadataCache
+
+try:
+    from mypy_boto3_s3 import S3Client
+except ImportError:
+    ...
+
+if TYPE_CHECKING:
+    # only for annotations: the key index imports read_objects, which imports this module
+    from files_api.s3.key_index import KeyIndex
+
 # try:
 # from files_api.s3.read_objects import object_exists_in_s3
 # except ImportError as e:
@@ -23,13 +39,28 @@ def list_flatten(list_input: List[List]):
     return result
 
 
-def object_exists_response(s3_bucket_name: str, file_path: str):
+def object_exists_response(
+    s3_bucket_name: str,
+    file_path: str,
+    s3_client: Optional["S3Client"] = None,
+    metadata_cache: Optional[ObjectMetadataCache] = None,
+    key_index: Optional["KeyIndex"] = None,
+):
     """Check if object exists and return proper responses"""
     from files_api.s3.read_objects import object_exists_in_s3  # Is there no better way to avoid circular dependencies?
 
-    object_already_exists = object_exists_in_s3(bucket_name=s3_bucket_name, object_key=file_path)
+    # a fresh key index answers without a round trip to S3
+    object_already_exists = key_index.contains(file_path) if key_index is not None else None
+    if object_already_exists is None:
+        object_already_exists = object_exists_in_s3(
+            bucket_name=s3_bucket_name, object_key=file_path, s3_client=s3_client, metadata_cache=metadata_cache
+        )
     logger.debug("object_already_exists_at_path: {exists}", exists=object_already_exists)
+    return upload_response(file_path, object_already_exists)
+
 
+def upload_response(file_path: str, object_already_exists: bool) -> Tuple[str, int]:
+    """Build the message and status code of an upload, depending on whether it replaced an existing file."""
     if object_already_exists:
         response_message = f"Existing file updated at path: /{file_path}"
         status_code = status.HTTP_200_OK
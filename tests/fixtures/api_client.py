@@ -1,5 +1,12 @@
 """Set up api test client fixture for tests."""
 
+from contextlib import ExitStack
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+)
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -11,11 +18,24 @@ from tests.consts import (
 )
 
 
+@pytest.fixture
+def make_client(mocked_aws) -> Iterator[Callable[..., TestClient]]:  # type: ignore
+    """
+    Create api test clients for the test bucket, with settings overriding the defaults.
+
+    Each client's app is started when it is made, and shut down at the end of the test.
+    """
+    with ExitStack() as clients:
+
+        def _make_client(**settings_overrides: Any) -> TestClient:
+            settings = Settings(s3_bucket_name=TEST_BUCKET_NAME, **settings_overrides)
+            return clients.enter_context(TestClient(create_app(settings=settings)))
+
+        yield _make_client
+
+
 # Fixture for FastAPI test client
 @pytest.fixture
-def client(mocked_aws) -> TestClient:  # type: ignore # pylint: disable=unused-argument
+def client(make_client: Callable[..., TestClient]) -> TestClient:
     """Create standard api test client for tests."""
-    settings = Settings(s3_bucket_name=TEST_BUCKET_NAME)
-    app = create_app(settings=settings)
-    with TestClient(app) as client:
-        yield client
+    return make_client()
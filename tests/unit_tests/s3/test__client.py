@@ -0,0 +1,32 @@
+"""Test the shared S3 client."""
+
+from fastapi.testclient import TestClient
+
+from files_api.s3.client import create_s3_client
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+
+
+def test__create_s3_client__uses_settings(mocked_aws: None):
+    """Test that the pool size, keep-alive, timeouts and retries come from the settings."""
+    settings = Settings(
+        s3_bucket_name=TEST_BUCKET_NAME,
+        s3_max_pool_connections=7,
+        s3_connect_timeout_seconds=2,
+        s3_read_timeout_seconds=9,
+        s3_tcp_keepalive=False,
+        s3_max_attempts=3,
+    )
+    s3_client = create_s3_client(settings)
+
+    assert s3_client.meta.config.max_pool_connections == 7
+    assert s3_client.meta.config.connect_timeout == 2
+    assert s3_client.meta.config.read_timeout == 9
+    assert s3_client.meta.config.tcp_keepalive is False
+    assert s3_client.meta.config.retries == {"mode": "adaptive", "total_max_attempts": 3}
+
+
+def test__routes_report_server_timing(client: TestClient):
+    """Test that every route reports its handler latency."""
+    response = client.get("/v1/files")
+    assert response.headers["Server-Timing"].startswith("app;dur=")
@@ -0,0 +1,90 @@
+"""Test copying objects within the bucket."""
+
+import asyncio
+import os
+
+import boto3
+import pytest
+
+from files_api.s3.copy_objects import (
+    copy_s3_object,
+    copy_s3_object_in_parts,
+)
+from files_api.s3.executor import S3Executor
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import count_s3_calls
+
+PART_SIZE = S3_MIN_PART_SIZE_BYTES
+
+
+def test__copy_s3_object(mocked_aws: None):
+    """Test that a copy keeps the content and content type of its source."""
+    s3_client = boto3.client("s3")
+    s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"hello", ContentType="text/plain")
+    etag = s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="a.txt")["ETag"]
+
+    copy_s3_object(TEST_BUCKET_NAME, "a.txt", "b.txt", if_match=etag, s3_client=s3_client)
+
+    copy = s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="b.txt")
+    assert copy["Body"].read() == b"hello"
+    assert copy["ContentType"] == "text/plain"
+
+
+def test__copy_s3_object_in_parts(mocked_aws: None):
+    """Test that a large object is copied part by part with UploadPartCopy."""
+    s3_client = boto3.client("s3")
+    content = os.urandom(2 * PART_SIZE + 123)
+    s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="big.bin", Body=content)
+    etag = s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["ETag"]
+
+    with count_s3_calls(s3_client) as s3_calls:
+        asyncio.run(
+            copy_s3_object_in_parts(
+                S3Executor(max_workers=4),
+                bucket_name=TEST_BUCKET_NAME,
+                source_key="big.bin",
+                destination_key="copy.bin",
+                size=len(content),
+                etag=etag,
+                content_type="application/x-custom",
+                part_size_bytes=PART_SIZE,
+                max_concurrency=2,
+                s3_client=s3_client,
+            )
+        )
+
+    assert s3_calls == {"CreateMultipartUpload": 1, "UploadPartCopy": 3, "CompleteMultipartUpload": 1}
+    copy = s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="copy.bin")
+    assert copy["Body"].read() == content
+    assert copy["ContentType"] == "application/x-custom"
+
+
+def test__copy_s3_object_in_parts__aborts_on_error(mocked_aws: None):
+    """Test that a failed part aborts the multipart upload and leaves no copy behind."""
+    s3_client = boto3.client("s3")
+    s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="big.bin", Body=os.urandom(PART_SIZE + 1))
+
+    def fail_second_part(params, **kwargs):
+        if params["PartNumber"] == 2:
+            raise ConnectionError("connection reset while copying part 2")
+
+    s3_client.meta.events.register("before-parameter-build.s3.UploadPartCopy", fail_second_part)
+
+    with count_s3_calls(s3_client) as s3_calls, pytest.raises(ConnectionError):
+        asyncio.run(
+            copy_s3_object_in_parts(
+                S3Executor(max_workers=4),
+                bucket_name=TEST_BUCKET_NAME,
+                source_key="big.bin",
+                destination_key="copy.bin",
+                size=PART_SIZE + 1,
+                etag=s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["ETag"],
+                part_size_bytes=PART_SIZE,
+                s3_client=s3_client,
+            )
+        )
+
+    assert s3_calls["AbortMultipartUpload"] == 1
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket=TEST_BUCKET_NAME)
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=TEST_BUCKET_NAME, Prefix="copy.bin")
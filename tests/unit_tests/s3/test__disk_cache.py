@@ -0,0 +1,48 @@
+"""Test the local disk cache of object bodies."""
+
+import os
+from pathlib import Path
+
+from files_api.s3.disk_cache import ObjectDiskCache
+from tests.consts import TEST_BUCKET_NAME
+
+TEST_METADATA = {"ContentLength": 4, "ContentType": "text/plain", "ETag": '"abc"'}
+
+
+def test_disk_cache__evicts_least_recently_used(tmp_path: Path):
+    """Test that bodies beyond `max_bytes` evict the least recently used ones, and oversized bodies are skipped."""
+    cache = ObjectDiskCache(max_bytes=8, max_object_bytes=4, directory=str(tmp_path))
+    cache.put(TEST_BUCKET_NAME, "a.txt", b"aaaa", TEST_METADATA)
+    cache.put(TEST_BUCKET_NAME, "b.txt", b"bbbb", TEST_METADATA)
+    cache.release(cache.acquire(TEST_BUCKET_NAME, "a.txt"))
+    cache.put(TEST_BUCKET_NAME, "c.txt", b"cccc", TEST_METADATA)
+    cache.put(TEST_BUCKET_NAME, "big.txt", b"too big", TEST_METADATA)
+
+    assert cache.acquire(TEST_BUCKET_NAME, "b.txt") is None
+    assert cache.acquire(TEST_BUCKET_NAME, "big.txt") is None
+    entry = cache.acquire(TEST_BUCKET_NAME, "a.txt")
+    assert Path(entry.path).read_bytes() == b"aaaa"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 8
+    assert len(os.listdir(cache.directory)) == 2
+
+    cache.clear()
+    assert not os.path.exists(cache.directory)
+
+
+def test_disk_cache__keeps_files_being_read_until_released(tmp_path: Path):
+    """Test that an invalidated entry keeps its file for the requests sending it, and that stale puts are dropped."""
+    cache = ObjectDiskCache(max_bytes=100, max_object_bytes=100, directory=str(tmp_path))
+    cache.put(TEST_BUCKET_NAME, "a.txt", b"aaaa", TEST_METADATA)
+    entry = cache.acquire(TEST_BUCKET_NAME, "a.txt")
+
+    generation = cache.generation
+    cache.invalidate(TEST_BUCKET_NAME, "a.txt")
+    assert cache.acquire(TEST_BUCKET_NAME, "a.txt") is None
+    assert os.path.exists(entry.path)
+    cache.release(entry)
+    assert not os.path.exists(entry.path)
+
+    cache.put(TEST_BUCKET_NAME, "a.txt", b"old!", TEST_METADATA, generation=generation)
+    assert cache.acquire(TEST_BUCKET_NAME, "a.txt") is None
+    assert os.listdir(cache.directory) == []
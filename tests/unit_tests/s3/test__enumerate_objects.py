@@ -0,0 +1,88 @@
+"""Test enumerating objects with concurrently listed shards of the keyspace."""
+
+import asyncio
+from typing import List
+
+import boto3
+import pytest
+
+from files_api.s3.enumerate_objects import (
+    KeyRangeShard,
+    discover_key_range_shards,
+    iter_s3_objects_sharded,
+    shards_from_boundaries,
+)
+from files_api.s3.executor import S3Executor
+from tests.consts import TEST_BUCKET_NAME
+
+TREE_KEYS = sorted(
+    [f"logs/2024/{month:02}/{day:02}.log" for month in range(1, 4) for day in range(1, 6)]
+    + [f"photos/{name}/{i}.jpg" for name in ["cats", "dogs", "owls"] for i in range(4)]
+    + ["readme.md", "z.txt"]
+)
+FLAT_KEYS = sorted(f"{i * 2654435761 % 2**32:08x}" for i in range(120))
+
+
+def put_keys(keys: List[str]) -> None:
+    """Upload an empty object at each key."""
+    s3_client = boto3.client("s3")
+    for key in keys:
+        s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=b"")
+
+
+def enumerate_keys(prefix: str = "", **kwargs) -> List[str]:
+    """Enumerate the keys under a prefix with small pages, so shards span several of them."""
+
+    async def collect() -> List[str]:
+        pages = iter_s3_objects_sharded(
+            S3Executor(max_workers=4), TEST_BUCKET_NAME, prefix=prefix, page_size=3, max_buffered_pages=1, **kwargs
+        )
+        return [obj["Key"] async for page in pages for obj in page]
+
+    return asyncio.run(collect())
+
+
+def test__shards_from_boundaries__tile_the_keyspace():
+    """Test that shards cover every key exactly once."""
+    assert shards_from_boundaries(["m", "c", "m"]) == [
+        KeyRangeShard(start_after=None, end_at="c"),
+        KeyRangeShard(start_after="c", end_at="m"),
+        KeyRangeShard(start_after="m", end_at=None),
+    ]
+
+
+@pytest.mark.parametrize("keys", [TREE_KEYS, FLAT_KEYS], ids=["tree", "flat"])
+def test__discover_key_range_shards(mocked_aws: None, keys: List[str]):
+    """Test that both directory trees and flat keyspaces are split into several shards."""
+    put_keys(keys)
+    shards = asyncio.run(discover_key_range_shards(S3Executor(max_workers=4), TEST_BUCKET_NAME, num_shards=6))
+    assert len(shards) == 6
+
+
+@pytest.mark.parametrize("keys", [TREE_KEYS, FLAT_KEYS], ids=["tree", "flat"])
+def test__iter_s3_objects_sharded__ordered(mocked_aws: None, keys: List[str]):
+    """Test that the ordered merge yields every key once, in key order."""
+    put_keys(keys)
+    assert enumerate_keys(num_shards=6) == keys
+    assert enumerate_keys(prefix="photos/", num_shards=3) == [key for key in keys if key.startswith("photos/")]
+
+
+def test__iter_s3_objects_sharded__unordered(mocked_aws: None):
+    """Test that the unordered merge yields every key once."""
+    put_keys(TREE_KEYS)
+    keys = enumerate_keys(num_shards=6, ordered=False)
+    assert sorted(keys) == TREE_KEYS
+
+
+def test__iter_s3_objects_sharded__listing_error(mocked_aws: None):
+    """Test that a failed listing fails the enumeration."""
+    put_keys(TREE_KEYS)
+    s3_client = boto3.client("s3")
+
+    def fail_shard_listing(params, **kwargs):
+        if params.get("StartAfter", "").startswith("photos/"):
+            raise RuntimeError("listing failed")
+
+    s3_client.meta.events.register("before-parameter-build.s3.ListObjectsV2", fail_shard_listing)
+    with pytest.raises(RuntimeError, match="listing failed"):
+        enumerate_keys(num_shards=6, s3_client=s3_client)
@@ -0,0 +1,82 @@
+"""Test the local index of the keys in the bucket."""
+
+import boto3
+
+from files_api.s3.key_index import KeyIndex
+from tests.consts import TEST_BUCKET_NAME
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        """Tell the time, which only changes when a test sets `now`."""
+        return self.now
+
+
+def put_objects(sizes: dict) -> None:
+    """Upload objects of the given sizes, keyed by their key."""
+    s3_client = boto3.client("s3")
+    for key, size in sizes.items():
+        s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=b"x" * size)
+
+
+def list_all(key_index: KeyIndex, **kwargs) -> list:
+    """Follow the cursors of `list_page` to the last page."""
+    keys, after = [], None
+    while True:
+        objects, after = key_index.list_page(page_size=2, after=after, **kwargs)
+        keys += [obj.key for obj in objects]
+        if after is None:
+            return keys
+
+
+def test_key_index__reconcile_and_list(mocked_aws: None):
+    """Test that a reconciled index lists keys by prefix, in any sort order, across pages."""
+    put_objects({"a/1.txt": 30, "a/2.txt": 10, "a/3.txt": 20, "b/1.txt": 5})
+    key_index = KeyIndex(bucket_name=TEST_BUCKET_NAME)
+    assert key_index.list_page() is None
+
+    assert key_index.reconcile(page_size=3) == 4
+
+    assert list_all(key_index) == ["a/1.txt", "a/2.txt", "a/3.txt", "b/1.txt"]
+    assert list_all(key_index, prefix="a/", sort_by="size_bytes") == ["a/2.txt", "a/3.txt", "a/1.txt"]
+    assert list_all(key_index, sort_by="size_bytes", descending=True) == ["a/1.txt", "a/3.txt", "a/2.txt", "b/1.txt"]
+    assert key_index.contains("b/1.txt") is True
+    assert key_index.contains("b/2.txt") is False
+
+
+def test_key_index__writes_survive_concurrent_reconcile(mocked_aws: None):
+    """Test that a reconcile drops vanished keys but not the ones written through this process meanwhile."""
+    clock = FakeClock()
+    put_objects({"old.txt": 1, "deleted.txt": 1})
+    key_index = KeyIndex(bucket_name=TEST_BUCKET_NAME, clock=clock)
+    key_index.reconcile()
+
+    boto3.client("s3").delete_object(Bucket=TEST_BUCKET_NAME, Key="old.txt")
+    clock.now += 1
+    # written and deleted after the bucket was listed, but before the reconcile finished
+    key_index.remove("deleted.txt")
+    put_objects({"new.txt": 1})
+    key_index.refresh_key("new.txt")
+    clock.now -= 1
+    key_index.reconcile()
+
+    assert key_index.contains("old.txt") is False
+    assert key_index.contains("deleted.txt") is False
+    assert key_index.contains("new.txt") is True
+
+
+def test_key_index__staleness_bound(mocked_aws: None):
+    """Test that the index stops answering once its last reconcile is too old."""
+    clock = FakeClock()
+    key_index = KeyIndex(bucket_name=TEST_BUCKET_NAME, max_staleness_seconds=60, clock=clock)
+    key_index.reconcile()
+    assert key_index.contains("a.txt") is False
+
+    clock.now += 61
+    assert key_index.contains("a.txt") is None
+    assert key_index.list_page() is None
@@ -0,0 +1,263 @@
+"""Test the local filesystem storage backend against the S3 behavior the API relies on."""
+
+import asyncio
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+from files_api.s3.executor import S3Executor
+from files_api.s3.local_backend import LocalStorageBackend
+from files_api.s3.write_objects import upload_s3_object_from_stream
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
+from tests.consts import TEST_BUCKET_NAME
+
+
+@pytest.fixture
+def backend(tmp_path: Path) -> LocalStorageBackend:
+    """Create a local storage backend in a fresh directory."""
+    return LocalStorageBackend(directory=str(tmp_path), fsync=False)
+
+
+def error_code(err: pytest.ExceptionInfo) -> str:
+    """Get the S3 error code of a raised `ClientError`."""
+    return err.value.response["Error"]["Code"]
+
+
+def test_local_backend__put_get_head(backend: LocalStorageBackend):
+    """Test that an object comes back with its bytes, type, lowercased metadata and an S3-style ETag."""
+    backend.put_object(
+        Bucket=TEST_BUCKET_NAME, Key="a/b.txt", Body=b"hello", ContentType="text/plain", Metadata={"Owner": "me"}
+    )
+
+    obj = backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a/b.txt")
+    assert obj["Body"].read() == b"hello"
+    assert obj["ContentLength"] == 5
+    assert obj["ContentType"] == "text/plain"
+    assert obj["ETag"] == f'"{hashlib.md5(b"hello").hexdigest()}"'
+    assert obj["Metadata"] == {"owner": "me"}
+    head = backend.head_object(Bucket=TEST_BUCKET_NAME, Key="a/b.txt")
+    assert head["ETag"] == obj["ETag"]
+    assert head["LastModified"] == obj["LastModified"]
+
+    with pytest.raises(ClientError) as err:
+        backend.head_object(Bucket=TEST_BUCKET_NAME, Key="a")
+    assert error_code(err) == "404"
+    with pytest.raises(ClientError) as err:
+        backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a/b.txt/c")
+    assert error_code(err) == "NoSuchKey"
+
+
+@pytest.mark.parametrize(
+    "byte_range, expected_content, expected_content_range",
+    [
+        ("bytes=0-3", b"0123", "bytes 0-3/10"),
+        ("bytes=7-", b"789", "bytes 7-9/10"),
+        ("bytes=-2", b"89", "bytes 8-9/10"),
+        ("bytes=8-100", b"89", "bytes 8-9/10"),
+    ],
+)
+def test_local_backend__ranged_get(backend: LocalStorageBackend, byte_range, expected_content, expected_content_range):
+    """Test that a ranged GET returns the range's bytes and its Content-Range."""
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="digits", Body=b"0123456789")
+
+    obj = backend.get_object(Bucket=TEST_BUCKET_NAME, Key="digits", Range=byte_range)
+
+    assert obj["Body"].read() == expected_content
+    assert obj["ContentRange"] == expected_content_range
+    assert obj["ContentLength"] == len(expected_content)
+
+
+def test_local_backend__unsatisfiable_range(backend: LocalStorageBackend):
+    """Test that ranges past the end, and any range of an empty object, fail like S3's."""
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="digits", Body=b"0123456789")
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="empty", Body=b"")
+
+    with pytest.raises(ClientError) as err:
+        backend.get_object(Bucket=TEST_BUCKET_NAME, Key="digits", Range="bytes=10-")
+    assert error_code(err) == "InvalidRange"
+    assert err.value.response["Error"]["ActualObjectSize"] == "10"
+    with pytest.raises(ClientError) as err:
+        backend.get_object(Bucket=TEST_BUCKET_NAME, Key="empty", Range="bytes=0-99")
+    assert error_code(err) == "InvalidRange"
+    assert backend.get_object(Bucket=TEST_BUCKET_NAME, Key="empty")["Body"].read() == b""
+
+
+def test_local_backend__conditional_get(backend: LocalStorageBackend):
+    """Test that a current ETag gets S3's 304 error with the object's validators, and a stale If-Match a 412."""
+    etag = backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"a")["ETag"]
+
+    with pytest.raises(ClientError) as err:
+        backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", IfNoneMatch=etag)
+    assert error_code(err) == "304"
+    assert err.value.response["ResponseMetadata"]["HTTPHeaders"]["etag"] == etag
+    with pytest.raises(ClientError) as err:
+        backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", IfMatch='"stale"')
+    assert error_code(err) == "PreconditionFailed"
+    assert backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", IfMatch=etag)["Body"].read() == b"a"
+
+
+def test_local_backend__open_body_survives_overwrite(backend: LocalStorageBackend):
+    """Test that a body being read keeps the object as it was, while new reads see the overwrite whole."""
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"old content")
+    body = backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a.txt")["Body"]
+
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"new")
+
+    assert body.read(4) + body.read() == b"old content"
+    body.close()
+    assert backend.get_object(Bucket=TEST_BUCKET_NAME, Key="a.txt")["Body"].read() == b"new"
+
+
+def test_local_backend__rejects_wrong_checksum(backend: LocalStorageBackend):
+    """Test that a put whose SHA-256 checksum does not match its bytes stores nothing."""
+    with pytest.raises(ClientError) as err:
+        backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"a", ChecksumSHA256="bm90IHRoZSBkaWdlc3Q=")
+    assert error_code(err) == "BadDigest"
+    with pytest.raises(ClientError):
+        backend.head_object(Bucket=TEST_BUCKET_NAME, Key="a.txt")
+
+
+def test_local_backend__lists_in_key_order(backend: LocalStorageBackend):
+    """Test listing keys that are both objects and directories, with and without a delimiter, page by page."""
+    keys = ["a", "a-b", "a/b", "a/c/d", "b/", "z"]
+    for key in reversed(keys):
+        backend.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=key.encode())
+
+    listing = backend.list_objects_v2(Bucket=TEST_BUCKET_NAME)
+    assert [obj["Key"] for obj in listing["Contents"]] == keys
+    assert listing["Contents"][0]["Size"] == 1
+    directory = backend.list_objects_v2(Bucket=TEST_BUCKET_NAME, Prefix="a/", Delimiter="/")
+    assert [obj["Key"] for obj in directory["Contents"]] == ["a/b"]
+    assert directory["CommonPrefixes"] == [{"Prefix": "a/c/"}]
+    assert [obj["Key"] for obj in backend.list_objects_v2(Bucket=TEST_BUCKET_NAME, Prefix="a-")["Contents"]] == ["a-b"]
+    pages = backend.get_paginator("list_objects_v2").paginate(
+        Bucket=TEST_BUCKET_NAME, PaginationConfig={"PageSize": 4}
+    )
+    assert [[obj["Key"] for obj in page["Contents"]] for page in pages] == [keys[:4], keys[4:]]
+
+
+def test_local_backend__delete_removes_empty_directories(backend: LocalStorageBackend, tmp_path: Path):
+    """Test that deleting the last object under a prefix leaves no directory behind, and missing keys are fine."""
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a/b/c.txt", Body=b"c")
+
+    backend.delete_object(Bucket=TEST_BUCKET_NAME, Key="a/b/c.txt")
+    backend.delete_object(Bucket=TEST_BUCKET_NAME, Key="a/b/c.txt")
+
+    assert os.listdir(tmp_path / TEST_BUCKET_NAME) == []
+    assert "Contents" not in backend.list_objects_v2(Bucket=TEST_BUCKET_NAME)
+
+
+def test_local_backend__copy_object(backend: LocalStorageBackend):
+    """Test that copies keep the bytes and metadata, and honor CopySourceIfMatch and S3's self-copy rule."""
+    etag = backend.put_object(Bucket=TEST_BUCKET_NAME, Key="a.txt", Body=b"a", ContentType="text/plain")["ETag"]
+
+    backend.copy_object(
+        Bucket=TEST_BUCKET_NAME,
+        Key="b.txt",
+        CopySource={"Bucket": TEST_BUCKET_NAME, "Key": "a.txt"},
+        CopySourceIfMatch=etag,
+    )
+    copy = backend.get_object(Bucket=TEST_BUCKET_NAME, Key="b.txt")
+    assert copy["Body"].read() == b"a"
+    assert copy["ContentType"] == "text/plain"
+    with pytest.raises(ClientError) as err:
+        backend.copy_object(
+            Bucket=TEST_BUCKET_NAME,
+            Key="c.txt",
+            CopySource={"Bucket": TEST_BUCKET_NAME, "Key": "a.txt"},
+            CopySourceIfMatch='"stale"',
+        )
+    assert error_code(err) == "PreconditionFailed"
+    with pytest.raises(ClientError) as err:
+        backend.copy_object(
+            Bucket=TEST_BUCKET_NAME, Key="a.txt", CopySource={"Bucket": TEST_BUCKET_NAME, "Key": "a.txt"}
+        )
+    assert error_code(err) == "InvalidRequest"
+
+
+def test_local_backend__multipart_upload(backend: LocalStorageBackend):
+    """Test that parts, uploaded or copied, join in order under an S3-style multipart ETag."""
+    first_part = os.urandom(S3_MIN_PART_SIZE_BYTES)
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key="source", Body=b"0123456789")
+    upload_id = backend.create_multipart_upload(Bucket=TEST_BUCKET_NAME, Key="big", ContentType="text/plain")[
+        "UploadId"
+    ]
+
+    parts = [
+        {
+            "PartNumber": 1,
+            "ETag": backend.upload_part(
+                Bucket=TEST_BUCKET_NAME, Key="big", UploadId=upload_id, PartNumber=1, Body=first_part
+            )["ETag"],
+        },
+        {
+            "PartNumber": 2,
+            "ETag": backend.upload_part_copy(
+                Bucket=TEST_BUCKET_NAME,
+                Key="big",
+                UploadId=upload_id,
+                PartNumber=2,
+                CopySource={"Bucket": TEST_BUCKET_NAME, "Key": "source"},
+                CopySourceRange="bytes=2-5",
+            )["CopyPartResult"]["ETag"],
+        },
+    ]
+    backend.complete_multipart_upload(
+        Bucket=TEST_BUCKET_NAME, Key="big", UploadId=upload_id, MultipartUpload={"Parts": parts}
+    )
+
+    obj = backend.get_object(Bucket=TEST_BUCKET_NAME, Key="big")
+    assert obj["Body"].read() == first_part + b"2345"
+    assert obj["ETag"].endswith('-2"')
+    assert obj["ContentType"] == "text/plain"
+    with pytest.raises(ClientError) as err:
+        backend.abort_multipart_upload(Bucket=TEST_BUCKET_NAME, Key="big", UploadId=upload_id)
+    assert error_code(err) == "NoSuchUpload"
+
+
+def test_local_backend__rejects_small_parts(backend: LocalStorageBackend):
+    """Test that every part but the last must be at least 5 MiB, as in S3."""
+    upload_id = backend.create_multipart_upload(Bucket=TEST_BUCKET_NAME, Key="big")["UploadId"]
+    parts = [
+        {
+            "PartNumber": number,
+            "ETag": backend.upload_part(
+                Bucket=TEST_BUCKET_NAME, Key="big", UploadId=upload_id, PartNumber=number, Body=b"small"
+            )["ETag"],
+        }
+        for number in (1, 2)
+    ]
+
+    with pytest.raises(ClientError) as err:
+        backend.complete_multipart_upload(
+            Bucket=TEST_BUCKET_NAME, Key="big", UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    assert error_code(err) == "EntityTooSmall"
+
+
+def test_local_backend__streams_uploads_with_write_objects(backend: LocalStorageBackend):
+    """Test that the S3 write functions run unchanged against the local backend, multipart included."""
+    content = os.urandom(2 * S3_MIN_PART_SIZE_BYTES + 10)
+    stream = io.BytesIO(content)
+
+    async def read(size: int) -> bytes:
+        return stream.read(size)
+
+    asyncio.run(
+        upload_s3_object_from_stream(
+            S3Executor(max_workers=4),
+            read=read,
+            bucket_name=TEST_BUCKET_NAME,
+            object_key="big.bin",
+            multipart_threshold_bytes=S3_MIN_PART_SIZE_BYTES,
+            part_size_bytes=S3_MIN_PART_SIZE_BYTES,
+            max_concurrency=2,
+            s3_client=backend,
+        )
+    )
+
+    assert backend.get_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["Body"].read() == content
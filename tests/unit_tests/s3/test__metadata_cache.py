@@ -0,0 +1,78 @@
+"""Test the in-process object metadata cache."""
+
+from files_api.s3.metadata_cache import ObjectMetadataCache
+from tests.consts import TEST_BUCKET_NAME
+
+TEST_METADATA = {"ContentLength": 12, "ContentType": "text/plain", "ETag": '"abc"', "ResponseMetadata": {}}
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Tell the time, which only changes when a test sets `now`."""
+        return self.now
+
+
+def test_metadata_cache__hits_and_negative_entries():
+    """Test that stored metadata and "not found" entries are returned, without the response metadata."""
+    cache = ObjectMetadataCache(max_entries=10, ttl_seconds=10)
+    assert cache.get(TEST_BUCKET_NAME, "a.txt") is None
+
+    cache.put(TEST_BUCKET_NAME, "a.txt", TEST_METADATA)
+    cache.put(TEST_BUCKET_NAME, "missing.txt", None)
+
+    assert cache.get(TEST_BUCKET_NAME, "a.txt").metadata == {
+        "ContentLength": 12,
+        "ContentType": "text/plain",
+        "ETag": '"abc"',
+    }
+    assert cache.get(TEST_BUCKET_NAME, "missing.txt").metadata is None
+    assert cache.stats() == {
+        "hits": 2,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 0,
+        "entries": 2,
+        "max_entries": 10,
+    }
+
+
+def test_metadata_cache__lru_eviction_and_ttl():
+    """Test that the least recently used entry is evicted, and that entries expire after the TTL."""
+    clock = FakeClock()
+    cache = ObjectMetadataCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put(TEST_BUCKET_NAME, "a.txt", TEST_METADATA)
+    cache.put(TEST_BUCKET_NAME, "b.txt", TEST_METADATA)
+    cache.get(TEST_BUCKET_NAME, "a.txt")
+    cache.put(TEST_BUCKET_NAME, "c.txt", TEST_METADATA)
+
+    assert cache.get(TEST_BUCKET_NAME, "b.txt") is None
+    assert cache.get(TEST_BUCKET_NAME, "a.txt") is not None
+
+    clock.now = 10
+    assert cache.get(TEST_BUCKET_NAME, "c.txt") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_metadata_cache__invalidation_wins_races():
+    """Test that a lookup started before a write does not cache its possibly stale result."""
+    cache = ObjectMetadataCache(max_entries=10, ttl_seconds=10)
+    cache.put(TEST_BUCKET_NAME, "a.txt", TEST_METADATA)
+
+    generation = cache.generation
+    cache.invalidate(TEST_BUCKET_NAME, "a.txt")
+    cache.put(TEST_BUCKET_NAME, "a.txt", None, generation=generation)
+
+    assert cache.get(TEST_BUCKET_NAME, "a.txt") is None
+
+
+def test_metadata_cache__disabled():
+    """Test that a cache without room stores nothing."""
+    cache = ObjectMetadataCache(max_entries=0, ttl_seconds=10)
+    cache.put(TEST_BUCKET_NAME, "a.txt", TEST_METADATA)
+    assert cache.get(TEST_BUCKET_NAME, "a.txt") is None
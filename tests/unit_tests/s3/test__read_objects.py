@@ -1,11 +1,18 @@
 """Test read file operations."""
 
+import asyncio
+import time
+
+import boto3
 from moto import mock_aws
 
+from files_api.s3.executor import S3Executor
 from files_api.s3.read_objects import (
+    fetch_s3_directory_page,
     fetch_s3_object,
     fetch_s3_objects_metadata,
     fetch_s3_objects_using_page_token,
+    iter_s3_object_parts,
     object_exists_in_s3,
 )
 from files_api.s3.write_objects import upload_s3_object
@@ -100,3 +107,59 @@ def test__fetch_s3_objects_using_page_token(mocked_aws: None):
 
     assert continuation_token is not None
     assert objects[0]["Key"] == "test2.txt"
+
+
+@mock_aws
+def test__fetch_s3_directory_page(mocked_aws: None):
+    """Test that a directory page lists the objects directly under the prefix, and groups deeper ones."""
+    for key in ["docs/readme.md", "docs/a/1.txt", "docs/a/b/2.txt", "docs/c/3.txt", "docs/z.txt", "other.txt"]:
+        upload_s3_object(bucket_name=TEST_BUCKET_NAME, object_key=key, file_content=b"x")
+
+    objects, directories, continuation_token = fetch_s3_directory_page(
+        bucket_name=TEST_BUCKET_NAME, prefix="docs/", max_keys=3
+    )
+    assert [obj["Key"] for obj in objects] == ["docs/readme.md"]
+    assert directories == ["docs/a/", "docs/c/"]
+    assert continuation_token is not None
+
+    objects, directories, continuation_token = fetch_s3_directory_page(
+        bucket_name=TEST_BUCKET_NAME, prefix="docs/", max_keys=3, continuation_token=continuation_token
+    )
+    assert [obj["Key"] for obj in objects] == ["docs/z.txt"]
+    assert directories == []
+    assert continuation_token is None
+
+
+@mock_aws
+def test__iter_s3_object_parts__yields_parts_in_order(mocked_aws: None):
+    """Test that parts finishing out of order are reassembled in order."""
+    content = bytes(range(256)) * 8
+    upload_s3_object(bucket_name=TEST_BUCKET_NAME, object_key="big.bin", file_content=content)
+    s3_client = boto3.client("s3")
+
+    def delay_earlier_parts(params, **kwargs):
+        # the earlier the range, the slower it arrives
+        first_byte = int(params["Range"].split("=")[1].split("-")[0])
+        time.sleep((len(content) - first_byte) / len(content) / 10)
+
+    s3_client.meta.events.register("before-parameter-build.s3.GetObject", delay_earlier_parts)
+
+    async def download() -> bytes:
+        async def head_chunks():
+            yield content[:100]
+
+        parts = iter_s3_object_parts(
+            S3Executor(max_workers=8),
+            head_chunks=head_chunks(),
+            bucket_name=TEST_BUCKET_NAME,
+            object_key="big.bin",
+            etag=s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["ETag"],
+            start=100,
+            total_size=len(content),
+            part_size=300,
+            max_concurrency=4,
+            s3_client=s3_client,
+        )
+        return b"".join([part async for part in parts])
+
+    assert asyncio.run(download()) == content
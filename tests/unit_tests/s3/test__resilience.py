@@ -0,0 +1,69 @@
+"""Test the circuit breaker and the per-prefix concurrency limit guarding S3 calls."""
+
+import pytest
+
+from files_api.s3.resilience import (
+    CircuitBreaker,
+    PrefixConcurrencyLimiter,
+    S3UnavailableError,
+    key_prefix,
+)
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Tell the time, which only changes when a test sets `now`."""
+        return self.now
+
+
+def test_circuit_breaker__opens_half_opens_and_closes():
+    """Test that failures open the circuit, and that a single probe call decides whether it closes again."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=10, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(S3UnavailableError) as exc_info:
+        breaker.before_call()
+    assert exc_info.value.retry_after_seconds == 10
+
+    clock.now = 10
+    breaker.before_call()
+    with pytest.raises(S3UnavailableError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 20
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "times_opened": 2, "rejected_calls": 2}
+
+
+def test_prefix_concurrency_limiter__rejects_calls_over_the_limit():
+    """Test that calls over the limit of a prefix are rejected after the wait, and calls to other prefixes are not."""
+    limiter = PrefixConcurrencyLimiter(max_concurrency=1, max_wait_seconds=0.01)
+    slot = limiter.acquire("bucket", "reports/")
+    with pytest.raises(S3UnavailableError):
+        limiter.acquire("bucket", "reports/")
+    limiter.release(limiter.acquire("bucket", "images/"))
+
+    limiter.release(slot)
+    limiter.release(limiter.acquire("bucket", "reports/"))
+    assert limiter.rejected_calls == 1
+
+
+def test_key_prefix():
+    """Test that the prefix of a key is its first path segment."""
+    assert key_prefix("reports/2024/q1.csv") == "reports/"
+    assert key_prefix("top.txt") == ""
@@ -0,0 +1,166 @@
+"""Test spreading the files of a logical bucket over shards, and rebalancing them."""
+
+import asyncio
+from typing import (
+    Dict,
+    List,
+)
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from files_api.s3.copy_objects import copy_s3_object
+from files_api.s3.delete_objects import delete_s3_objects
+from files_api.s3.executor import S3Executor
+from files_api.s3.read_objects import fetch_s3_object
+from files_api.s3.sharding import (
+    BucketShard,
+    ShardedStorageBackend,
+    ShardMap,
+    rebalance_shards,
+)
+from tests.consts import TEST_BUCKET_NAME
+
+SHARDS = [BucketShard("shard-a"), BucketShard("shard-b", "files/"), BucketShard("shard-b", "more/")]
+KEYS = [f"dir{i % 3}/{i:03}.txt" for i in range(30)] + ["top.txt", "zzz.txt"]
+
+
+@pytest.fixture
+def shard_buckets(mocked_aws: None) -> None:
+    """Create the buckets of the shards."""
+    s3_client = boto3.client("s3")
+    for bucket_name in {shard.bucket_name for shard in SHARDS} | {"shard-c"}:
+        s3_client.create_bucket(Bucket=bucket_name)
+
+
+def physical_keys(s3_client, shard: BucketShard) -> List[str]:
+    """List the keys of the logical bucket stored on a shard."""
+    response = s3_client.list_objects_v2(Bucket=shard.bucket_name, Prefix=shard.prefix)
+    return [obj["Key"][len(shard.prefix) :] for obj in response.get("Contents", [])]
+
+
+def test_shard_map__adding_a_shard_only_moves_keys_onto_it():
+    """Test that a key keeps its shard when shards are added, unless it moves to the new one."""
+    keys = [f"file-{i}.txt" for i in range(1000)]
+    old_map = ShardMap(SHARDS)
+    new_map = ShardMap(SHARDS + [BucketShard("shard-c")])
+
+    moved = [key for key in keys if old_map.shard_for(key) != new_map.shard_for(key)]
+    assert {new_map.shard_for(key) for key in moved} == {BucketShard("shard-c")}
+    assert 150 < len(moved) < 350
+    assert all(new_map.rank(key)[1] == old_map.shard_for(key) for key in moved)
+    assert ShardMap(list(reversed(SHARDS))).shard_for("a.txt") == old_map.shard_for("a.txt")
+
+
+def test_shard_map__rejects_overlapping_shards():
+    """Test that shards in the same bucket cannot hold the same keys."""
+    assert BucketShard.parse("bucket/files") == BucketShard("bucket", "files/")
+    assert BucketShard.parse("bucket") == BucketShard("bucket", "")
+    with pytest.raises(ValueError, match="overlap"):
+        ShardMap([BucketShard("bucket"), BucketShard("bucket", "files/")])
+    with pytest.raises(ValueError, match="overlap"):
+        ShardMap([BucketShard("bucket", "files/"), BucketShard("bucket", "files/old/")])
+    with pytest.raises(ValueError):
+        ShardMap([])
+
+
+def test_sharded_backend__stores_each_file_on_its_shard(shard_buckets: None):
+    """Test that files are written under their shard's prefix, and read back through the logical bucket."""
+    s3_client = boto3.client("s3")
+    shard_map = ShardMap(SHARDS)
+    backend = ShardedStorageBackend(s3_client, TEST_BUCKET_NAME, shard_map)
+    for key in KEYS:
+        backend.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=key.encode())
+
+    for shard in SHARDS:
+        assert physical_keys(s3_client, shard) == sorted(key for key in KEYS if shard_map.shard_for(key) == shard)
+    assert all(physical_keys(s3_client, shard) for shard in SHARDS)
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=TEST_BUCKET_NAME)
+    assert fetch_s3_object(TEST_BUCKET_NAME, "dir1/001.txt", s3_client=backend)["Body"].read() == b"dir1/001.txt"
+    assert backend.head_object(Bucket=TEST_BUCKET_NAME, Key="top.txt")["ContentLength"] == len(b"top.txt")
+
+
+def test_sharded_backend__lists_every_shard_in_key_order(shard_buckets: None):
+    """Test that listings merge the shards in key order, page by page, with each common prefix once."""
+    backend = ShardedStorageBackend(boto3.client("s3"), TEST_BUCKET_NAME, ShardMap(SHARDS))
+    for key in KEYS:
+        backend.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=b"abc")
+
+    pages = list(
+        backend.get_paginator("list_objects_v2").paginate(Bucket=TEST_BUCKET_NAME, PaginationConfig={"PageSize": 4})
+    )
+    assert len(pages) == len(KEYS) // 4
+    assert [obj["Key"] for page in pages for obj in page["Contents"]] == sorted(KEYS)
+    assert {obj["Size"] for page in pages for obj in page["Contents"]} == {3}
+
+    entries: List[str] = []
+    params: Dict[str, str] = {}
+    while True:
+        response = backend.list_objects_v2(Bucket=TEST_BUCKET_NAME, Delimiter="/", MaxKeys=1, **params)
+        entries += [obj["Key"] for obj in response.get("Contents", [])]
+        entries += [common_prefix["Prefix"] for common_prefix in response.get("CommonPrefixes", [])]
+        if not response["IsTruncated"]:
+            break
+        params = {"ContinuationToken": response["NextContinuationToken"]}
+    assert entries == ["dir0/", "dir1/", "dir2/", "top.txt", "zzz.txt"]
+
+    response = backend.list_objects_v2(Bucket=TEST_BUCKET_NAME, Prefix="dir2/", StartAfter="dir2/011.txt")
+    assert [obj["Key"] for obj in response["Contents"]] == [key for key in sorted(KEYS) if "dir2/011.txt" < key < "t"]
+
+
+def test_sharded_backend__copies_and_deletes_across_shards(shard_buckets: None):
+    """Test that copies and bulk deletes work between keys on different shards."""
+    s3_client = boto3.client("s3")
+    shard_map = ShardMap(SHARDS)
+    backend = ShardedStorageBackend(s3_client, TEST_BUCKET_NAME, shard_map)
+    source_key = "top.txt"
+    destination_key = next(key for key in KEYS if shard_map.shard_for(key) != shard_map.shard_for(source_key))
+    backend.put_object(Bucket=TEST_BUCKET_NAME, Key=source_key, Body=b"copied", ContentType="text/plain")
+
+    copy_s3_object(TEST_BUCKET_NAME, source_key, destination_key, s3_client=backend)
+    copy = backend.get_object(Bucket=TEST_BUCKET_NAME, Key=destination_key)
+    assert copy["Body"].read() == b"copied"
+    assert copy["ContentType"] == "text/plain"
+    assert destination_key in physical_keys(s3_client, shard_map.shard_for(destination_key))
+
+    deleted_keys, errors = delete_s3_objects(TEST_BUCKET_NAME, [source_key, destination_key], s3_client=backend)
+    assert sorted(deleted_keys) == sorted([source_key, destination_key])
+    assert not errors
+    assert all(not physical_keys(s3_client, shard) for shard in SHARDS)
+
+
+def test_rebalance_shards__moves_files_onto_an_added_shard(shard_buckets: None):
+    """Test that files stay readable with read fallback after adding a shard, until rebalancing moves them."""
+    s3_client = boto3.client("s3")
+    old_backend = ShardedStorageBackend(s3_client, TEST_BUCKET_NAME, ShardMap(SHARDS))
+    for key in KEYS:
+        old_backend.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=key.encode())
+    new_shard = BucketShard("shard-c")
+    new_map = ShardMap(SHARDS + [new_shard])
+    backend = ShardedStorageBackend(s3_client, TEST_BUCKET_NAME, new_map, read_fallback=True)
+    to_move = sorted(key for key in KEYS if new_map.shard_for(key) == new_shard)
+    assert to_move
+
+    without_fallback = ShardedStorageBackend(s3_client, TEST_BUCKET_NAME, new_map)
+    with pytest.raises(ClientError):
+        without_fallback.head_object(Bucket=TEST_BUCKET_NAME, Key=to_move[0])
+    assert backend.get_object(Bucket=TEST_BUCKET_NAME, Key=to_move[0])["Body"].read() == to_move[0].encode()
+    assert [obj["Key"] for obj in backend.list_objects_v2(Bucket=TEST_BUCKET_NAME)["Contents"]] == sorted(KEYS)
+
+    s3_executor = S3Executor(max_workers=4)
+    try:
+        planned = asyncio.run(rebalance_shards(s3_executor, new_map, dry_run=True, s3_client=s3_client))
+        assert sorted(move.key for move in planned) == to_move
+        assert not physical_keys(s3_client, new_shard)
+
+        moves = asyncio.run(rebalance_shards(s3_executor, new_map, s3_client=s3_client))
+    finally:
+        s3_executor.shutdown()
+    assert sorted(move.key for move in moves) == to_move
+    assert {move.destination for move in moves} == {new_shard}
+    assert physical_keys(s3_client, new_shard) == to_move
+    remaining_keys = sorted(key for shard in SHARDS for key in physical_keys(s3_client, shard))
+    assert remaining_keys == sorted(set(KEYS) - set(to_move))
+    listing = backend.list_objects_v2(Bucket=TEST_BUCKET_NAME)
+    assert [obj["Key"] for obj in listing["Contents"]] == sorted(KEYS)
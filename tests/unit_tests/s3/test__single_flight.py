@@ -0,0 +1,52 @@
+"""Test coalescing concurrent identical calls."""
+
+import asyncio
+
+import pytest
+
+from files_api.s3.single_flight import SingleFlight
+
+
+def test_single_flight__shares_results_and_errors():
+    """Test that concurrent callers of a key share one call, its error included, and later callers start anew."""
+    single_flight = SingleFlight()
+    num_executions = 0
+
+    async def fetch() -> int:
+        nonlocal num_executions
+        num_executions += 1
+        await asyncio.sleep(0.01)
+        return num_executions
+
+    async def fail() -> int:
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        assert await asyncio.gather(*(single_flight.run("a", fetch) for _ in range(3))) == [1, 1, 1]
+        assert await single_flight.run("a", fetch) == 2
+        results = await asyncio.gather(*(single_flight.run("b", fail) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(main())
+    assert single_flight.stats() == {"calls": 6, "executions": 3, "coalesced": 3, "coalescing_ratio": 0.5}
+
+
+def test_single_flight__cancelled_caller_does_not_cancel_the_call():
+    """Test that a caller giving up leaves the shared call running for the others."""
+    single_flight = SingleFlight()
+
+    async def fetch() -> str:
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.run("a", fetch))
+        second = asyncio.ensure_future(single_flight.run("a", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == "done"
+
+    asyncio.run(main())
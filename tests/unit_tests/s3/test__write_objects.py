@@ -1,10 +1,25 @@
 """Test write file operations."""
 
+import asyncio
+import io
+import os
+import zlib
+
 import boto3
+import pytest
 from moto import mock_aws
 
+from files_api.checksums import crc32_checksum
+from files_api.s3.executor import S3Executor
+from files_api.s3.write_objects import upload_s3_object_from_stream
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
 from tests.consts import TEST_BUCKET_NAME
-from tests.unit_tests.utils import upload_test_object
+from tests.unit_tests.utils import (
+    count_s3_calls,
+    upload_test_object,
+)
+
+PART_SIZE = S3_MIN_PART_SIZE_BYTES
 
 # from tests.consts import TEST_BUCKET_NAME
 
@@ -20,3 +35,103 @@ def test__upload_s3_object(mocked_aws: None):
     response = s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key=object_key)
     assert response["ContentType"] == content_type
     assert response["Body"].read() == file_content
+
+
+def stream_reader(content: bytes):
+    """Wrap bytes in an async `read(n)` function like `UploadFile.read`."""
+    stream = io.BytesIO(content)
+
+    async def read(size: int) -> bytes:
+        return stream.read(size)
+
+    return read
+
+
+def upload_from_stream(s3_client, content: bytes, object_key: str = "big.bin") -> None:
+    """Upload `content` with 5 MiB parts and a 5 MiB single-put threshold."""
+    asyncio.run(
+        upload_s3_object_from_stream(
+            S3Executor(max_workers=4),
+            read=stream_reader(content),
+            bucket_name=TEST_BUCKET_NAME,
+            object_key=object_key,
+            content_type="application/octet-stream",
+            multipart_threshold_bytes=PART_SIZE,
+            part_size_bytes=PART_SIZE,
+            max_concurrency=2,
+            s3_client=s3_client,
+        )
+    )
+
+
+@mock_aws
+def test__upload_s3_object_from_stream__small_file_uses_single_put(mocked_aws: None):
+    """Test that streams below the threshold keep the single put_object fast path."""
+    s3_client = boto3.client("s3")
+    with count_s3_calls(s3_client) as s3_calls:
+        upload_from_stream(s3_client, b"small file")
+
+    assert s3_calls == {"PutObject": 1}
+    assert s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["Body"].read() == b"small file"
+
+
+@mock_aws
+def test__upload_s3_object_from_stream__large_file_uses_multipart(mocked_aws: None):
+    """Test that large streams are split into parts and reassembled in order."""
+    s3_client = boto3.client("s3")
+    content = os.urandom(2 * PART_SIZE + 1024)
+    with count_s3_calls(s3_client) as s3_calls:
+        upload_from_stream(s3_client, content)
+
+    assert s3_calls == {"CreateMultipartUpload": 1, "UploadPart": 3, "CompleteMultipartUpload": 1}
+    assert s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="big.bin")["Body"].read() == content
+
+
+@mock_aws
+def test__upload_s3_object_from_stream__sends_part_checksums(mocked_aws: None):
+    """Test that every part of a multipart upload is sent with its CRC32 checksum, for S3 to check."""
+    s3_client = boto3.client("s3")
+    content = os.urandom(PART_SIZE + 1024)
+    sent_checksums = []
+    s3_client.meta.events.register(
+        "before-parameter-build.s3.UploadPart",
+        lambda params, **kwargs: sent_checksums.append(params["ChecksumCRC32"]),
+    )
+    upload_from_stream(s3_client, content)
+
+    # parts are uploaded concurrently, in no particular order
+    assert sorted(sent_checksums) == sorted(
+        crc32_checksum(zlib.crc32(part)) for part in (content[:PART_SIZE], content[PART_SIZE:])
+    )
+
+
+@mock_aws
+def test__upload_s3_object_from_stream__records_full_object_checksum(mocked_aws: None):
+    """Test that a multipart upload is completed with the CRC32 of the whole stream, without rewriting the object."""
+    s3_client = boto3.client("s3")
+    content = os.urandom(2 * PART_SIZE + 1024)
+    upload_from_stream(s3_client, content)
+
+    obj = s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="big.bin", ChecksumMode="ENABLED")
+    assert obj["ChecksumCRC32"] == crc32_checksum(zlib.crc32(content))
+    assert obj["ChecksumType"] == "FULL_OBJECT"
+    assert obj["ContentType"] == "application/octet-stream"
+    assert obj["ContentLength"] == len(content)
+
+
+@mock_aws
+def test__upload_s3_object_from_stream__aborts_on_failure(mocked_aws: None):
+    """Test that a failed part aborts the multipart upload and leaves no object behind."""
+    s3_client = boto3.client("s3")
+
+    def fail_second_part(params, **kwargs):
+        if params["PartNumber"] == 2:
+            raise ConnectionError("connection reset while uploading part 2")
+
+    s3_client.meta.events.register("before-parameter-build.s3.UploadPart", fail_second_part)
+
+    with pytest.raises(ConnectionError):
+        upload_from_stream(s3_client, os.urandom(3 * PART_SIZE))
+
+    assert "Uploads" not in s3_client.list_multipart_uploads(Bucket=TEST_BUCKET_NAME)
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=TEST_BUCKET_NAME)
@@ -0,0 +1,187 @@
+"""Test reading archives as a stream."""
+
+import io
+import tarfile
+import zipfile
+from datetime import datetime
+from typing import Literal
+
+import pytest
+
+from files_api.archives import (
+    ArchiveError,
+    TarStreamWriter,
+    ZipStreamWriter,
+    iter_tar_entries,
+    iter_zip_entries,
+    make_archive_writer,
+)
+
+FILES = {"a.txt": b"first file", "dir/b.bin": bytes(range(256)) * 1000, "empty.txt": b""}
+
+
+class NonSeekableStream(io.RawIOBase):
+    """A stream that only supports sequential reads, like a request body."""
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        self._data = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        """Tell `io` that the stream can be read."""
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Read at most 1000 bytes at a time, like a body arriving in chunks."""
+        chunk = self._data.read(min(len(buffer), 1000))
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+
+def make_tar(mode: Literal["w", "w:gz"]) -> bytes:
+    """Build a tar archive of `FILES`."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        directory = tarfile.TarInfo("dir")
+        directory.type = tarfile.DIRTYPE  # not a regular file, so it is skipped
+        archive.addfile(directory)
+        for name, content in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def make_zip(compression: int, seekable: bool) -> bytes:
+    """Build a zip archive of `FILES`. Written to a non-seekable stream, sizes follow the data of each entry."""
+    buffer = io.BytesIO()
+    target = buffer if seekable else NonSeekableWriter(buffer)
+    with zipfile.ZipFile(target, mode="w", compression=compression) as archive:
+        archive.writestr("dir/", b"")
+        for name, content in FILES.items():
+            with archive.open(name, mode="w") as entry:
+                entry.write(content)
+    return buffer.getvalue()
+
+
+class NonSeekableWriter(io.RawIOBase):
+    """A write-only stream that cannot seek back, which makes zipfile write data descriptors."""
+
+    def __init__(self, buffer: io.BytesIO):
+        super().__init__()
+        self._buffer = buffer
+
+    def writable(self) -> bool:
+        """Tell `io` that the stream can be written."""
+        return True
+
+    def write(self, data) -> int:
+        """Append `data` to the buffer."""
+        return self._buffer.write(data)
+
+
+@pytest.mark.parametrize("mode", ["w", "w:gz"])
+def test_iter_tar_entries(mode: Literal["w", "w:gz"]):
+    """Test that regular files are read from plain and compressed tar archives."""
+    entries = {
+        entry.name: (entry.size, entry.reader.read()) for entry in iter_tar_entries(NonSeekableStream(make_tar(mode)))
+    }
+    assert entries == {name: (len(content), content) for name, content in FILES.items()}
+
+
+@pytest.mark.parametrize(
+    "compression,seekable",
+    [(zipfile.ZIP_STORED, True), (zipfile.ZIP_DEFLATED, True), (zipfile.ZIP_DEFLATED, False)],
+)
+def test_iter_zip_entries(compression: int, seekable: bool):
+    """Test that files are read from zip archives, including deflated entries whose sizes follow their data."""
+    entries = {
+        entry.name: (entry.size, entry.reader.read())
+        for entry in iter_zip_entries(NonSeekableStream(make_zip(compression, seekable)))
+    }
+    expected_sizes = {name: len(content) if seekable else None for name, content in FILES.items()}
+    assert entries == {name: (expected_sizes[name], content) for name, content in FILES.items()}
+
+
+def test_iter_zip_entries__unread_entries_are_skipped():
+    """Test that entries the consumer does not read do not desynchronize the stream."""
+    names = [entry.name for entry in iter_zip_entries(NonSeekableStream(make_zip(zipfile.ZIP_DEFLATED, False)))]
+    assert names == list(FILES)
+
+
+def test_iter_zip_entries__stored_with_data_descriptor():
+    """Test that stored entries whose size is unknown until after their data are rejected."""
+    with pytest.raises(ArchiveError):
+        list(iter_zip_entries(NonSeekableStream(make_zip(zipfile.ZIP_STORED, False))))
+
+
+def test_iter_zip_entries__larger_than_declared():
+    """Test that an entry inflating past the size its header declares is rejected, a little at a time."""
+    target = io.BytesIO()
+    with zipfile.ZipFile(target, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("bomb.bin", bytes(10 * 1024 * 1024))
+    archive_bytes = bytearray(target.getvalue())
+    # the uncompressed size of the first local file header
+    archive_bytes[22:26] = (1024).to_bytes(4, "little")
+
+    entry = next(iter_zip_entries(NonSeekableStream(bytes(archive_bytes))))
+    assert len(entry.reader.read(512)) == 512
+    with pytest.raises(ArchiveError):
+        entry.reader.read(64 * 1024)
+
+
+def test_iter_zip_entries__not_a_zip():
+    """Test that other content is rejected."""
+    with pytest.raises(ArchiveError):
+        list(iter_zip_entries(NonSeekableStream(b"definitely not a zip archive")))
+
+
+@pytest.mark.parametrize("archive_format", ["zip", "tar"])
+def test_archive_writers__round_trip(archive_format: str):
+    """Test that written archives read back with the standard library and with the streaming readers."""
+    writer = make_archive_writer(archive_format)
+    chunks = []
+    for name, content in FILES.items():
+        chunks.append(writer.start_entry(name, size=len(content), last_modified=datetime(2024, 1, 2, 3, 4, 5)))
+        for start in range(0, len(content), 1000):
+            chunks.append(writer.write(content[start : start + 1000]))
+        chunks.append(writer.finish_entry())
+    chunks.append(writer.finish())
+    archive_bytes = b"".join(chunks)
+
+    if archive_format == "zip":
+        with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+            assert archive.testzip() is None
+            assert {name: archive.read(name) for name in archive.namelist()} == FILES
+            assert archive.getinfo("a.txt").date_time == (2024, 1, 2, 3, 4, 4)
+        entries = iter_zip_entries(NonSeekableStream(archive_bytes))
+    else:
+        with tarfile.open(fileobj=io.BytesIO(archive_bytes)) as archive:
+            assert {member.name: archive.extractfile(member).read() for member in archive} == FILES
+        entries = iter_tar_entries(NonSeekableStream(archive_bytes))
+    assert {entry.name: entry.reader.read() for entry in entries} == FILES
+
+
+def test_tar_stream_writer__size_mismatch():
+    """Test that an entry longer than its announced size is rejected, since tar headers carry the size."""
+    writer = TarStreamWriter()
+    writer.start_entry("a.txt", size=3, last_modified=datetime(2024, 1, 1))
+    with pytest.raises(ArchiveError):
+        writer.write(b"four")
+
+
+def test_zip_stream_writer__zip64_entries():
+    """Test that entries announced as larger than 4 GiB get zip64 sizes that both readers understand."""
+    writer = ZipStreamWriter()
+    archive_bytes = (
+        writer.start_entry("big.bin", size=5 * 1024**3, last_modified=datetime(2024, 1, 1))
+        + writer.write(b"not actually big")
+        + writer.finish_entry()
+        + writer.finish()
+    )
+
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        assert archive.read("big.bin") == b"not actually big"
+    assert [entry.reader.read() for entry in iter_zip_entries(NonSeekableStream(archive_bytes))] == [
+        b"not actually big"
+    ]
@@ -0,0 +1,99 @@
+"""Test the Lambda handler with synthetic API Gateway events, for each size class of download."""
+
+import base64
+import importlib
+from types import SimpleNamespace
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+)
+
+import boto3
+import pytest
+from fastapi import status
+
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+
+INLINE_MAX_BYTES = 100
+STREAMING_MAX_BYTES = 200
+
+Handler = Callable[[dict, object], dict]
+
+
+def http_api_event(path: str, headers: Optional[Dict[str, str]] = None) -> dict:
+    """Build the event API Gateway's HTTP API (payload format 2.0) sends for a GET."""
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "files.example.com", "x-forwarded-proto": "https", **(headers or {})},
+        "requestContext": {
+            "http": {"method": "GET", "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1"},
+            "stage": "$default",
+        },
+        "isBase64Encoded": False,
+    }
+
+
+@pytest.fixture
+def make_handler(mocked_aws: None, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Handler]:
+    """Build Lambda handlers over a bucket holding a file of each size class."""
+    # the module builds its own handler on import, from the environment
+    monkeypatch.setenv("S3_BUCKET_NAME", TEST_BUCKET_NAME)
+    aws_lambda_handler = importlib.import_module("files_api.aws_lambda_handler")
+
+    s3_client = boto3.client("s3")
+    for name, size in [("inline.bin", 50), ("streamed.bin", 150), ("redirect.bin", 300)]:
+        s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key=name, Body=b"x" * size)
+
+    def make(streaming: bool = False) -> Handler:
+        settings = Settings(
+            s3_bucket_name=TEST_BUCKET_NAME,
+            lambda_inline_response_max_bytes=INLINE_MAX_BYTES,
+            lambda_response_streaming_enabled=streaming,
+            lambda_streaming_response_max_bytes=STREAMING_MAX_BYTES,
+        )
+        return aws_lambda_handler.create_handler(settings)
+
+    return make
+
+
+def invoke(handler: Handler, path: str, headers: Optional[Dict[str, str]] = None) -> dict:
+    """Invoke the handler with an HTTP API event."""
+    return handler(http_api_event(path, headers), SimpleNamespace(aws_request_id="test"))
+
+
+def test_lambda_handler__inline_download(make_handler: Callable[..., Handler]):
+    """Test that small files are returned in the invocation's payload."""
+    response = invoke(make_handler(), "/v1/files/inline.bin")
+    assert response["statusCode"] == status.HTTP_200_OK
+    assert response["isBase64Encoded"] is True
+    assert base64.b64decode(response["body"]) == b"x" * 50
+
+
+def test_lambda_handler__streamed_download(make_handler: Callable[..., Handler]):
+    """Test that files above the inline limit are streamed if the deployment streams responses."""
+    response = invoke(make_handler(streaming=True), "/v1/files/streamed.bin")
+    assert response["statusCode"] == status.HTTP_200_OK
+    assert base64.b64decode(response["body"]) == b"x" * 150
+
+    response = invoke(make_handler(streaming=True), "/v1/files/redirect.bin")
+    assert response["statusCode"] == status.HTTP_307_TEMPORARY_REDIRECT
+
+
+def test_lambda_handler__redirected_download(make_handler: Callable[..., Handler]):
+    """Test that files too large to return are redirected to S3, whole or in ranges."""
+    handler = make_handler()
+    response = invoke(handler, "/v1/files/streamed.bin")
+    assert response["statusCode"] == status.HTTP_307_TEMPORARY_REDIRECT
+    assert "/streamed.bin?" in response["headers"]["location"]
+    assert response["body"] == ""
+
+    response = invoke(handler, "/v1/files/redirect.bin", headers={"range": "bytes=0-149"})
+    assert response["statusCode"] == status.HTTP_307_TEMPORARY_REDIRECT
+    response = invoke(handler, "/v1/files/redirect.bin", headers={"range": "bytes=0-99"})
+    assert response["statusCode"] == status.HTTP_206_PARTIAL_CONTENT
+    assert base64.b64decode(response["body"]) == b"x" * 100
@@ -0,0 +1,61 @@
+"""Test the `files-api` command line tools."""
+
+import json
+
+import boto3
+import pytest
+
+from files_api.cli import main
+from tests.consts import TEST_BUCKET_NAME
+
+
+def test_enumerate(mocked_aws: None, capsys: pytest.CaptureFixture):
+    """Test that `files-api enumerate` prints every file under the prefix, in key order."""
+    s3_client = boto3.client("s3")
+    keys = [f"dir/{i:03}.txt" for i in range(25)] + ["other.txt"]
+    for key in keys:
+        s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=b"abc")
+
+    assert main(["enumerate", "--bucket", TEST_BUCKET_NAME, "--prefix", "dir/", "--shards", "4"]) == 0
+    files = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [file["file_path"] for file in files] == keys[:-1]
+    assert {file["size_bytes"] for file in files} == {3}
+
+    assert main(["enumerate", "--bucket", TEST_BUCKET_NAME, "--unordered", "--keys-only"]) == 0
+    assert sorted(capsys.readouterr().out.splitlines()) == keys
+
+
+def test_gc(mocked_aws: None, capsys: pytest.CaptureFixture):
+    """Test that `files-api gc` deletes and prints the blobs no file points to."""
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket="blobs")
+    s3_client.put_object(Bucket="blobs", Key="sha256/ab/ab12", Body=b"orphaned")
+    s3_client.put_object(Bucket="blobs", Key="sha256/cd/cd34", Body=b"kept")
+    s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="kept.txt", Body=b"", Metadata={"blob-sha256": "cd34"})
+
+    args = ["gc", "--bucket", TEST_BUCKET_NAME, "--blob-bucket", "blobs", "--grace-seconds", "0"]
+    assert main(args) == 0
+    assert capsys.readouterr().out.splitlines() == ["sha256/ab/ab12"]
+    assert [obj["Key"] for obj in s3_client.list_objects_v2(Bucket="blobs")["Contents"]] == ["sha256/cd/cd34"]
+
+
+def test_rebalance(mocked_aws: None, capsys: pytest.CaptureFixture, monkeypatch: pytest.MonkeyPatch):
+    """Test that `files-api rebalance` moves and prints the files on the wrong shard."""
+    s3_client = boto3.client("s3")
+    for bucket_name in ("shard-0", "shard-1"):
+        s3_client.create_bucket(Bucket=bucket_name)
+    keys = [f"{i}.txt" for i in range(20)]
+    for key in keys:
+        s3_client.put_object(Bucket="shard-0", Key=key, Body=b"abc")
+    monkeypatch.setenv("S3_SHARDS", '["shard-0", "shard-1"]')
+
+    assert main(["rebalance", "--bucket", TEST_BUCKET_NAME, "--dry-run"]) == 0
+    planned = capsys.readouterr().out.splitlines()
+    assert planned
+    assert all(line.endswith(" shard-0/ -> shard-1/") for line in planned)
+
+    assert main(["rebalance", "--bucket", TEST_BUCKET_NAME]) == 0
+    assert capsys.readouterr().out.splitlines() == planned
+    moved_keys = [obj["Key"] for obj in s3_client.list_objects_v2(Bucket="shard-1")["Contents"]]
+    assert sorted(moved_keys) == sorted(line.split()[0] for line in planned)
+    assert len(s3_client.list_objects_v2(Bucket="shard-0")["Contents"]) == len(keys) - len(moved_keys)
@@ -0,0 +1,110 @@
+"""Test parsing and resolving HTTP headers."""
+
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+import pytest
+
+from files_api.http_headers import (
+    ByteRange,
+    RangeNotSatisfiableError,
+    accepts_content_encoding,
+    format_http_date,
+    is_not_modified,
+    parse_http_date,
+    parse_range_header,
+    resolve_byte_ranges,
+)
+
+
+@pytest.mark.parametrize(
+    "range_header, expected_specs",
+    [
+        ("bytes=0-499", [(0, 499)]),
+        ("bytes=500-", [(500, None)]),
+        ("bytes=-500", [(None, 500)]),
+        ("bytes=0-0, -1", [(0, 0), (None, 1)]),
+        (None, None),
+        ("", None),
+        ("items=0-1", None),
+        ("bytes=5-1", None),
+        ("bytes=-", None),
+        ("bytes=0-1,abc", None),
+    ],
+)
+def test_parse_range_header(range_header, expected_specs):
+    """Test that valid headers are parsed and invalid ones are ignored."""
+    assert parse_range_header(range_header) == expected_specs
+
+
+def test_resolve_byte_ranges():
+    """Test that ranges are clamped to the file and ranges outside of it are dropped."""
+    specs = [(0, 9), (95, 200), (None, 3), (100, None)]
+    assert resolve_byte_ranges(specs, file_size=100) == [
+        ByteRange(first_byte=0, last_byte=9),
+        ByteRange(first_byte=95, last_byte=99),
+        ByteRange(first_byte=97, last_byte=99),
+    ]
+
+
+def test_resolve_byte_ranges__not_satisfiable():
+    """Test that an error is raised when no range overlaps the file."""
+    with pytest.raises(RangeNotSatisfiableError):
+        resolve_byte_ranges([(100, None), (None, 0)], file_size=100)
+
+
+def test_format_and_parse_http_date():
+    """Test that datetimes round-trip through HTTP-dates in GMT."""
+    last_modified = datetime(2022, 1, 1, 1, 0, 0, tzinfo=timezone(timedelta(hours=1)))
+    assert format_http_date(last_modified) == "Sat, 01 Jan 2022 00:00:00 GMT"
+    assert parse_http_date("Sat, 01 Jan 2022 00:00:00 GMT") == last_modified
+    assert parse_http_date("yesterday") is None
+
+
+@pytest.mark.parametrize(
+    "if_none_match, if_modified_since, expected",
+    [
+        ('"abc"', None, True),
+        ('W/"abc"', None, True),
+        ('"xyz", "abc"', None, True),
+        ("*", None, True),
+        ('"xyz"', None, False),
+        # If-Modified-Since is ignored when If-None-Match is present
+        ('"xyz"', "Sat, 01 Jan 2022 00:00:00 GMT", False),
+        (None, "Sat, 01 Jan 2022 00:00:00 GMT", True),
+        (None, "Fri, 31 Dec 2021 23:59:59 GMT", False),
+        (None, "not a date", False),
+    ],
+)
+def test_is_not_modified(if_none_match, if_modified_since, expected):
+    """Test evaluating If-None-Match and If-Modified-Since."""
+    last_modified = datetime(2022, 1, 1, 0, 0, 0, 500_000, tzinfo=timezone.utc)
+    assert (
+        is_not_modified(
+            etag='"abc"',
+            last_modified=last_modified,
+            if_none_match=if_none_match,
+            if_modified_since=if_modified_since,
+        )
+        == expected
+    )
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip", True),
+        ("deflate, GZIP;q=0.5", True),
+        ("br, *", True),
+        ("gzip;q=0", False),
+        ("*, gzip;q=0", False),
+        ("identity", False),
+        (None, False),
+    ],
+)
+def test_accepts_content_encoding(accept_encoding, expected):
+    """Test matching a content coding against an Accept-Encoding header."""
+    assert accepts_content_encoding(accept_encoding, "gzip") == expected
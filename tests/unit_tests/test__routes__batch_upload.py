@@ -0,0 +1,137 @@
+"""Test uploading many files in one request."""
+
+import io
+import tarfile
+import zipfile
+from typing import Callable
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+)
+
+
+def make_tar_gz(files: dict) -> bytes:
+    """Build a gzipped tar archive of the given files."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def make_zip(files: dict) -> bytes:
+    """Build a deflated zip archive of the given files."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_batch_upload__multipart_form(client: TestClient):
+    """Test that every file of a form is uploaded and reported as created or updated."""
+    client.put("/v1/files/docs/a.txt", files={"file": ("a.txt", b"old", "text/plain")})
+
+    response = client.post(
+        "/v1/files/batch-upload",
+        files=[
+            ("files", ("docs/a.txt", b"new a", "text/plain")),
+            ("files", ("docs/b.txt", b"new b", "text/plain")),
+        ],
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [(file["file_path"], file["status"]) for file in response.json()["files"]] == [
+        ("docs/a.txt", "updated"),
+        ("docs/b.txt", "created"),
+    ]
+    assert client.get("/v1/files/docs/a.txt").content == b"new a"
+    assert client.get("/v1/files/docs/b.txt").headers["Content-Type"].startswith("text/plain")
+
+
+def test_batch_upload__tar_gz_into_directory(client: TestClient):
+    """Test that a compressed tar archive is unpacked into the requested directory."""
+    files = {f"file{i}.txt": f"content {i}".encode() for i in range(5)}
+
+    response = client.post(
+        "/v1/files/batch-upload",
+        params={"directory": "unpacked"},
+        content=make_tar_gz(files),
+        headers={"Content-Type": "application/gzip"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["error"] is None
+    assert [file["status"] for file in response.json()["files"]] == ["created"] * 5
+    for name, content in files.items():
+        assert client.get(f"/v1/files/unpacked/{name}").content == content
+
+
+def test_batch_upload__lists_existing_files_once(client: TestClient):
+    """Test that existing files are found with one listing of the directory, not one HEAD per file."""
+    client.put("/v1/files/docs/a.txt", files={"file": ("a.txt", b"old", "text/plain")})
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.post(
+            "/v1/files/batch-upload",
+            params={"directory": "docs"},
+            content=make_tar_gz({"a.txt": b"new a", "b.txt": b"b", "c.txt": b"c"}),
+            headers={"Content-Type": "application/gzip"},
+        )
+
+    assert [file["status"] for file in response.json()["files"]] == ["updated", "created", "created"]
+    assert s3_calls["ListObjectsV2"] == 1
+    assert s3_calls["HeadObject"] == 0
+
+
+def test_batch_upload__zip_and_invalid_paths(client: TestClient):
+    """Test that zip entries with paths escaping their directory are reported as failed, not uploaded."""
+    response = client.post(
+        "/v1/files/batch-upload",
+        content=make_zip({"ok.txt": b"fine", "../escape.txt": b"nope"}),
+        headers={"Content-Type": "application/zip"},
+    )
+
+    assert [(file["file_path"], file["status"]) for file in response.json()["files"]] == [
+        ("ok.txt", "created"),
+        ("../escape.txt", "failed"),
+    ]
+    assert client.get("/v1/files/ok.txt").content == b"fine"
+    assert [file["file_path"] for file in client.get("/v1/files").json()["files"]] == ["ok.txt"]
+
+
+def test_batch_upload__large_entries_use_multipart_uploads(make_client: Callable[..., TestClient]):
+    """Test that entries above the multipart threshold are streamed rather than buffered."""
+    client = make_client(s3_multipart_threshold_bytes=1024)
+    large_content = b"x" * 6 * 1024 * 1024
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.post(
+            "/v1/files/batch-upload",
+            content=make_tar_gz({"small.txt": b"small", "large.bin": large_content}),
+            headers={"Content-Type": "application/x-tar"},
+        )
+
+    assert [file["status"] for file in response.json()["files"]] == ["created", "created"]
+    assert s3_calls["PutObject"] == 1
+    assert s3_calls["CompleteMultipartUpload"] == 1
+    assert client.get("/v1/files/large.bin").content == large_content
+
+
+def test_batch_upload__malformed_archive(client: TestClient):
+    """Test that a malformed archive is reported in the response."""
+    response = client.post("/v1/files/batch-upload", content=b"not a zip", headers={"Content-Type": "application/zip"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"files": [], "error": "Not a zip archive, or a corrupted one"}
+
+
+def test_batch_upload__unsupported_media_type(client: TestClient):
+    """Test that other bodies are rejected."""
+    response = client.post("/v1/files/batch-upload", json={"files": []})
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
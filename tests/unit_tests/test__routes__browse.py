@@ -0,0 +1,63 @@
+"""Test browsing directories one level at a time."""
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from files_api.schemas import GetFilesQueryParams
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    upload_files,
+)
+
+TEST_FILE_PATHS = ["docs/readme.md", "docs/a/1.txt", "docs/a/b/2.txt", "docs/c/3.txt", "docs/z.txt", "other.txt"]
+
+
+def test_list_files__browse_mode(client: TestClient):
+    """Test that browsing lists the files directly in a directory and its subdirectories, with one S3 call a page."""
+    upload_files(client, dict.fromkeys(TEST_FILE_PATHS, b"x"))
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.get("/v1/files?mode=browse&directory=docs&page_size=10")
+    assert s3_calls == {"ListObjectsV2": 1}
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [file["file_path"] for file in page["files"]] == ["docs/readme.md", "docs/z.txt"]
+    assert page["directories"] == ["docs/a/", "docs/c/"]
+    assert page["next_page_token"] is None
+
+    page = client.get("/v1/files?mode=browse").json()
+    assert [file["file_path"] for file in page["files"]] == ["other.txt"]
+    assert page["directories"] == ["docs/"]
+
+    # the recursive listing is unchanged
+    page = client.get("/v1/files?directory=docs/a/").json()
+    assert [file["file_path"] for file in page["files"]] == ["docs/a/1.txt", "docs/a/b/2.txt"]
+    assert page["directories"] == []
+
+
+def test_list_files__browse_mode_pagination(client: TestClient):
+    """Test that browse page tokens continue the same directory level."""
+    for i in range(12):
+        client.put(f"/v1/files/dir/sub{i:02}/file.txt", files={"file": ("file.txt", b"x", "text/plain")})
+    client.put("/v1/files/dir/top.txt", files={"file": ("top.txt", b"x", "text/plain")})
+
+    first_page = client.get("/v1/files?mode=browse&directory=dir/").json()
+    assert len(first_page["directories"]) == 10
+    second_page = client.get(f"/v1/files?page_token={first_page['next_page_token']}").json()
+    assert second_page["directories"] == ["dir/sub10/", "dir/sub11/"]
+    assert [file["file_path"] for file in second_page["files"]] == ["dir/top.txt"]
+    assert second_page["next_page_token"] is None
+
+
+def test_get_files_query_params__browse_mode_is_in_file_path_order(client: TestClient):
+    """Test that browsing cannot be sorted by anything but ascending file path, nor combined with a page token."""
+    with pytest.raises(ValidationError, match="file_path order"):
+        GetFilesQueryParams(mode="browse", sort_by="size_bytes")
+    with pytest.raises(ValidationError, match="file_path order"):
+        GetFilesQueryParams(mode="browse", descending=True)
+    response = client.get("/v1/files?mode=browse&page_token=token")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "mutually exclusive with mode" in response.json()["detail"]
@@ -0,0 +1,56 @@
+"""Test deleting many files at once."""
+
+from typing import Callable
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    read_lines,
+    upload_files,
+)
+
+TEST_FILE_CONTENT = b"some content"
+
+
+def test_bulk_delete__directory_in_batches(make_client: Callable[..., TestClient]):
+    """Test that a directory is listed and deleted in batches, with results streamed per batch."""
+    client = make_client(s3_bulk_delete_batch_size=3)
+    file_paths = [f"generated/file{i}.txt" for i in range(7)]
+    upload_files(client, dict.fromkeys(file_paths + ["kept/file.txt"], TEST_FILE_CONTENT))
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.post("/v1/files/bulk-delete", json={"directory": "generated/"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    *batches, summary = read_lines(response)
+    assert sorted(key for batch in batches for key in batch["deleted"]) == file_paths
+    assert summary == {"done": True, "deleted_count": 7, "error_count": 0}
+    assert s3_calls == {"ListObjectsV2": 3, "DeleteObjects": 3}
+
+    remaining = [file["file_path"] for file in client.get("/v1/files").json()["files"]]
+    assert remaining == ["kept/file.txt"]
+
+
+def test_bulk_delete__file_paths(client: TestClient):
+    """Test deleting an explicit list of files, and that deleted files are no longer served from the cache."""
+    upload_files(client, dict.fromkeys(["a.txt", "b.txt", "c.txt"], TEST_FILE_CONTENT))
+    assert client.head("/v1/files/a.txt").status_code == status.HTTP_200_OK
+
+    response = client.post("/v1/files/bulk-delete", json={"file_paths": ["a.txt", "b.txt"]})
+
+    *batches, summary = read_lines(response)
+    assert sorted(batches[0]["deleted"]) == ["a.txt", "b.txt"]
+    assert summary["deleted_count"] == 2
+    assert client.head("/v1/files/a.txt").status_code == status.HTTP_404_NOT_FOUND
+    assert client.head("/v1/files/c.txt").status_code == status.HTTP_200_OK
+
+
+def test_bulk_delete__needs_exactly_one_selector(client: TestClient):
+    """Test that the request names either files or a directory."""
+    assert client.post("/v1/files/bulk-delete", json={}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = client.post("/v1/files/bulk-delete", json={"file_paths": ["a.txt"], "directory": "dir/"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,72 @@
+"""Test that uploads send S3 a checksum, and that downloads are verified against the recorded SHA-256 digest."""
+
+import base64
+import hashlib
+import os
+import zlib
+from typing import Callable
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from files_api.checksums import (
+    ChecksumMismatchError,
+    crc32_checksum,
+)
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import app_state
+
+CONTENT = b"checked end to end\n" * 100
+
+
+def test_upload__sends_sha256_checksum(client: TestClient):
+    """Test that a single-put upload sends its digest to S3 for checking, and records it with the object."""
+    sent_headers = []
+    app_state(client).s3_client.meta.events.register(
+        "before-call.s3.PutObject", lambda params, **kwargs: sent_headers.append(params["headers"])
+    )
+
+    client.put("/v1/files/notes.bin", files={"file": ("notes.bin", CONTENT, "application/octet-stream")})
+
+    digest = hashlib.sha256(CONTENT)
+    assert sent_headers[0]["x-amz-checksum-sha256"] == base64.b64encode(digest.digest()).decode()
+    obj = app_state(client).s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="notes.bin")
+    assert obj["Metadata"]["sha256"] == digest.hexdigest()
+
+
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+def test_download__sends_repr_digest(client: TestClient, method: str):
+    """Test that downloads carry the recorded digest as a Repr-Digest header."""
+    client.put("/v1/files/notes.bin", files={"file": ("notes.bin", CONTENT, "application/octet-stream")})
+
+    response = client.request(method, "/v1/files/notes.bin")
+
+    assert response.status_code == status.HTTP_200_OK
+    expected = base64.b64encode(hashlib.sha256(CONTENT).digest()).decode()
+    assert response.headers["Repr-Digest"] == f"sha-256=:{expected}:"
+
+
+def test_upload__checks_files_uploaded_in_parts(make_client: Callable[..., TestClient]):
+    """Test that a file uploaded in parts is stored with the CRC32 of its whole content, for S3 to check."""
+    client = make_client(s3_multipart_threshold_bytes=1024)
+    content = os.urandom(1024 * 1024)
+    client.put("/v1/files/big.bin", files={"file": ("big.bin", content, "application/octet-stream")})
+
+    obj = app_state(client).s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="big.bin", ChecksumMode="ENABLED")
+    assert obj["ChecksumCRC32"] == crc32_checksum(zlib.crc32(content))
+    assert obj["ChecksumType"] == "FULL_OBJECT"
+    assert client.get("/v1/files/big.bin").content == content
+
+
+def test_download__fails_on_corrupted_content(client: TestClient):
+    """Test that a download whose bytes do not match the recorded digest is cut short with an error."""
+    app_state(client).s3_client.put_object(
+        Bucket=TEST_BUCKET_NAME,
+        Key="notes.bin",
+        Body=CONTENT[:-1] + b"!",
+        Metadata={"sha256": hashlib.sha256(CONTENT).hexdigest()},
+    )
+
+    with pytest.raises(ChecksumMismatchError):
+        client.get("/v1/files/notes.bin")
@@ -0,0 +1,71 @@
+"""Test that concurrent requests for the same file share their S3 calls."""
+
+import asyncio
+
+from files_api.main import create_app
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    add_s3_latency,
+    count_s3_calls,
+    send_concurrent_requests,
+)
+
+S3_LATENCY_SECONDS = 0.1
+NUM_CONCURRENT_REQUESTS = 10
+
+
+def create_app_with_file(settings: Settings, content: bytes):
+    """Create the app, store a file, and slow down its S3 calls."""
+    app = create_app(settings=settings)
+    app.state.s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="hot.txt", Body=content, ContentType="text/plain")
+    add_s3_latency(app.state.s3_client, S3_LATENCY_SECONDS)
+    return app
+
+
+def test_get_file__concurrent_downloads_share_one_get(mocked_aws: None):
+    """Test that concurrent GETs of a small file make one `get_object` call, and that every client gets the file."""
+    app = create_app_with_file(Settings(s3_bucket_name=TEST_BUCKET_NAME), b"hot content")
+    with count_s3_calls(app.state.s3_client) as s3_calls:
+        responses = asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/files/hot.txt"))
+
+    assert all(response.content == b"hot content" for response in responses)
+    assert s3_calls == {"GetObject": 1}
+    stats = app.state.download_single_flight.stats()
+    assert stats["coalesced"] == NUM_CONCURRENT_REQUESTS - 1
+    assert stats["coalescing_ratio"] == (NUM_CONCURRENT_REQUESTS - 1) / NUM_CONCURRENT_REQUESTS
+
+
+def test_get_file__larger_files_share_only_their_start(mocked_aws: None):
+    """Test that each request downloads the rest of a file larger than the shared part itself."""
+    content = bytes(range(256)) * 4
+    settings = Settings(s3_bucket_name=TEST_BUCKET_NAME, s3_single_flight_max_object_bytes=100)
+    app = create_app_with_file(settings, content)
+    with count_s3_calls(app.state.s3_client) as s3_calls:
+        responses = asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/files/hot.txt"))
+
+    assert all(response.content == content for response in responses)
+    assert s3_calls == {"GetObject": 1 + NUM_CONCURRENT_REQUESTS}
+
+
+def test_get_file_metadata__concurrent_lookups_share_one_head(mocked_aws: None):
+    """Test that concurrent HEADs of a file make one `head_object` call, which the metrics report."""
+    app = create_app_with_file(Settings(s3_bucket_name=TEST_BUCKET_NAME), b"hot content")
+    with count_s3_calls(app.state.s3_client) as s3_calls:
+        responses = asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/files/hot.txt", "HEAD"))
+
+    assert all(response.headers["Content-Length"] == "11" for response in responses)
+    assert s3_calls == {"HeadObject": 1}
+    metrics = asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/metrics"))[0].json()
+    assert metrics["metadata_single_flight"]["coalesced"] == NUM_CONCURRENT_REQUESTS - 1
+
+
+def test_get_file__coalescing_can_be_disabled(mocked_aws: None):
+    """Test that without coalescing every request makes its own call."""
+    settings = Settings(s3_bucket_name=TEST_BUCKET_NAME, s3_single_flight_enabled=False)
+    app = create_app_with_file(settings, b"hot content")
+    with count_s3_calls(app.state.s3_client) as s3_calls:
+        asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/files/hot.txt"))
+
+    assert s3_calls == {"GetObject": NUM_CONCURRENT_REQUESTS}
+    assert app.state.download_single_flight is None
@@ -0,0 +1,120 @@
+"""Test storing compressible files compressed and negotiating their encoding on download."""
+
+import gzip
+import hashlib
+import io
+import zipfile
+from typing import Callable
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import app_state
+
+TEXT = b"the same line, again and again\n" * 200
+
+
+@pytest.fixture
+def gzip_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client that stores compressible uploads gzipped."""
+    return make_client(s3_compression_encoding="gzip")
+
+
+def test_upload__compresses_compressible_types(gzip_client: TestClient):
+    """Test that text is stored gzipped with its uncompressed size, and that other types are stored as is."""
+    gzip_client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+    gzip_client.put("/v1/files/image.png", files={"file": ("image.png", TEXT, "image/png")})
+    s3_client = app_state(gzip_client).s3_client
+
+    obj = s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="notes.txt")
+    assert obj["ContentEncoding"] == "gzip"
+    stored = obj["Body"].read()
+    assert obj["Metadata"] == {"uncompressed-size": str(len(TEXT)), "sha256": hashlib.sha256(stored).hexdigest()}
+    assert gzip.decompress(stored) == TEXT
+    obj = s3_client.get_object(Bucket=TEST_BUCKET_NAME, Key="image.png")
+    assert "ContentEncoding" not in obj
+    assert obj["Body"].read() == TEXT
+
+
+def test_download__sends_stored_gzip_to_clients_accepting_it(gzip_client: TestClient):
+    """Test that a client accepting gzip gets the stored bytes, with their encoding and length."""
+    gzip_client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+    s3_client = app_state(gzip_client).s3_client
+    stored_size = s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="notes.txt")["ContentLength"]
+
+    with gzip_client.stream("GET", "/v1/files/notes.txt", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Length"] == str(stored_size) == str(len(raw))
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(raw) == TEXT
+
+
+def test_download__decompresses_for_other_clients(gzip_client: TestClient):
+    """Test that a client not accepting gzip gets the file decompressed, whole even if it asked for a range."""
+    gzip_client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+
+    for headers in ({"Accept-Encoding": "identity"}, {"Accept-Encoding": "br, gzip;q=0", "Range": "bytes=0-9"}):
+        response = gzip_client.get("/v1/files/notes.txt", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Content-Length"] == str(len(TEXT))
+        assert response.headers["Accept-Ranges"] == "none"
+        assert response.headers["ETag"].startswith("W/")
+        assert response.content == TEXT
+
+
+def test_download__redirects_by_the_size_sent(make_client: Callable[..., TestClient]):
+    """Test that a file is redirected by its decompressed size for clients not accepting its stored encoding."""
+    client = make_client(
+        s3_compression_encoding="gzip",
+        s3_presigned_urls_enabled=True,
+        s3_presigned_download_redirect_threshold_bytes=len(TEXT) - 1,
+    )
+    client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+
+    # the first request downloads the file, the second finds its metadata cached
+    for _ in range(2):
+        response = client.get("/v1/files/notes.txt", headers={"Accept-Encoding": "gzip"}, follow_redirects=False)
+        assert response.status_code == status.HTTP_200_OK
+        response = client.get("/v1/files/notes.txt", headers={"Accept-Encoding": "identity"}, follow_redirects=False)
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+
+
+def test_head__describes_the_negotiated_representation(gzip_client: TestClient):
+    """Test that HEAD reports the encoding and length a GET with the same `Accept-Encoding` would send."""
+    gzip_client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+
+    response = gzip_client.head("/v1/files/notes.txt", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < len(TEXT)
+    response = gzip_client.head("/v1/files/notes.txt", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Length"] == str(len(TEXT))
+
+
+def test_directory_archive__decompresses_members(gzip_client: TestClient):
+    """Test that compressed files are archived decompressed."""
+    gzip_client.put("/v1/files/docs/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+
+    response = gzip_client.get("/v1/files/archive", params={"directory": "docs/"})
+    assert response.status_code == status.HTTP_200_OK
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.read("notes.txt") == TEXT
+
+
+def test_upload__zstd(make_client: Callable[..., TestClient]):
+    """Test that zstd-compressed files round trip, sent as stored or decompressed."""
+    zstandard = pytest.importorskip("zstandard")
+    client = make_client(s3_compression_encoding="zstd")
+    client.put("/v1/files/notes.txt", files={"file": ("notes.txt", TEXT, "text/plain")})
+
+    response = client.get("/v1/files/notes.txt", headers={"Accept-Encoding": "identity"})
+    assert response.content == TEXT
+    with client.stream("GET", "/v1/files/notes.txt", headers={"Accept-Encoding": "zstd"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["Content-Encoding"] == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(raw) == TEXT
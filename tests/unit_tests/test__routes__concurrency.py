@@ -0,0 +1,32 @@
+"""Test that slow S3 calls do not stall other requests on the same worker."""
+
+import asyncio
+import time
+
+import pytest
+
+from files_api.main import create_app
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    add_s3_latency,
+    send_concurrent_requests,
+)
+
+S3_LATENCY_SECONDS = 0.2
+NUM_CONCURRENT_REQUESTS = 10
+
+
+@pytest.mark.slow
+def test__slow_s3_calls_run_concurrently(mocked_aws: None):
+    """Test that concurrent requests overlap their S3 calls instead of queueing on the event loop."""
+    app = create_app(settings=Settings(s3_bucket_name=TEST_BUCKET_NAME))
+    add_s3_latency(app.state.s3_client, S3_LATENCY_SECONDS)
+
+    start_time = time.perf_counter()
+    responses = asyncio.run(send_concurrent_requests(app, NUM_CONCURRENT_REQUESTS, "/v1/files"))
+    elapsed_seconds = time.perf_counter() - start_time
+
+    assert all(response.status_code == 200 for response in responses)
+    # serialized on the event loop this would take NUM_CONCURRENT_REQUESTS * S3_LATENCY_SECONDS
+    assert elapsed_seconds < NUM_CONCURRENT_REQUESTS * S3_LATENCY_SECONDS / 2
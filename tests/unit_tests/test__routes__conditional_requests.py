@@ -0,0 +1,85 @@
+"""Test conditional GET and HEAD requests with ETag and Last-Modified validators."""
+
+from email.utils import parsedate_to_datetime
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    upload_file,
+)
+
+TEST_FILE_PATH = "some/file.txt"
+TEST_FILE_CONTENT = b"some content"
+
+
+def test_get_file__validators(client: TestClient):
+    """Test that HEAD and GET return the same ETag and an HTTP-date Last-Modified."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+
+    head_response = client.head(f"/v1/files/{TEST_FILE_PATH}")
+    get_response = client.get(f"/v1/files/{TEST_FILE_PATH}")
+
+    assert head_response.headers["ETag"] == get_response.headers["ETag"]
+    assert head_response.headers["Last-Modified"] == get_response.headers["Last-Modified"]
+    assert head_response.headers["Last-Modified"].endswith(" GMT")
+    parsedate_to_datetime(head_response.headers["Last-Modified"])
+
+
+def test_get_file__if_none_match(client: TestClient):
+    """Test that a matching ETag returns 304 from a single conditional GET, and a stale one the file."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    etag = client.head(f"/v1/files/{TEST_FILE_PATH}").headers["ETag"]
+    # start cold, so the precondition is evaluated by S3 rather than the metadata cache
+    app_state(client).metadata_cache.invalidate(TEST_BUCKET_NAME, TEST_FILE_PATH)
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert s3_calls == {"GetObject": 1}
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"If-None-Match": f'"stale", {etag}'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == TEST_FILE_CONTENT
+
+
+def test_get_file__if_modified_since(client: TestClient):
+    """Test that If-Modified-Since returns 304 unless the file changed after the given date."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    last_modified = client.head(f"/v1/files/{TEST_FILE_PATH}").headers["Last-Modified"]
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(
+        f"/v1/files/{TEST_FILE_PATH}", headers={"If-Modified-Since": "Thu, 01 Jan 2015 00:00:00 GMT"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_get_file_metadata__if_none_match(client: TestClient):
+    """Test that HEAD evaluates If-None-Match on its single head_object call."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    etag = client.head(f"/v1/files/{TEST_FILE_PATH}").headers["ETag"]
+
+    response = client.head(f"/v1/files/{TEST_FILE_PATH}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == etag
+
+
+def test_get_file__if_none_match_with_range(client: TestClient):
+    """Test that a current copy gets a 304 even when byte ranges are requested."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    etag = client.head(f"/v1/files/{TEST_FILE_PATH}").headers["ETag"]
+
+    for range_header in ["bytes=0-1", "bytes=0-1, 4-5"]:
+        response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"If-None-Match": etag, "Range": range_header})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -0,0 +1,202 @@
+"""Test storing file contents once per digest, with files as pointers to them, and collecting orphaned blobs."""
+
+import asyncio
+import hashlib
+import io
+import os
+import zipfile
+from typing import Callable
+
+import boto3
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from files_api.s3 import write_objects
+from files_api.s3.blobs import (
+    blob_key_for_digest,
+    claim_blob,
+    collect_orphaned_blobs,
+)
+from files_api.s3.executor import S3Executor
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+)
+
+BLOB_BUCKET_NAME = "test-blob-bucket"
+MULTIPART_THRESHOLD_BYTES = 1024
+
+
+@pytest.fixture
+def cas_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client storing file contents in a blob bucket."""
+    boto3.client("s3").create_bucket(Bucket=BLOB_BUCKET_NAME)
+    return make_client(
+        s3_blob_bucket_name=BLOB_BUCKET_NAME,
+        s3_multipart_threshold_bytes=MULTIPART_THRESHOLD_BYTES,
+        s3_presigned_urls_enabled=True,
+    )
+
+
+def _blob_keys(client: TestClient) -> list:
+    """List the keys in the blob bucket."""
+    response = app_state(client).s3_client.list_objects_v2(Bucket=BLOB_BUCKET_NAME)
+    return [obj["Key"] for obj in response.get("Contents", [])]
+
+
+def test_upload__large_file_is_uploaded_straight_to_its_blob(cas_client: TestClient):
+    """Test that a file too large to hash in memory is uploaded to its blob key once, without a copy in S3."""
+    content = os.urandom(MULTIPART_THRESHOLD_BYTES * 3)
+    with count_s3_calls(app_state(cas_client).s3_client) as s3_calls:
+        cas_client.put("/v1/files/a.bin", files={"file": ("a.bin", content, "application/octet-stream")})
+
+    assert s3_calls["CopyObject"] == 0 and s3_calls["UploadPartCopy"] == 0 and s3_calls["DeleteObject"] == 0
+    digest = hashlib.sha256(content).hexdigest()
+    assert _blob_keys(cas_client) == [f"sha256/{digest[:2]}/{digest}"]
+    assert cas_client.get("/v1/files/a.bin").content == content
+
+
+@pytest.mark.parametrize("size", [100, MULTIPART_THRESHOLD_BYTES * 3])
+def test_upload__same_content_is_stored_once(cas_client: TestClient, size: int):
+    """Test that files with the same content point to one blob, and that the second upload sends no content."""
+    content = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+    cas_client.put("/v1/files/a.bin", files={"file": ("a.bin", content, "application/octet-stream")})
+    with count_s3_calls(app_state(cas_client).s3_client) as s3_calls:
+        response = cas_client.put("/v1/files/b.bin", files={"file": ("b.bin", content, "application/octet-stream")})
+    assert response.status_code == status.HTTP_201_CREATED
+    # only the pointer is written
+    assert s3_calls["PutObject"] == 1 and s3_calls["UploadPart"] == 0
+
+    digest = hashlib.sha256(content).hexdigest()
+    assert _blob_keys(cas_client) == [f"sha256/{digest[:2]}/{digest}"]
+    pointer = app_state(cas_client).s3_client.head_object(Bucket=TEST_BUCKET_NAME, Key="b.bin")
+    assert pointer["ContentLength"] == 0
+    for path in ("a.bin", "b.bin"):
+        assert cas_client.get(f"/v1/files/{path}").content == content
+        assert cas_client.head(f"/v1/files/{path}").headers["Content-Length"] == str(size)
+
+
+def test_download__serves_ranges_and_archives_from_blobs(cas_client: TestClient):
+    """Test that ranged downloads and directory archives read the blob of a pointer."""
+    cas_client.put("/v1/files/docs/a.txt", files={"file": ("a.txt", b"hello blob", "text/plain")})
+
+    response = cas_client.get("/v1/files/docs/a.txt", headers={"Range": "bytes=6-"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"blob"
+    response = cas_client.get("/v1/files/archive", params={"directory": "docs/"})
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.read("a.txt") == b"hello blob"
+    assert cas_client.get("/v1/files/docs/missing.txt").status_code == status.HTTP_404_NOT_FOUND
+
+    # a missing blob is reported under the file's path, not the blob's key
+    app_state(cas_client).s3_client.delete_object(Bucket=BLOB_BUCKET_NAME, Key=_blob_keys(cas_client)[0])
+    for headers in ({}, {"Range": "bytes=0-1"}, {"Range": "bytes=0-1,4-5"}):
+        response = cas_client.get("/v1/files/docs/a.txt", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json() == {"detail": "File not found: docs/a.txt"}
+
+
+def test_download__uses_the_content_type_of_each_file(cas_client: TestClient):
+    """Test that files sharing a blob are each served with the content type they were uploaded with."""
+    content = b'{"shared": true}'
+    cas_client.put("/v1/files/a.txt", files={"file": ("a.txt", content, "text/plain")})
+    cas_client.put("/v1/files/b.json", files={"file": ("b.json", content, "application/json")})
+    assert len(_blob_keys(cas_client)) == 1
+
+    for path, content_type in (("a.txt", "text/plain"), ("b.json", "application/json")):
+        for response in (
+            cas_client.get(f"/v1/files/{path}"),
+            cas_client.get(f"/v1/files/{path}", headers={"Range": "bytes=0-1"}),
+            cas_client.head(f"/v1/files/{path}"),
+        ):
+            assert response.status_code in (status.HTTP_200_OK, status.HTTP_206_PARTIAL_CONTENT)
+            assert response.headers["Content-Type"].startswith(content_type)
+        response = cas_client.get(f"/v1/files/{path}", headers={"Range": "bytes=0-1,3-4"})
+        assert response.content.count(f"Content-Type: {content_type}".encode()) == 2
+        presigned_url = cas_client.get(f"/v1/presigned/download/{path}").json()["url"]
+        assert f"response-content-type={content_type.replace('/', '%2F')}" in presigned_url
+
+
+def test_list_files__reports_the_size_of_blobs(cas_client: TestClient):
+    """Test that listing and browsing report the size of a pointer's content, and of empty files as 0."""
+    cas_client.put("/v1/files/docs/a.txt", files={"file": ("a.txt", b"hello blob", "text/plain")})
+    cas_client.put("/v1/files/docs/b.txt", files={"file": ("b.txt", b"hello blob", "text/plain")})
+    cas_client.put("/v1/files/docs/empty.txt", files={"file": ("empty.txt", b"", "text/plain")})
+    expected = {"docs/a.txt": 10, "docs/b.txt": 10, "docs/empty.txt": 0}
+
+    listed = cas_client.get("/v1/files").json()["files"]
+    assert {file["file_path"]: file["size_bytes"] for file in listed} == expected
+    browsed = cas_client.get("/v1/files", params={"mode": "browse", "directory": "docs"}).json()["files"]
+    assert {file["file_path"]: file["size_bytes"] for file in browsed} == expected
+
+
+def test_presigned_upload__known_digest_skips_the_upload(cas_client: TestClient):
+    """Test that a presigned upload of stored content creates the file at once, and of new content gets a URL."""
+    cas_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"stored", "text/plain")})
+
+    body = {"file_path": "b.txt", "size_bytes": 6, "sha256": hashlib.sha256(b"stored").hexdigest()}
+    response = cas_client.post("/v1/presigned/upload", json=body)
+    assert response.json()["deduplicated"] is True
+    assert response.json()["url"] is None
+    assert cas_client.get("/v1/files/b.txt").content == b"stored"
+
+    body = {"file_path": "c.txt", "size_bytes": 3, "sha256": hashlib.sha256(b"new").hexdigest()}
+    response = cas_client.post("/v1/presigned/upload", json=body)
+    assert response.json()["deduplicated"] is False
+    assert response.json()["url"] is not None
+
+
+def test_collect_orphaned_blobs(cas_client: TestClient):
+    """Test that garbage collection deletes only the blobs no file points to, once past the grace period."""
+    cas_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"kept", "text/plain")})
+    cas_client.put("/v1/files/b.txt", files={"file": ("b.txt", b"orphaned", "text/plain")})
+    cas_client.put("/v1/files/c.txt", files={"file": ("c.txt", b"orphaned", "text/plain")})
+    cas_client.delete("/v1/files/b.txt")
+    cas_client.delete("/v1/files/c.txt")
+
+    async def collect(gc_grace_seconds: int) -> list:
+        return await collect_orphaned_blobs(
+            S3Executor(max_workers=2),
+            bucket_name=TEST_BUCKET_NAME,
+            blob_bucket_name=BLOB_BUCKET_NAME,
+            gc_grace_seconds=gc_grace_seconds,
+            s3_client=app_state(cas_client).s3_client,
+        )
+
+    assert asyncio.run(collect(gc_grace_seconds=3600)) == []
+    orphaned = hashlib.sha256(b"orphaned").hexdigest()
+    assert asyncio.run(collect(gc_grace_seconds=0)) == [f"sha256/{orphaned[:2]}/{orphaned}"]
+    assert cas_client.get("/v1/files/a.txt").content == b"kept"
+
+
+def test_claim_blob__refreshes_blobs_too_large_to_copy_at_once(mocked_aws: None, monkeypatch: pytest.MonkeyPatch):
+    """Test that a blob above the `copy_object` limit is copied onto itself in parts, keeping its metadata."""
+    monkeypatch.setattr(write_objects, "S3_MAX_COPY_OBJECT_BYTES", S3_MIN_PART_SIZE_BYTES)
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=BLOB_BUCKET_NAME)
+    content = os.urandom(S3_MIN_PART_SIZE_BYTES + 1)
+    sha256 = hashlib.sha256(content).hexdigest()
+    blob_key = blob_key_for_digest(sha256)
+    s3_client.put_object(
+        Bucket=BLOB_BUCKET_NAME,
+        Key=blob_key,
+        Body=content,
+        ContentType="application/x-tar",
+        ContentEncoding="gzip",
+        Metadata={"sha256": sha256},
+    )
+
+    with count_s3_calls(s3_client) as s3_calls:
+        obj = claim_blob(BLOB_BUCKET_NAME, sha256, gc_grace_seconds=0, s3_client=s3_client)
+
+    assert obj["ContentLength"] == len(content)
+    assert s3_calls == {"HeadObject": 1, "CreateMultipartUpload": 1, "UploadPartCopy": 2, "CompleteMultipartUpload": 1}
+    refreshed = s3_client.get_object(Bucket=BLOB_BUCKET_NAME, Key=blob_key)
+    assert refreshed["LastModified"] >= obj["LastModified"]
+    assert refreshed["ContentType"] == "application/x-tar"
+    assert refreshed["ContentEncoding"] == "gzip"
+    assert refreshed["Metadata"] == {"sha256": sha256}
+    assert refreshed["Body"].read() == content
@@ -0,0 +1,80 @@
+"""Test copying and moving files with server-side copies."""
+
+import os
+from typing import Callable
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from files_api.settings import S3_MIN_PART_SIZE_BYTES
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    read_lines,
+    upload_files,
+)
+
+
+def test_copy_file(client: TestClient):
+    """Test copying one file with a single CopyObject call, and that no bytes are downloaded."""
+    upload_files(client, {"a.txt": b"hello"})
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.post("/v1/files/copy", json={"source": "a.txt", "destination": "b.txt"})
+
+    assert response.status_code == status.HTTP_200_OK
+    batch, summary = read_lines(response)
+    assert batch == {"copied": [{"source": "a.txt", "destination": "b.txt"}], "deleted": [], "errors": []}
+    assert summary == {"done": True, "copied_count": 1, "deleted_count": 0, "error_count": 0}
+    assert s3_calls == {"HeadObject": 1, "CopyObject": 1}
+    assert client.get("/v1/files/a.txt").content == b"hello"
+    assert client.get("/v1/files/b.txt").content == b"hello"
+
+
+def test_move_directory(client: TestClient):
+    """Test moving every file under a prefix, keeping the rest of their paths."""
+    upload_files(client, {"drafts/a.txt": b"a", "drafts/sub/b.txt": b"b", "other/c.txt": b"c"})
+
+    response = client.post(
+        "/v1/files/move", json={"source": "drafts/", "destination": "published/", "recursive": True}
+    )
+
+    *_, summary = read_lines(response)
+    assert summary == {"done": True, "copied_count": 2, "deleted_count": 2, "error_count": 0}
+    paths = [file["file_path"] for file in client.get("/v1/files").json()["files"]]
+    assert paths == ["other/c.txt", "published/a.txt", "published/sub/b.txt"]
+    # the moved files are not served from a stale cache entry
+    assert client.head("/v1/files/drafts/a.txt").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/v1/files/published/sub/b.txt").content == b"b"
+
+
+def test_copy_large_file_in_parts(make_client: Callable[..., TestClient]):
+    """Test that files above the threshold are copied with UploadPartCopy and keep their content type."""
+    client = make_client(
+        s3_copy_multipart_threshold_bytes=S3_MIN_PART_SIZE_BYTES,
+        s3_copy_part_size_bytes=S3_MIN_PART_SIZE_BYTES,
+    )
+    content = os.urandom(S3_MIN_PART_SIZE_BYTES + 1)
+    upload_files(client, {"big.bin": content})
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.post("/v1/files/copy", json={"source": "big.bin", "destination": "copy.bin"})
+
+    assert read_lines(response)[-1]["copied_count"] == 1
+    assert s3_calls["UploadPartCopy"] == 2
+    assert "CopyObject" not in s3_calls
+    copy = client.get("/v1/files/copy.bin")
+    assert copy.content == content
+    assert copy.headers["Content-Type"].startswith("text/plain")
+
+
+def test_copy__missing_source(client: TestClient):
+    """Test that copying nothing is a 404."""
+    response = client.post("/v1/files/copy", json={"source": "missing/", "destination": "x/", "recursive": True})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_copy__destination_inside_source(client: TestClient):
+    """Test that a recursive copy into its own source is rejected."""
+    response = client.post("/v1/files/copy", json={"source": "a/", "destination": "a/b/", "recursive": True})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,64 @@
+"""Test downloading a directory as an archive."""
+
+import io
+import tarfile
+import zipfile
+from typing import Callable
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    upload_files,
+)
+
+FILES = {
+    "docs/readme.md": b"# readme",
+    "docs/guides/setup.txt": b"step 1" * 1000,
+    "docs/empty.txt": b"",
+    "other/skipped.txt": b"not in the directory",
+}
+
+
+def test_download_directory__zip(client: TestClient):
+    """Test that the files of a directory are archived with paths relative to it."""
+    upload_files(client, FILES)
+
+    response = client.get("/v1/files/archive", params={"directory": "docs/"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Type"] == "application/zip"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="docs.zip"'
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == {
+            "readme.md": b"# readme",
+            "guides/setup.txt": b"step 1" * 1000,
+            "empty.txt": b"",
+        }
+
+
+def test_download_directory__tar_across_listing_pages(make_client: Callable[..., TestClient]):
+    """Test a tar archive of a directory spanning several listing pages, with a small prefetch window and chunks."""
+    client = make_client(s3_archive_prefetch_window=2, s3_stream_chunk_size_bytes=100)
+    files = {f"many/file{i:04}.txt": f"content {i}".encode() * 50 for i in range(1005)}
+    s3_client = app_state(client).s3_client
+    for key, content in files.items():
+        s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key=key, Body=content)
+
+    with count_s3_calls(s3_client) as s3_calls:
+        response = client.get("/v1/files/archive", params={"directory": "many/", "format": "tar"})
+
+    assert response.headers["Content-Type"] == "application/x-tar"
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        archived = {member.name: archive.extractfile(member).read() for member in archive}
+    assert archived == {key.removeprefix("many/"): content for key, content in files.items()}
+    assert s3_calls == {"ListObjectsV2": 2, "GetObject": 1005}
+
+
+def test_download_directory__empty(client: TestClient):
+    """Test that a directory without files is a 404 rather than an empty archive."""
+    response = client.get("/v1/files/archive", params={"directory": "nothing/"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
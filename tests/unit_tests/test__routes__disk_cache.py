@@ -0,0 +1,67 @@
+"""Test serving small hot files from the local disk cache."""
+
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+)
+
+
+@pytest.fixture
+def disk_cache_client(make_client: Callable[..., TestClient], tmp_path: Path) -> TestClient:
+    """Create an api test client with the disk cache enabled."""
+    return make_client(
+        disk_cache_enabled=True,
+        disk_cache_directory=str(tmp_path),
+        disk_cache_max_object_bytes=1024,
+    )
+
+
+def test_get_file__second_download_is_served_from_disk(disk_cache_client: TestClient):
+    """Test that a downloaded file is sent from disk next time, without a `GetObject` call."""
+    disk_cache_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"hot file", "text/plain")})
+    first = disk_cache_client.get("/v1/files/a.txt")
+
+    with count_s3_calls(app_state(disk_cache_client).s3_client) as s3_calls:
+        second = disk_cache_client.get("/v1/files/a.txt")
+    assert s3_calls["GetObject"] == 0
+    assert second.status_code == status.HTTP_200_OK
+    assert second.content == b"hot file"
+    assert second.headers["content-type"] == first.headers["content-type"]
+    assert second.headers["etag"] == first.headers["etag"]
+
+    response = disk_cache_client.get("/v1/files/a.txt", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    metrics = disk_cache_client.get("/v1/metrics").json()
+    assert metrics["disk_cache"]["entries"] == 1
+    assert metrics["disk_cache"]["hits"] >= 1
+
+
+def test_get_file__writes_invalidate_the_cached_body(disk_cache_client: TestClient):
+    """Test that overwriting or deleting a cached file serves the new content or a 404."""
+    disk_cache_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"old", "text/plain")})
+    assert disk_cache_client.get("/v1/files/a.txt").content == b"old"
+
+    disk_cache_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"new", "text/plain")})
+    assert disk_cache_client.get("/v1/files/a.txt").content == b"new"
+    disk_cache_client.delete("/v1/files/a.txt")
+    assert disk_cache_client.get("/v1/files/a.txt").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_file__large_files_and_ranges_skip_the_cache(disk_cache_client: TestClient):
+    """Test that files above `disk_cache_max_object_bytes` are not cached, and that ranges are read from S3."""
+    disk_cache_client.put("/v1/files/big.bin", files={"file": ("big.bin", b"x" * 2048, "application/octet-stream")})
+    disk_cache_client.put("/v1/files/a.txt", files={"file": ("a.txt", b"hot file", "text/plain")})
+    disk_cache_client.get("/v1/files/big.bin")
+    disk_cache_client.get("/v1/files/a.txt")
+
+    response = disk_cache_client.get("/v1/files/a.txt", headers={"Range": "bytes=4-"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"file"
+    assert disk_cache_client.get("/v1/metrics").json()["disk_cache"]["entries"] == 1
@@ -55,6 +55,13 @@ def test_get_files_page_token_is_mutually_exclusive_with_page_size_and_directory
     assert "mutually exclusive" in str(response.json())
 
 
+def test_get_files_page_token_is_mutually_exclusive_with_sort_order(client: TestClient):
+    """Test fetching page of files with a page token and a sort order, even the default one."""
+    response = client.get("/v1/files?page_token=token&sort_by=file_path")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "mutually exclusive with sort_by and descending" in str(response.json())
+
+
 # def test_unforeseen_500_error(client: TestClient):
 #     """Test general internal server error for unanticipated errors."""
 #     # delete the S3 bucket and all the objects inside
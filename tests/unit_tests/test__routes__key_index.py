@@ -0,0 +1,71 @@
+"""Test listing and looking up files through the local key index."""
+
+from typing import Callable
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    upload_file,
+)
+
+
+@pytest.fixture
+def indexed_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client whose app keeps a key index."""
+    client = make_client(s3_key_index_enabled=True)
+    app_state(client).key_index.reconcile()
+    return client
+
+
+def test_list_files__sorted_from_key_index(indexed_client: TestClient):
+    """Test that listings in any sort order are paginated from the index, without listing the bucket."""
+    for i, size in enumerate([30, 10, 20, 40, 50, 60, 70, 80, 90, 100, 110, 120]):
+        upload_file(indexed_client, f"dir/file{i:02}.txt", b"x" * size)
+
+    with count_s3_calls(app_state(indexed_client).s3_client) as s3_calls:
+        response = indexed_client.get("/v1/files?directory=dir/&sort_by=size_bytes&descending=true")
+        first_page = response.json()
+        response = indexed_client.get(f"/v1/files?page_token={first_page['next_page_token']}")
+        second_page = response.json()
+    assert not s3_calls
+
+    sizes = [file["size_bytes"] for file in first_page["files"] + second_page["files"]]
+    assert sizes == [120, 110, 100, 90, 80, 70, 60, 50, 40, 30, 20, 10]
+    assert second_page["next_page_token"] is None
+
+
+def test_key_index__tracks_writes(indexed_client: TestClient):
+    """Test that uploads and deletes made through the API show up in the index at once."""
+    upload_file(indexed_client, "a.txt", b"x")
+    assert [file["file_path"] for file in indexed_client.get("/v1/files").json()["files"]] == ["a.txt"]
+
+    with count_s3_calls(app_state(indexed_client).s3_client) as s3_calls:
+        response = indexed_client.delete("/v1/files/a.txt")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert s3_calls == {"DeleteObject": 1}
+    assert indexed_client.get("/v1/files").json()["files"] == []
+    assert indexed_client.delete("/v1/files/a.txt").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_list_files__stale_key_index_falls_back_to_s3(indexed_client: TestClient):
+    """Test that index page tokens resume from S3 while the index is too stale to answer."""
+    for i in range(15):
+        upload_file(indexed_client, f"file{i:02}.txt", b"x")
+    next_page_token = indexed_client.get("/v1/files").json()["next_page_token"]
+
+    app_state(indexed_client).key_index.last_reconciled_at = None
+    response = indexed_client.get(f"/v1/files?page_token={next_page_token}")
+    assert [file["file_path"] for file in response.json()["files"]] == [f"file{i:02}.txt" for i in range(10, 15)]
+
+    response = indexed_client.get("/v1/files?sort_by=last_modified")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def test_list_files__sorting_needs_key_index(client: TestClient):
+    """Test that sort orders S3 cannot list in are rejected without a key index."""
+    response = client.get("/v1/files?sort_by=size_bytes")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
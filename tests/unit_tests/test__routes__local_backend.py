@@ -0,0 +1,69 @@
+"""Test the API running on the local filesystem storage backend, without S3."""
+
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from files_api.s3.local_backend import LocalStorageBackend
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import app_state
+
+
+@pytest.fixture
+def local_client(make_client: Callable[..., TestClient], tmp_path: Path) -> TestClient:
+    """Create an api test client storing files in a temporary directory rather than on S3."""
+    return make_client(
+        storage_backend="local",
+        local_storage_directory=str(tmp_path),
+        local_storage_fsync=False,
+    )
+
+
+def test_local_backend__files_round_trip(local_client: TestClient):
+    """Test uploading, listing, reading, copying and deleting files on local storage."""
+    assert isinstance(app_state(local_client).s3_client, LocalStorageBackend)
+    local_client.put("/v1/files/docs/a.txt", files={"file": ("a.txt", b"hello local", "text/plain")})
+
+    response = local_client.get("/v1/files/docs/a.txt")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"hello local"
+    assert response.headers["Content-Type"].startswith("text/plain")
+    not_modified = local_client.get("/v1/files/docs/a.txt", headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    ranged = local_client.get("/v1/files/docs/a.txt", headers={"Range": "bytes=6-"})
+    assert ranged.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert ranged.content == b"local"
+
+    local_client.post("/v1/files/copy", json={"source": "docs/a.txt", "destination": "docs/b.txt"})
+    files = local_client.get("/v1/files").json()["files"]
+    assert [file["file_path"] for file in files] == ["docs/a.txt", "docs/b.txt"]
+    assert files[0]["size_bytes"] == len(b"hello local")
+
+    assert local_client.delete("/v1/files/docs/a.txt").status_code == status.HTTP_204_NO_CONTENT
+    assert local_client.head("/v1/files/docs/a.txt").status_code == status.HTTP_404_NOT_FOUND
+    assert local_client.get("/v1/files/docs/b.txt").content == b"hello local"
+
+
+def test_local_backend__invalid_page_token(local_client: TestClient):
+    """Test that a page token the backend did not issue is a client error."""
+    response = local_client.get("/v1/files?page_token=not-a-token!")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json() == {"detail": "Invalid page_token"}
+
+
+def test_local_backend__settings_need_a_directory_and_no_presigned_urls(tmp_path: Path):
+    """Test that local storage fails at startup without a directory, or with features needing presigned URLs."""
+    with pytest.raises(ValidationError, match="local_storage_directory"):
+        Settings(s3_bucket_name=TEST_BUCKET_NAME, storage_backend="local")
+    with pytest.raises(ValidationError, match="presign"):
+        Settings(
+            s3_bucket_name=TEST_BUCKET_NAME,
+            storage_backend="local",
+            local_storage_directory=str(tmp_path),
+            s3_presigned_urls_enabled=True,
+        )
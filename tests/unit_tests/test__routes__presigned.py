@@ -0,0 +1,115 @@
+"""Test uploading and downloading files straight with S3 through presigned URLs."""
+
+from typing import Callable
+from urllib.parse import (
+    parse_qs,
+    urlparse,
+)
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import app_state
+
+MULTIPART_THRESHOLD_BYTES = 1024
+PART_SIZE_BYTES = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def presigned_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client with presigned URLs, a key index and a download redirect threshold."""
+    return make_client(
+        s3_presigned_urls_enabled=True,
+        s3_presigned_download_redirect_threshold_bytes=100,
+        s3_multipart_threshold_bytes=MULTIPART_THRESHOLD_BYTES,
+        s3_multipart_part_size_bytes=PART_SIZE_BYTES,
+        s3_key_index_enabled=True,
+    )
+
+
+def test_presigned_upload__single_put(presigned_client: TestClient):
+    """Test that a small file gets one PUT URL, and that completing it makes the file visible to the API."""
+    response = presigned_client.post(
+        "/v1/presigned/upload", json={"file_path": "small.txt", "size_bytes": 5, "content_type": "text/plain"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    upload = response.json()
+    assert upload["upload_id"] is None and upload["parts"] == []
+    assert urlparse(upload["url"]).path.endswith("/small.txt")
+    assert upload["headers"] == {"Content-Type": "text/plain"}
+
+    # moto only intercepts botocore, so the client's PUT to the URL is made with the S3 client instead
+    s3_client = app_state(presigned_client).s3_client
+    s3_client.put_object(Bucket=TEST_BUCKET_NAME, Key="small.txt", Body=b"hello", ContentType="text/plain")
+
+    response = presigned_client.post("/v1/presigned/upload/complete", json={"file_path": "small.txt"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["size_bytes"] == 5
+    assert [file["file_path"] for file in presigned_client.get("/v1/files").json()["files"]] == ["small.txt"]
+    assert presigned_client.get("/v1/files/small.txt").content == b"hello"
+
+
+def test_presigned_upload__multipart(presigned_client: TestClient):
+    """Test that a large file gets one URL per part, and that completing the parts assembles the file."""
+    size = PART_SIZE_BYTES + 10
+    response = presigned_client.post("/v1/presigned/upload", json={"file_path": "big.bin", "size_bytes": size})
+    upload = response.json()
+    assert upload["url"] is None
+    assert [(part["part_number"], part["first_byte"], part["size_bytes"]) for part in upload["parts"]] == [
+        (1, 0, PART_SIZE_BYTES),
+        (2, PART_SIZE_BYTES, 10),
+    ]
+    assert parse_qs(urlparse(upload["parts"][1]["url"]).query)["partNumber"] == ["2"]
+
+    s3_client = app_state(presigned_client).s3_client
+    parts = []
+    for part in upload["parts"]:
+        response = s3_client.upload_part(
+            Bucket=TEST_BUCKET_NAME,
+            Key="big.bin",
+            UploadId=upload["upload_id"],
+            PartNumber=part["part_number"],
+            Body=b"x" * part["size_bytes"],
+        )
+        parts.append({"part_number": part["part_number"], "etag": response["ETag"]})
+
+    response = presigned_client.post(
+        "/v1/presigned/upload/complete",
+        json={"file_path": "big.bin", "upload_id": upload["upload_id"], "parts": parts[::-1]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["size_bytes"] == size
+    assert presigned_client.head("/v1/files/big.bin").headers["Content-Length"] == str(size)
+
+
+def test_presigned_upload__unknown_upload(presigned_client: TestClient):
+    """Test that aborting an upload, or completing a single PUT, that never happened is a 404."""
+    response = presigned_client.post("/v1/presigned/upload/abort", json={"file_path": "a.bin", "upload_id": "nope"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = presigned_client.post("/v1/presigned/upload/complete", json={"file_path": "a.bin"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_file__redirects_above_threshold(presigned_client: TestClient):
+    """Test that whole-file GETs above the threshold are redirected to S3, while small files and ranges stream."""
+    presigned_client.put("/v1/files/small.txt", files={"file": ("small.txt", b"x" * 100, "text/plain")})
+    presigned_client.put("/v1/files/big.txt", files={"file": ("big.txt", b"x" * 101, "text/plain")})
+
+    assert presigned_client.get("/v1/files/small.txt").status_code == status.HTTP_200_OK
+    response = presigned_client.get("/v1/files/big.txt", follow_redirects=False)
+    assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert urlparse(response.headers["Location"]).path.endswith("/big.txt")
+    response = presigned_client.get("/v1/files/big.txt", headers={"Range": "bytes=0-9"}, follow_redirects=False)
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+
+    response = presigned_client.get("/v1/presigned/download/big.txt")
+    assert response.json()["size_bytes"] == 101
+    assert presigned_client.get("/v1/presigned/download/missing.txt").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_presigned_routes__disabled_by_default(client: TestClient):
+    """Test that the presigned endpoints are not served unless enabled."""
+    response = client.post("/v1/presigned/upload", json={"file_path": "a.txt", "size_bytes": 1})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
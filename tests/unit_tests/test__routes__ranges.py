@@ -0,0 +1,73 @@
+"""Test downloading byte ranges of files with the `Range` header."""
+
+from email import message_from_bytes
+from email.message import Message
+from typing import (
+    List,
+    cast,
+)
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import upload_file
+
+TEST_FILE_PATH = "some/file.txt"
+TEST_FILE_CONTENT = b"0123456789abcdefghij"
+
+
+def test_get_file__advertises_range_support(client: TestClient):
+    """Test that HEAD and GET tell clients they may request byte ranges."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    assert client.head(f"/v1/files/{TEST_FILE_PATH}").headers["Accept-Ranges"] == "bytes"
+    assert client.get(f"/v1/files/{TEST_FILE_PATH}").headers["Accept-Ranges"] == "bytes"
+
+
+def test_get_file__single_range(client: TestClient):
+    """Test that a single range returns just those bytes."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"Range": "bytes=2-5"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"2345"
+    assert response.headers["Content-Range"] == "bytes 2-5/20"
+    assert response.headers["Content-Length"] == "4"
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"Range": "bytes=-3"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == b"hij"
+
+
+def test_get_file__multiple_ranges(client: TestClient):
+    """Test that several ranges are returned as a multipart/byteranges body."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"Range": "bytes=0-1, 10-12, 100-"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.headers["Content-Type"].startswith("multipart/byteranges; boundary=")
+    assert int(response.headers["Content-Length"]) == len(response.content)
+
+    message = message_from_bytes(
+        f"Content-Type: {response.headers['Content-Type']}\r\n\r\n".encode() + response.content
+    )
+    parts = [(part["Content-Range"], part.get_payload()) for part in cast(List[Message], message.get_payload())]
+    assert parts == [("bytes 0-1/20", "01"), ("bytes 10-12/20", "abc")]
+
+
+def test_get_file__range_not_satisfiable(client: TestClient):
+    """Test that a range past the end of the file returns 416 with the file size."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+
+    for range_header in ["bytes=20-", "bytes=20-21, 30-"]:
+        response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"Range": range_header})
+        assert response.status_code == status.HTTP_416_RANGE_NOT_SATISFIABLE
+        assert response.headers["Content-Range"] == "bytes */20"
+
+
+def test_get_file__invalid_range_is_ignored(client: TestClient):
+    """Test that an unparseable Range header returns the whole file."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+
+    response = client.get(f"/v1/files/{TEST_FILE_PATH}", headers={"Range": "bytes=5-1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == TEST_FILE_CONTENT
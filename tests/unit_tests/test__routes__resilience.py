@@ -0,0 +1,98 @@
+"""Test that the app retries S3 throttling, then sheds load with 503s while S3 keeps failing."""
+
+import time
+from typing import Callable
+
+import pytest
+from botocore.awsrequest import AWSResponse
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    upload_file,
+)
+
+SLOW_DOWN_BODY = b"<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>"
+
+
+class RawBody:
+    """The raw HTTP body of a canned response."""
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def stream(self, **kwargs):
+        """Yield the whole body at once, as botocore reads it."""
+        yield self.content
+
+
+class FaultInjectingS3:
+    """A stand-in for S3 that answers the next `num_faults` requests with a 503 SlowDown, and passes the rest on."""
+
+    def __init__(self, s3_client):
+        self.num_faults = 0
+        self.num_requests = 0
+        # ahead of moto, which answers every request it sees
+        s3_client.meta.events.register_first("before-send.s3", self.send)
+
+    def send(self, request, **kwargs):
+        """Answer the request with a fault while any are left, or return None to let it through."""
+        self.num_requests += 1
+        if self.num_faults == 0:
+            return None
+        self.num_faults -= 1
+        return AWSResponse(request.url, 503, {}, RawBody(SLOW_DOWN_BODY))
+
+
+@pytest.fixture
+def faulty_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client whose S3 calls fail on demand, without retries and with a short circuit reset."""
+    client = make_client(
+        s3_retry_mode="standard",
+        s3_max_attempts=1,
+        s3_circuit_breaker_failure_threshold=2,
+        s3_circuit_breaker_reset_seconds=0.2,
+    )
+    upload_file(client, "a.txt", b"content")
+    return client
+
+
+@pytest.fixture
+def faulty_s3(faulty_client: TestClient) -> FaultInjectingS3:
+    """Inject faults into the S3 calls of `faulty_client`."""
+    return FaultInjectingS3(app_state(faulty_client).s3_client)
+
+
+def test_throttling__is_retried_with_backoff(make_client: Callable[..., TestClient]):
+    """Test that a throttled call succeeds on a later attempt, unseen by the client."""
+    client = make_client(s3_max_attempts=3)
+    upload_file(client, "a.txt", b"content")
+    s3 = FaultInjectingS3(app_state(client).s3_client)
+    s3.num_faults = 1
+    response = client.get("/v1/files/a.txt")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"content"
+    assert s3.num_requests == 2
+
+
+def test_throttling__opens_the_circuit(faulty_client: TestClient, faulty_s3: FaultInjectingS3):
+    """Test that failed calls answer 503 with `Retry-After`, and that an open circuit sheds calls without S3."""
+    faulty_s3.num_faults = 2
+    for _ in range(2):
+        response = faulty_client.get("/v1/files/a.txt")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+
+    response = faulty_client.head("/v1/files/other.txt")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert faulty_s3.num_requests == 2
+    breaker = faulty_client.get("/v1/metrics").json()["s3_circuit_breaker"]
+    assert breaker["state"] == "open"
+    assert breaker["rejected_calls"] == 1
+
+    # once the circuit half-opens, a successful probe closes it
+    time.sleep(0.25)
+    assert faulty_client.get("/v1/files/a.txt").content == b"content"
+    assert faulty_client.get("/v1/metrics").json()["s3_circuit_breaker"]["state"] == "closed"
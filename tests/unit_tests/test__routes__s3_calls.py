@@ -0,0 +1,99 @@
+"""Test that each route needs as few S3 round trips as possible."""
+
+import os
+from typing import Callable
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+    upload_file,
+)
+
+TEST_FILE_PATH = "some/file.txt"
+TEST_FILE_CONTENT = b"some content"
+
+
+def test_upload_file__one_metadata_call(client: TestClient):
+    """Test that the created-or-updated status comes from a single HEAD."""
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    assert s3_calls == {"HeadObject": 1, "PutObject": 1}
+
+
+def test_get_file_metadata__one_call(client: TestClient):
+    """Test that HEAD uses head_object and never downloads the body."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.head(f"/v1/files/{TEST_FILE_PATH}")
+    assert response.status_code == status.HTTP_200_OK
+    assert s3_calls == {"HeadObject": 1}
+
+
+def test_get_file__one_call(client: TestClient):
+    """Test that GET fetches the object with a single get_object, whether or not it exists."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.get(f"/v1/files/{TEST_FILE_PATH}")
+    assert response.status_code == status.HTTP_200_OK
+    assert s3_calls == {"GetObject": 1}
+
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.get("/v1/files/nonexistant_file.txt")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert s3_calls == {"GetObject": 1}
+
+
+def test_delete_file__no_body_download(client: TestClient):
+    """Test that DELETE checks existence with a HEAD rather than a GET."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        client.delete(f"/v1/files/{TEST_FILE_PATH}")
+    assert s3_calls == {"HeadObject": 1, "DeleteObject": 1}
+
+
+def test_get_file__large_object_uses_parallel_ranged_gets(make_client: Callable[..., TestClient]):
+    """Test that objects above the threshold are fetched with ranged GETs and reassembled in order."""
+    client = make_client(
+        s3_parallel_download_threshold_bytes=1024,
+        s3_parallel_download_part_size_bytes=256,
+        s3_parallel_download_concurrency=3,
+    )
+    content = os.urandom(5000)
+    upload_file(client, "big.bin", content, "application/octet-stream")
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        response = client.get("/v1/files/big.bin")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Length"] == str(len(content))
+    assert response.content == content
+    # the first GET covers the threshold, the remaining 3976 bytes take 16 ranged GETs of 256 bytes
+    assert s3_calls == {"GetObject": 1 + 16}
+
+
+def test_metadata_cache__repeated_lookups(client: TestClient):
+    """Test that repeated lookups of a key, found or not, reach S3 once until the key is written."""
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        for _ in range(3):
+            assert client.head(f"/v1/files/{TEST_FILE_PATH}").status_code == status.HTTP_200_OK
+            assert client.head("/v1/files/missing.txt").status_code == status.HTTP_404_NOT_FOUND
+            assert client.get("/v1/files/missing.txt").status_code == status.HTTP_404_NOT_FOUND
+    assert s3_calls == {"HeadObject": 2}
+
+    # writes through the API invalidate the cached metadata
+    upload_file(client, TEST_FILE_PATH, TEST_FILE_CONTENT)
+    upload_file(client, "missing.txt", TEST_FILE_CONTENT)
+    with count_s3_calls(app_state(client).s3_client) as s3_calls:
+        assert client.head(f"/v1/files/{TEST_FILE_PATH}").status_code == status.HTTP_200_OK
+        assert client.get("/v1/files/missing.txt").status_code == status.HTTP_200_OK
+    assert s3_calls == {"HeadObject": 1, "GetObject": 1}
+
+    client.delete("/v1/files/missing.txt")
+    assert client.head("/v1/files/missing.txt").status_code == status.HTTP_404_NOT_FOUND
+
+    metrics = client.get("/v1/metrics").json()["metadata_cache"]
+    assert metrics["hits"] > 0
+    assert metrics["misses"] > 0
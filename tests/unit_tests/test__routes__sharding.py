@@ -0,0 +1,78 @@
+"""Test the API storing files on several shard buckets, which clients never see."""
+
+from typing import Callable
+
+import boto3
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from files_api.main import create_app
+from files_api.s3.sharding import ShardedStorageBackend
+from files_api.settings import Settings
+from tests.consts import TEST_BUCKET_NAME
+from tests.unit_tests.utils import (
+    app_state,
+    count_s3_calls,
+)
+
+SHARD_BUCKET_NAMES = ["files-shard-0", "files-shard-1"]
+
+
+@pytest.fixture
+def sharded_client(make_client: Callable[..., TestClient]) -> TestClient:
+    """Create an api test client storing files on two shard buckets."""
+    s3_client = boto3.client("s3")
+    for bucket_name in SHARD_BUCKET_NAMES:
+        s3_client.create_bucket(Bucket=bucket_name)
+    return make_client(s3_shards=SHARD_BUCKET_NAMES)
+
+
+def test_sharding__files_round_trip(sharded_client: TestClient):
+    """Test that uploads spread over the shards, and that listing, reading, copying and deleting are unchanged."""
+    assert isinstance(app_state(sharded_client).s3_client, ShardedStorageBackend)
+    file_paths = sorted(f"docs/{i}.txt" for i in range(25))
+    for file_path in file_paths:
+        sharded_client.put(f"/v1/files/{file_path}", files={"file": (file_path, file_path.encode(), "text/plain")})
+
+    s3_client = boto3.client("s3")
+    shard_keys = [
+        [obj["Key"] for obj in s3_client.list_objects_v2(Bucket=bucket_name).get("Contents", [])]
+        for bucket_name in SHARD_BUCKET_NAMES
+    ]
+    assert all(shard_keys)
+    assert sorted(shard_keys[0] + shard_keys[1]) == file_paths
+
+    listed = sharded_client.get("/v1/files", params={"page_size": 100}).json()["files"]
+    assert [file["file_path"] for file in listed] == file_paths
+    browsed = sharded_client.get("/v1/files", params={"mode": "browse"}).json()
+    assert browsed["directories"] == ["docs/"]
+
+    with count_s3_calls(app_state(sharded_client).s3_client) as s3_calls:
+        assert sharded_client.get("/v1/files/docs/3.txt").content == b"docs/3.txt"
+    assert s3_calls == {"GetObject": 1}
+
+    sharded_client.post("/v1/files/copy", json={"source": "docs/3.txt", "destination": "copies/3.txt"})
+    assert sharded_client.get("/v1/files/copies/3.txt").content == b"docs/3.txt"
+    assert sharded_client.delete("/v1/files/docs/3.txt").status_code == status.HTTP_204_NO_CONTENT
+    assert sharded_client.head("/v1/files/docs/3.txt").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_sharding__shutdown_releases_the_listing_threads(mocked_aws: None):
+    """Test that stopping the app shuts down the thread pool listing the shards."""
+    s3_client = boto3.client("s3")
+    for bucket_name in SHARD_BUCKET_NAMES:
+        s3_client.create_bucket(Bucket=bucket_name)
+    settings = Settings(s3_bucket_name=TEST_BUCKET_NAME, s3_shards=SHARD_BUCKET_NAMES)
+    with TestClient(create_app(settings=settings)) as client:
+        backend = app_state(client).s3_client
+
+    with pytest.raises(RuntimeError, match="shutdown"):
+        backend.list_objects_v2(Bucket=TEST_BUCKET_NAME)
+
+
+def test_sharding__settings_reject_shards_in_the_blob_bucket():
+    """Test that shards cannot share the blob bucket, whose blobs would be listed as files."""
+    with pytest.raises(ValidationError, match="s3_blob_bucket_name"):
+        Settings(s3_bucket_name=TEST_BUCKET_NAME, s3_shards=["blobs/files/"], s3_blob_bucket_name="blobs")
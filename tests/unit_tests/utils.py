@@ -1,8 +1,23 @@
 """Define commonly used utils."""
 
-from typing import Tuple
+import asyncio
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Tuple,
+    cast,
+)
 
 import boto3
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.datastructures import State
 
 from files_api.s3.write_objects import upload_s3_object
 from tests.consts import TEST_BUCKET_NAME
@@ -25,3 +40,55 @@ def upload_test_object() -> Tuple[str, bytes, str]:
         bucket_name=TEST_BUCKET_NAME, object_key=object_key, file_content=file_content, content_type=content_type
     )
     return object_key, file_content, content_type
+
+
+@contextmanager
+def count_s3_calls(s3_client) -> Iterator[Counter]:
+    """Count the S3 API calls made by `s3_client`, keyed by operation name, e.g. "HeadObject"."""
+    s3_calls: Counter = Counter()
+
+    def count_call(model, **kwargs):
+        s3_calls[model.name] += 1
+
+    s3_client.meta.events.register("before-call.s3", count_call, unique_id="count_s3_calls")
+    try:
+        yield s3_calls
+    finally:
+        s3_client.meta.events.unregister("before-call.s3", unique_id="count_s3_calls")
+
+
+def app_state(client: TestClient) -> State:
+    """Get the state of the app a test client calls, e.g. its S3 client and caches."""
+    return cast(FastAPI, client.app).state
+
+
+def upload_file(client: TestClient, file_path: str, content: bytes, content_type: str = "text/plain"):
+    """Upload a file through the API, returning the response of the test client."""
+    return client.put(f"/v1/files/{file_path}", files={"file": (file_path, content, content_type)})
+
+
+def upload_files(client: TestClient, files: Dict[str, bytes]) -> None:
+    """Upload files through the API, keyed by their path."""
+    for file_path, content in files.items():
+        upload_file(client, file_path, content)
+
+
+def read_lines(response) -> list:
+    """Parse an NDJSON response of the test client."""
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def add_s3_latency(s3_client, latency_seconds: float) -> None:
+    """Simulate a slow S3 endpoint by delaying every call made by `s3_client`."""
+
+    def sleep(**kwargs):
+        time.sleep(latency_seconds)
+
+    s3_client.meta.events.register("before-call.s3", sleep)
+
+
+async def send_concurrent_requests(app, num_requests: int, path: str, method: str = "GET") -> List[httpx.Response]:
+    """Send `num_requests` identical requests to the app at once."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await asyncio.gather(*[client.request(method, path) for _ in range(num_requests)])